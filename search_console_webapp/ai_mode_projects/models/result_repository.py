@@ -7,10 +7,12 @@ inner SQL raises.
 """
 
 import logging
-import json
+from collections import defaultdict
 from datetime import date, timedelta
-from typing import List, Dict
+from typing import List, Dict, Set
+from psycopg2.extras import execute_values
 from database import get_db_connection
+from services import payload_blobs
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,8 @@ class ResultRepository:
                      country_code: str):
         """
         Crear un nuevo resultado de análisis AI Mode
+
+        `serp_data` se guarda en `payload_blobs` (la fila solo lleva su hash).
         """
         conn = get_db_connection()
         if not conn:
@@ -32,23 +36,16 @@ class ResultRepository:
         try:
             cur = conn.cursor()
             try:
-                cur.execute("""
-                    INSERT INTO ai_mode_results (
-                        project_id, keyword_id, analysis_date, keyword, brand_name,
-                        brand_mentioned, mention_position, mention_context,
-                        total_sources, sentiment, raw_ai_mode_data, country_code
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    project_id, keyword_id, analysis_date, keyword, brand_name,
-                    ai_result.get('brand_mentioned', False),
-                    ai_result.get('mention_position'),
-                    ai_result.get('mention_context'),
-                    ai_result.get('total_sources', 0),
-                    ai_result.get('sentiment', 'neutral'),
-                    json.dumps(serp_data),
-                    country_code
-                ))
-
+                ResultRepository.insert_results(cur, [{
+                    'project_id': project_id,
+                    'keyword_id': keyword_id,
+                    'analysis_date': analysis_date,
+                    'keyword': keyword,
+                    'brand_name': brand_name,
+                    'ai_result': ai_result,
+                    'serp_data': serp_data,
+                    'country_code': country_code,
+                }])
                 conn.commit()
 
             except Exception as e:
@@ -60,6 +57,87 @@ class ResultRepository:
             except Exception:
                 pass
 
+    @staticmethod
+    def insert_results(cur, results: List[Dict], replace: bool = False) -> None:
+        """
+        Insertar un lote de resultados AI Mode con el cursor del llamador (sin commit).
+
+        Cada resultado lleva los argumentos de `create_result`. Con `replace`
+        se borran antes los resultados del mismo día de esas keywords
+        (sobreescritura del análisis manual).
+        """
+        if not results:
+            return
+        if replace:
+            ResultRepository.delete_results_for_keywords(cur, results)
+
+        packed = payload_blobs.pack_payloads(cur, [r['serp_data'] for r in results])
+        rows = []
+        for r, (serp_json, serp_hash) in zip(results, packed):
+            ai_result = r['ai_result']
+            rows.append((
+                r['project_id'], r['keyword_id'], r['analysis_date'], r['keyword'], r['brand_name'],
+                ai_result.get('brand_mentioned', False),
+                ai_result.get('mention_position'),
+                ai_result.get('mention_context'),
+                ai_result.get('total_sources', 0),
+                ai_result.get('sentiment', 'neutral'),
+                serp_json,
+                serp_hash,
+                r['country_code']
+            ))
+
+        execute_values(cur, """
+            INSERT INTO ai_mode_results (
+                project_id, keyword_id, analysis_date, keyword, brand_name,
+                brand_mentioned, mention_position, mention_context,
+                total_sources, sentiment, raw_ai_mode_data, raw_ai_mode_data_hash,
+                country_code
+            ) VALUES %s
+            ON CONFLICT (project_id, keyword_id, analysis_date) DO NOTHING
+        """, rows)
+
+    @staticmethod
+    def delete_results_for_keywords(cur, results: List[Dict]) -> None:
+        """Borrar (sin commit) los resultados AI Mode existentes de las keywords/días del lote"""
+        keys = defaultdict(list)
+        for r in results:
+            keys[(r['project_id'], r['analysis_date'])].append(r['keyword_id'])
+        for (project_id, analysis_date), keyword_ids in keys.items():
+            cur.execute("""
+                DELETE FROM ai_mode_results
+                WHERE project_id = %s AND analysis_date = %s AND keyword_id = ANY(%s)
+            """, (project_id, analysis_date, keyword_ids))
+
+    @staticmethod
+    def get_analyzed_keyword_ids(project_id: int, analysis_date: date) -> Set[int]:
+        """
+        IDs de las keywords del proyecto AI Mode que ya tienen resultado en la
+        fecha (una consulta para todo el lote en vez de una por keyword)
+        """
+        conn = get_db_connection()
+        if not conn:
+            logger.error(f"get_analyzed_keyword_ids[ai_mode]({project_id}): no DB connection")
+            return set()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    SELECT keyword_id FROM ai_mode_results
+                    WHERE project_id = %s AND analysis_date = %s
+                """, (project_id, analysis_date))
+
+                return {row['keyword_id'] for row in cur.fetchall()}
+
+            except Exception as e:
+                logger.error(f"Error fetching analyzed AI Mode keywords: {e}")
+                return set()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     @staticmethod
     def result_exists_for_date(project_id: int, keyword_id: int, analysis_date: date) -> bool:
         """
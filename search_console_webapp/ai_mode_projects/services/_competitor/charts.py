@@ -7,6 +7,7 @@ import json
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 from services.utils import normalize_search_console_url
 from ai_mode_projects.config import MAX_COMPETITORS_PER_PROJECT
 
@@ -74,16 +75,17 @@ class _ChartsMixin:
             cur.execute("""
                 SELECT 
                     r.raw_ai_mode_data,
+                    r.raw_ai_mode_data_hash,
                     r.analysis_date,
                     r.keyword_id
                 FROM ai_mode_results r
                 WHERE r.project_id = %s 
                     AND r.analysis_date >= %s 
                     AND r.analysis_date <= %s
-                    AND r.raw_ai_mode_data IS NOT NULL
+                    AND (r.raw_ai_mode_data IS NOT NULL OR r.raw_ai_mode_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
             
-            results = cur.fetchall()
+            results = hydrate_payloads(cur.fetchall(), 'raw_ai_mode_data')
             
             cur.close()
             conn.close()
@@ -314,15 +316,15 @@ class _ChartsMixin:
                     
                     # Obtener todos los resultados para procesar
                     cur.execute("""
-                        SELECT raw_ai_mode_data, analysis_date, keyword_id
+                        SELECT raw_ai_mode_data, raw_ai_mode_data_hash, analysis_date, keyword_id
                         FROM ai_mode_results
                         WHERE project_id = %s 
                           AND analysis_date >= %s 
                           AND analysis_date <= %s
-                          AND raw_ai_mode_data IS NOT NULL
+                          AND (raw_ai_mode_data IS NOT NULL OR raw_ai_mode_data_hash IS NOT NULL)
                     """, (project_id, start_date, end_date))
                     
-                    comp_results = cur.fetchall()
+                    comp_results = hydrate_payloads(cur.fetchall(), 'raw_ai_mode_data')
                     
                     # Agrupar por fecha
                     mentions_by_date = defaultdict(lambda: {'keywords': set(), 'positions': []})
@@ -6,6 +6,7 @@ import logging
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 
 logger = logging.getLogger(__name__)
 
@@ -113,13 +114,14 @@ class _DomainsMixin:
             cur.execute("""
                 SELECT
                     raw_ai_mode_data,
+                    raw_ai_mode_data_hash,
                     analysis_date,
                     keyword_id
                 FROM ai_mode_results
                 WHERE project_id = %s
                     AND analysis_date >= %s
                     AND analysis_date <= %s
-                    AND raw_ai_mode_data IS NOT NULL
+                    AND (raw_ai_mode_data IS NOT NULL OR raw_ai_mode_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
 
             results = cur.fetchall()
@@ -128,6 +130,7 @@ class _DomainsMixin:
                 conn.close()
             except Exception:
                 pass
+        results = hydrate_payloads(results, 'raw_ai_mode_data')
 
         # Contador de dominios: {domain: {mentions: int, positions: [], dates: set}}
         domain_stats = defaultdict(lambda: {
@@ -247,12 +250,13 @@ class _DomainsMixin:
                 SELECT
                     r.id,
                     r.keyword,
-                    r.raw_ai_mode_data
+                    r.raw_ai_mode_data,
+                    r.raw_ai_mode_data_hash
                 FROM ai_mode_results r
                 WHERE r.project_id = %s
                     AND r.analysis_date >= %s
                     AND r.analysis_date <= %s
-                    AND r.raw_ai_mode_data IS NOT NULL
+                    AND (r.raw_ai_mode_data IS NOT NULL OR r.raw_ai_mode_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
 
             results = cur.fetchall()
@@ -261,6 +265,7 @@ class _DomainsMixin:
                 conn.close()
             except Exception:
                 pass
+        results = hydrate_payloads(results, 'raw_ai_mode_data')
 
         # Procesar referencias y agrupar URLs
         url_mentions = {}
@@ -6,6 +6,7 @@ import logging
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 
 logger = logging.getLogger(__name__)
 
@@ -145,8 +146,11 @@ class _KeywordsMixin:
 
             keywords = [dict(row) for row in cur.fetchall()]
 
-            # Para cada keyword, obtener información de competidores desde raw_ai_mode_data
+            # Para cada keyword, obtener información de competidores desde raw_ai_mode_data.
+            # Las filas se recogen en el bucle y los payloads se cargan al final en
+            # una sola consulta, ya con la conexión devuelta al pool.
             result_keywords = []
+            raw_rows = []
             for kw in keywords:
                 keyword_data = {
                     'keyword': kw['keyword'],
@@ -159,73 +163,86 @@ class _KeywordsMixin:
                 # Extraer competidores de raw_ai_mode_data si hay análisis
                 if competitor_domains and kw['last_analysis']:
                     cur.execute("""
-                        SELECT raw_ai_mode_data
+                        SELECT raw_ai_mode_data, raw_ai_mode_data_hash
                         FROM ai_mode_results
                         WHERE project_id = %s
                             AND keyword_id = %s
                             AND analysis_date = %s
-                            AND raw_ai_mode_data IS NOT NULL
+                            AND (raw_ai_mode_data IS NOT NULL OR raw_ai_mode_data_hash IS NOT NULL)
                     """, (project_id, kw['id'], kw['last_analysis']))
 
                     result_row = cur.fetchone()
-                    if result_row and result_row['raw_ai_mode_data']:
-                        try:
-                            from urllib.parse import urlparse
-                            serp_data = result_row['raw_ai_mode_data']
-                            references = serp_data.get('references', [])
-
-                            # Ordenar referencias por el campo 'index' (0-based) para mantener consistencia
-                            # con analysis_service.py
-                            enriched_refs = []
-                            for i, ref in enumerate(references):
-                                if not isinstance(ref, dict):
-                                    continue
-                                idx = ref.get('index')
-                                idx_num = idx if isinstance(idx, int) and idx >= 0 else None
-                                enriched_refs.append((idx_num, i, ref))
-                            enriched_refs.sort(key=lambda t: (t[0] is None, t[0] if t[0] is not None else 10**9, t[1]))
-
-                            # Buscar cada competidor en las references ordenadas
-                            for comp_domain in competitor_domains:
-                                comp_lower = comp_domain.lower()
-                                found = False
-                                for loop_idx, (index_value, original_idx, ref) in enumerate(enriched_refs):
-                                    link = ref.get('link', '')
-                                    if link:
-                                        try:
-                                            parsed = urlparse(link)
-                                            domain = parsed.netloc.lower()
-                                            if domain.startswith('www.'):
-                                                domain = domain[4:]
-
-                                            # Si el dominio coincide con el competidor
-                                            if comp_lower in domain or domain in comp_lower:
-                                                # Calcular posición: usar index (0-based) + 1, igual que en analysis_service.py
-                                                actual_index = ref.get('index')
-                                                position = (actual_index + 1) if isinstance(actual_index, int) and actual_index >= 0 else (loop_idx + 1)
-
-                                                keyword_data['competitors'].append({
-                                                    'domain': comp_domain,
-                                                    'position': position
-                                                })
-                                                found = True
-                                                break  # Solo la primera aparición de este competidor
-                                        except:
-                                            continue
-                                    if found:
-                                        break
-                        except Exception as e:
-                            logger.warning(f"Error extracting competitors from raw_ai_mode_data: {e}")
+                    if result_row:
+                        raw_rows.append((keyword_data, result_row))
 
                 result_keywords.append(keyword_data)
-
-            return {
-                'keywordResults': result_keywords,
-                'competitorDomains': competitor_domains,
-                'total_keywords': len(result_keywords)
-            }
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
+
+        hydrated = hydrate_payloads([row for _, row in raw_rows], 'raw_ai_mode_data')
+        for (keyword_data, _), result_row in zip(raw_rows, hydrated):
+            if result_row['raw_ai_mode_data']:
+                keyword_data['competitors'] = _KeywordsMixin._competitor_positions(
+                    result_row['raw_ai_mode_data'], competitor_domains
+                )
+
+        return {
+            'keywordResults': result_keywords,
+            'competitorDomains': competitor_domains,
+            'total_keywords': len(result_keywords)
+        }
+
+    @staticmethod
+    def _competitor_positions(serp_data: Dict, competitor_domains: List[str]) -> List[Dict]:
+        """Posición de cada competidor en las references de una respuesta de AI Mode."""
+        competitors = []
+        try:
+            from urllib.parse import urlparse
+            references = serp_data.get('references', [])
+
+            # Ordenar referencias por el campo 'index' (0-based) para mantener consistencia
+            # con analysis_service.py
+            enriched_refs = []
+            for i, ref in enumerate(references):
+                if not isinstance(ref, dict):
+                    continue
+                idx = ref.get('index')
+                idx_num = idx if isinstance(idx, int) and idx >= 0 else None
+                enriched_refs.append((idx_num, i, ref))
+            enriched_refs.sort(key=lambda t: (t[0] is None, t[0] if t[0] is not None else 10**9, t[1]))
+
+            # Buscar cada competidor en las references ordenadas
+            for comp_domain in competitor_domains:
+                comp_lower = comp_domain.lower()
+                found = False
+                for loop_idx, (index_value, original_idx, ref) in enumerate(enriched_refs):
+                    link = ref.get('link', '')
+                    if link:
+                        try:
+                            parsed = urlparse(link)
+                            domain = parsed.netloc.lower()
+                            if domain.startswith('www.'):
+                                domain = domain[4:]
+
+                            # Si el dominio coincide con el competidor
+                            if comp_lower in domain or domain in comp_lower:
+                                # Calcular posición: usar index (0-based) + 1, igual que en analysis_service.py
+                                actual_index = ref.get('index')
+                                position = (actual_index + 1) if isinstance(actual_index, int) and actual_index >= 0 else (loop_idx + 1)
+
+                                competitors.append({
+                                    'domain': comp_domain,
+                                    'position': position
+                                })
+                                found = True
+                                break  # Solo la primera aparición de este competidor
+                        except:
+                            continue
+                    if found:
+                        break
+        except Exception as e:
+            logger.warning(f"Error extracting competitors from raw_ai_mode_data: {e}")
+        return competitors
@@ -3,6 +3,7 @@ Servicio de análisis de keywords con AI Mode
 Motor principal del sistema AI Mode Monitoring
 """
 
+import functools
 import logging
 import json
 import time
@@ -19,13 +20,17 @@ from ai_mode_projects.models.result_repository import ResultRepository
 from ai_mode_projects.utils.country_utils import convert_iso_to_internal_country
 from ai_mode_projects.utils.decorators import with_backoff
 from ai_mode_projects.services.domains_service import DomainsService
+from services import serp_store
+from services.bulk_writer import BufferedWriter
 
 logger = logging.getLogger(__name__)
 
 # Frescura de datos: forzar a SerpAPI a ignorar su caché de servidor para
 # obtener un resultado de AI Mode actual en cada análisis (objetividad por
 # mercado). Configurable por env para poder revertir sin redeploy si el
-# coste en RU lo requiere. Por defecto: activado.
+# coste en RU lo requiere. Por defecto: activado. Con el almacén compartido
+# (services/serp_store.py) equivale a "como mucho una descarga fresca por
+# búsqueda, país y día": el resto de análisis del día reutilizan esa SERP.
 SERP_NO_CACHE = os.getenv('SERP_NO_CACHE', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
 
 # Lazy imports para evitar problemas de orden
@@ -157,6 +162,15 @@ class AnalysisService:
         analysis_mode = "MANUAL (with overwrite)" if force_overwrite else "AUTOMATIC (skip existing)"
         logger.info(f"🚀 Starting AI Mode {analysis_mode} analysis for project {project_id} with {len(keywords)} keywords")
         
+        # Los resultados se acumulan y se escriben en bloque (una transacción
+        # cada RESULT_BULK_FLUSH_EVERY keywords); hay que volcar lo pendiente
+        # antes de cada retorno.
+        analyzed_today = self.result_repo.get_analyzed_keyword_ids(project_id, today)
+        writer = BufferedWriter(
+            functools.partial(self._persist_results, replace=force_overwrite),
+            label=f'ai_mode:{project_id}'
+        )
+
         for keyword_data in keywords:
             # Re-validar cuota en cada iteración
             current_quota = get_user_quota_status(current_user['id'])
@@ -165,6 +179,8 @@ class AnalysisService:
                               f"Keywords procesadas: {len(results)}. Keywords pendientes: {len(keywords) - len(results)}")
                 paused_until = current_quota.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
                 pause_ai_mode_projects_for_quota(current_user['id'], paused_until, reason='quota_exceeded')
+                writer.flush()
+                results = self._without_unstored(results, writer)
                 return {
                     'results': results,
                     'quota_exceeded': True,
@@ -180,31 +196,34 @@ class AnalysisService:
             keyword_id = keyword_data['id']
             
             try:
-                # Verificar si ya existe análisis para hoy
-                existing_analysis = self.result_repo.result_exists_for_date(project_id, keyword_id, today)
+                # Verificar si ya existe análisis para hoy (consultado una vez antes del bucle)
+                existing_analysis = keyword_id in analyzed_today
                 
                 if existing_analysis and not force_overwrite:
                     logger.debug(f"Analysis already exists for keyword '{keyword}' on {today}, skipping (auto mode)")
                     continue
                 elif existing_analysis and force_overwrite:
-                    self.result_repo.delete_result_for_date(project_id, keyword_id, today)
                     logger.info(f"🔄 Overwriting existing analysis for keyword '{keyword}' (manual mode)")
                 
                 # Ejecutar análisis AI Mode
                 try:
                     ai_result, serp_data = self._analyze_keyword(keyword, project, keyword_id)
                     
-                    # Guardar resultado en base de datos
-                    self.result_repo.create_result(
-                        project_id=project_id,
-                        keyword_id=keyword_id,
-                        analysis_date=today,
-                        keyword=keyword,
-                        brand_name=project['brand_name'],
-                        ai_result=ai_result,
-                        serp_data=serp_data,
-                        country_code=project['country_code']
-                    )
+                    # Guardar resultado en base de datos (en bloque, ver BufferedWriter)
+                    record = {
+                        'result': {
+                            'project_id': project_id,
+                            'keyword_id': keyword_id,
+                            'analysis_date': today,
+                            'keyword': keyword,
+                            'brand_name': project['brand_name'],
+                            'ai_result': ai_result,
+                            'serp_data': serp_data,
+                            'country_code': project['country_code'],
+                        },
+                        'domain_rows': None,   # [] borra los dominios del día de la keyword
+                        'index': len(results),
+                    }
                     
                     # Almacenar dominios globales detectados para ranking/competidores
                     try:
@@ -227,7 +246,7 @@ class AnalysisService:
                                 'source': ref.get('source', '')
                             })
                         ai_analysis_data = { 'debug_info': { 'references_found': ordered_refs } }
-                        DomainsService.store_global_domains_detected(
+                        record['domain_rows'] = DomainsService.build_global_domain_rows(
                             project_id=project_id,
                             keyword_id=keyword_id,
                             keyword=keyword,
@@ -239,6 +258,7 @@ class AnalysisService:
                         )
                     except Exception as domains_error:
                         logger.warning(f"[AI MODE] Error storing global domains for '{keyword}': {domains_error}")
+                    writer.add(record)
                     
                     results.append({
                         'keyword': keyword,
@@ -284,6 +304,8 @@ class AnalysisService:
                                    f"Used: {quota_info.get('quota_used', 0)}/{quota_info.get('quota_limit', 0)} RU")
                         paused_until = quota_info.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
                         pause_ai_mode_projects_for_quota(current_user['id'], paused_until, reason='quota_exceeded')
+                        writer.flush()
+                        results = self._without_unstored(results, writer)
 
                         return {
                             'results': results,
@@ -305,6 +327,13 @@ class AnalysisService:
                 failed_keywords += 1
                 continue
         
+        writer.flush()
+        if writer.failed:
+            # No cuentan como analizadas: se reintentan en la próxima ejecución
+            results = self._without_unstored(results, writer)
+            failed_keywords += len(writer.failed)
+            logger.error(f"❌ {len(writer.failed)} AI Mode results could not be stored for project {project_id}")
+
         overwrite_info = " (with overwrite)" if force_overwrite else " (skipping existing)"
         logger.info(f"✅ Completed {analysis_mode} analysis for project {project_id}: "
                    f"{len(results)}/{len(keywords)} keywords processed, {failed_keywords} failed{overwrite_info}, "
@@ -315,6 +344,37 @@ class AnalysisService:
         
         return results
     
+    def _persist_results(self, cur, records: List[Dict], replace: bool = False) -> None:
+        """
+        Escribir un lote de keywords analizadas en una transacción: resultados
+        (con sus payloads) y dominios globales. Un fallo en los dominios no
+        tumba los resultados (SAVEPOINT), igual que cuando se guardaban aparte.
+        """
+        self.result_repo.insert_results(cur, [r['result'] for r in records], replace=replace)
+
+        domain_records = [r for r in records if r['domain_rows'] is not None]
+        if not domain_records:
+            return
+        cur.execute('SAVEPOINT ai_mode_global_domains')
+        try:
+            DomainsService.replace_global_domains(
+                cur, [row for r in domain_records for row in r['domain_rows']],
+                keywords=[(r['result']['project_id'], r['result']['keyword_id'], r['result']['analysis_date'])
+                          for r in domain_records]
+            )
+            cur.execute('RELEASE SAVEPOINT ai_mode_global_domains')
+        except Exception as e:
+            cur.execute('ROLLBACK TO SAVEPOINT ai_mode_global_domains')
+            logger.warning(f"[AI MODE] Error storing global domains for {len(records)} keywords: {e}")
+
+    @staticmethod
+    def _without_unstored(results: List[Dict], writer: BufferedWriter) -> List[Dict]:
+        """`results` sin las keywords cuyo resultado no se pudo escribir."""
+        if not writer.failed:
+            return results
+        unstored = {record['index'] for record in writer.failed}
+        return [result for index, result in enumerate(results) if index not in unstored]
+
     @with_backoff(max_attempts=3, base_delay_sec=1.0)
     def _analyze_keyword(self, keyword: str, project: Dict, keyword_id: int) -> tuple:
         """
@@ -382,9 +442,8 @@ class AnalysisService:
             
             logger.info(f"🔍 Calling SerpApi Google AI Mode for keyword: '{keyword}' (location: {location}, gl: {serp_gl}, hl: {serp_hl})")
             
-            # Hacer la llamada a SerpApi
-            search = GoogleSearch(params)
-            serp_data = search.get_dict()
+            # Hacer la llamada a SerpApi (o reutilizar la SERP compartida del día)
+            serp_data = serp_store.fetch_serp(params, lambda p: GoogleSearch(p).get_dict(), source='ai_mode')
             
             # Analizar resultados para detectar menciones de la marca
             ai_result = self._parse_ai_mode_response(serp_data, brand_name)
@@ -9,6 +9,8 @@ from io import BytesIO
 from datetime import datetime, date, timedelta
 from typing import Dict, Optional
 from database import get_db_connection
+from services.cluster_classifier import get_cluster_classifier
+from services.payload_blobs import hydrate_payloads
 
 logger = logging.getLogger(__name__)
 
@@ -314,16 +316,17 @@ class ExportService:
             cur.execute("""
                 SELECT 
                     raw_ai_mode_data,
+                    raw_ai_mode_data_hash,
                     analysis_date,
                     keyword_id
                 FROM ai_mode_results
                 WHERE project_id = %s 
                     AND analysis_date >= %s 
                     AND analysis_date <= %s
-                    AND raw_ai_mode_data IS NOT NULL
+                    AND (raw_ai_mode_data IS NOT NULL OR raw_ai_mode_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
             
-            results = cur.fetchall()
+            results = hydrate_payloads(cur.fetchall(), 'raw_ai_mode_data')
             
             # Procesar cada resultado para extraer competidores por día
             # {competitor: {date: set(keyword_ids)}}
@@ -714,6 +717,7 @@ class ExportService:
             
             # Clasificar keywords en clusters
             rows = []
+            classifier = get_cluster_classifier(clusters_config)
             for kw_data in keywords_data:
                 keyword = kw_data['keyword']
                 brand_mentioned = 'Yes' if kw_data.get('brand_mentioned') else 'No'
@@ -721,7 +725,7 @@ class ExportService:
                 last_analysis_str = str(last_analysis) if last_analysis else 'Never'
                 
                 # Clasificar keyword
-                matching_clusters = ClusterService.classify_keyword(keyword, clusters_config)
+                matching_clusters = classifier.classify(keyword)
                 
                 if matching_clusters:
                     # Añadir una fila por cada cluster al que pertenece
@@ -8,11 +8,11 @@ import zipfile
 from io import BytesIO
 from datetime import datetime, timedelta, timezone # Importación añadida
 from urllib.parse import quote
-from flask import Flask, render_template, request, jsonify, send_file, Response, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, Response, session, redirect, url_for, g, stream_with_context, copy_current_request_context
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import pandas as pd
-from excel_generator import generate_excel_from_data
+from excel_generator import write_excel_to_tempfile
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
@@ -24,10 +24,13 @@ if not os.getenv('RAILWAY_ENVIRONMENT'):
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 # --- Servicios extraídos ---
-from services.search_console import authenticate, fetch_searchconsole_data_single_call
-from services.serp_service import get_serp_json, get_serp_html, get_page_screenshot, SCREENSHOT_CACHE
+from services.search_console import (
+    authenticate, fetch_searchconsole_data_single_call, fetch_searchconsole_data_multi, run_concurrent_fetches
+)
+from services.serp_service import get_serp_json, get_serp_html, get_page_screenshot, clear_screenshot_cache
 from services.ai_analysis import detect_ai_overview_elements
 from services.aio_recommendations import get_ai_recommendations
+from services.cluster_classifier import get_cluster_classifier
 from stripe_webhooks import create_webhook_route
 from services.utils import extract_domain, normalize_search_console_url, urls_match
 from services.country_config import get_country_config
@@ -44,7 +47,7 @@ from auth import (
     get_user_credentials,
     get_current_user
 )
-from database import get_connection_for_site, list_gsc_properties_for_user, user_owns_site_url
+from database import get_connection_for_site, user_owns_site_url
 
 # --- NUEVO: Detector de dispositivos móviles ---
 from mobile_detector import (
@@ -62,6 +65,16 @@ from database import (
     get_ai_overview_history
 )
 from services.ai_cache import ai_cache
+from services import serp_store
+from services import payload_blobs
+from services import gsc_warehouse
+from services import get_data_jobs
+from services import analysis_results
+from services import gsc_property_inventory
+from services.gsc_aggregation import (
+    page_metrics_frame, property_summary_frame, build_metrics_payload,
+    aggregate_keywords, keyword_stats, keyword_comparison
+)
 from services.project_access_service import accept_project_invitation
 
 # Configurar logging mejorado
@@ -459,46 +472,54 @@ def get_site_position_from_serp(keyword, site_url, organic_results, serp_data=No
         'result_type': first.get('type', 'Unknown') if first else None
     }
 
-# --- ACTUALIZADO: Función para obtener sitios validados usando autenticación ---
-def fetch_validated_sites():
-    """Obtiene sitios validados usando las credenciales del usuario autenticado"""
+# --- NUEVO: Warehouse local de GSC ---
+def resolve_warehouse_state(site_url, mapping_conn, date_ranges, data_source='auto'):
+    """
+    Registra la propiedad en el warehouse y devuelve su estado de sincronización
+    si cubre todos los `date_ranges` pedidos; None si hay que ir a la API de GSC.
+
+    Solo se usa con una conexión OAuth mapeada a la propiedad (garantiza que el
+    usuario tiene acceso a esos datos sin preguntar a Google).
+    """
+    if not gsc_warehouse.GSC_WAREHOUSE_ENABLED or not mapping_conn or data_source == 'live':
+        return None
     try:
-        gsc_service = get_authenticated_service('searchconsole', 'v1')
-        if not gsc_service:
-            logger.error("No se pudo obtener servicio autenticado de Search Console")
-            return []
-        
-        resp = gsc_service.sites().list().execute()
-        return resp.get('siteEntry', [])
+        gsc_warehouse.register_property(mapping_conn['user_id'], site_url, mapping_conn['id'])
+        state = gsc_warehouse.get_sync_state(site_url)
+        if all(gsc_warehouse.covers(state, start, end) for start, end in date_ranges):
+            return state
     except Exception as e:
-        logger.error(f"Error obteniendo sitios validados: {e}", exc_info=True)
-        return []
+        logger.warning(f"[GSC WAREHOUSE] No disponible para {site_url}: {e}")
+    return None
+
+
+def build_data_freshness(warehouse_state, rows_served_by):
+    """Indicador de origen/frescura de los datos para el frontend."""
+    if warehouse_state and rows_served_by.get('warehouse') and not rows_served_by.get('gsc_api'):
+        return gsc_warehouse.freshness_info(warehouse_state)
+    if warehouse_state and rows_served_by.get('warehouse'):
+        return {**gsc_warehouse.freshness_info(warehouse_state), 'source': 'mixed'}
+    return {'source': 'gsc_api'}
+
 
 @app.route('/get-properties')
 @auth_required
 def get_properties():
-    """Compat: Obtiene propiedades agregadas de todas las conexiones del usuario"""
+    """
+    Compat: Obtiene propiedades agregadas de todas las conexiones del usuario.
+    ✅ NUEVO: Se sirve del inventario guardado (Postgres/Redis) sin llamar a Google;
+    las conexiones caducadas (o todas con `?refresh=true`) se sincronizan en segundo plano.
+    """
     try:
         user = get_current_user()
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
 
-        props_db = list_gsc_properties_for_user(user['id']) or []
+        force_refresh = request.args.get('refresh', '').lower() in ('1', 'true')
         # Mantener contrato: lista de objetos con siteUrl (se admiten campos extra)
-        props = []
-        for p in props_db:
-            site_url = p.get('site_url') or p.get('siteUrl')
-            if not site_url:
-                continue
-            props.append({
-                'siteUrl': site_url,
-                'googleEmail': p.get('google_email'),
-                'googleAccountId': p.get('google_account_id'),
-                'connectionId': p.get('connection_id'),
-                'permissionLevel': p.get('permission_level')
-            })
+        props, inventory = gsc_property_inventory.get_user_properties(user['id'], force_refresh=force_refresh)
 
-        return jsonify({'properties': props})
+        return jsonify({'properties': props, 'inventory': inventory})
     except Exception as e:
         logger.error(f"Error en get-properties (compat agregado): {e}", exc_info=True)
         return jsonify({'error': 'Error obteniendo propiedades'}), 500
@@ -628,6 +649,13 @@ def app_main():
 @auth_required
 def get_data():
     """Obtiene datos de Search Console con fechas específicas y comparación opcional"""
+    request_started = time.perf_counter()
+
+    # ✅ NUEVO: Modo job (async=true): se responde con un job_id y el análisis
+    # corre en segundo plano (progreso por SSE en /get-data/jobs/<id>/events)
+    if request.form.get('async', 'false').lower() == 'true' and not g.get('get_data_job'):
+        return start_get_data_job()
+    progress = get_data_jobs.current_progress()
     
     # ✅ NUEVO: Detectar dispositivos móviles para ajustar timeouts
     user_agent = request.headers.get('User-Agent', '')
@@ -733,6 +761,7 @@ def get_data():
 
         # Obtener servicio autenticado (seleccionando conexión por site_url si está mapeada)
         gsc_service = None
+        mapping_conn = None
         try:
             mapping_conn = get_connection_for_site(get_current_user()['id'], site_url_sc)
             if mapping_conn:
@@ -748,6 +777,51 @@ def get_data():
                 error_msg += ' Tu sesión puede haber expirado. Intenta recargar la página.'
             return jsonify({'error': error_msg, 'auth_required': True}), 401
 
+        # ✅ NUEVO: Warehouse local de GSC. Si la propiedad está sincronizada para
+        # todo el rango pedido, las consultas se responden desde Postgres en ms.
+        # data_source: 'auto' (por defecto) | 'live' (forzar API de Google)
+        data_source = request.form.get('data_source', 'auto')
+        requested_ranges = [(current_start, current_end)]
+        if has_comparison and comparison_start and comparison_end:
+            requested_ranges.append((comparison_start, comparison_end))
+        warehouse_state = resolve_warehouse_state(site_url_sc, mapping_conn, requested_ranges, data_source)
+        rows_served_by = {'warehouse': 0, 'gsc_api': 0}
+        rows_served_lock = threading.Lock()
+
+        def count_served(source, n=1):
+            with rows_served_lock:
+                rows_served_by[source] += n
+
+        # `http`: transporte del hilo que descarga (None en el hilo de la petición)
+        def fetch_rows(start_date, end_date, dimensions, filters=None, http=None):
+            if warehouse_state:
+                rows = gsc_warehouse.query_rows(site_url_sc, start_date, end_date, dimensions, filters)
+                if rows is not None:
+                    count_served('warehouse')
+                    progress.advance(rows_fetched=len(rows))
+                    return rows
+            count_served('gsc_api')
+            rows = fetch_searchconsole_data_single_call(gsc_service, site_url_sc, start_date, end_date, dimensions, filters, http=http)
+            progress.advance(rows_fetched=len(rows))
+            return rows
+
+        def fetch_rows_multi(queries, http=None):
+            if warehouse_state:
+                rows_by_key = {}
+                for q in queries:
+                    rows = gsc_warehouse.query_rows(site_url_sc, q['start_date'], q['end_date'], q['dimensions'], q.get('filters'))
+                    if rows is None:
+                        break
+                    rows_by_key[q['key']] = rows
+                else:
+                    count_served('warehouse', len(queries))
+                    progress.advance(rows_fetched=sum(len(rows) for rows in rows_by_key.values()))
+                    return rows_by_key
+            count_served('gsc_api', len(queries))
+            rows_by_key = fetch_searchconsole_data_multi(gsc_service, site_url_sc, queries, http=http)
+            progress.advance(rows_fetched=sum(len(rows) for rows in rows_by_key.values()))
+            return rows_by_key
+
         def get_base_filters(url_filters=None):
             filters = []
             
@@ -771,41 +845,22 @@ def get_data():
         logger.info(f"[GSC REQUEST] Modo de análisis: {analysis_mode}")
         
         # ✅ NUEVA: Obtener datos para tabla de URLs (siempre muestra páginas individuales)
-        def fetch_urls_data(start_date, end_date, label_suffix=""):
-            period_data = {}
-            
+        # Las filas se agregan en columnas (services/gsc_aggregation.py): una fila por página y período
+        def fetch_urls_data(start_date, end_date, http=None):
             if analysis_mode == "property":
                 # SIN filtro de página - obtener TODAS las páginas de la propiedad
                 combined_filters = get_base_filters()  # Solo filtros de país si aplica
                 
                 # Obtener datos de TODAS las páginas de la propiedad (como GSC sin filtros)
-                rows_data = fetch_searchconsole_data_single_call(
-                    gsc_service, site_url_sc, 
+                rows_data = fetch_rows(
                     start_date.strftime('%Y-%m-%d'), 
                     end_date.strftime('%Y-%m-%d'), 
                     ['page'],  # Usar 'page' para obtener todas las páginas individuales
-                    combined_filters
+                    combined_filters, http=http
                 )
+                period_frame = page_metrics_frame(rows_data)
                 
-                # Para datos de propiedad completa, procesar cada página individualmente
-                for r_item in rows_data:
-                    page_url = r_item['keys'][0]
-                    period_label = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}{label_suffix}"
-                    
-                    if page_url not in period_data:
-                        period_data[page_url] = []
-                    
-                    period_data[page_url].append({
-                        'Period': period_label,
-                        'StartDate': start_date.strftime('%Y-%m-%d'),
-                        'EndDate': end_date.strftime('%Y-%m-%d'),
-                        'Clicks': r_item['clicks'], 
-                        'Impressions': r_item['impressions'],
-                        'CTR': r_item['ctr'], 
-                        'Position': r_item['position']
-                    })
-                
-                logger.info(f"[GSC URLS] Obtenidas {len(period_data)} páginas de la propiedad completa")
+                logger.info(f"[GSC URLS] Obtenidas {len(period_frame)} páginas de la propiedad completa")
             else:
                 # CON filtro de página - modo tradicional
                 if match_type == 'notContains' and len(form_urls) > 1:
@@ -819,563 +874,192 @@ def get_data():
                     }
                     combined_filters = get_base_filters([url_filter_group])
 
-                    rows_data = fetch_searchconsole_data_single_call(
-                        gsc_service, site_url_sc,
+                    rows_data = fetch_rows(
                         start_date.strftime('%Y-%m-%d'),
                         end_date.strftime('%Y-%m-%d'),
                         ['page'],
-                        combined_filters
+                        combined_filters, http=http
                     )
-
-                    for r_item in rows_data:
-                        page_url = r_item['keys'][0]
-                        period_label = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}{label_suffix}"
-
-                        if page_url not in period_data:
-                            period_data[page_url] = []
-
-                        period_data[page_url].append({
-                            'Period': period_label,
-                            'StartDate': start_date.strftime('%Y-%m-%d'),
-                            'EndDate': end_date.strftime('%Y-%m-%d'),
-                            'Clicks': r_item['clicks'],
-                            'Impressions': r_item['impressions'],
-                            'CTR': r_item['ctr'],
-                            'Position': r_item['position']
-                        })
                 else:
-                    for val_url in form_urls:
-                        url_filter = [{'filters':[{'dimension':'page','operator':match_type,'expression':val_url}]}]
-                        combined_filters = get_base_filters(url_filter)
-                        
-                        # Obtener datos para este período
-                        rows_data = fetch_searchconsole_data_single_call(
-                            gsc_service, site_url_sc, 
-                            start_date.strftime('%Y-%m-%d'), 
-                            end_date.strftime('%Y-%m-%d'), 
-                            ['page'], 
-                            combined_filters
-                        )
-                        
-                        for r_item in rows_data:
-                            page_url = r_item['keys'][0]
-                            period_label = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}{label_suffix}"
-                            
-                            if page_url not in period_data:
-                                period_data[page_url] = []
-                            
-                            period_data[page_url].append({
-                                'Period': period_label,
-                                'StartDate': start_date.strftime('%Y-%m-%d'),
-                                'EndDate': end_date.strftime('%Y-%m-%d'),
-                                'Clicks': r_item['clicks'], 
-                                'Impressions': r_item['impressions'],
-                                'CTR': r_item['ctr'], 
-                                'Position': r_item['position']
-                            })
-            
-            return period_data
+                    # Una consulta por URL, lanzadas en paralelo (pool acotado + QPS por propiedad)
+                    rows_by_url = fetch_rows_multi([
+                        {
+                            'key': val_url,
+                            'start_date': start_date.strftime('%Y-%m-%d'),
+                            'end_date': end_date.strftime('%Y-%m-%d'),
+                            'dimensions': ['page'],
+                            'filters': get_base_filters([{'filters':[{'dimension':'page','operator':match_type,'expression':val_url}]}])
+                        }
+                        for val_url in form_urls
+                    ], http=http)
+                    # En el orden de las URLs del formulario (una página puede coincidir con varias)
+                    rows_data = [r_item for val_url in form_urls for r_item in rows_by_url.get(val_url, [])]
+                period_frame = page_metrics_frame(rows_data)
+            
+            return period_frame
 
         # ✅ NUEVA: Obtener datos agregados para métricas generales (sin dimensión de página)
-        def fetch_summary_data(start_date, end_date, label_suffix=""):
-            summary_data = {}
-            
+        def fetch_summary_data(start_date, end_date, http=None):
             if analysis_mode == "property":
                 # SIN filtro de página - obtener datos agregados de toda la propiedad
                 combined_filters = get_base_filters()  # Solo filtros de país si aplica
                 
                 # Obtener datos agregados sin dimensión de página
-                rows_data = fetch_searchconsole_data_single_call(
-                    gsc_service, site_url_sc, 
+                rows_data = fetch_rows(
                     start_date.strftime('%Y-%m-%d'), 
                     end_date.strftime('%Y-%m-%d'), 
                     ['date'],  # Usar 'date' para obtener datos agregados por día
-                    combined_filters
+                    combined_filters, http=http
                 )
                 
-                # Para métricas agregadas, crear una entrada única con totales
-                if rows_data:
-                    # Sumar todos los datos
-                    total_clicks = sum(r.get('clicks', 0) for r in rows_data)
-                    total_impressions = sum(r.get('impressions', 0) for r in rows_data)
-                    total_ctr_weighted = sum(r.get('ctr', 0) * r.get('impressions', 0) for r in rows_data)
-                    total_pos_weighted = sum(r.get('position', 0) * r.get('impressions', 0) for r in rows_data)
-                    
-                    avg_ctr = total_ctr_weighted / total_impressions if total_impressions > 0 else 0
-                    avg_position = total_pos_weighted / total_impressions if total_impressions > 0 else 0
-                    
-                    property_url = f"{site_url_sc} (propiedad completa)"
-                    period_label = f"{start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}{label_suffix}"
-                    
-                    summary_data[property_url] = [{
-                        'Period': period_label,
-                        'StartDate': start_date.strftime('%Y-%m-%d'),
-                        'EndDate': end_date.strftime('%Y-%m-%d'),
-                        'Clicks': total_clicks, 
-                        'Impressions': total_impressions,
-                        'CTR': avg_ctr, 
-                        'Position': avg_position
-                    }]
-                    
-                    logger.info(f"[GSC SUMMARY] {property_url}: {total_clicks} clicks, {total_impressions} impressions")
-            else:
-                # Para páginas específicas, usar la misma lógica que URLs
-                summary_data = fetch_urls_data(start_date, end_date, label_suffix)
-            
-            return summary_data
-
-        # ✅ SEPARADO: Obtener datos de URLs (para tabla) y datos de summary (para métricas)
-        
-        # Datos para tabla de URLs (páginas individuales)
-        current_urls_data = fetch_urls_data(current_start, current_end, " (Current)")
-        comparison_urls_data = {}
-        if has_comparison and comparison_start and comparison_end:
-            comparison_urls_data = fetch_urls_data(comparison_start, comparison_end, " (Comparison)")
-
-        # ✅ CORREGIDO: Combinar datos asegurando que hay métricas para ambos períodos si se seleccionó comparación
-        combined_urls_data = {}
-        
-        if has_comparison and comparison_start and comparison_end:
-            # Si hay comparación, asegurar que todas las URLs tengan datos para ambos períodos
-            all_urls = set(current_urls_data.keys()) | set(comparison_urls_data.keys())
-            
-            for page_url in all_urls:
-                current_metric = current_urls_data.get(page_url, [])
-                comparison_metric = comparison_urls_data.get(page_url, [])
-                
-                # Si no hay datos para el período actual, crear entrada con 0s
-                if not current_metric:
-                    current_metric = [{
-                        'Period': f"{current_start.strftime('%Y-%m-%d')} to {current_end.strftime('%Y-%m-%d')} (Current)",
-                        'StartDate': current_start.strftime('%Y-%m-%d'),
-                        'EndDate': current_end.strftime('%Y-%m-%d'),
-                        'Clicks': 0,
-                        'Impressions': 0,
-                        'CTR': 0.0,
-                        'Position': 0.0
-                    }]
-                
-                # Si no hay datos para el período de comparación, crear entrada con 0s
-                if not comparison_metric:
-                    comparison_metric = [{
-                        'Period': f"{comparison_start.strftime('%Y-%m-%d')} to {comparison_end.strftime('%Y-%m-%d')} (Comparison)",
-                        'StartDate': comparison_start.strftime('%Y-%m-%d'),
-                        'EndDate': comparison_end.strftime('%Y-%m-%d'),
-                        'Clicks': 0,
-                        'Impressions': 0,
-                        'CTR': 0.0,
-                        'Position': 0.0
-                    }]
-                
-                # Combinar ambos períodos (actual + comparación)
-                combined_urls_data[page_url] = current_metric + comparison_metric
-        else:
-            # Sin comparación, usar solo datos actuales
-            combined_urls_data = current_urls_data
-
-        # Datos para métricas agregadas (summary)
-        current_summary_data = fetch_summary_data(current_start, current_end, " (Current)")
-        comparison_summary_data = {}
-        if has_comparison and comparison_start and comparison_end:
-            comparison_summary_data = fetch_summary_data(comparison_start, comparison_end, " (Comparison)")
-
-        # ✅ CORREGIDO: Combinar datos de summary asegurando que hay métricas para ambos períodos si se seleccionó comparación
-        combined_summary_data = {}
-        
-        if has_comparison and comparison_start and comparison_end:
-            # Si hay comparación, asegurar que hay datos para ambos períodos
-            all_summary_keys = set(current_summary_data.keys()) | set(comparison_summary_data.keys())
-            
-            for summary_key in all_summary_keys:
-                current_summary_metric = current_summary_data.get(summary_key, [])
-                comparison_summary_metric = comparison_summary_data.get(summary_key, [])
-                
-                # Si no hay datos para el período actual, crear entrada con 0s
-                if not current_summary_metric:
-                    current_summary_metric = [{
-                        'Period': f"{current_start.strftime('%Y-%m-%d')} to {current_end.strftime('%Y-%m-%d')} (Current)",
-                        'StartDate': current_start.strftime('%Y-%m-%d'),
-                        'EndDate': current_end.strftime('%Y-%m-%d'),
-                        'Clicks': 0,
-                        'Impressions': 0,
-                        'CTR': 0.0,
-                        'Position': 0.0
-                    }]
-                
-                # Si no hay datos para el período de comparación, crear entrada con 0s
-                if not comparison_summary_metric:
-                    comparison_summary_metric = [{
-                        'Period': f"{comparison_start.strftime('%Y-%m-%d')} to {comparison_end.strftime('%Y-%m-%d')} (Comparison)",
-                        'StartDate': comparison_start.strftime('%Y-%m-%d'),
-                        'EndDate': comparison_end.strftime('%Y-%m-%d'),
-                        'Clicks': 0,
-                        'Impressions': 0,
-                        'CTR': 0.0,
-                        'Position': 0.0
-                    }]
-                
-                # Combinar ambos períodos
-                combined_summary_data[summary_key] = current_summary_metric + comparison_summary_metric
-        else:
-            # Sin comparación, usar solo datos actuales
-            combined_summary_data = current_summary_data
-
-        # Convertir a formato esperado por el frontend
-        pages_payload_list = [{'URL': url, 'Metrics': metrics} for url, metrics in combined_urls_data.items()]
-        summary_payload_list = [{'URL': url, 'Metrics': metrics} for url, metrics in combined_summary_data.items()]
+                # Para métricas agregadas, una entrada única con totales (CTR/posición ponderados)
+                property_url = f"{site_url_sc} (propiedad completa)"
+                summary_frame = property_summary_frame(rows_data, property_url)
+                if not summary_frame.empty:
+                    logger.info(f"[GSC SUMMARY] {property_url}: {summary_frame['clicks'].iat[0]} clicks, {summary_frame['impressions'].iat[0]} impressions")
+                return summary_frame
+            # Para páginas específicas, usar la misma lógica que URLs
+            return fetch_urls_data(start_date, end_date, http=http)
 
         # ✅ CORREGIDO: Procesar keywords con asociación correcta URL-Keyword
-        # Ahora cada combinación keyword+URL se guarda por separado para no perder información
-        def process_keywords_for_period(start_date, end_date):
-            keyword_data = {}
-            
+        # Modo propiedad: una fila por keyword con su(s) URL(s) real(es).
+        # Modo URL: cada combinación keyword+URL por separado para no perder información.
+        def process_keywords_for_period(start_date, end_date, http=None):
             if analysis_mode == "property":
                 # SIN filtro de página - obtener keywords con su(s) URL(s) real(es) de TODA la propiedad
                 combined_filters_kw = get_base_filters()  # Solo filtros de país si aplica
                 
-                rows_data = fetch_searchconsole_data_single_call(
-                    gsc_service, site_url_sc,
+                rows_data = fetch_rows(
                     start_date.strftime('%Y-%m-%d'),
                     end_date.strftime('%Y-%m-%d'),
                     ['query', 'page'],  # Query + página para identificar landings reales
-                    combined_filters_kw
+                    combined_filters_kw, http=http
                 )
-                
-                for r_item in rows_data:
-                    if len(r_item.get('keys', [])) >= 2:
-                        query = r_item['keys'][0]
-                        page_url = r_item['keys'][1]
-
-                        if not query:
-                            continue
-
-                        if query not in keyword_data:
-                            keyword_data[query] = {
-                                'clicks': 0, 'impressions': 0, 'ctr_sum': 0.0, 
-                                'pos_sum': 0.0, 'count': 0, 'url': '',
-                                'top_urls': [], 'top_urls_count': 0, 'url_metrics': {}
-                            }
-                        
-                        kw_entry = keyword_data[query]
-                        kw_entry['clicks'] += r_item['clicks']
-                        kw_entry['impressions'] += r_item['impressions']
-                        kw_entry['ctr_sum'] += r_item['ctr'] * r_item['impressions']
-                        kw_entry['pos_sum'] += r_item['position'] * r_item['impressions']
-                        kw_entry['count'] += r_item['impressions']
-
-                        if page_url:
-                            if page_url not in kw_entry['url_metrics']:
-                                kw_entry['url_metrics'][page_url] = {'clicks': 0, 'impressions': 0}
-                            kw_entry['url_metrics'][page_url]['clicks'] += r_item['clicks']
-                            kw_entry['url_metrics'][page_url]['impressions'] += r_item['impressions']
-
-                # Determinar URL principal y lista de URLs por keyword (ordenadas por clicks e impresiones)
-                for _, kw_entry in keyword_data.items():
-                    url_metrics = kw_entry.pop('url_metrics', {})
-                    if not url_metrics:
-                        kw_entry['url'] = ''
-                        kw_entry['top_urls'] = []
-                        kw_entry['top_urls_count'] = 0
-                        continue
-
-                    sorted_url_items = sorted(
-                        url_metrics.items(),
-                        key=lambda item: (item[1].get('clicks', 0), item[1].get('impressions', 0)),
-                        reverse=True
-                    )
-                    all_urls_sorted = [url for url, _ in sorted_url_items]
-                    kw_entry['url'] = all_urls_sorted[0] if all_urls_sorted else ''
-                    kw_entry['top_urls'] = all_urls_sorted
-                    kw_entry['top_urls_count'] = len(all_urls_sorted)
+                keyword_data = aggregate_keywords(rows_data, by_page=False)
                 
                 logger.info(f"[GSC KEYWORDS PROPERTY] Obtenidas {len(keyword_data)} keywords con URL(s) real(es) de propiedad completa")
+                return keyword_data
+
+            # CON filtro de página - modo tradicional
+            if match_type == 'notContains' and len(form_urls) > 1:
+                # Excluir páginas que contengan cualquiera de las expresiones: combinar con AND
+                url_filter_kw_group = {
+                    'groupType': 'and',
+                    'filters': [
+                        {'dimension': 'page', 'operator': 'notContains', 'expression': val_url_kw}
+                        for val_url_kw in form_urls
+                    ]
+                }
+                combined_filters_kw = get_base_filters([url_filter_kw_group])
+
+                rows_data = fetch_rows(
+                    start_date.strftime('%Y-%m-%d'),
+                    end_date.strftime('%Y-%m-%d'),
+                    ['page','query'], 
+                    combined_filters_kw, http=http
+                )
             else:
-                # CON filtro de página - modo tradicional
-                if match_type == 'notContains' and len(form_urls) > 1:
-                    # Excluir páginas que contengan cualquiera de las expresiones: combinar con AND
-                    url_filter_kw_group = {
-                        'groupType': 'and',
-                        'filters': [
-                            {'dimension': 'page', 'operator': 'notContains', 'expression': val_url_kw}
-                            for val_url_kw in form_urls
-                        ]
+                rows_by_url_kw = fetch_rows_multi([
+                    {
+                        'key': val_url_kw,
+                        'start_date': start_date.strftime('%Y-%m-%d'),
+                        'end_date': end_date.strftime('%Y-%m-%d'),
+                        'dimensions': ['page', 'query'],
+                        'filters': get_base_filters([{'filters':[{'dimension':'page','operator':match_type,'expression':val_url_kw}]}])
                     }
-                    combined_filters_kw = get_base_filters([url_filter_kw_group])
+                    for val_url_kw in form_urls
+                ], http=http)
+                rows_data = [r_item for val_url_kw in form_urls for r_item in rows_by_url_kw.get(val_url_kw, [])]
 
-                    rows_data = fetch_searchconsole_data_single_call(
-                        gsc_service, site_url_sc,
-                        start_date.strftime('%Y-%m-%d'),
-                        end_date.strftime('%Y-%m-%d'),
-                        ['page','query'], 
-                        combined_filters_kw
-                    )
-
-                    for r_item in rows_data:
-                        if len(r_item.get('keys', [])) >= 2:
-                            page_url = r_item['keys'][0]  # La URL real donde posiciona
-                            query = r_item['keys'][1]
-                            
-                            # 🔧 CORREGIDO: Usar combinación keyword+URL como clave única
-                            unique_key = f"{query}|||{page_url}"
-                            
-                            if unique_key not in keyword_data:
-                                keyword_data[unique_key] = {
-                                    'clicks': 0, 'impressions': 0, 'ctr_sum': 0.0, 
-                                    'pos_sum': 0.0, 'count': 0, 'url': page_url, 'keyword': query,
-                                    'top_urls': [page_url], 'top_urls_count': 1
-                                }
-                            
-                            kw_entry = keyword_data[unique_key]
-                            kw_entry['clicks'] += r_item['clicks']
-                            kw_entry['impressions'] += r_item['impressions']
-                            kw_entry['ctr_sum'] += r_item['ctr'] * r_item['impressions']
-                            kw_entry['pos_sum'] += r_item['position'] * r_item['impressions']
-                            kw_entry['count'] += r_item['impressions']
-                else:
-                    # 🔧 CORREGIDO: Procesar cada URL y guardar la URL real donde posiciona cada keyword
-                    for val_url_kw in form_urls:
-                        url_filter_kw = [{'filters':[{'dimension':'page','operator':match_type,'expression':val_url_kw}]}]
-                        combined_filters_kw = get_base_filters(url_filter_kw)
-                        
-                        rows_data = fetch_searchconsole_data_single_call(
-                            gsc_service, site_url_sc,
-                            start_date.strftime('%Y-%m-%d'),
-                            end_date.strftime('%Y-%m-%d'),
-                            ['page','query'], 
-                            combined_filters_kw
-                        )
-                        
-                        for r_item in rows_data:
-                            if len(r_item.get('keys', [])) >= 2:
-                                page_url = r_item['keys'][0]  # La URL real donde posiciona
-                                query = r_item['keys'][1]
-                                
-                                # 🔧 CORREGIDO: Usar combinación keyword+URL como clave única
-                                # Esto evita que se sobrescriban las URLs cuando una keyword aparece en múltiples páginas
-                                unique_key = f"{query}|||{page_url}"
-                                
-                                if unique_key not in keyword_data:
-                                    keyword_data[unique_key] = {
-                                        'clicks': 0, 'impressions': 0, 'ctr_sum': 0.0, 
-                                        'pos_sum': 0.0, 'count': 0, 'url': page_url, 'keyword': query,
-                                        'top_urls': [page_url], 'top_urls_count': 1
-                                    }
-                                
-                                kw_entry = keyword_data[unique_key]
-                                kw_entry['clicks'] += r_item['clicks']
-                                kw_entry['impressions'] += r_item['impressions']
-                                kw_entry['ctr_sum'] += r_item['ctr'] * r_item['impressions']
-                                kw_entry['pos_sum'] += r_item['position'] * r_item['impressions']
-                                kw_entry['count'] += r_item['impressions']
-                    
-                    logger.info(f"[GSC KEYWORDS] Procesadas {len(keyword_data)} combinaciones keyword-URL únicas")
-            
+            # 🔧 Clave keyword|||url: evita que se sobrescriban las URLs cuando una keyword aparece en múltiples páginas
+            keyword_data = aggregate_keywords(rows_data, by_page=True)
+            logger.info(f"[GSC KEYWORDS] Procesadas {len(keyword_data)} combinaciones keyword-URL únicas")
             return keyword_data
 
-        # Procesar keywords para el período actual SIEMPRE
-        current_keywords = process_keywords_for_period(current_start, current_end)
-        comparison_keywords = {}
-        
-        # Solo procesar comparación si existe
+        # ✅ SEPARADO: Obtener datos de URLs (para tabla) y datos de summary (para métricas)
+
+        # ✅ NUEVO: Las descargas de cada período son independientes, así que se
+        # lanzan a la vez (transporte HTTP por hilo; las cuotas por propiedad y
+        # por cuenta de Google se comparten entre todas). La latencia pasa a ser
+        # la de la descarga más lenta en lugar de la suma de todas.
+        fetch_periods = [('current', current_start, current_end)]
         if has_comparison and comparison_start and comparison_end:
-            comparison_keywords = process_keywords_for_period(comparison_start, comparison_end)
+            fetch_periods.append(('comparison', comparison_start, comparison_end))
+
+        def tracked(fetch, counter=None):
+            # Informa al job (si lo hay) de cada descarga terminada
+            def run(http):
+                result = fetch(http)
+                counters = {'fetches_done': 1}
+                if counter:
+                    counters[counter] = len(result)
+                progress.advance(**counters)
+                return result
+            return run
+
+        fetch_tasks = {}
+        for period_name, period_start, period_end in fetch_periods:
+            fetch_tasks[f'urls_{period_name}'] = tracked(
+                lambda http, s=period_start, e=period_end: fetch_urls_data(s, e, http=http),
+                'pages_fetched'
+            )
+            # En modo página el summary es la misma consulta que la tabla de URLs: se reutiliza
+            if analysis_mode == "property":
+                fetch_tasks[f'summary_{period_name}'] = tracked(
+                    lambda http, s=period_start, e=period_end: fetch_summary_data(s, e, http=http)
+                )
+            fetch_tasks[f'keywords_{period_name}'] = tracked(
+                lambda http, s=period_start, e=period_end: process_keywords_for_period(s, e, http=http),
+                'keywords_processed'
+            )
 
-        # ✅ CORREGIDO: Generar estadísticas de keywords (funciona con claves compuestas keyword|||url)
-        def generate_keyword_stats(current_kw, comparison_kw=None):
-            def process_kw_by_position(kw_data):
-                stats = {'total': set(), 'pos1_3': set(), 'pos4_10': set(), 'pos11_20': set(), 'pos20_plus': set()}
-                
-                for unique_key, data in kw_data.items():
-                    if data['count'] > 0:
-                        avg_pos = data['pos_sum'] / data['count']
-                        # Usar la clave completa (keyword|||url) para contabilizar cada combinación única
-                        stats['total'].add(unique_key)
-                        
-                        if avg_pos <= 3:
-                            stats['pos1_3'].add(unique_key)
-                        elif avg_pos <= 10:
-                            stats['pos4_10'].add(unique_key)
-                        elif avg_pos <= 20:
-                            stats['pos11_20'].add(unique_key)
-                        else:
-                            stats['pos20_plus'].add(unique_key)
-                
-                return stats
-
-            current_stats = process_kw_by_position(current_kw)
-            
-            # ✅ NUEVO: Estadísticas básicas para período único
-            keyword_stats = {
-                'overall': {'total': len(current_stats['total'])},
-                'total': {'current': len(current_stats['total'])},
-                'top3': {'current': len(current_stats['pos1_3'])},
-                'top10': {'current': len(current_stats['pos4_10'])},
-                'top20': {'current': len(current_stats['pos11_20'])},
-                'top20plus': {'current': len(current_stats['pos20_plus'])}
+        progress.set_counters(fetches_total=len(fetch_tasks), fetches_done=0, rows_fetched=0,
+                              pages_fetched=0, keywords_processed=0)
+        fetch_started = time.perf_counter()
+        fetched, fetch_timings = run_concurrent_fetches(gsc_service, fetch_tasks, max_workers=len(fetch_tasks))
+        fetch_wall_seconds = round(time.perf_counter() - fetch_started, 3)
+        logger.info(
+            f"[GSC REQUEST] {len(fetch_tasks)} descargas en {fetch_wall_seconds}s "
+            f"(suma secuencial: {round(sum(fetch_timings.values()), 3)}s)"
+        )
+        progress.set_phase('Calculando métricas y comparativas')
+        aggregation_started = time.perf_counter()
+
+        # ✅ CORREGIDO: Combinar datos asegurando que hay métricas para ambos períodos si se seleccionó comparación
+        # (si falta un período para una URL se rellena con una entrada a 0s)
+        current_period = {
+            'label': f"{current_start.strftime('%Y-%m-%d')} to {current_end.strftime('%Y-%m-%d')} (Current)",
+            'start': current_start.strftime('%Y-%m-%d'),
+            'end': current_end.strftime('%Y-%m-%d')
+        }
+        comparison_period = None
+        if has_comparison and comparison_start and comparison_end:
+            comparison_period = {
+                'label': f"{comparison_start.strftime('%Y-%m-%d')} to {comparison_end.strftime('%Y-%m-%d')} (Comparison)",
+                'start': comparison_start.strftime('%Y-%m-%d'),
+                'end': comparison_end.strftime('%Y-%m-%d')
             }
-            
-            # ✅ NUEVO: Solo calcular comparaciones si hay datos de comparación
-            if comparison_kw and len(comparison_kw) > 0:
-                comparison_stats = process_kw_by_position(comparison_kw)
-                
-                # Calcular cambios entre períodos
-                for key, label in [('total', 'total'), ('pos1_3', 'top3'), ('pos4_10', 'top10'), 
-                                   ('pos11_20', 'top20'), ('pos20_plus', 'top20plus')]:
-                    current_set = current_stats[key]
-                    comparison_set = comparison_stats[key]
-                    
-                    keyword_stats[label].update({
-                        'previous': len(comparison_set),
-                        'new': len(current_set - comparison_set),
-                        'lost': len(comparison_set - current_set),
-                        'stay': len(current_set & comparison_set)
-                    })
-                
-                # Estadísticas generales de cambio de posiciones
-                current_positions = {q: d['pos_sum']/d['count'] for q, d in current_kw.items() if d['count'] > 0}
-                comparison_positions = {q: d['pos_sum']/d['count'] for q, d in comparison_kw.items() if d['count'] > 0}
-                
-                common_queries = set(current_positions.keys()) & set(comparison_positions.keys())
-                
-                improved = sum(1 for q in common_queries if current_positions[q] < comparison_positions[q])
-                worsened = sum(1 for q in common_queries if current_positions[q] > comparison_positions[q])
-                same = sum(1 for q in common_queries if current_positions[q] == comparison_positions[q])
-                
-                keyword_stats['overall'] = {
-                    'total': len(current_positions),
-                    'improved': improved,
-                    'worsened': worsened,
-                    'same': same,
-                    'new': len(set(current_positions.keys()) - set(comparison_positions.keys())),
-                    'lost': len(set(comparison_positions.keys()) - set(current_positions.keys()))
-                }
-            else:
-                # ✅ NUEVO: Para período único, agregar valores por defecto
-                for label in ['total', 'top3', 'top10', 'top20', 'top20plus']:
-                    keyword_stats[label].update({
-                        'previous': 0,
-                        'new': 0,
-                        'lost': 0,
-                        'stay': keyword_stats[label]['current']  # Todas las keywords "se mantienen"
-                    })
-                
-                # Estadísticas overall para período único
-                keyword_stats['overall'].update({
-                    'improved': 0,
-                    'worsened': 0,
-                    'same': 0,
-                    'new': len(current_stats['total']),  # Todas son "nuevas" para el análisis
-                    'lost': 0
-                })
-            
-            return keyword_stats
 
-        kw_stats_data = generate_keyword_stats(current_keywords, comparison_keywords)
+        # Datos para tabla de URLs (páginas individuales)
+        current_urls_data = fetched['urls_current']
+        comparison_urls_data = fetched.get('urls_comparison')
+        # Datos para métricas agregadas (summary)
+        current_summary_data = fetched.get('summary_current', current_urls_data)
+        comparison_summary_data = fetched.get('summary_comparison', comparison_urls_data)
 
-        # ✅ CORREGIDO: Generar datos de comparación de keywords con asociación correcta URL-Keyword
-        def generate_keyword_comparison(current_kw, comparison_kw=None):
-            comparison_data = []
-            
-            # 🔧 HELPER: Extraer keyword real de la clave compuesta (keyword|||url o solo keyword)
-            def extract_keyword_from_key(key, data):
-                if '|||' in key:
-                    return data.get('keyword', key.split('|||')[0])
-                return key
-            
-            # ✅ NUEVO: Para período único, mostrar datos del período actual
-            if not comparison_kw or len(comparison_kw) == 0:
-                for unique_key, current_data in current_kw.items():
-                    # Extraer la keyword real (puede estar en la clave compuesta o en el campo 'keyword')
-                    query = extract_keyword_from_key(unique_key, current_data)
-                    
-                    # Calcular métricas del período actual
-                    current_clicks = current_data['clicks']
-                    current_impressions = current_data['impressions']
-                    current_ctr = (current_data['ctr_sum'] / current_data['count'] * 100) if current_data['count'] > 0 else 0
-                    current_pos = (current_data['pos_sum'] / current_data['count']) if current_data['count'] > 0 else None
-                    
-                    comparison_data.append({
-                        'keyword': query,
-                        'url': current_data.get('url', ''),
-                        'top_urls': current_data.get('top_urls', []),
-                        'top_urls_count': current_data.get('top_urls_count', 0),
-                        'clicks_m1': current_clicks,  # Sin período de comparación
-                        'clicks_m2': 0,  # Período actual
-                        'delta_clicks_percent': 'New',  # Marcado como nuevo
-                        'impressions_m1': current_impressions,
-                        'impressions_m2': 0,
-                        'delta_impressions_percent': 'New',
-                        'ctr_m1': current_ctr,
-                        'ctr_m2': 0,
-                        'delta_ctr_percent': 'New',
-                        'position_m1': current_pos,
-                        'position_m2': None,
-                        'delta_position_absolute': 'New'
-                    })
-            else:
-                # ✅ CORREGIDO: Lógica para comparación entre períodos con claves compuestas
-                all_keys = set(current_kw.keys()) | set(comparison_kw.keys())
-                
-                for unique_key in all_keys:
-                    current_data = current_kw.get(unique_key, {'clicks': 0, 'impressions': 0, 'ctr_sum': 0, 'pos_sum': 0, 'count': 0, 'url': '', 'keyword': '', 'top_urls': [], 'top_urls_count': 0})
-                    comparison_data_kw = comparison_kw.get(unique_key, {'clicks': 0, 'impressions': 0, 'ctr_sum': 0, 'pos_sum': 0, 'count': 0, 'url': '', 'keyword': '', 'top_urls': [], 'top_urls_count': 0})
-                    
-                    # Extraer la keyword real
-                    query = extract_keyword_from_key(unique_key, current_data) or extract_keyword_from_key(unique_key, comparison_data_kw)
-                    
-                    # Calcular métricas
-                    current_clicks = current_data['clicks']
-                    comparison_clicks = comparison_data_kw['clicks']
-                    
-                    current_impressions = current_data['impressions']
-                    comparison_impressions = comparison_data_kw['impressions']
-                    
-                    current_ctr = (current_data['ctr_sum'] / current_data['count'] * 100) if current_data['count'] > 0 else 0
-                    comparison_ctr = (comparison_data_kw['ctr_sum'] / comparison_data_kw['count'] * 100) if comparison_data_kw['count'] > 0 else 0
-                    
-                    current_pos = (current_data['pos_sum'] / current_data['count']) if current_data['count'] > 0 else None
-                    comparison_pos = (comparison_data_kw['pos_sum'] / comparison_data_kw['count']) if comparison_data_kw['count'] > 0 else None
-                    
-                    # Calcular cambios
-                    def calculate_percentage_change(new_val, old_val):
-                        if old_val == 0:
-                            return 'Infinity' if new_val > 0 else 0
-                        return ((new_val / old_val) - 1) * 100
-                    
-                    delta_clicks = calculate_percentage_change(current_clicks, comparison_clicks)
-                    delta_impressions = calculate_percentage_change(current_impressions, comparison_impressions)
-                    delta_ctr = current_ctr - comparison_ctr  # Diferencia absoluta en puntos porcentuales
-                    
-                    if current_pos is not None and comparison_pos is not None:
-                        delta_position = current_pos - comparison_pos  # KEYWORDS: P1 - P2 (como estaba originalmente)
-                    elif current_pos is not None:
-                        delta_position = 'New'
-                    else:
-                        delta_position = 'Lost'
-                    
-                    comparison_data.append({
-                        'keyword': query,
-                        'url': current_data.get('url') or comparison_data_kw.get('url', ''),
-                        'top_urls': current_data.get('top_urls') or comparison_data_kw.get('top_urls', []),
-                        'top_urls_count': current_data.get('top_urls_count') or comparison_data_kw.get('top_urls_count', 0),
-                        'clicks_m1': current_clicks,      # ✅ Actual en P1
-                        'clicks_m2': comparison_clicks,   # ✅ Comparación en P2
-                        'delta_clicks_percent': calculate_percentage_change(current_clicks, comparison_clicks),  # ✅ (P1 / P2 - 1) * 100
-                        'impressions_m1': current_impressions,
-                        'impressions_m2': comparison_impressions,
-                        'delta_impressions_percent': calculate_percentage_change(current_impressions, comparison_impressions),
-                        'ctr_m1': current_ctr,
-                        'ctr_m2': comparison_ctr,
-                        'delta_ctr_percent': current_ctr - comparison_ctr,  # Diferencia absoluta en puntos porcentuales
-                        'position_m1': current_pos,
-                        'position_m2': comparison_pos,
-                        'delta_position_absolute': current_pos - comparison_pos if current_pos is not None and comparison_pos is not None else ('New' if current_pos is not None else 'Lost')
-                    })
-            
-            return comparison_data
+        # Convertir a formato esperado por el frontend
+        pages_payload_list = build_metrics_payload(current_urls_data, current_period, comparison_urls_data, comparison_period)
+        summary_payload_list = build_metrics_payload(current_summary_data, current_period, comparison_summary_data, comparison_period)
 
+        # Keywords del período actual SIEMPRE y de comparación solo si existe
+        current_keywords = fetched['keywords_current']
+        comparison_keywords = fetched.get('keywords_comparison')
+
+        # ✅ Estadísticas por bucket de posición y comparativa por keyword (claves keyword|||url en modo URL)
+        kw_stats_data = keyword_stats(current_keywords, comparison_keywords)
         # ✅ NUEVO: Generar datos de keywords SIEMPRE (con o sin comparación)
-        keyword_comparison_data = generate_keyword_comparison(current_keywords, comparison_keywords)
+        keyword_comparison_data = keyword_comparison(current_keywords, comparison_keywords)
+        aggregation_seconds = round(time.perf_counter() - aggregation_started, 3)
 
         # ✅ ACTUALIZADA: Respuesta con información de períodos y modo de análisis
         response_data = {
@@ -1408,9 +1092,30 @@ def get_data():
                 'end_date': comparison_end_date,
                 'label': f"{comparison_start_date} to {comparison_end_date}"
             }
+
+        response_data['data_freshness'] = build_data_freshness(warehouse_state, rows_served_by)
+        # ✅ NUEVO: Desglose de tiempos (segundos) de cada descarga y de la petición
+        response_data['timings'] = {
+            'fetches': fetch_timings,
+            'fetch_wall': fetch_wall_seconds,
+            'fetch_sum': round(sum(fetch_timings.values()), 3),
+            'aggregation': aggregation_seconds,
+            'total': round(time.perf_counter() - request_started, 3)
+        }
         
         logger.info(f"[RESPONSE] Keywords encontradas: {len(keyword_comparison_data)}")
         logger.info(f"[RESPONSE] Total KWs: {kw_stats_data.get('overall', {}).get('total', 0)}")
+
+        # ✅ NUEVO: Las tablas completas se guardan en servidor; la respuesta lleva
+        # solo la primera página de URLs y keywords (el resto, /api/analysis/...)
+        try:
+            page_size = int(request.form.get('page_size') or analysis_results.ANALYSIS_FIRST_PAGE_SIZE)
+        except ValueError:
+            page_size = analysis_results.ANALYSIS_FIRST_PAGE_SIZE
+        page_size = max(1, min(page_size, analysis_results.MAX_PAGE_SIZE))
+        analysis_results.paginate_response(response_data, get_current_user()['id'], page_size)
+        logger.info(f"[RESPONSE] Resultados guardados en el análisis {response_data['paging']['analysis_id']}, "
+                    f"{page_size} filas por página")
         
         return jsonify(response_data)
 
@@ -1418,6 +1123,112 @@ def get_data():
         logger.error(f"Error general en get_data: {e}", exc_info=True)
         return jsonify({'error': 'Internal server error'}), 500
 
+
+def start_get_data_job():
+    """Lanza /get-data en segundo plano con una copia del contexto de la petición."""
+    user = get_current_user()
+
+    @copy_current_request_context
+    def run(job):
+        g.get_data_job = job
+        response = app.make_response(get_data())
+        return response.get_json(silent=True), response.status_code
+
+    job = get_data_jobs.submit_job(user['id'], run)
+    return jsonify({
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': url_for('get_data_job_status', job_id=job.job_id),
+        'events_url': url_for('get_data_job_events', job_id=job.job_id)
+    }), 202
+
+
+@app.route('/api/analysis/<analysis_id>/<table>', methods=['GET'])
+@auth_required
+def get_analysis_rows(analysis_id, table):
+    """
+    Filas paginadas de un análisis de /get-data (tablas `keywords` y `pages`).
+    Parámetros: page (base 0), limit, sort, order (asc|desc), search y, en
+    keywords, url_search, terms (separados por comas), method, preset y group.
+    Formato pensado para el modo server de Grid.js.
+    """
+    if table not in analysis_results.TABLES:
+        return jsonify({'error': 'Tabla no válida'}), 400
+    try:
+        page = int(request.args.get('page', 0))
+        limit = int(request.args.get('limit', analysis_results.ANALYSIS_FIRST_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'page y limit deben ser enteros'}), 400
+    order = 'asc' if request.args.get('order', 'desc').lower() == 'asc' else 'desc'
+    terms = [t for t in request.args.get('terms', '').split(',') if t.strip()]
+
+    found = analysis_results.query_rows(
+        analysis_id, get_current_user()['id'], table,
+        page=page, limit=limit, sort=request.args.get('sort'), order=order,
+        search=request.args.get('search'), url_search=request.args.get('url_search'),
+        terms=terms, method=request.args.get('method', 'contains'),
+        preset=request.args.get('preset'), group=request.args.get('group')
+    )
+    if found is None:
+        return jsonify({'error': 'Análisis no encontrado o caducado', 'expired': True}), 404
+    rows, total = found
+    return jsonify({'results': rows, 'total': total, 'page': page, 'limit': limit})
+
+
+@app.route('/get-data/jobs/<job_id>', methods=['GET'])
+@auth_required
+def get_data_job_status(job_id):
+    """Estado de un job de /get-data; incluye `result` cuando ha terminado."""
+    return job_status_response(job_id)
+
+
+@app.route('/get-data/jobs/<job_id>/events', methods=['GET'])
+@auth_required
+def get_data_job_events(job_id):
+    """Progreso de un job de /get-data como Server-Sent Events."""
+    return job_events_response(job_id)
+
+
+@app.route('/api/analyze-ai-overview/jobs/<job_id>', methods=['GET'])
+@auth_required
+def ai_overview_job_status(job_id):
+    """Estado de un job de AI Overview; incluye `result` cuando ha terminado."""
+    return job_status_response(job_id)
+
+
+@app.route('/api/analyze-ai-overview/jobs/<job_id>/events', methods=['GET'])
+@auth_required
+def ai_overview_job_events(job_id):
+    """Progreso y resultados por keyword de un job de AI Overview como Server-Sent Events."""
+    return job_events_response(job_id)
+
+
+def job_status_response(job_id):
+    found = get_data_jobs.get_job_result(job_id, get_current_user()['id'])
+    if not found:
+        return jsonify({'error': 'Job no encontrado o caducado'}), 404
+    job_info, payload, http_status = found
+    response = dict(job_info)
+    if job_info['status'] in ('done', 'error'):
+        response['result'] = payload
+        response['result_status'] = http_status
+    return jsonify(response)
+
+
+def job_events_response(job_id):
+    job = get_data_jobs.get_job(job_id, get_current_user()['id'])
+    if not job:
+        return jsonify({'error': 'Job no encontrado o caducado'}), 404
+    try:
+        after_seq = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        after_seq = 0
+    return Response(
+        stream_with_context(get_data_jobs.stream_events(job, after_seq)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/download-excel', methods=['POST'])
 @auth_required  # NUEVO: Requiere autenticación
 def download_excel():
@@ -1435,7 +1246,18 @@ def download_excel():
         if not data_processed:
             return jsonify({'error': 'No se proporcionaron datos para generar el Excel'}), 400
             
-        if not isinstance(data_processed, dict) or 'pages' not in data_processed:
+        if not isinstance(data_processed, dict):
+            return jsonify({'error': 'Estructura de datos inválida'}), 400
+
+        # ✅ NUEVO: Con analysis_id las tablas completas salen del resultado guardado
+        analysis_id = json_payload.get('analysis_id')
+        if analysis_id:
+            result_set = analysis_results.load_result_set(analysis_id, get_current_user()['id'])
+            if result_set is None:
+                return jsonify({'error': 'Análisis no encontrado o caducado. Vuelve a ejecutar el análisis.',
+                                'expired': True}), 404
+            data_processed = {**data_processed, **result_set}
+        elif 'pages' not in data_processed:
             return jsonify({'error': 'Estructura de datos inválida'}), 400
         
         logger.info(f"Generando Excel con {len(data_processed.get('pages', []))} páginas y {len(data_processed.get('keyword_comparison_data', []))} keywords")
@@ -1444,18 +1266,32 @@ def download_excel():
             logger.info("Incluyendo datos de AI Overview en el Excel")
         
         try:
-            xlsx_file = generate_excel_from_data(data_processed, ai_overview_data_excel)
+            # ✅ NUEVO: El Excel se genera en disco (modo constant_memory) y se envía
+            # por trozos desde el fichero; se borra al cerrar la respuesta
+            xlsx_path = write_excel_to_tempfile(data_processed, ai_overview_data_excel)
             
             timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
             ai_suffix = "_con_AI" if ai_overview_data_excel else ""
             filename = f'search_console_report{ai_suffix}_{timestamp}.xlsx'
             
-            return send_file(
-                xlsx_file,
-                download_name=filename,
-                as_attachment=True,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+            def remove_export_file():
+                try:
+                    os.remove(xlsx_path)
+                except OSError:
+                    pass
+            
+            try:
+                response = send_file(
+                    xlsx_path,
+                    download_name=filename,
+                    as_attachment=True,
+                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
+            except Exception:
+                remove_export_file()
+                raise
+            response.call_on_close(remove_export_file)
+            return response
             
         except Exception as e:
             logger.error(f"Error generando Excel: {e}", exc_info=True)
@@ -1708,7 +1544,8 @@ def analyze_single_keyword_ai_impact(keyword_arg, site_url_arg, country_code=Non
     params_ai = get_serp_params_with_location(keyword_arg, api_key_env_val, country_code, site_url_arg)
     
     try:
-        serp_data_from_service = get_serp_json(params_ai)
+        # ✅ NUEVO: SERP compartida del día (Manual AI / AI Mode / otros usuarios) antes de SerpAPI
+        serp_data_from_service = serp_store.fetch_serp(params_ai, get_serp_json, source='ai_overview')
         
         # ✅ FASE 4: Manejar errores de quota específicamente en AI Overview
         if not serp_data_from_service:
@@ -1765,6 +1602,8 @@ def analyze_single_keyword_ai_impact(keyword_arg, site_url_arg, country_code=Non
                         # Merge expanded ai_overview into original SERP data for complete analysis
                         serp_data_from_service['ai_overview'] = expanded_serp_data['ai_overview']
                         ai_analysis_data = detect_ai_overview_elements(serp_data_from_service, site_url_arg)
+                        # Guardar la SERP ya expandida: los siguientes no pagan la segunda llamada
+                        serp_store.save_serp(params_ai, serp_data_from_service, source='ai_overview')
                     else:
                         logger.warning(f"[AI OVERVIEW] Second call returned no expanded data for '{keyword_arg}'")
                 except Exception as e_page_token:
@@ -2159,15 +1998,26 @@ def get_domain_position_in_ai(ai_analysis, target_domain):
     return None
 
 
-def analyze_keywords_parallel(keywords_data_list, site_url_req, country_req, max_workers=3):
+# ✅ NUEVO: Hilos de espera del análisis AI Overview (acompaña a SERPAPI_MAX_CONCURRENCY)
+AI_OVERVIEW_MAX_WORKERS = int(os.getenv('AI_OVERVIEW_MAX_WORKERS', '48'))
+
+def analyze_keywords_parallel(keywords_data_list, site_url_req, country_req, max_workers=AI_OVERVIEW_MAX_WORKERS, on_result=None):
     """
     Analiza múltiples keywords en paralelo para mejorar la velocidad del análisis de AI Overview.
     
+    Los hilos solo esperan a SerpAPI: las llamadas van al cliente asíncrono
+    compartido de `quota_middleware`, cuyo límite adaptativo decide cuántas hay
+    realmente en vuelo. Los hilos no llevan el contexto de la petición: el RU
+    se cobra una vez por keyword analizada al terminar (`source='ai_overview'`),
+    no por llamada SerpAPI.
+    
     Args:
         keywords_data_list: Lista de datos de keywords a analizar
         site_url_req: URL del sitio para analizar
         country_req: Código de país para el análisis
-        max_workers: Número máximo de hilos concurrentes (default: 3)
+        max_workers: Número máximo de hilos concurrentes (default: AI_OVERVIEW_MAX_WORKERS)
+        on_result: Callback opcional `on_result(result, done, total)` llamado con
+            cada keyword terminada (el modo job lo publica por SSE)
     
     Returns:
         tuple: (results_list, errors_list, successful_analyses_count)
@@ -2179,11 +2029,18 @@ def analyze_keywords_parallel(keywords_data_list, site_url_req, country_req, max
     max_duration_seconds = int(os.getenv('AI_OVERVIEW_MAX_DURATION_SECONDS', '1800'))
     start_time = time.time()
     
+    # ✅ NUEVO: Sin país, el país con más clics se resuelve una sola vez (consulta a GSC)
+    # en lugar de una vez por keyword dentro de cada hilo
+    serp_country = country_req or get_top_country_for_site(site_url_req)
+
+    # ✅ NUEVO: Un solo MGET para toda la lista; los hilos leen después de la caché local
+    ai_cache.prefetch([(kw_data['keyword'], site_url_req, serp_country or '') for kw_data in keywords_data_list])
+
     # Usar ThreadPoolExecutor para procesamiento paralelo
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(keywords_data_list)))) as executor:
         # Crear un mapeo de futuros a datos de keyword
         future_to_keyword = {
-            executor.submit(analyze_single_keyword_ai_impact, kw_data['keyword'], site_url_req, country_req): kw_data
+            executor.submit(analyze_single_keyword_ai_impact, kw_data['keyword'], site_url_req, serp_country): kw_data
             for kw_data in keywords_data_list
         }
         
@@ -2217,7 +2074,6 @@ def analyze_keywords_parallel(keywords_data_list, site_url_req, country_req, max
                 # Log de progreso cada 5 keywords procesadas
                 if i % 5 == 0 or i == len(keywords_data_list):
                     logger.info(f"✅ Progreso: {i}/{len(keywords_data_list)} keywords procesadas")
-                    # TODO: En futuras versiones, enviar progreso real al frontend via SSE
                 
                 # ✅ FASE 4: Manejar resultados de quota en análisis paralelo
                 if 'ai_analysis' not in ai_result_item:
@@ -2263,13 +2119,55 @@ def analyze_keywords_parallel(keywords_data_list, site_url_req, country_req, max
                     'country_analyzed': country_req
                 }
                 results_list.append(error_result)
+
+            # ✅ NUEVO: Progreso real por keyword (SSE en modo job)
+            if on_result is not None:
+                try:
+                    on_result(results_list[-1], i, len(keywords_data_list))
+                except Exception as e:
+                    logger.warning(f"No se pudo publicar el progreso de '{keyword_str}': {e}")
     
     return results_list, errors_list, successful_analyses
 
+# ✅ NUEVO: Executor propio para los jobs de AI Overview (no compiten con /get-data)
+_ai_overview_job_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AI_OVERVIEW_JOB_WORKERS', '4')),
+    thread_name_prefix='ai-overview-job'
+)
+
 @app.route('/api/analyze-ai-overview', methods=['POST'])
 @auth_required  # NUEVO: Requiere autenticación
 @limiter.limit("20 per minute")
 def analyze_ai_overview_route():
+    return run_ai_overview_analysis()
+
+
+def start_ai_overview_job(user, quota_status):
+    """
+    Lanza el análisis AI Overview en segundo plano con una copia del contexto
+    de la petición. Las comprobaciones ya se hicieron en la petición que crea
+    el job: el job solo ejecuta el análisis.
+    """
+    @copy_current_request_context
+    def run(job):
+        response = app.make_response(analyze_ai_overview_keywords(user, quota_status, ai_job=job))
+        return response.get_json(silent=True), response.status_code
+
+    job = get_data_jobs.submit_job(user['id'], run, phase='Consultando SERPs', executor=_ai_overview_job_executor)
+    return jsonify({
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': url_for('ai_overview_job_status', job_id=job.job_id),
+        'events_url': url_for('ai_overview_job_events', job_id=job.job_id)
+    }), 202
+
+
+def run_ai_overview_analysis():
+    """
+    /api/analyze-ai-overview: plan, pausa, cuota y datos de la petición se
+    validan aquí una sola vez; luego se analiza en esta petición o, con
+    `async=true`, en un job.
+    """
     # ✅ NUEVO FASE 4.5: PAYWALL CHECK
     user = get_current_user()
     
@@ -2326,6 +2224,27 @@ def analyze_ai_overview_route():
             'paused_until': quota_status.get('reset_date').isoformat() if quota_status.get('reset_date') else None
         }), 429  # Too Many Requests
     
+    request_payload = request.get_json(silent=True) or {}
+    site_url_req = request_payload.get('site_url', '')
+    if not request_payload.get('keywords'):
+        return jsonify({'error': 'No se proporcionaron keywords para analizar'}), 400
+    if not site_url_req:
+        return jsonify({'error': 'site_url es requerido'}), 400
+    if not user_owns_site_url(user['id'], site_url_req) and user.get('role') != 'admin':
+        return jsonify({'error': 'No tienes acceso a este site_url'}), 403
+    if not os.getenv('SERPAPI_KEY'):
+        logger.error("SERPAPI_KEY no configurada para ruta analyze-ai-overview")
+        return jsonify({'error': 'Unexpected error, please contact support'}), 500
+
+    # ✅ NUEVO: Modo job (async=true): se responde con un job_id tras las comprobaciones
+    # de plan y cuota; cada keyword analizada se emite por SSE en .../jobs/<id>/events
+    if request_payload.get('async') is True:
+        return start_ai_overview_job(user, quota_status)
+    return analyze_ai_overview_keywords(user, quota_status)
+
+
+def analyze_ai_overview_keywords(user, quota_status, ai_job=None):
+    """Análisis de /api/analyze-ai-overview ya validado (síncrono o dentro de `ai_job`)."""
     try:
         request_payload = request.get_json()
         keywords_data_list = request_payload.get('keywords', [])
@@ -2395,18 +2314,6 @@ def analyze_ai_overview_route():
         else:
             logger.info("[AI ANALYSIS] 🌍 Sin país especificado - usando detección dinámica del país con más clics")
         
-        if not keywords_data_list:
-            return jsonify({'error': 'No se proporcionaron keywords para analizar'}), 400
-        if not site_url_req:
-            return jsonify({'error': 'site_url es requerido'}), 400
-        if not user_owns_site_url(user['id'], site_url_req) and user.get('role') != 'admin':
-            return jsonify({'error': 'No tienes acceso a este site_url'}), 403
-        
-        serpapi_key = os.getenv('SERPAPI_KEY')
-        if not serpapi_key:
-            logger.error("SERPAPI_KEY no configurada para ruta analyze-ai-overview")
-            return jsonify({'error': 'Unexpected error, please contact support'}), 500
-        
         original_count = len(keywords_data_list)
         
         # 🔍 NUEVO: Aplicar exclusiones de keywords si están habilitadas
@@ -2429,23 +2336,40 @@ def analyze_ai_overview_route():
         if original_count > requested_count:
             logger.warning(f"Se truncaron {original_count - requested_count} keywords. Analizando solo las primeras {requested_count}.")
         
-        # 🆕 MODIFICADO: Optimizar workers basado en cantidad solicitada
+        # ✅ NUEVO: Un hilo por keyword hasta AI_OVERVIEW_MAX_WORKERS; el rate limiting
+        # lo gestiona el límite adaptativo del cliente SerpAPI, no el número de hilos
         num_keywords = len(keywords_to_process_list)
-        if num_keywords <= 15:
-            max_workers = 2  # Análisis pequeño
-        elif num_keywords <= 30:
-            max_workers = 4  # Análisis medio
-        else:
-            max_workers = 5  # Análisis grande (máximo para evitar rate limiting)
+        max_workers = max(1, min(num_keywords, AI_OVERVIEW_MAX_WORKERS))
             
         logger.info(f"🚀 Iniciando análisis paralelo de {num_keywords} keywords con {max_workers} workers")
         
+        on_result = None
+        if ai_job is not None:
+            ai_job.set_counters(keywords_total=num_keywords, keywords_done=0)
+
+            def on_result(result, done, total):
+                # Solo lo necesario para pintar la fila parcial: el resultado completo
+                # llega con el job terminado y los eventos se guardan en memoria
+                ai_analysis = result.get('ai_analysis') or {}
+                ai_job.publish('result', {'result': {
+                    'keyword': result.get('keyword'),
+                    'clicks_m1': result.get('clicks_m1'),
+                    'site_position': result.get('site_position'),
+                    'has_ai_overview': bool(ai_analysis.get('has_ai_overview')),
+                    'domain_is_ai_source': bool(ai_analysis.get('domain_is_ai_source')),
+                    'domain_ai_source_position': ai_analysis.get('domain_ai_source_position'),
+                    'error': result.get('error'),
+                }}, keywords_done=done, keywords_total=total)
+
         results_list_overview, errors_list_overview, successful_analyses_overview = analyze_keywords_parallel(
             keywords_to_process_list, 
             site_url_req, 
             country_req, 
-            max_workers
+            max_workers,
+            on_result=on_result
         )
+        if ai_job is not None:
+            ai_job.set_phase('Calculando competidores y resumen')
 
         # Si se alcanzó cuota durante el análisis, pausar AI Overview
         try:
@@ -2455,6 +2379,7 @@ def analyze_ai_overview_route():
                 for item in results_list_overview
             )
             if quota_blocked:
+                from database import pause_ai_overview_for_quota
                 pause_ai_overview_for_quota(user['id'], quota_status.get('reset_date'), reason='quota_exceeded')
         except Exception:
             pass
@@ -2845,6 +2770,7 @@ def get_url_keywords():
         
         # ✅ ARREGLO: Usar la misma lógica de autenticación que el endpoint principal
         gsc_service = None
+        mapping_conn = None
         try:
             mapping_conn = get_connection_for_site(get_current_user()['id'], site_url_sc)
             if mapping_conn:
@@ -2869,39 +2795,50 @@ def get_url_keywords():
                 ]
             }), 401
             
+        # ✅ NUEVO: Responder desde el warehouse local si cubre los períodos pedidos
+        requested_ranges = [(datetime.strptime(current_start_date, '%Y-%m-%d').date(),
+                             datetime.strptime(current_end_date, '%Y-%m-%d').date())]
+        if has_comparison and comparison_start_date and comparison_end_date:
+            requested_ranges.append((datetime.strptime(comparison_start_date, '%Y-%m-%d').date(),
+                                     datetime.strptime(comparison_end_date, '%Y-%m-%d').date()))
+        warehouse_state = resolve_warehouse_state(site_url_sc, mapping_conn, requested_ranges, data.get('data_source', 'auto'))
+        rows_served_by = {'warehouse': 0, 'gsc_api': 0}
+
         # ✅ ARREGLO: Verificar que tenemos acceso al sitio antes de proceder
-        try:
-            # Hacer una pequeña consulta de prueba para verificar acceso
-            test_request = {
-                'startDate': current_start_date,
-                'endDate': current_end_date,
-                'dimensions': ['page'],
-                'rowLimit': 1
-            }
+        # (con warehouse el acceso ya está garantizado por la conexión mapeada)
+        if not warehouse_state:
+            try:
+                # Hacer una pequeña consulta de prueba para verificar acceso
+                test_request = {
+                    'startDate': current_start_date,
+                    'endDate': current_end_date,
+                    'dimensions': ['page'],
+                    'rowLimit': 1
+                }
             
-            # Si hay filtro de país, incluirlo en la prueba
-            if selected_country:
-                test_request['dimensionFilterGroups'] = [{
-                    'filters': [{'dimension': 'country', 'operator': 'equals', 'expression': selected_country}]
-                }]
+                # Si hay filtro de país, incluirlo en la prueba
+                if selected_country:
+                    test_request['dimensionFilterGroups'] = [{
+                        'filters': [{'dimension': 'country', 'operator': 'equals', 'expression': selected_country}]
+                    }]
             
-            logger.info(f"[URL KEYWORDS] Verificando acceso al sitio con query de prueba...")
-            test_response = gsc_service.searchanalytics().query(siteUrl=site_url_sc, body=test_request).execute()
-            logger.info(f"[URL KEYWORDS] ✅ Acceso verificado, test query exitoso")
+                logger.info(f"[URL KEYWORDS] Verificando acceso al sitio con query de prueba...")
+                test_response = gsc_service.searchanalytics().query(siteUrl=site_url_sc, body=test_request).execute()
+                logger.info(f"[URL KEYWORDS] ✅ Acceso verificado, test query exitoso")
             
-        except Exception as access_error:
-            logger.error(f"[URL KEYWORDS] ❌ Error verificando acceso al sitio: {access_error}")
-            # Si la verificación falla, devolver un error específico
-            return jsonify({
-                'error': 'Access verification failed',
-                'error_type': 'auth_error',
-                'details': f'Unable to access Search Console data for {site_url_sc}. You may have lost access to this property.',
-                'suggestions': [
-                    'Verify you still have access to this property in Google Search Console',
-                    'Try refreshing the page to re-authenticate',
-                    'Contact the site owner to regain access'
-                ]
-            }), 403
+            except Exception as access_error:
+                logger.error(f"[URL KEYWORDS] ❌ Error verificando acceso al sitio: {access_error}")
+                # Si la verificación falla, devolver un error específico
+                return jsonify({
+                    'error': 'Access verification failed',
+                    'error_type': 'auth_error',
+                    'details': f'Unable to access Search Console data for {site_url_sc}. You may have lost access to this property.',
+                    'suggestions': [
+                        'Verify you still have access to this property in Google Search Console',
+                        'Try refreshing the page to re-authenticate',
+                        'Contact the site owner to regain access'
+                    ]
+                }), 403
         
         # Configurar filtros base (país)
         def get_base_filters_url_keywords(additional_filters=None):
@@ -2934,12 +2871,19 @@ def get_url_keywords():
             
             # Obtener datos de Search Console
             try:
-                rows_data = fetch_searchconsole_data_single_call(
-                    gsc_service, site_url_sc,
-                    start_date, end_date,
-                    ['page', 'query'],  # Dimensiones: página y keyword
-                    combined_filters
-                )
+                rows_data = None
+                if warehouse_state:
+                    rows_data = gsc_warehouse.query_rows(site_url_sc, start_date, end_date, ['page', 'query'], combined_filters)
+                if rows_data is not None:
+                    rows_served_by['warehouse'] += 1
+                else:
+                    rows_served_by['gsc_api'] += 1
+                    rows_data = fetch_searchconsole_data_single_call(
+                        gsc_service, site_url_sc,
+                        start_date, end_date,
+                        ['page', 'query'],  # Dimensiones: página y keyword
+                        combined_filters
+                    )
             except Exception as api_error:
                 logger.error(f"[URL KEYWORDS] Error en API de Search Console: {api_error}")
                 logger.error(f"[URL KEYWORDS] Tipo de error: {type(api_error)}")
@@ -2976,7 +2920,6 @@ def get_url_keywords():
             return ((current - comparison) / comparison) * 100
         
         # Convertir fechas
-        from datetime import datetime
         current_start = datetime.strptime(current_start_date, '%Y-%m-%d')
         current_end = datetime.strptime(current_end_date, '%Y-%m-%d')
         
@@ -3095,6 +3038,7 @@ def get_url_keywords():
             'url': target_url,
             'total_keywords': len(comparison_data),
             'has_comparison': has_comparison,
+            'data_freshness': build_data_freshness(warehouse_state, rows_served_by),
             'periods': {
                 'current': {
                     'start_date': current_start_date,
@@ -3379,9 +3323,8 @@ def cache_management_route():
         if action == 'clear':
             # Limpiar caché de AI Overview (Redis)
             deleted = ai_cache.clear_cache()
-            # Limpiar caché de screenshots in-memory
-            screenshot_deleted = len(SCREENSHOT_CACHE)
-            SCREENSHOT_CACHE.clear()
+            # Limpiar caché de screenshots (LRU local + Redis)
+            screenshot_deleted = clear_screenshot_cache()
             return jsonify({
                 'success': True,
                 'message': f'Caché limpiado: {deleted} entradas de AI + {screenshot_deleted} screenshots eliminados',
@@ -3395,6 +3338,21 @@ def cache_management_route():
                 'cache_stats': stats
             })
             
+        elif action == 'serp_store':
+            # ✅ NUEVO: Llamadas a SerpAPI ahorradas por el almacén compartido de SERPs
+            days = int(request.get_json().get('days') or 7)
+            return jsonify({
+                'success': True,
+                'serp_store': serp_store.get_serp_store_report(days)
+            })
+            
+        elif action == 'payload_blobs':
+            # ✅ NUEVO: Tamaño de los payloads SERP/AIO y ratio de compresión/deduplicación
+            return jsonify({
+                'success': True,
+                'payload_blobs': payload_blobs.get_payload_size_report()
+            })
+            
         elif action == 'invalidate_site':
             site_url = request.get_json().get('site_url')
             if not site_url:
@@ -3410,7 +3368,7 @@ def cache_management_route():
         else:
             return jsonify({
                 'success': False,
-                'error': 'Acción no reconocida. Acciones válidas: clear, stats, invalidate_site'
+                'error': 'Acción no reconocida. Acciones válidas: clear, stats, serp_store, payload_blobs, invalidate_site'
             }), 400
             
     except Exception as e:
@@ -3623,38 +3581,7 @@ def classify_keyword_into_clusters(keyword_text, clusters_config):
     Returns:
         list: Lista de nombres de clusters que coinciden
     """
-    if not keyword_text or not clusters_config or not clusters_config.get('enabled'):
-        return []
-    
-    clusters_list = clusters_config.get('clusters', [])
-    cluster_method = clusters_config.get('method', 'contains')
-    keyword_lower = keyword_text.lower()
-    matching_clusters = []
-    
-    for cluster in clusters_list:
-        cluster_name = cluster.get('name', '')
-        cluster_terms = cluster.get('terms', [])
-        
-        # Verificar si la keyword coincide con algún término del cluster
-        for term in cluster_terms:
-            term_lower = term.lower()
-            matches = False
-            
-            if cluster_method == 'contains':
-                matches = term_lower in keyword_lower
-            elif cluster_method == 'equals':
-                matches = keyword_lower == term_lower
-            elif cluster_method == 'notContains':
-                matches = term_lower not in keyword_lower
-            elif cluster_method == 'notEquals':
-                matches = keyword_lower != term_lower
-            
-            if matches:
-                if cluster_name not in matching_clusters:
-                    matching_clusters.append(cluster_name)
-                break  # Una coincidencia por cluster es suficiente
-    
-    return matching_clusters
+    return get_cluster_classifier(clusters_config).classify(keyword_text)
 
 def group_keywords_by_clusters(keywords_results, clusters_config):
     """
@@ -3689,10 +3616,11 @@ def group_keywords_by_clusters(keywords_results, clusters_config):
                 'terms': cluster.get('terms', [])
             }
     
-    # Clasificar cada keyword en clusters
+    # Clasificar cada keyword en clusters (clasificador compilado una vez)
+    classifier = get_cluster_classifier(clusters_config)
     for keyword_result in keywords_results:
         keyword_text = keyword_result.get('keyword', '')
-        matching_clusters = classify_keyword_into_clusters(keyword_text, clusters_config)
+        matching_clusters = classifier.classify(keyword_text)
         
         if matching_clusters:
             # Añadir nombre del cluster a la keyword (usar el primero si hay múltiples)
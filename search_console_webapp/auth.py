@@ -6,12 +6,14 @@ import urllib.request
 import urllib.parse
 import json
 import secrets
+import hashlib
+import threading
 from functools import wraps
 from datetime import datetime, timedelta
 from flask import session, redirect, request, jsonify, url_for, flash, render_template
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
 from google.auth.transport.requests import Request
 import logging
 from dotenv import load_dotenv
@@ -62,6 +64,7 @@ from database import (
     use_password_reset_token,
     cleanup_expired_reset_tokens
 )
+from services import gsc_property_inventory
 
 # Carga las variables de entorno desde el .env
 load_dotenv()
@@ -1474,6 +1477,7 @@ def setup_auth_routes(app):
                     site_entries = sites_resp.get('siteEntry', []) if sites_resp else []
                     if connection:
                         upsert_gsc_properties_for_connection(current_user['id'], connection['id'], site_entries)
+                        gsc_property_inventory.invalidate_user_properties(current_user['id'])
                 except Exception as e:
                     logger.warning(f"No se pudieron sincronizar propiedades GSC en link: {e}")
 
@@ -2143,13 +2147,9 @@ def setup_auth_routes(app):
             if not conn or conn['user_id'] != user['id']:
                 return jsonify({'error': 'Connection not found'}), 404
 
-            service = get_authenticated_service_for_connection(conn, 'searchconsole', 'v1')
-            if not service:
+            count = gsc_property_inventory.refresh_connection_properties(conn)
+            if count is None:
                 return jsonify({'error': 'Authentication required', 'auth_required': True}), 401
-
-            resp = service.sites().list().execute()
-            site_entries = resp.get('siteEntry', []) if resp else []
-            count = upsert_gsc_properties_for_connection(user['id'], connection_id, site_entries)
             return jsonify({'success': True, 'properties_synced': count})
         except Exception as e:
             logger.error(f"Error refrescando propiedades de conexión {connection_id}: {e}")
@@ -2173,6 +2173,8 @@ def setup_auth_routes(app):
                 cur = db.cursor()
                 cur.execute('DELETE FROM oauth_connections WHERE id = %s', (connection_id,))
                 db.commit()
+                invalidate_connection_credentials(connection_id)
+                gsc_property_inventory.invalidate_user_properties(user['id'])
                 return jsonify({'success': True})
             finally:
                 if db is not None:
@@ -2556,6 +2558,98 @@ def setup_auth_routes(app):
                 except Exception:
                     pass
 
+# ================================
+# Caché de servicios de Google API
+# ================================
+# Construir un servicio implica leer y parsear el documento de discovery,
+# descifrar el refresh token (Fernet) y, a menudo, refrescar el access token.
+# Se cachea por proceso:
+# - el documento de discovery ya parseado, por (servicio, versión);
+# - las credenciales refrescadas, por conexión OAuth (o por refresh token de sesión).
+# El objeto service se crea en cada llamada desde el documento cacheado (~0,1 ms):
+# su transporte httplib2 no es thread-safe y Flask atiende peticiones en paralelo.
+
+GOOGLE_CREDENTIALS_REFRESH_MARGIN = timedelta(seconds=int(os.getenv('GOOGLE_CREDENTIALS_REFRESH_MARGIN_SECONDS', '300')))
+GOOGLE_CREDENTIALS_CACHE_MAX = int(os.getenv('GOOGLE_CREDENTIALS_CACHE_MAX', '1000'))
+
+_discovery_docs = {}        # (service_name, version) -> documento parseado
+_credentials_cache = {}     # clave -> {'fingerprint', 'credentials', 'lock'}
+_credentials_cache_lock = threading.Lock()
+
+
+def _build_service(service_name, version, credentials):
+    """Equivalente a `build()` reutilizando el documento de discovery parseado."""
+    key = (service_name, version)
+    doc = _discovery_docs.get(key)
+    if doc is None:
+        try:
+            from googleapiclient import discovery_cache
+            raw = discovery_cache.get_static_doc(service_name, version)
+        except Exception:
+            raw = None
+        if not raw:
+            return build(service_name, version, credentials=credentials)
+        doc = _discovery_docs.setdefault(key, json.loads(raw))
+    return build_from_document(doc, credentials=credentials)
+
+
+def _credentials_need_refresh(credentials) -> bool:
+    """True si el access token falta o caduca dentro del margen configurado."""
+    if not credentials.refresh_token:
+        return False
+    if not credentials.token:
+        return True
+    if credentials.expiry is None:
+        return False
+    return credentials.expiry - GOOGLE_CREDENTIALS_REFRESH_MARGIN <= datetime.utcnow()
+
+
+def _get_cached_credentials(cache_key, fingerprint, factory, on_refresh=None):
+    """
+    Devuelve credenciales válidas para `cache_key`, creándolas con `factory()`
+    solo si no están en caché o si `fingerprint` cambió (reconexión, rotación
+    del refresh token). Refresca antes de que caduquen y llama a
+    `on_refresh(credentials)` para persistir el nuevo token.
+    """
+    with _credentials_cache_lock:
+        entry = _credentials_cache.get(cache_key)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            if entry is None and len(_credentials_cache) >= GOOGLE_CREDENTIALS_CACHE_MAX:
+                _credentials_cache.pop(next(iter(_credentials_cache)))
+            entry = {'fingerprint': fingerprint, 'credentials': None, 'lock': threading.Lock()}
+            _credentials_cache[cache_key] = entry
+
+    # Lock por entrada: un solo refresh por conexión aunque lleguen peticiones en paralelo
+    with entry['lock']:
+        if entry['credentials'] is None:
+            entry['credentials'] = factory()
+        credentials = entry['credentials']
+        if _credentials_need_refresh(credentials):
+            try:
+                credentials.refresh(Request())
+            except Exception:
+                # No dejar en caché credenciales que no se pueden refrescar (p.ej. acceso revocado)
+                invalidate_cached_credentials(cache_key)
+                raise
+            if on_refresh:
+                on_refresh(credentials)
+        return credentials
+
+
+def invalidate_cached_credentials(cache_key=None):
+    """Elimina de la caché las credenciales de una clave (o todas si es None)."""
+    with _credentials_cache_lock:
+        if cache_key is None:
+            _credentials_cache.clear()
+        else:
+            _credentials_cache.pop(cache_key, None)
+
+
+def invalidate_connection_credentials(connection_id):
+    """Olvida las credenciales cacheadas de una conexión OAuth (borrado, reconexión)."""
+    invalidate_cached_credentials(('connection', connection_id))
+
+
 def get_authenticated_service(service_name, version):
     """Obtiene un servicio autenticado de Google API"""
     credentials = get_user_credentials()
@@ -2563,11 +2657,30 @@ def get_authenticated_service(service_name, version):
         return None
     
     try:
-        credentials = refresh_credentials_if_needed(credentials)
+        # Las credenciales de sesión se cachean por refresh token: así se
+        # conserva el access token refrescado (y su caducidad) entre peticiones
+        if credentials.refresh_token:
+            fingerprint = hashlib.sha256(credentials.refresh_token.encode('utf-8')).hexdigest()
+
+            def _save_to_session(refreshed):
+                session['credentials'] = {
+                    'token': refreshed.token,
+                    'refresh_token': refreshed.refresh_token,
+                    'token_uri': refreshed.token_uri,
+                    'client_id': refreshed.client_id,
+                    'client_secret': refreshed.client_secret,
+                    'scopes': refreshed.scopes
+                }
+
+            credentials = _get_cached_credentials(
+                ('session', fingerprint), fingerprint, lambda: credentials, on_refresh=_save_to_session
+            )
+        else:
+            credentials = refresh_credentials_if_needed(credentials)
         if not credentials:
             return None
             
-        return build(service_name, version, credentials=credentials)
+        return _build_service(service_name, version, credentials)
     except Exception as e:
         logger.error(f"Error obteniendo servicio autenticado: {e}")
         return None
@@ -2577,33 +2690,46 @@ def get_authenticated_service_for_connection(connection, service_name, version):
     if not connection:
         return None
     try:
-        # Construir credenciales con refresh token (descifrado si aplica)
         refresh_token_enc = connection.get('refresh_token_encrypted')
-        refresh_token = _decrypt_token(refresh_token_enc)
-
-        creds = Credentials(
-            token=connection.get('access_token'),
-            refresh_token=refresh_token,
-            token_uri=connection.get('token_uri'),
-            client_id=connection.get('client_id'),
-            client_secret=connection.get('client_secret'),
-            scopes=json.loads(connection['scopes']) if connection.get('scopes') and connection['scopes'].startswith('[') else connection.get('scopes')
-        )
 
-        # Refrescar si es necesario para garantizar validez
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+        def _build_credentials():
+            # Construir credenciales con refresh token (descifrado si aplica)
+            refresh_token = _decrypt_token(refresh_token_enc)
+            expires_at = connection.get('expires_at')
+            return Credentials(
+                token=connection.get('access_token'),
+                refresh_token=refresh_token,
+                token_uri=connection.get('token_uri'),
+                client_id=connection.get('client_id'),
+                client_secret=connection.get('client_secret'),
+                scopes=json.loads(connection['scopes']) if connection.get('scopes') and connection['scopes'].startswith('[') else connection.get('scopes'),
+                expiry=expires_at.replace(tzinfo=None) if isinstance(expires_at, datetime) else None
+            )
+
+        original_refresh_token = []
+
+        def _persist_tokens(creds):
+            # Solo se re-cifra el refresh token si Google lo rotó: así el valor
+            # cifrado en BD (huella de la caché) no cambia en cada refresh
+            if not original_refresh_token:
+                original_refresh_token.append(_decrypt_token(refresh_token_enc))
+            rotated = creds.refresh_token != original_refresh_token[0]
             try:
                 update_oauth_connection_tokens(
                     connection_id=connection['id'],
                     token=creds.token,
-                    refresh_token=creds.refresh_token,
-                    expires_at=None
+                    refresh_token=creds.refresh_token if rotated else None,
+                    expires_at=creds.expiry
                 )
             except Exception as e:
                 logger.warning(f"No se pudieron actualizar tokens en BD: {e}")
 
-        return build(service_name, version, credentials=creds)
+        # Refrescar si es necesario para garantizar validez
+        creds = _get_cached_credentials(
+            ('connection', connection['id']), refresh_token_enc, _build_credentials, on_refresh=_persist_tokens
+        )
+
+        return _build_service(service_name, version, creds)
     except Exception as e:
         logger.error(f"Error construyendo servicio por conexión: {e}")
         return None
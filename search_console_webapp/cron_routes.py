@@ -2,7 +2,8 @@
 HTTP endpoints invoked by Railway Bun cron functions for non-LLM-monitoring crons.
 
 Currently exposes:
-  POST /api/cron/quota-reset   — runs the daily quota reset (with health check).
+  POST /api/cron/quota-reset        — runs the daily quota reset (with health check).
+  POST /api/cron/gsc-warehouse-sync — incremental daily sync of the local GSC warehouse.
 
 Auth: Bearer CRON_TOKEN (env). Same pattern as the existing LLM monitoring
 cron endpoint at /api/llm-monitoring/cron/daily-analysis.
@@ -104,6 +105,47 @@ def trigger_quota_reset():
         return jsonify({'success': False, 'error': 'internal_error'}), 500
 
 
+# ---------------------------------------------------------------------------
+# GSC warehouse daily sync
+# ---------------------------------------------------------------------------
+
+@cron_bp.route('/gsc-warehouse-sync', methods=['POST'])
+def trigger_gsc_warehouse_sync():
+    """
+    Incremental daily sync of every GSC property registered in the local
+    warehouse (see services/gsc_warehouse.py). Always runs in background: a
+    full pass can take minutes and each property is bounded by
+    GSC_WAREHOUSE_SYNC_BUDGET_SECONDS. Per-property advisory locks make
+    overlapping triggers safe.
+
+    Returns:
+        202 with the list being synced in background, 200 if disabled.
+    """
+    auth_error = _ensure_cron_token()
+    if auth_error:
+        return auth_error
+
+    from services import gsc_warehouse
+    if not gsc_warehouse.GSC_WAREHOUSE_ENABLED:
+        return jsonify({'success': True, 'skipped': True, 'reason': 'GSC_WAREHOUSE_ENABLED is off'}), 200
+
+    triggered_by = request.args.get('triggered_by', 'cron')
+
+    def run_bg():
+        try:
+            logger.info(f"🚀 gsc-warehouse-sync cron triggered (by={triggered_by})")
+            gsc_warehouse.ensure_gsc_warehouse_tables()
+            results = gsc_warehouse.sync_all_properties()
+            errors = [r for r in results if r.get('status') == 'error']
+            logger.info(f"✅ gsc-warehouse-sync finished: {len(results)} properties, {len(errors)} errors")
+        except Exception as e:
+            logger.error(f"💥 gsc-warehouse-sync bg error: {e}", exc_info=True)
+
+    thread = threading.Thread(target=run_bg, daemon=True, name='gsc-warehouse-sync-bg')
+    thread.start()
+    return jsonify({'success': True, 'message': 'GSC warehouse sync started in background'}), 202
+
+
 # ---------------------------------------------------------------------------
 # Quota health check (defensive monitoring)
 # ---------------------------------------------------------------------------
@@ -397,4 +439,4 @@ def _send_stuck_quota_alert(stuck_users):
 def register_cron_routes(app):
     """Wire the cron blueprint into the Flask app. Call once during app init."""
     app.register_blueprint(cron_bp)
-    logger.info("🔧 cron_routes registered (POST /api/cron/quota-reset, /api/cron/quota-health-check)")
+    logger.info("🔧 cron_routes registered (POST /api/cron/quota-reset, /api/cron/quota-health-check, /api/cron/gsc-warehouse-sync)")
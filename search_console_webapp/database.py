@@ -389,6 +389,12 @@ def init_database():
         cur.execute('CREATE INDEX IF NOT EXISTS idx_oauth_connections_user ON oauth_connections(user_id)')
         cur.execute('CREATE INDEX IF NOT EXISTS idx_oauth_connections_provider ON oauth_connections(provider)')
 
+        # ✅ NUEVO: Momento de la última sincronización de propiedades (sites().list()) por conexión
+        try:
+            cur.execute("ALTER TABLE oauth_connections ADD COLUMN IF NOT EXISTS properties_synced_at TIMESTAMP NULL")
+        except Exception:
+            pass
+
         cur.execute('''
             CREATE TABLE IF NOT EXISTS gsc_properties (
                 id SERIAL PRIMARY KEY,
@@ -792,10 +798,12 @@ def update_oauth_connection_tokens(connection_id: int, token: Optional[str], ref
 # ================================
 
 def upsert_gsc_properties_for_connection(user_id: int, connection_id: int, site_entries: List[Dict[str, Any]]) -> int:
-    """Inserta/actualiza propiedades de GSC para una conexión. Retorna cantidad procesada."""
+    """
+    Inserta/actualiza propiedades de GSC para una conexión y la marca como
+    sincronizada (`properties_synced_at`). Retorna cantidad procesada.
+    """
+    conn = None
     try:
-        if not site_entries:
-            return 0
         conn = get_db_connection()
         if not conn:
             return 0
@@ -821,6 +829,7 @@ def upsert_gsc_properties_for_connection(user_id: int, connection_id: int, site_
                               updated_at = NOW()
             ''', (user_id, connection_id, site_url, permission_level, verified))
             processed += 1
+        cur.execute('UPDATE oauth_connections SET properties_synced_at = NOW() WHERE id = %s', (connection_id,))
         conn.commit()
         return processed
     except Exception as e:
@@ -853,6 +862,28 @@ def list_gsc_properties_for_user(user_id: int) -> List[Dict[str, Any]]:
         if conn:
             conn.close()
 
+def get_gsc_properties_sync_state(user_id: int) -> List[Dict[str, Any]]:
+    """Conexiones Google del usuario con su última sincronización de propiedades (fecha y antigüedad en segundos)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return []
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT id, properties_synced_at,
+                   EXTRACT(EPOCH FROM (NOW() - properties_synced_at)) AS synced_age_seconds
+            FROM oauth_connections
+            WHERE user_id = %s AND provider = 'google'
+        ''', (user_id,))
+        return [dict(r) for r in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"Error obteniendo estado de sincronización de propiedades GSC: {e}")
+        return []
+    finally:
+        if conn:
+            conn.close()
+
 def get_connection_for_site(user_id: int, site_url: str) -> Optional[Dict[str, Any]]:
     try:
         conn = get_db_connection()
@@ -1,11 +1,30 @@
 import pandas as pd
 from io import BytesIO
 import logging
+import os
+import re
+import tempfile
+import xlsxwriter
 from urllib.parse import urlparse
 from services.country_config import get_country_name # Importar la función get_country_name
 
 logger = logging.getLogger(__name__)
 
+# Columnas comunes de las hojas de keywords (consolidada y por rangos de posición)
+KEYWORD_COLUMNS = [
+    'Keyword', 'URL que Posiciona', 'Clicks P1', 'Clicks P2', 'Impresiones P1',
+    'Impresiones P2', 'CTR P1 (%)', 'CTR P2 (%)', 'Posición Media P1', 'Posición Media P2'
+]
+PAGE_COLUMNS = [
+    'URL', 'Clicks P1', 'Clicks P2', 'Impresiones P1', 'Impresiones P2',
+    'CTR P1 (%)', 'CTR P2 (%)', 'Posición Media P1', 'Posición Media P2'
+]
+
+# Hipervínculos: los mismos esquemas que convertía pandas/xlsxwriter por defecto
+# (sin enlaces internal:/external: a ficheros), hasta el máximo de Excel por hoja
+_URL_RE = re.compile(r'(ftp|http)s?://|mailto:')
+EXCEL_MAX_URLS_PER_SHEET = 65530
+
 
 def _sanitize_cell(value):
     """
@@ -20,6 +39,44 @@ def _sanitize_cell(value):
     return value
 
 
+def _write_cell(worksheet, row_num, col_num, value, cell_format=None):
+    """
+    Escribe una celda. Las URLs van como hipervínculo mientras la hoja no
+    llegue a EXCEL_MAX_URLS_PER_SHEET; a partir de ahí (o si Excel no admite
+    el enlace, p.ej. por longitud) se escriben como texto. xlsxwriter guarda
+    los hipervínculos en memoria hasta cerrar la hoja, así que el tope también
+    acota la memoria.
+    """
+    if (isinstance(value, str) and _URL_RE.match(value)
+            and worksheet.hlink_count < EXCEL_MAX_URLS_PER_SHEET
+            and worksheet.write_url(row_num, col_num, value, cell_format) >= 0):
+        return
+    worksheet.write(row_num, col_num, value, cell_format)
+
+
+def _write_row(worksheet, row_num, values, cell_format=None):
+    """Escribe una fila completa (lista de valores) en `row_num`."""
+    for col_num, value in enumerate(values):
+        _write_cell(worksheet, row_num, col_num, value, cell_format)
+
+
+def _write_rows(worksheet, first_row, rows, section_titles=(), section_format=None):
+    """
+    Escribe filas (iterable de listas) en orden desde `first_row` y devuelve la
+    siguiente fila libre. En modo `constant_memory` xlsxwriter vuelca cada fila
+    a disco al pasar a la siguiente, así que `rows` puede ser un generador y la
+    memoria no crece con el número de filas. Las filas cuyo primer valor está
+    en `section_titles` se marcan con `section_format` (antes de escribirlas).
+    """
+    row_num = first_row
+    for values in rows:
+        if section_titles and values and values[0] in section_titles:
+            worksheet.set_row(row_num, None, section_format)
+        _write_row(worksheet, row_num, values)
+        row_num += 1
+    return row_num
+
+
 def format_percent_or_infinity(value):
     """
     Convierte un valor numérico a porcentaje con un decimal,
@@ -186,7 +243,111 @@ def bucket_keywords_by_position(keyword_data):
     return buckets
 
 
-def create_keyword_position_sheets(writer, data, country_info, header_format):
+def _keyword_row(k):
+    """Fila de la hoja de keywords (columnas KEYWORD_COLUMNS) para una keyword del payload."""
+    keyword = k.get('keyword', '')
+
+    # ✅ CORREGIDO: La URL ahora viene directamente del backend
+    url = k.get('url', '')
+
+    # Solo como fallback si realmente no hay URL
+    if not url:
+        url = "URL no disponible"
+
+    if 'clicks_m1' in k and 'clicks_m2' in k:  # Si hay datos de comparación
+        return [
+            keyword,
+            url,
+            k.get('clicks_m1', 0),
+            k.get('clicks_m2', 0),
+            k.get('impressions_m1', 0),
+            k.get('impressions_m2', 0),
+            f"{k.get('ctr_m1', 0):.2f}%",
+            f"{k.get('ctr_m2', 0):.2f}%",
+            k.get('position_m1', ''),
+            k.get('position_m2', '')
+        ]
+    # Si solo hay un período
+    return [
+        keyword,
+        url,
+        k.get('clicks_m1', 0),
+        '',
+        k.get('impressions_m1', 0),
+        '',
+        f"{k.get('ctr_m1', 0):.2f}%",
+        '',
+        k.get('position_m1', ''),
+        ''
+    ]
+
+
+def _keyword_sort_key(k):
+    """Orden de las hojas de keywords: por URL (para agrupar) y luego por clics descendente."""
+    url = k.get('url', '') or "URL no disponible"
+    clicks = k.get('clicks_m1', 0)
+    return (url, -clicks if isinstance(clicks, (int, float)) else 0)
+
+
+def _keyword_rows(keywords, empty_message):
+    """
+    Genera las filas de una hoja de keywords ordenadas por URL y clics.
+    Solo se ordenan las referencias a los dicts del payload; cada fila se
+    construye al escribirla.
+    """
+    if not keywords:
+        yield [empty_message] + [''] * (len(KEYWORD_COLUMNS) - 1)
+        return
+    for k in sorted(keywords, key=_keyword_sort_key):
+        yield _keyword_row(k)
+
+
+def _page_row(p):
+    """Fila de 'Resultados por URL' (columnas PAGE_COLUMNS) para una página del payload."""
+    url = p.get('URL') or p.get('url')
+    metrics = p.get('Metrics', []) or p.get('metrics', [])
+
+    if len(metrics) >= 2:  # Si hay datos de comparación
+        # ✅ CORREGIDO: Ordenar por fecha para determinar P1 (actual) y P2 (comparación)
+        sorted_metrics = sorted(metrics, key=lambda x: x.get('StartDate', ''))
+        p2_metrics = sorted_metrics[0]  # Período de comparación (más antiguo)
+        p1_metrics = sorted_metrics[-1]  # Período principal (más reciente)
+
+        return [
+            url,
+            p1_metrics.get('Clicks') or p1_metrics.get('clicks', 0),
+            p2_metrics.get('Clicks') or p2_metrics.get('clicks', 0),
+            p1_metrics.get('Impressions') or p1_metrics.get('impressions', 0),
+            p2_metrics.get('Impressions') or p2_metrics.get('impressions', 0),
+            f"{((p1_metrics.get('CTR') or p1_metrics.get('ctr', 0)) * 100):.1f}%",
+            f"{((p2_metrics.get('CTR') or p2_metrics.get('ctr', 0)) * 100):.1f}%",
+            p1_metrics.get('Position') or p1_metrics.get('position', 0),
+            p2_metrics.get('Position') or p2_metrics.get('position', 0)
+        ]
+    # Si solo hay un período
+    p1_metrics = metrics[0] if metrics else {}
+    return [
+        url,
+        p1_metrics.get('Clicks') or p1_metrics.get('clicks', 0),
+        '',
+        p1_metrics.get('Impressions') or p1_metrics.get('impressions', 0),
+        '',
+        f"{((p1_metrics.get('CTR') or p1_metrics.get('ctr', 0)) * 100):.1f}%",
+        '',
+        p1_metrics.get('Position') or p1_metrics.get('position', 0),
+        ''
+    ]
+
+
+def _page_rows(pages, empty_message):
+    if not pages:
+        yield [empty_message] + [''] * (len(PAGE_COLUMNS) - 1)
+        return
+    for p in pages:
+        yield _page_row(p)
+
+
+def create_keyword_position_sheets(workbook, data, country_info, header_format):
     """
     Crea hojas separadas para cada rango de posición de keywords.
     ✅ MEJORADO: Ahora ordena por URL para agrupar claramente las keywords de cada página.
@@ -196,7 +357,7 @@ def create_keyword_position_sheets(writer, data, country_info, header_format):
         {'range': 'top10', 'title': 'Keywords Posiciones 4-10', 'description': 'Posiciones 4 a 10'},
         {'range': 'top20', 'title': 'Keywords Posiciones 11-20', 'description': 'Posiciones 11 a 20'}
     ]
-    
+
     all_keywords = data.get('keyword_comparison_data', [])
 
     # Single-pass: clasificar todas las keywords en buckets de una vez
@@ -209,104 +370,54 @@ def create_keyword_position_sheets(writer, data, country_info, header_format):
 
         # Usar el bucket pre-calculado en lugar de filtrar 3 veces
         filtered_keywords = position_buckets.get(range_name, [])
-        
-        # Crear filas para la hoja
-        keyword_rows = []
-        for k in filtered_keywords:
-            keyword = k.get('keyword', '')
-            
-            # ✅ CORREGIDO: La URL ahora viene directamente del backend
-            url = k.get('url', '')
-            
-            # Solo como fallback si realmente no hay URL
-            if not url:
-                url = "URL no disponible"
-            
-            if 'clicks_m1' in k and 'clicks_m2' in k:  # Si hay datos de comparación
-                keyword_rows.append({
-                    'Keyword': keyword,
-                    'URL que Posiciona': url,
-                    'Clicks P1': k.get('clicks_m1', 0),
-                    'Clicks P2': k.get('clicks_m2', 0),
-                    'Impresiones P1': k.get('impressions_m1', 0),
-                    'Impresiones P2': k.get('impressions_m2', 0),
-                    'CTR P1 (%)': f"{k.get('ctr_m1', 0):.2f}%",
-                    'CTR P2 (%)': f"{k.get('ctr_m2', 0):.2f}%",
-                    'Posición Media P1': k.get('position_m1', ''),
-                    'Posición Media P2': k.get('position_m2', '')
-                })
-            else:  # Si solo hay un período
-                keyword_rows.append({
-                    'Keyword': keyword,
-                    'URL que Posiciona': url,
-                    'Clicks P1': k.get('clicks_m1', 0),
-                    'Clicks P2': '',
-                    'Impresiones P1': k.get('impressions_m1', 0),
-                    'Impresiones P2': '',
-                    'CTR P1 (%)': f"{k.get('ctr_m1', 0):.2f}%",
-                    'CTR P2 (%)': '',
-                    'Posición Media P1': k.get('position_m1', ''),
-                    'Posición Media P2': ''
-                })
-        
-        # Si no hay keywords para este rango, añadir fila explicativa
-        if not keyword_rows:
-            keyword_rows = [{
-                'Keyword': f'No hay keywords en {description.lower()} para {country_info}.',
-                'URL que Posiciona': '',
-                'Clicks P1': '', 'Clicks P2': '',
-                'Impresiones P1': '', 'Impresiones P2': '',
-                'CTR P1 (%)': '', 'CTR P2 (%)': '',
-                'Posición Media P1': '', 'Posición Media P2': ''
-            }]
-        
-        # ✅ NUEVO: Ordenar por URL (para agrupar) y luego por Clicks descendente
-        keyword_rows_sorted = sorted(
-            keyword_rows, 
-            key=lambda x: (x.get('URL que Posiciona', ''), -x.get('Clicks P1', 0) if isinstance(x.get('Clicks P1', 0), (int, float)) else 0)
-        )
-        
-        # Crear la hoja con datos ordenados
-        df_keywords_range = pd.DataFrame(keyword_rows_sorted)
-        df_keywords_range.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        # Ajustar columnas de la hoja
-        worksheet_range = writer.sheets[sheet_name]
+
+        worksheet_range = workbook.add_worksheet(sheet_name)
         worksheet_range.set_column('A:A', 30)  # Keyword
         worksheet_range.set_column('B:B', 50)  # URL que Posiciona
         worksheet_range.set_column('C:J', 15)  # Métricas
-        
-        # Aplicar formato de cabecera
-        for col_num, col_name in enumerate(['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']):
-            if col_num < len(df_keywords_range.columns):
-                worksheet_range.write(f'{col_name}1', df_keywords_range.columns[col_num], header_format)
 
+        # Cabecera con formato y filas ordenadas por URL y clics
+        _write_row(worksheet_range, 0, KEYWORD_COLUMNS, header_format)
+        _write_rows(worksheet_range, 1, _keyword_rows(
+            filtered_keywords,
+            f'No hay keywords en {description.lower()} para {country_info}.'
+        ))
 
-def generate_excel_from_data(data, ai_overview_data=None):
+
+def generate_excel_from_data(data, ai_overview_data=None, output=None):
     """
     Genera un Excel con datos de páginas, keywords y AI Overview opcional.
+
+    El libro se escribe con xlsxwriter en modo `constant_memory`: cada hoja se
+    genera fila a fila y las filas se vuelcan a disco según se escriben, así
+    que el pico de memoria no depende del número de keywords ni de páginas.
+
     :param data: dict con claves 'pages', 'keywordStats', 'keyword_comparison_data', 'selected_country'
     :param ai_overview_data: dict retornado por el endpoint de AI Overview
-    :return: BytesIO con el Excel generado
+    :param output: ruta o fichero donde escribir el Excel. Si se omite se usa un BytesIO
+    :return: `output` con el Excel generado (el BytesIO rebobinado si no se pasó `output`)
     """
-    output = BytesIO()
-    with pd.ExcelWriter(
-        output,
-        engine='xlsxwriter',
-        engine_kwargs={'options': {'strings_to_formulas': False}}
-    ) as writer:
-        workbook = writer.book
-        
+    if output is None:
+        output = BytesIO()
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        # Las URLs se convierten en hipervínculo en `_write_cell`, con el tope
+        # de Excel por hoja; `write()` las deja siempre como texto
+        'strings_to_urls': False,
+        'nan_inf_to_errors': True,
+    })
+    try:
         # Obtener información del país y determinar su origen
         selected_country = data.get('selected_country', '')
-        
+
         if selected_country:
             country_info = get_country_name(selected_country)
             country_context = f"{country_info} (país principal del negocio)"
         else:
             country_info = 'Todos los países'
             country_context = 'Análisis global'
-        
+
         # Formatos comunes
         header_format = workbook.add_format({
             'bold': True,
@@ -316,6 +427,13 @@ def generate_excel_from_data(data, ai_overview_data=None):
             'font_color': 'white',
             'border': 1
         })
+        # Cabecera sencilla (mismo estilo que la cabecera por defecto de pandas)
+        plain_header_format = workbook.add_format({
+            'bold': True,
+            'border': 1,
+            'align': 'center',
+            'valign': 'top'
+        })
 
         # ❌ ELIMINADO: Executive Dashboard (no se requiere)
 
@@ -333,12 +451,12 @@ def generate_excel_from_data(data, ai_overview_data=None):
             ['Criterio', 'País con más clics (principal del negocio)'],
             ['Beneficio', 'Análisis desde mercado más importante'],
         ]
-        
+
         # 🚀 NUEVO: Añadir información de AI Overview si está disponible
         if ai_overview_data and ai_overview_data.get('results'):
             keyword_results_aio = ai_overview_data.get('results', [])
             total_keywords_aio = len([r for r in keyword_results_aio if r.get('ai_analysis', {}).get('has_ai_overview', False)])
-            
+
             info_data.extend([
                 ['', ''], # Separador
                 ['ANÁLISIS AI OVERVIEW', ''],
@@ -346,164 +464,77 @@ def generate_excel_from_data(data, ai_overview_data=None):
                 ['Total Keywords en el análisis', len(keyword_results_aio)],
                 ['Porcentaje con AI Overview', f"{(total_keywords_aio / len(keyword_results_aio) * 100):.1f}%" if len(keyword_results_aio) > 0 else "0.0%"]
             ])
-        
-        df_info = pd.DataFrame(info_data[1:], columns=info_data[0])
-        df_info.to_excel(writer, sheet_name='Información del Análisis', index=False)
-        
-        # Ajustar columnas de la hoja de información
-        worksheet_info = writer.sheets['Información del Análisis']
+
+        worksheet_info = workbook.add_worksheet('Información del Análisis')
         worksheet_info.set_column('A:A', 30) # Parámetro
         worksheet_info.set_column('B:B', 50) # Valor
-        
+
         # Aplicar formato especial a las secciones
         section_format = workbook.add_format({
             'bold': True,
             'bg_color': '#E7E6E6',
             'border': 1
         })
-        
+
         # ✅ MODIFICADO: Solo aplicar formato a la sección de país (ya no hay sección de AI Overview)
-        for row_num, row_data in enumerate(info_data[1:], start=1):
-            if row_data[0] in ['LÓGICA DE PAÍS']:
-                worksheet_info.set_row(row_num, None, section_format)
+        _write_row(worksheet_info, 0, info_data[0], plain_header_format)
+        _write_rows(worksheet_info, 1, info_data[1:], ('LÓGICA DE PAÍS',), section_format)
 
         # Hoja 2: Resultados por URL (sin cambios)
-        rows = []
-        for p in data.get('pages', []):
-            url = p.get('URL') or p.get('url')
-            metrics = p.get('Metrics', []) or p.get('metrics', [])
-            
-            if len(metrics) >= 2:  # Si hay datos de comparación
-                # ✅ CORREGIDO: Ordenar por fecha para determinar P1 (actual) y P2 (comparación)
-                sorted_metrics = sorted(metrics, key=lambda x: x.get('StartDate', ''))
-                p2_metrics = sorted_metrics[0]  # Período de comparación (más antiguo)
-                p1_metrics = sorted_metrics[-1]  # Período principal (más reciente)
-                
-                rows.append({
-                    'URL': url,
-                    'Clicks P1': p1_metrics.get('Clicks') or p1_metrics.get('clicks', 0),
-                    'Clicks P2': p2_metrics.get('Clicks') or p2_metrics.get('clicks', 0),
-                    'Impresiones P1': p1_metrics.get('Impressions') or p1_metrics.get('impressions', 0),
-                    'Impresiones P2': p2_metrics.get('Impressions') or p2_metrics.get('impressions', 0),
-                    'CTR P1 (%)': f"{((p1_metrics.get('CTR') or p1_metrics.get('ctr', 0)) * 100):.1f}%",
-                    'CTR P2 (%)': f"{((p2_metrics.get('CTR') or p2_metrics.get('ctr', 0)) * 100):.1f}%",
-                    'Posición Media P1': p1_metrics.get('Position') or p1_metrics.get('position', 0),
-                    'Posición Media P2': p2_metrics.get('Position') or p2_metrics.get('position', 0)
-                })
-            else:  # Si solo hay un período
-                p1_metrics = metrics[0] if metrics else {}
-                rows.append({
-                    'URL': url,
-                    'Clicks P1': p1_metrics.get('Clicks') or p1_metrics.get('clicks', 0),
-                    'Clicks P2': '',
-                    'Impresiones P1': p1_metrics.get('Impressions') or p1_metrics.get('impressions', 0),
-                    'Impresiones P2': '',
-                    'CTR P1 (%)': f"{((p1_metrics.get('CTR') or p1_metrics.get('ctr', 0)) * 100):.1f}%",
-                    'CTR P2 (%)': '',
-                    'Posición Media P1': p1_metrics.get('Position') or p1_metrics.get('position', 0),
-                    'Posición Media P2': ''
-                })
-        
-        if not rows:
-            rows = [{
-                'URL': f'No hay datos para {country_info}.',
-                'Clicks P1': '', 'Clicks P2': '',
-                'Impresiones P1': '', 'Impresiones P2': '',
-                'CTR P1 (%)': '', 'CTR P2 (%)': '',
-                'Posición Media P1': '', 'Posición Media P2': ''
-            }]
-        
-        df_pages = pd.DataFrame(rows)
-        df_pages.to_excel(writer, sheet_name='Resultados por URL', index=False)
-        
-        # Ajustar columnas de la hoja de páginas
-        worksheet_pages = writer.sheets['Resultados por URL']
+        worksheet_pages = workbook.add_worksheet('Resultados por URL')
         worksheet_pages.set_column('A:A', 50)  # URL
         worksheet_pages.set_column('B:I', 15)  # Métricas
+        _write_row(worksheet_pages, 0, PAGE_COLUMNS, plain_header_format)
+        _write_rows(worksheet_pages, 1, _page_rows(data.get('pages', []), f'No hay datos para {country_info}.'))
 
         # Hoja 3: Keywords consolidadas - ✅ CORREGIDO: Ahora ordena por URL para agrupar claramente
-        keyword_rows = []
-        for k in data.get('keyword_comparison_data', []):
-            keyword = k.get('keyword', '')
-            
-            # ✅ CORREGIDO: La URL ahora viene directamente del backend
-            url = k.get('url', '')
-            
-            # Solo como fallback si realmente no hay URL
-            if not url:
-                url = "URL no disponible"
-            
-            if 'clicks_m1' in k and 'clicks_m2' in k:  # Si hay datos de comparación
-                keyword_rows.append({
-                    'Keyword': keyword,
-                    'URL que Posiciona': url,
-                    'Clicks P1': k.get('clicks_m1', 0),
-                    'Clicks P2': k.get('clicks_m2', 0),
-                    'Impresiones P1': k.get('impressions_m1', 0),
-                    'Impresiones P2': k.get('impressions_m2', 0),
-                    'CTR P1 (%)': f"{k.get('ctr_m1', 0):.2f}%",
-                    'CTR P2 (%)': f"{k.get('ctr_m2', 0):.2f}%",
-                    'Posición Media P1': k.get('position_m1', ''),
-                    'Posición Media P2': k.get('position_m2', '')
-                })
-            else:  # Si solo hay un período
-                keyword_rows.append({
-                    'Keyword': keyword,
-                    'URL que Posiciona': url,
-                    'Clicks P1': k.get('clicks_m1', 0),
-                    'Clicks P2': '',
-                    'Impresiones P1': k.get('impressions_m1', 0),
-                    'Impresiones P2': '',
-                    'CTR P1 (%)': f"{k.get('ctr_m1', 0):.2f}%",
-                    'CTR P2 (%)': '',
-                    'Posición Media P1': k.get('position_m1', ''),
-                    'Posición Media P2': ''
-                })
-        
-        if not keyword_rows:
-            keyword_rows = [{
-                'Keyword': f'No hay datos de keywords para {country_info}.',
-                'URL que Posiciona': '',
-                'Clicks P1': '', 'Clicks P2': '',
-                'Impresiones P1': '', 'Impresiones P2': '',
-                'CTR P1 (%)': '', 'CTR P2 (%)': '',
-                'Posición Media P1': '', 'Posición Media P2': ''
-            }]
-        
-        # ✅ NUEVO: Ordenar por URL (para agrupar) y luego por Clicks descendente
-        keyword_rows_sorted = sorted(
-            keyword_rows, 
-            key=lambda x: (x.get('URL que Posiciona', ''), -x.get('Clicks P1', 0) if isinstance(x.get('Clicks P1', 0), (int, float)) else 0)
-        )
-        
-        df_keywords = pd.DataFrame(keyword_rows_sorted)
-        df_keywords.to_excel(writer, sheet_name='Keywords', index=False)
-        
-        # Ajustar columnas de la hoja de keywords
-        worksheet_keywords = writer.sheets['Keywords']
+        worksheet_keywords = workbook.add_worksheet('Keywords')
         worksheet_keywords.set_column('A:A', 30)  # Keyword
         worksheet_keywords.set_column('B:B', 50)  # URL que Posiciona
         worksheet_keywords.set_column('C:J', 15)  # Métricas
+        _write_row(worksheet_keywords, 0, KEYWORD_COLUMNS, plain_header_format)
+        _write_rows(worksheet_keywords, 1, _keyword_rows(
+            data.get('keyword_comparison_data', []),
+            f'No hay datos de keywords para {country_info}.'
+        ))
 
         # ✅ NUEVAS HOJAS: Keywords por rangos de posición
-        create_keyword_position_sheets(writer, data, country_info, header_format)
+        create_keyword_position_sheets(workbook, data, country_info, header_format)
 
         # ✅ PROCESAMIENTO DE AIO: Hojas de AI Overview (solo si hay datos)
         if ai_overview_data:
             # 1. Hoja de análisis principal (sin competidores)
-            create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selected_country)
-            
+            create_aio_consolidated_sheet(workbook, ai_overview_data, header_format, selected_country)
+
             # 2. Hoja específica de competidores (refleja exactamente la info del SaaS)
-            create_competitors_analysis_sheet(writer, ai_overview_data, header_format)
+            create_competitors_analysis_sheet(workbook, ai_overview_data, header_format)
+    finally:
+        workbook.close()
 
-    output.seek(0)
+    if isinstance(output, BytesIO):
+        output.seek(0)
     return output
 
 
+def write_excel_to_tempfile(data, ai_overview_data=None):
+    """
+    Genera el Excel en un fichero temporal y devuelve su ruta, para enviarlo
+    desde disco sin cargarlo entero en memoria. El llamante debe borrarlo.
+    """
+    fd, path = tempfile.mkstemp(prefix='search_console_report_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        generate_excel_from_data(data, ai_overview_data, output=path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
 # ❌ FUNCIÓN ELIMINADA: create_executive_dashboard (no se requiere)
 
 
-def create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selected_country):
+def create_aio_consolidated_sheet(workbook, ai_overview_data, header_format, selected_country):
     """
     Crea UNA sola hoja consolidada con todo el análisis de AI Overview
     Estructura: 1) Resumen ejecutivo 2) Tipología 3) Posiciones 4) Tabla completa keywords
@@ -631,36 +662,38 @@ def create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selec
             ['Keyword', 'With AIO', 'Your Domain in AIO', 'AIO Position', 'Organic Position', 'Clicks (P1)', 'Impressions (P1)', 'CTR (P1)', 'Cluster'],
         ]
         
-        for result in keyword_results:
-            ai_analysis = result.get('ai_analysis', {})
-            keyword = result.get('keyword', '')
-            has_ai_overview = 'Sí' if ai_analysis.get('has_ai_overview', False) else 'No'
-            organic_position = result.get('site_position', 'No encontrado')
-            domain_in_aio = 'Sí' if ai_analysis.get('domain_is_ai_source', False) else 'No'
-            aio_position = ai_analysis.get('domain_ai_source_position', '') or 'N/A'
-            
-            # ✅ NUEVO: Datos de tráfico
-            clicks_p1 = result.get('clicks_p1') or result.get('clicks_m1', 0)
-            impressions_p1 = result.get('impressions_p1') or result.get('impressions_m1', 0)
-            ctr_p1 = result.get('ctr_p1') or result.get('ctr_m1', 0)
-            if isinstance(ctr_p1, (int, float)) and ctr_p1 > 0:
-                ctr_formatted = f"{(ctr_p1 * 100):.2f}%" if ctr_p1 < 1 else f"{ctr_p1:.2f}%"
-            else:
-                ctr_formatted = "0.00%"
-            
-            # ❌ ELIMINADO: Datos de competidores en AIO (no requeridos en página de análisis)
-            
-            keywords_section.append([
-                keyword,
-                has_ai_overview,
-                domain_in_aio,
-                aio_position,
-                organic_position,
-                clicks_p1,
-                impressions_p1,
-                ctr_formatted,
-                result.get('cluster_name', 'Unclassified')
-            ])
+        def keyword_detail_rows():
+            # Se generan al escribir la hoja: no se materializa la tabla completa
+            for result in keyword_results:
+                ai_analysis = result.get('ai_analysis', {})
+                keyword = result.get('keyword', '')
+                has_ai_overview = 'Sí' if ai_analysis.get('has_ai_overview', False) else 'No'
+                organic_position = result.get('site_position', 'No encontrado')
+                domain_in_aio = 'Sí' if ai_analysis.get('domain_is_ai_source', False) else 'No'
+                aio_position = ai_analysis.get('domain_ai_source_position', '') or 'N/A'
+                
+                # ✅ NUEVO: Datos de tráfico
+                clicks_p1 = result.get('clicks_p1') or result.get('clicks_m1', 0)
+                impressions_p1 = result.get('impressions_p1') or result.get('impressions_m1', 0)
+                ctr_p1 = result.get('ctr_p1') or result.get('ctr_m1', 0)
+                if isinstance(ctr_p1, (int, float)) and ctr_p1 > 0:
+                    ctr_formatted = f"{(ctr_p1 * 100):.2f}%" if ctr_p1 < 1 else f"{ctr_p1:.2f}%"
+                else:
+                    ctr_formatted = "0.00%"
+                
+                # ❌ ELIMINADO: Datos de competidores en AIO (no requeridos en página de análisis)
+                
+                yield [
+                    keyword,
+                    has_ai_overview,
+                    domain_in_aio,
+                    aio_position,
+                    organic_position,
+                    clicks_p1,
+                    impressions_p1,
+                    ctr_formatted,
+                    result.get('cluster_name', 'Unclassified')
+                ]
         
         # ===== COMBINAR TODAS LAS SECCIONES =====
         # Normalizar todas las secciones a 9 columnas para que coincidan con la tabla final (incluye Cluster)
@@ -682,15 +715,11 @@ def create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selec
         posiciones_normalized = normalize_to_n_columns(posiciones_section)
         keywords_normalized = normalize_to_n_columns(keywords_section)
         
-        # Combinar todas las secciones
-        all_data = executive_normalized + tipologia_normalized + posiciones_normalized + keywords_normalized
-        
-        # Crear DataFrame y exportar
-        df_aio = pd.DataFrame(all_data[1:], columns=all_data[0])
-        df_aio.to_excel(writer, sheet_name='AI Overview Analysis', index=False)
+        # Secciones de resumen (pocas filas); la tabla de keywords se añade fila a fila
+        summary_rows = executive_normalized + tipologia_normalized + posiciones_normalized + keywords_normalized
         
         # Formatear hoja expandida (sin columnas de competidores)
-        worksheet = writer.sheets['AI Overview Analysis']
+        worksheet = workbook.add_worksheet('AI Overview Analysis')
         worksheet.set_column('A:A', 35)  # Keyword
         worksheet.set_column('B:B', 12)  # With AIO
         worksheet.set_column('C:C', 18)  # Your Domain in AIO
@@ -702,23 +731,13 @@ def create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selec
         worksheet.set_column('I:I', 22)  # Cluster
         
         # Aplicar formatos especiales
-        workbook = writer.book
         section_format = workbook.add_format({'bold': True, 'bg_color': '#FFE6E6', 'border': 1})
+        section_titles = ('RESUMEN EJECUTIVO AI OVERVIEW', 'TIPOLOGÍA DE KEYWORDS', 'POSICIONES EN AI OVERVIEW', 'DETALLE COMPLETO POR KEYWORD')
         
-        # Encontrar filas de sección para formatear
-        section_rows = []
-        for i, row in enumerate(all_data[1:], start=1):
-            if row[0] in ['RESUMEN EJECUTIVO AI OVERVIEW', 'TIPOLOGÍA DE KEYWORDS', 'POSICIONES EN AI OVERVIEW', 'DETALLE COMPLETO POR KEYWORD']:
-                section_rows.append(i)
-        
-        for row_num in section_rows:
-            worksheet.set_row(row_num, None, section_format)
-        
-        # Aplicar header format para las 9 columnas
-        column_letters = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I']
-        for col_num, col_name in enumerate(column_letters):
-            if col_num < len(df_aio.columns):
-                worksheet.write(f'{col_name}1', df_aio.columns[col_num], header_format)
+        # Header format para las 9 columnas, secciones y después la tabla de keywords
+        _write_row(worksheet, 0, summary_rows[0], header_format)
+        next_row = _write_rows(worksheet, 1, summary_rows[1:], section_titles, section_format)
+        _write_rows(worksheet, next_row, keyword_detail_rows(), section_titles, section_format)
         
         # ❌ ELIMINADO: La hoja de competidores se crea desde la función principal
         
@@ -729,7 +748,7 @@ def create_aio_consolidated_sheet(writer, ai_overview_data, header_format, selec
         # No fallar silenciosamente, pero continuar con el resto del Excel
 
 
-def create_competitors_analysis_sheet(writer, ai_overview_data, header_format):
+def create_competitors_analysis_sheet(workbook, ai_overview_data, header_format):
     """
     Crea una hoja específica para análisis detallado de competidores en AI Overview
     Refleja exactamente la información disponible en el SaaS:
@@ -972,69 +991,55 @@ def create_competitors_analysis_sheet(writer, ai_overview_data, header_format):
             truncated_domain = domain[:15] + '...' if len(domain) > 15 else domain
             aio_table_headers.extend([f"{truncated_domain} in AIO", f"Position of {truncated_domain}"])
         
-        # Crear la tabla
-        aio_table_section = [
-            aio_table_headers
-        ]
-        
         # Llenar datos de la tabla - solo keywords que tienen AI Overview
         keywords_with_aio = [result for result in keyword_results if result.get('ai_analysis', {}).get('has_ai_overview', False)]
         
-        for result in keywords_with_aio:
-            keyword = result.get('keyword', '')
-            ai_analysis = result.get('ai_analysis', {})
-            
-            # Datos del dominio principal
-            your_domain_in_aio = 'Yes' if ai_analysis.get('domain_is_ai_source', False) else 'No'
-            your_position = ai_analysis.get('domain_ai_source_position', 'N/A')
-            if your_position == '' or your_position is None:
-                your_position = 'N/A'
-            
-            # Crear fila base
-            row_data = [keyword, your_domain_in_aio, your_position]
-            
-            # Añadir datos de competidores
-            debug_info = ai_analysis.get('debug_info', {})
-            references_found = debug_info.get('references_found', [])
-            
-            # Crear diccionario de dominios competidores y sus posiciones para esta keyword
-            competitor_positions = {}
-            for ref in references_found:
-                link = ref.get('link', '')
-                if link:
-                    try:
-                        parsed = urlparse(link)
-                        domain = parsed.netloc.replace('www.', '')
-                        position = ref.get('index', 0) + 1  # +1 porque index empieza en 0
-                        
-                        if domain in top_competitor_domains:
-                            competitor_positions[domain] = position
-                    except:
-                        continue
-            
-            # Añadir datos de cada competidor a la fila
-            for domain in top_competitor_domains:
-                if domain in competitor_positions:
-                    row_data.extend(['Yes', competitor_positions[domain]])
-                else:
-                    row_data.extend(['No', 'N/A'])
-            
-            aio_table_section.append(row_data)
+        def aio_table_rows():
+            # Se generan al escribir la hoja: no se materializa la tabla completa
+            for result in keywords_with_aio:
+                keyword = result.get('keyword', '')
+                ai_analysis = result.get('ai_analysis', {})
+                
+                # Datos del dominio principal
+                your_domain_in_aio = 'Yes' if ai_analysis.get('domain_is_ai_source', False) else 'No'
+                your_position = ai_analysis.get('domain_ai_source_position', 'N/A')
+                if your_position == '' or your_position is None:
+                    your_position = 'N/A'
+                
+                # Crear fila base
+                row_data = [keyword, your_domain_in_aio, your_position]
+                
+                # Añadir datos de competidores
+                debug_info = ai_analysis.get('debug_info', {})
+                references_found = debug_info.get('references_found', [])
+                
+                # Crear diccionario de dominios competidores y sus posiciones para esta keyword
+                competitor_positions = {}
+                for ref in references_found:
+                    link = ref.get('link', '')
+                    if link:
+                        try:
+                            parsed = urlparse(link)
+                            domain = parsed.netloc.replace('www.', '')
+                            position = ref.get('index', 0) + 1  # +1 porque index empieza en 0
+                            
+                            if domain in top_competitor_domains:
+                                competitor_positions[domain] = position
+                        except:
+                            continue
+                
+                # Añadir datos de cada competidor a la fila
+                for domain in top_competitor_domains:
+                    if domain in competitor_positions:
+                        row_data.extend(['Yes', competitor_positions[domain]])
+                    else:
+                        row_data.extend(['No', 'N/A'])
+                
+                yield row_data
         
         # Crear la hoja con secciones separadas
         sheet_name = 'AIO Competitors Analysis'
-        
-        # Escribir resumen
-        df_summary = pd.DataFrame(competitors_summary[1:], columns=competitors_summary[0])
-        df_summary.to_excel(writer, sheet_name=sheet_name, index=False, startrow=1)
-        
-        # Escribir tabla detallada
-        startrow_table = len(df_summary) + 4  # data rows + header + 3 para espacio y título
-        df_table = pd.DataFrame(aio_table_section[1:], columns=aio_table_section[0])
-        df_table.to_excel(writer, sheet_name=sheet_name, index=False, startrow=startrow_table)
-        
-        # Formatear hoja - dinámico según número de columnas
-        worksheet = writer.sheets[sheet_name]
+        worksheet = workbook.add_worksheet(sheet_name)
         
         # Calcular número de columnas total
         num_columns = len(aio_table_headers)
@@ -1053,32 +1058,27 @@ def create_competitors_analysis_sheet(writer, ai_overview_data, header_format):
                 worksheet.set_column(f'{col_letter}:{col_letter}', 15)
         
         # Aplicar formatos especiales
-        workbook = writer.book
         section_format = workbook.add_format({'bold': True, 'bg_color': '#E6F3FF', 'border': 1})
         
-        # Escribir títulos de secciones
-        worksheet.write('A1', 'RESUMEN COMPETIDORES', section_format)
-        worksheet.write(f'A{startrow_table}', 'DETAILS OF KEYWORDS WITH AIO', section_format)
+        # Las filas se escriben en orden (modo constant_memory): título, cabecera y datos de cada sección
+        # 1) Resumen: título en la fila 0, cabecera en la 1 y datos desde la 2
+        worksheet.write(0, 0, 'RESUMEN COMPETIDORES', section_format)
+        _write_row(worksheet, 1, competitors_summary[0], header_format)
+        _write_rows(worksheet, 2, competitors_summary[1:])
         
-        # Aplicar header format para headers de summary (row 1, pero startrow=1 escribe header en row 1 (0-based row 1))
-        # Ajustar según indexing 0-based
-        summary_header_row = 1  # 0-based
-        for col_num in range(5):
-            worksheet.write(summary_header_row, col_num, df_summary.columns[col_num], header_format)
-        
-        # Para table header
-        table_header_row = startrow_table  # 0-based
-        for col_num in range(min(num_columns, len(df_table.columns))):
-            col_letter = chr(ord('A') + col_num)
-            worksheet.write(table_header_row, col_num, _sanitize_cell(df_table.columns[col_num]), header_format)
+        # 2) Tabla detallada: título una fila antes de la cabecera
+        startrow_table = len(competitors_summary) - 1 + 4  # data rows + header + 3 para espacio y título
+        worksheet.write(startrow_table - 1, 0, 'DETAILS OF KEYWORDS WITH AIO', section_format)
+        _write_row(worksheet, startrow_table, [_sanitize_cell(h) for h in aio_table_headers], header_format)
+        _write_rows(worksheet, startrow_table + 1, aio_table_rows())
         
         # 3) MOST CITED URLs section
         most_cited_urls = summary.get('most_cited_urls', [])
         if most_cited_urls:
-            startrow_cited = startrow_table + len(df_table) + 4  # After detail table + spacing
+            startrow_cited = startrow_table + len(keywords_with_aio) + 4  # After detail table + spacing
 
             cited_section_title = 'MOST CITED URLs'
-            worksheet.write(f'A{startrow_cited}', cited_section_title, section_format)
+            worksheet.write(startrow_cited - 1, 0, cited_section_title, section_format)
 
             cited_headers = ['URL', 'Domain', 'Citations', 'Keywords Cited In']
             cited_data = []
@@ -1091,13 +1091,10 @@ def create_competitors_analysis_sheet(writer, ai_overview_data, header_format):
                     len(keywords_list)
                 ])
 
-            df_cited = pd.DataFrame(cited_data, columns=cited_headers)
-            df_cited.to_excel(writer, sheet_name=sheet_name, index=False, startrow=startrow_cited + 1)
-
             # Format cited table headers
             cited_header_row = startrow_cited + 1  # 0-based
-            for col_num in range(len(cited_headers)):
-                worksheet.write(cited_header_row, col_num, cited_headers[col_num], header_format)
+            _write_row(worksheet, cited_header_row, cited_headers, header_format)
+            _write_rows(worksheet, cited_header_row + 1, cited_data)
 
             logger.info(f"[COMPETITORS DEBUG] ✅ Most Cited URLs section added: {len(cited_data)} URLs")
 
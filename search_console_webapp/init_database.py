@@ -85,6 +85,73 @@ def main():
         except Exception as e:
             logger.warning(f"⚠️ Error inicializando Project Access Control: {e} (no crítico)")
 
+        # 6b. Tablas del warehouse local de GSC (solo si está activado)
+        try:
+            from services.gsc_warehouse import GSC_WAREHOUSE_ENABLED, ensure_gsc_warehouse_tables
+            if GSC_WAREHOUSE_ENABLED:
+                logger.info("🗄️ Verificando tablas del warehouse GSC...")
+                if ensure_gsc_warehouse_tables():
+                    logger.info("✅ Tablas del warehouse GSC verificadas")
+                else:
+                    logger.warning("⚠️ Error con tablas del warehouse GSC (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando warehouse GSC: {e} (no crítico)")
+
+        # 6c. Almacén compartido de SERPs del día
+        try:
+            from services.serp_store import SERP_STORE_ENABLED, ensure_serp_store_table
+            if SERP_STORE_ENABLED:
+                if ensure_serp_store_table():
+                    logger.info("✅ Tabla serp_daily_results verificada")
+                else:
+                    logger.warning("⚠️ Error con la tabla serp_daily_results (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando el almacén de SERPs: {e} (no crítico)")
+
+        # 6d. Reservas de cuota: liberar las que dejaron ejecuciones caídas
+        try:
+            from quota_manager import ensure_quota_reservations_table, reconcile_stale_quota_reservations
+            if ensure_quota_reservations_table():
+                logger.info("✅ Tabla quota_reservations verificada")
+                reconcile_stale_quota_reservations()
+            else:
+                logger.warning("⚠️ Error con la tabla quota_reservations (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando reservas de quota: {e} (no crítico)")
+
+        # 6e. Payloads SERP/AIO direccionados por contenido
+        try:
+            from services.payload_blobs import PAYLOAD_BLOBS_ENABLED, ensure_payload_blobs_schema
+            if PAYLOAD_BLOBS_ENABLED:
+                if ensure_payload_blobs_schema():
+                    logger.info("✅ Tabla payload_blobs verificada")
+                else:
+                    logger.warning("⚠️ Error con la tabla payload_blobs (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando payload_blobs: {e} (no crítico)")
+
+        # 6f. Rollups diarios de Manual AI
+        try:
+            from manual_ai.models.rollup_repository import MANUAL_AI_ROLLUPS_ENABLED, RollupRepository
+            if MANUAL_AI_ROLLUPS_ENABLED:
+                if RollupRepository.ensure_rollup_tables():
+                    logger.info("✅ Tablas de rollups de Manual AI verificadas")
+                else:
+                    logger.warning("⚠️ Error con las tablas de rollups de Manual AI (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando rollups de Manual AI: {e} (no crítico)")
+
+        # 6g. Caché de informes PDF de Manual AI
+        try:
+            from manual_ai.services.pdf_report_cache import MANUAL_AI_PDF_CACHE_ENABLED, PdfReportCache
+            if MANUAL_AI_PDF_CACHE_ENABLED:
+                if PdfReportCache.ensure_pdf_cache_table():
+                    logger.info("✅ Tabla manual_ai_pdf_reports verificada")
+                else:
+                    logger.warning("⚠️ Error con la tabla manual_ai_pdf_reports (no crítico)")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando la caché de PDF de Manual AI: {e} (no crítico)")
+
         # 7. Obtener estadísticas iniciales
         logger.info("📊 Obteniendo estadísticas iniciales...")
         try:
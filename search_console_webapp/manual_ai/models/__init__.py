@@ -6,11 +6,13 @@ from manual_ai.models.project_repository import ProjectRepository
 from manual_ai.models.keyword_repository import KeywordRepository
 from manual_ai.models.result_repository import ResultRepository
 from manual_ai.models.event_repository import EventRepository
+from manual_ai.models.rollup_repository import RollupRepository
 
 __all__ = [
     'ProjectRepository',
     'KeywordRepository',
     'ResultRepository',
-    'EventRepository'
+    'EventRepository',
+    'RollupRepository'
 ]
 
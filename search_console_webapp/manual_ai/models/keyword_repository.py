@@ -10,6 +10,7 @@ leaks the pool slot.
 import logging
 from typing import List, Dict
 from database import get_db_connection
+from manual_ai.models.rollup_repository import RollupRepository
 
 logger = logging.getLogger(__name__)
 
@@ -159,8 +160,16 @@ class KeywordRepository:
                 cur.execute("""
                     DELETE FROM manual_ai_results
                     WHERE keyword_id = %s AND project_id = %s
+                    RETURNING analysis_date
                 """, (keyword_id, project_id))
 
+                # Recalcular los rollups de los días que tenía la keyword
+                RollupRepository.refresh(
+                    cur, project_id,
+                    analysis_dates=[row['analysis_date'] for row in cur.fetchall()],
+                    keyword_ids=[keyword_id]
+                )
+
                 conn.commit()
 
                 return {
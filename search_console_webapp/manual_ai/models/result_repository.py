@@ -7,10 +7,12 @@ inner SQL raises.
 """
 
 import logging
-import json
+from collections import defaultdict
 from datetime import date, timedelta
-from typing import List, Dict
+from typing import List, Dict, Set
+from psycopg2.extras import execute_values
 from database import get_db_connection
+from services import payload_blobs
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,9 @@ class ResultRepository:
                      country_code: str):
         """
         Crear un nuevo resultado de análisis
+
+        `serp_data` y `ai_result` completos se guardan en `payload_blobs`
+        (la fila solo lleva sus hashes); ver services/payload_blobs.py.
         """
         conn = get_db_connection()
         if not conn:
@@ -32,25 +37,16 @@ class ResultRepository:
         try:
             cur = conn.cursor()
             try:
-                cur.execute("""
-                    INSERT INTO manual_ai_results (
-                        project_id, keyword_id, analysis_date, keyword, domain,
-                        has_ai_overview, domain_mentioned, domain_position,
-                        ai_elements_count, impact_score, raw_serp_data,
-                        ai_analysis_data, country_code
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    project_id, keyword_id, analysis_date, keyword, domain,
-                    ai_result.get('has_ai_overview', False),
-                    ai_result.get('domain_is_ai_source', False),
-                    ai_result.get('domain_ai_source_position'),
-                    ai_result.get('total_elements', 0),
-                    ai_result.get('impact_score', 0),
-                    json.dumps(serp_data),
-                    json.dumps(ai_result),
-                    country_code
-                ))
-
+                ResultRepository.insert_results(cur, [{
+                    'project_id': project_id,
+                    'keyword_id': keyword_id,
+                    'analysis_date': analysis_date,
+                    'keyword': keyword,
+                    'domain': domain,
+                    'ai_result': ai_result,
+                    'serp_data': serp_data,
+                    'country_code': country_code,
+                }])
                 conn.commit()
 
             except Exception as e:
@@ -62,6 +58,94 @@ class ResultRepository:
             except Exception:
                 pass
 
+    @staticmethod
+    def insert_results(cur, results: List[Dict], replace: bool = False) -> None:
+        """
+        Insertar un lote de resultados con el cursor del llamador (sin commit).
+
+        Cada resultado lleva los argumentos de `create_result`. Con `replace`
+        se borran antes los resultados del mismo día de esas keywords
+        (sobreescritura del análisis manual). Los payloads de todo el lote van
+        a `payload_blobs` en una sola sentencia.
+        """
+        if not results:
+            return
+        if replace:
+            ResultRepository.delete_results_for_keywords(cur, results)
+
+        packed = payload_blobs.pack_payloads(
+            cur, [payload for r in results for payload in (r['serp_data'], r['ai_result'])]
+        )
+        rows = []
+        for i, r in enumerate(results):
+            (serp_json, serp_hash), (ai_json, ai_hash) = packed[2 * i], packed[2 * i + 1]
+            ai_result = r['ai_result']
+            rows.append((
+                r['project_id'], r['keyword_id'], r['analysis_date'], r['keyword'], r['domain'],
+                ai_result.get('has_ai_overview', False),
+                ai_result.get('domain_is_ai_source', False),
+                ai_result.get('domain_ai_source_position'),
+                ai_result.get('total_elements', 0),
+                ai_result.get('impact_score', 0),
+                serp_json,
+                ai_json,
+                serp_hash,
+                ai_hash,
+                r['country_code']
+            ))
+
+        execute_values(cur, """
+            INSERT INTO manual_ai_results (
+                project_id, keyword_id, analysis_date, keyword, domain,
+                has_ai_overview, domain_mentioned, domain_position,
+                ai_elements_count, impact_score, raw_serp_data,
+                ai_analysis_data, raw_serp_data_hash, ai_analysis_data_hash,
+                country_code
+            ) VALUES %s
+            ON CONFLICT (project_id, keyword_id, analysis_date) DO NOTHING
+        """, rows)
+
+    @staticmethod
+    def delete_results_for_keywords(cur, results: List[Dict]) -> None:
+        """Borrar (sin commit) los resultados existentes de las keywords/días del lote"""
+        keys = defaultdict(list)
+        for r in results:
+            keys[(r['project_id'], r['analysis_date'])].append(r['keyword_id'])
+        for (project_id, analysis_date), keyword_ids in keys.items():
+            cur.execute("""
+                DELETE FROM manual_ai_results
+                WHERE project_id = %s AND analysis_date = %s AND keyword_id = ANY(%s)
+            """, (project_id, analysis_date, keyword_ids))
+
+    @staticmethod
+    def get_analyzed_keyword_ids(project_id: int, analysis_date: date) -> Set[int]:
+        """
+        IDs de las keywords del proyecto que ya tienen resultado en la fecha
+        (una consulta para todo el lote en vez de una por keyword)
+        """
+        conn = get_db_connection()
+        if not conn:
+            logger.error(f"get_analyzed_keyword_ids({project_id}): no DB connection")
+            return set()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    SELECT keyword_id FROM manual_ai_results
+                    WHERE project_id = %s AND analysis_date = %s
+                """, (project_id, analysis_date))
+
+                return {row['keyword_id'] for row in cur.fetchall()}
+
+            except Exception as e:
+                logger.error(f"Error fetching analyzed keywords: {e}")
+                return set()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     @staticmethod
     def result_exists_for_date(project_id: int, keyword_id: int, analysis_date: date) -> bool:
         """
@@ -0,0 +1,309 @@
+"""
+Repositorio de agregados diarios (rollups) de Manual AI
+
+Las estadísticas del dashboard (visibilidad por día, posiciones, gráficas de
+competidores, clusters) agregaban `manual_ai_results` y
+`manual_ai_global_domains` de toda la ventana en cada carga. Estas tablas
+guardan el agregado por proyecto y día, y el último resultado de cada keyword,
+y se mantienen al escribir resultados (AnalysisService._persist_results,
+marcador de cuota, borrado de keywords): solo se recalculan los días y las
+keywords tocados, así que el coste no depende del histórico.
+
+- manual_ai_daily_rollups: visibilidad, AIO, menciones y posiciones por día.
+- manual_ai_domain_daily_rollups: citas por dominio y día (todas las filas y
+  solo las de keywords activas con AI Overview, que es lo que usan las
+  gráficas comparativas).
+- manual_ai_keyword_latest: último resultado de cada keyword.
+- manual_ai_rollup_state: proyectos cuyos rollups están completos. Los
+  lectores solo usan los rollups de proyectos presentes aquí; el primer
+  refresco de un proyecto sin estado reconstruye todo su histórico (backfill
+  perezoso; migrate_manual_ai_rollups.py lo hace de golpe).
+
+Activación: MANUAL_AI_ROLLUPS_ENABLED (por defecto true). Con false los
+lectores vuelven a las consultas sobre las tablas de resultados.
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+from typing import Iterable, Optional
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+MANUAL_AI_ROLLUPS_ENABLED = os.getenv('MANUAL_AI_ROLLUPS_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+class RollupRepository:
+    """Repositorio de agregados diarios de Manual AI"""
+
+    @staticmethod
+    def ensure_rollup_tables() -> bool:
+        """Crea las tablas de rollups (idempotente)."""
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS manual_ai_daily_rollups (
+                    project_id INTEGER NOT NULL REFERENCES manual_ai_projects(id) ON DELETE CASCADE,
+                    analysis_date DATE NOT NULL,
+                    keywords_analyzed INTEGER NOT NULL DEFAULT 0,
+                    ai_keywords INTEGER NOT NULL DEFAULT 0,
+                    mentions INTEGER NOT NULL DEFAULT 0,
+                    position_sum BIGINT NOT NULL DEFAULT 0,
+                    position_count INTEGER NOT NULL DEFAULT 0,
+                    pos_1_3 INTEGER NOT NULL DEFAULT 0,
+                    pos_4_10 INTEGER NOT NULL DEFAULT 0,
+                    pos_11_20 INTEGER NOT NULL DEFAULT 0,
+                    pos_21_plus INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT NOW(),
+                    PRIMARY KEY (project_id, analysis_date)
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS manual_ai_domain_daily_rollups (
+                    project_id INTEGER NOT NULL REFERENCES manual_ai_projects(id) ON DELETE CASCADE,
+                    analysis_date DATE NOT NULL,
+                    detected_domain VARCHAR(255) NOT NULL,
+                    keywords_mentioned INTEGER NOT NULL DEFAULT 0,
+                    total_mentions INTEGER NOT NULL DEFAULT 0,
+                    position_sum BIGINT NOT NULL DEFAULT 0,
+                    position_count INTEGER NOT NULL DEFAULT 0,
+                    aio_keywords_mentioned INTEGER NOT NULL DEFAULT 0,
+                    aio_position_sum BIGINT NOT NULL DEFAULT 0,
+                    aio_position_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (project_id, analysis_date, detected_domain)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_manual_domain_rollups_domain
+                ON manual_ai_domain_daily_rollups(project_id, detected_domain, analysis_date)
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS manual_ai_keyword_latest (
+                    keyword_id INTEGER PRIMARY KEY REFERENCES manual_ai_keywords(id) ON DELETE CASCADE,
+                    project_id INTEGER NOT NULL REFERENCES manual_ai_projects(id) ON DELETE CASCADE,
+                    analysis_date DATE NOT NULL,
+                    has_ai_overview BOOLEAN,
+                    domain_mentioned BOOLEAN,
+                    domain_position INTEGER
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_manual_keyword_latest_project
+                ON manual_ai_keyword_latest(project_id)
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS manual_ai_rollup_state (
+                    project_id INTEGER PRIMARY KEY REFERENCES manual_ai_projects(id) ON DELETE CASCADE,
+                    rebuilt_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error creando las tablas de rollups de Manual AI: {e}")
+            return False
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _ensure_schema_once() -> bool:
+        global _schema_ready
+        if _schema_ready:
+            return True
+        with _schema_lock:
+            if not _schema_ready:
+                _schema_ready = RollupRepository.ensure_rollup_tables()
+        return _schema_ready
+
+    # ================================
+    # Lectura
+    # ================================
+
+    @staticmethod
+    def is_ready(cur, project_id: int) -> bool:
+        """True si los lectores pueden usar los rollups del proyecto."""
+        if not MANUAL_AI_ROLLUPS_ENABLED or not RollupRepository._ensure_schema_once():
+            return False
+        try:
+            cur.execute("SELECT 1 AS ready FROM manual_ai_rollup_state WHERE project_id = %s", (project_id,))
+            return cur.fetchone() is not None
+        except Exception as e:
+            logger.warning(f"Rollups de Manual AI no disponibles para el proyecto {project_id}: {e}")
+            cur.connection.rollback()
+            return False
+
+    # ================================
+    # Mantenimiento
+    # ================================
+
+    @staticmethod
+    def refresh(cur, project_id: int, analysis_dates: Iterable[date],
+                keyword_ids: Optional[Iterable[int]] = None) -> None:
+        """
+        Recalcular los rollups de los días y keywords tocados, con el cursor
+        (y la transacción) del llamador. Si el proyecto aún no tiene rollups
+        completos, reconstruye todo su histórico y lo marca como listo.
+
+        Va dentro de un SAVEPOINT: si falla, se registra y la escritura del
+        llamador sigue adelante (el proyecto deja de estar listo y los
+        lectores vuelven a las tablas de resultados hasta el siguiente rebuild).
+        """
+        if not MANUAL_AI_ROLLUPS_ENABLED or not RollupRepository._ensure_schema_once():
+            return
+
+        cur.execute('SAVEPOINT manual_ai_rollups')
+        try:
+            cur.execute("SELECT 1 AS ready FROM manual_ai_rollup_state WHERE project_id = %s", (project_id,))
+            if cur.fetchone() is None:
+                RollupRepository.rebuild_project(cur, project_id)
+            else:
+                dates = sorted(set(analysis_dates))
+                if dates:
+                    RollupRepository._refresh_days(cur, project_id, dates)
+                keyword_ids = sorted(set(keyword_ids or []))
+                if keyword_ids:
+                    RollupRepository._refresh_keywords(cur, project_id, keyword_ids)
+            cur.execute('RELEASE SAVEPOINT manual_ai_rollups')
+        except Exception as e:
+            cur.execute('ROLLBACK TO SAVEPOINT manual_ai_rollups')
+            logger.error(f"❌ Error refreshing Manual AI rollups for project {project_id}: {e}")
+            try:
+                cur.execute("DELETE FROM manual_ai_rollup_state WHERE project_id = %s", (project_id,))
+            except Exception:
+                pass
+
+    @staticmethod
+    def rebuild_project(cur, project_id: int) -> None:
+        """Reconstruir todos los rollups de un proyecto y marcarlo como listo."""
+        RollupRepository._refresh_days(cur, project_id, None)
+        RollupRepository._refresh_keywords(cur, project_id, None)
+        cur.execute("""
+            INSERT INTO manual_ai_rollup_state (project_id, rebuilt_at)
+            VALUES (%s, NOW())
+            ON CONFLICT (project_id) DO UPDATE SET rebuilt_at = EXCLUDED.rebuilt_at
+        """, (project_id,))
+
+    @staticmethod
+    def _refresh_days(cur, project_id: int, dates) -> None:
+        # dates=None → todos los días del proyecto. DELETE + upsert: los días
+        # que se quedan sin filas desaparecen y dos refrescos simultáneos del
+        # mismo día no chocan en la clave primaria.
+        date_filter = "" if dates is None else "AND analysis_date = ANY(%s)"
+        gd_date_filter = "" if dates is None else "AND gd.analysis_date = ANY(%s)"
+        params = (project_id,) if dates is None else (project_id, list(dates))
+
+        cur.execute(f"""
+            DELETE FROM manual_ai_daily_rollups
+            WHERE project_id = %s {date_filter}
+        """, params)
+        cur.execute(f"""
+            INSERT INTO manual_ai_daily_rollups (
+                project_id, analysis_date, keywords_analyzed, ai_keywords, mentions,
+                position_sum, position_count, pos_1_3, pos_4_10, pos_11_20, pos_21_plus
+            )
+            SELECT
+                project_id,
+                analysis_date,
+                COUNT(DISTINCT keyword_id),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE has_ai_overview = true),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE domain_mentioned = true),
+                COALESCE(SUM(domain_position) FILTER (WHERE domain_mentioned = true), 0),
+                COUNT(domain_position) FILTER (WHERE domain_mentioned = true),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE domain_mentioned = true AND domain_position BETWEEN 1 AND 3),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE domain_mentioned = true AND domain_position BETWEEN 4 AND 10),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE domain_mentioned = true AND domain_position BETWEEN 11 AND 20),
+                COUNT(DISTINCT keyword_id) FILTER (WHERE domain_mentioned = true AND domain_position > 20)
+            FROM manual_ai_results
+            WHERE project_id = %s {date_filter}
+            GROUP BY project_id, analysis_date
+            ON CONFLICT (project_id, analysis_date) DO UPDATE SET
+                keywords_analyzed = EXCLUDED.keywords_analyzed,
+                ai_keywords = EXCLUDED.ai_keywords,
+                mentions = EXCLUDED.mentions,
+                position_sum = EXCLUDED.position_sum,
+                position_count = EXCLUDED.position_count,
+                pos_1_3 = EXCLUDED.pos_1_3,
+                pos_4_10 = EXCLUDED.pos_4_10,
+                pos_11_20 = EXCLUDED.pos_11_20,
+                pos_21_plus = EXCLUDED.pos_21_plus,
+                updated_at = NOW()
+        """, params)
+
+        cur.execute(f"""
+            DELETE FROM manual_ai_domain_daily_rollups
+            WHERE project_id = %s {date_filter}
+        """, params)
+        # aio_*: solo citas de keywords activas con AI Overview ese día (mismo
+        # JOIN que usaban las gráficas comparativas)
+        cur.execute(f"""
+            INSERT INTO manual_ai_domain_daily_rollups (
+                project_id, analysis_date, detected_domain, keywords_mentioned, total_mentions,
+                position_sum, position_count, aio_keywords_mentioned, aio_position_sum, aio_position_count
+            )
+            SELECT
+                gd.project_id,
+                gd.analysis_date,
+                gd.detected_domain,
+                COUNT(DISTINCT gd.keyword_id),
+                COUNT(*),
+                COALESCE(SUM(gd.domain_position), 0),
+                COUNT(gd.domain_position),
+                COUNT(DISTINCT gd.keyword_id) FILTER (WHERE r.keyword_id IS NOT NULL),
+                COALESCE(SUM(gd.domain_position) FILTER (WHERE r.keyword_id IS NOT NULL), 0),
+                COUNT(gd.domain_position) FILTER (WHERE r.keyword_id IS NOT NULL)
+            FROM manual_ai_global_domains gd
+            LEFT JOIN (
+                manual_ai_results r
+                JOIN manual_ai_keywords k ON k.id = r.keyword_id AND k.is_active = true
+            ) ON r.keyword_id = gd.keyword_id
+                AND r.analysis_date = gd.analysis_date
+                AND r.has_ai_overview = true
+            WHERE gd.project_id = %s {gd_date_filter}
+            GROUP BY gd.project_id, gd.analysis_date, gd.detected_domain
+            ON CONFLICT (project_id, analysis_date, detected_domain) DO UPDATE SET
+                keywords_mentioned = EXCLUDED.keywords_mentioned,
+                total_mentions = EXCLUDED.total_mentions,
+                position_sum = EXCLUDED.position_sum,
+                position_count = EXCLUDED.position_count,
+                aio_keywords_mentioned = EXCLUDED.aio_keywords_mentioned,
+                aio_position_sum = EXCLUDED.aio_position_sum,
+                aio_position_count = EXCLUDED.aio_position_count
+        """, params)
+
+    @staticmethod
+    def _refresh_keywords(cur, project_id: int, keyword_ids) -> None:
+        # keyword_ids=None → todas las keywords del proyecto
+        keyword_filter = "" if keyword_ids is None else "AND keyword_id = ANY(%s)"
+        params = (project_id,) if keyword_ids is None else (project_id, list(keyword_ids))
+
+        cur.execute(f"""
+            DELETE FROM manual_ai_keyword_latest
+            WHERE project_id = %s {keyword_filter}
+        """, params)
+        cur.execute(f"""
+            INSERT INTO manual_ai_keyword_latest (
+                keyword_id, project_id, analysis_date, has_ai_overview, domain_mentioned, domain_position
+            )
+            SELECT DISTINCT ON (keyword_id)
+                keyword_id, project_id, analysis_date, has_ai_overview, domain_mentioned, domain_position
+            FROM manual_ai_results
+            WHERE project_id = %s {keyword_filter}
+            ORDER BY keyword_id, analysis_date DESC
+            ON CONFLICT (keyword_id) DO UPDATE SET
+                analysis_date = EXCLUDED.analysis_date,
+                has_ai_overview = EXCLUDED.has_ai_overview,
+                domain_mentioned = EXCLUDED.domain_mentioned,
+                domain_position = EXCLUDED.domain_position
+        """, params)
@@ -51,6 +51,16 @@ def analyze_project(project_id):
         # Ejecutar análisis manual con sobreescritura forzada
         analysis_result = analysis_service.run_project_analysis(project_id, force_overwrite=True)
         
+        # Cuota libre pero retenida por otra ejecución en curso (p.ej. el cron)
+        if isinstance(analysis_result, dict) and analysis_result.get('quota_busy'):
+            return jsonify({
+                'success': False,
+                'error': 'quota_busy',
+                'retryable': True,
+                'quota_info': analysis_result.get('quota_info', {}),
+                'message': 'Another analysis is using your remaining quota. Try again when it finishes.'
+            }), 409
+
         # Manejar respuesta que puede incluir información de quota
         if isinstance(analysis_result, dict) and analysis_result.get('quota_exceeded'):
             # Análisis interrumpido por quota
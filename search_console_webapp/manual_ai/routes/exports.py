@@ -128,6 +128,8 @@ def download_manual_ai_pdf(project_id):
     Returns:
         Archivo PDF para descarga. Filename canónico:
             "AI Overview export - {project_name} - YYYY-MM-DD - Clicandseo.pdf"
+        O 202 {'status': 'pending', 'retry_after'} si el PDF se sigue generando
+        en segundo plano (ver manual_ai/services/pdf_report_cache.py).
     """
     user = get_current_user()
 
@@ -140,7 +142,9 @@ def download_manual_ai_pdf(project_id):
         return jsonify({'success': False, 'error': 'Unauthorized'}), 403
 
     try:
+        from io import BytesIO
         from manual_ai.services.pdf_export_service import ManualAiPdfExportService
+        from manual_ai.services.pdf_report_cache import MANUAL_AI_PDF_CACHE_ENABLED, PdfReportCache
         from manual_ai.models.project_repository import ProjectRepository
         from manual_ai.utils.export_filename import build_manual_ai_export_filename
         from flask import send_file
@@ -165,10 +169,18 @@ def download_manual_ai_pdf(project_id):
             f"user {user['id']}, days {days}"
         )
 
-        pdf_file = ManualAiPdfExportService.generate_project_pdf(
-            project_id=project_id,
-            days=days,
-        )
+        if MANUAL_AI_PDF_CACHE_ENABLED:
+            # Caché + generación en segundo plano: si el PDF no está listo
+            # tras MANUAL_AI_PDF_WAIT_SECONDS, el navegador reintenta
+            status, pdf_bytes = PdfReportCache.request_pdf(project_id, days)
+            if status == 'pending':
+                return jsonify({'success': True, 'status': 'pending', 'retry_after': 3}), 202
+            pdf_file = BytesIO(pdf_bytes)
+        else:
+            pdf_file = ManualAiPdfExportService.generate_project_pdf(
+                project_id=project_id,
+                days=days,
+            )
 
         logger.info(f"Manual AI PDF generated successfully for project {project_id}")
 
@@ -7,6 +7,7 @@ import json
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from manual_ai.models.rollup_repository import RollupRepository
 from services.utils import normalize_search_console_url
 from manual_ai.config import MAX_COMPETITORS_PER_PROJECT
 
@@ -89,22 +90,42 @@ class _ChartsMixin:
             # 2. Brand Position Over Time (posición promedio por fecha)
             position_over_time = {}
 
-            for domain in all_domains:
+            if RollupRepository.is_ready(cur, project_id):
+                # Una consulta sobre los rollups para todos los dominios
+                position_over_time = {domain: [] for domain in all_domains}
                 cur.execute("""
                     SELECT
+                        detected_domain,
                         analysis_date,
-                        AVG(domain_position) as avg_position,
-                        COUNT(DISTINCT keyword_id) as keyword_count
-                    FROM manual_ai_global_domains
+                        position_sum::numeric / NULLIF(position_count, 0) as avg_position,
+                        keywords_mentioned as keyword_count
+                    FROM manual_ai_domain_daily_rollups
                     WHERE project_id = %s
-                        AND detected_domain = %s
+                        AND detected_domain = ANY(%s)
                         AND analysis_date >= %s
                         AND analysis_date <= %s
-                    GROUP BY analysis_date
                     ORDER BY analysis_date
-                """, (project_id, domain, start_date, end_date))
+                """, (project_id, all_domains, start_date, end_date))
+                for row in cur.fetchall():
+                    row = dict(row)
+                    position_over_time[row.pop('detected_domain')].append(row)
+            else:
+                for domain in all_domains:
+                    cur.execute("""
+                        SELECT
+                            analysis_date,
+                            AVG(domain_position) as avg_position,
+                            COUNT(DISTINCT keyword_id) as keyword_count
+                        FROM manual_ai_global_domains
+                        WHERE project_id = %s
+                            AND detected_domain = %s
+                            AND analysis_date >= %s
+                            AND analysis_date <= %s
+                        GROUP BY analysis_date
+                        ORDER BY analysis_date
+                    """, (project_id, domain, start_date, end_date))
 
-                position_over_time[domain] = [dict(row) for row in cur.fetchall()]
+                    position_over_time[domain] = [dict(row) for row in cur.fetchall()]
 
             return {
                 'brand_visibility_index': visibility_data,
@@ -163,14 +184,28 @@ class _ChartsMixin:
             position_chart_data = {'dates': [], 'datasets': []}
             
             # Obtener fechas reales con datos
-            cur.execute("""
-                SELECT DISTINCT r.analysis_date
-                FROM manual_ai_results r
-                WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
-                ORDER BY r.analysis_date
-            """, (project_id, start_date, end_date))
+            use_rollups = RollupRepository.is_ready(cur, project_id)
+            if use_rollups:
+                cur.execute("""
+                    SELECT analysis_date
+                    FROM manual_ai_daily_rollups
+                    WHERE project_id = %s AND analysis_date >= %s AND analysis_date <= %s
+                    ORDER BY analysis_date
+                """, (project_id, start_date, end_date))
+            else:
+                cur.execute("""
+                    SELECT DISTINCT r.analysis_date
+                    FROM manual_ai_results r
+                    WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
+                    ORDER BY r.analysis_date
+                """, (project_id, start_date, end_date))
             
             date_range = [str(row['analysis_date']) for row in cur.fetchall()]
+
+            if use_rollups:
+                rollup_visibility, rollup_position = _ChartsMixin._comparative_series_from_rollups(
+                    cur, project_id, project_domain, selected_competitors, start_date, end_date
+                )
             
             visibility_chart_data['dates'] = date_range
             position_chart_data['dates'] = date_range
@@ -194,92 +229,14 @@ class _ChartsMixin:
             
             # Para cada dominio, obtener sus métricas por fecha
             for domain in domains_to_compare:
-                # Datos de visibilidad
-                if domain == project_domain:
-                    # Para dominio del proyecto, usar manual_ai_results
-                    cur.execute("""
-                        SELECT 
-                            r.analysis_date,
-                            (COUNT(DISTINCT CASE WHEN r.domain_mentioned = true THEN r.keyword_id END)::float / 
-                             NULLIF(COUNT(DISTINCT CASE WHEN r.has_ai_overview = true THEN r.keyword_id END), 0)::float * 100) as visibility_percentage
-                        FROM manual_ai_results r
-                        WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
-                        GROUP BY r.analysis_date
-                        ORDER BY r.analysis_date
-                    """, (project_id, start_date, end_date))
+                # Datos de visibilidad y de posición media por fecha
+                if use_rollups:
+                    visibility_by_date = rollup_visibility.get(domain, {})
+                    position_by_date = rollup_position.get(domain, {})
                 else:
-                    # Para competidores, usar manual_ai_global_domains
-                    cur.execute("""
-                        WITH daily_metrics AS (
-                            SELECT 
-                                gd.analysis_date,
-                                COUNT(DISTINCT gd.keyword_id) as domain_appearances,
-                                (
-                                    SELECT COUNT(DISTINCT r.keyword_id)
-                                    FROM manual_ai_results r
-                                    WHERE r.project_id = %s 
-                                    AND r.analysis_date = gd.analysis_date
-                                    AND r.has_ai_overview = true
-                                ) as total_ai_keywords
-                            FROM manual_ai_global_domains gd
-                            JOIN manual_ai_results r ON gd.keyword_id = r.keyword_id AND gd.analysis_date = r.analysis_date
-                            JOIN manual_ai_keywords k ON r.keyword_id = k.id
-                            WHERE gd.project_id = %s 
-                            AND gd.detected_domain = %s
-                            AND gd.analysis_date >= %s 
-                            AND gd.analysis_date <= %s
-                            AND k.is_active = true
-                            AND r.has_ai_overview = true
-                            GROUP BY gd.analysis_date
-                        )
-                        SELECT 
-                            analysis_date,
-                            CASE 
-                                WHEN total_ai_keywords > 0 
-                                THEN (domain_appearances::float / total_ai_keywords::float * 100) 
-                                ELSE 0 
-                            END as visibility_percentage
-                        FROM daily_metrics
-                        ORDER BY analysis_date
-                    """, (project_id, project_id, domain, start_date, end_date))
-                
-                visibility_results = cur.fetchall()
-                visibility_by_date = {str(row['analysis_date']): row['visibility_percentage'] for row in visibility_results}
-                
-                # Datos de posición media
-                if domain == project_domain:
-                    # Para dominio del proyecto, usar manual_ai_results
-                    cur.execute("""
-                        SELECT 
-                            r.analysis_date,
-                            AVG(CASE WHEN r.domain_position IS NOT NULL THEN r.domain_position END) as avg_position
-                        FROM manual_ai_results r
-                        WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
-                            AND r.domain_mentioned = true
-                        GROUP BY r.analysis_date
-                        ORDER BY r.analysis_date
-                    """, (project_id, start_date, end_date))
-                else:
-                    # Para competidores, usar manual_ai_global_domains
-                    cur.execute("""
-                        SELECT 
-                            gd.analysis_date,
-                            AVG(gd.domain_position) as avg_position
-                        FROM manual_ai_global_domains gd
-                        JOIN manual_ai_results r ON gd.keyword_id = r.keyword_id AND gd.analysis_date = r.analysis_date
-                        JOIN manual_ai_keywords k ON r.keyword_id = k.id
-                        WHERE gd.project_id = %s 
-                        AND gd.detected_domain = %s
-                        AND gd.analysis_date >= %s 
-                        AND gd.analysis_date <= %s
-                        AND k.is_active = true
-                        AND r.has_ai_overview = true
-                        GROUP BY gd.analysis_date
-                        ORDER BY gd.analysis_date
-                    """, (project_id, domain, start_date, end_date))
-                
-                position_results = cur.fetchall()
-                position_by_date = {str(row['analysis_date']): row['avg_position'] for row in position_results}
+                    visibility_by_date, position_by_date = _ChartsMixin._comparative_series_from_results(
+                        cur, project_id, project_domain, domain, start_date, end_date
+                    )
                 
                 # Preparar datos con lógica temporal
                 visibility_data = []
@@ -382,3 +339,152 @@ class _ChartsMixin:
                 conn.close()
             except Exception:
                 pass
+
+    @staticmethod
+    def _comparative_series_from_results(cur, project_id: int, project_domain: str, domain: str,
+                                         start_date: date, end_date: date):
+        """
+        Visibilidad y posición media por fecha de un dominio, calculadas sobre
+        manual_ai_results / manual_ai_global_domains (proyectos sin rollups).
+        """
+        # Datos de visibilidad
+        if domain == project_domain:
+            # Para dominio del proyecto, usar manual_ai_results
+            cur.execute("""
+                SELECT 
+                    r.analysis_date,
+                    (COUNT(DISTINCT CASE WHEN r.domain_mentioned = true THEN r.keyword_id END)::float / 
+                     NULLIF(COUNT(DISTINCT CASE WHEN r.has_ai_overview = true THEN r.keyword_id END), 0)::float * 100) as visibility_percentage
+                FROM manual_ai_results r
+                WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
+                GROUP BY r.analysis_date
+                ORDER BY r.analysis_date
+            """, (project_id, start_date, end_date))
+        else:
+            # Para competidores, usar manual_ai_global_domains
+            cur.execute("""
+                WITH daily_metrics AS (
+                    SELECT 
+                        gd.analysis_date,
+                        COUNT(DISTINCT gd.keyword_id) as domain_appearances,
+                        (
+                            SELECT COUNT(DISTINCT r.keyword_id)
+                            FROM manual_ai_results r
+                            WHERE r.project_id = %s 
+                            AND r.analysis_date = gd.analysis_date
+                            AND r.has_ai_overview = true
+                        ) as total_ai_keywords
+                    FROM manual_ai_global_domains gd
+                    JOIN manual_ai_results r ON gd.keyword_id = r.keyword_id AND gd.analysis_date = r.analysis_date
+                    JOIN manual_ai_keywords k ON r.keyword_id = k.id
+                    WHERE gd.project_id = %s 
+                    AND gd.detected_domain = %s
+                    AND gd.analysis_date >= %s 
+                    AND gd.analysis_date <= %s
+                    AND k.is_active = true
+                    AND r.has_ai_overview = true
+                    GROUP BY gd.analysis_date
+                )
+                SELECT 
+                    analysis_date,
+                    CASE 
+                        WHEN total_ai_keywords > 0 
+                        THEN (domain_appearances::float / total_ai_keywords::float * 100) 
+                        ELSE 0 
+                    END as visibility_percentage
+                FROM daily_metrics
+                ORDER BY analysis_date
+            """, (project_id, project_id, domain, start_date, end_date))
+
+        visibility_results = cur.fetchall()
+        visibility_by_date = {str(row['analysis_date']): row['visibility_percentage'] for row in visibility_results}
+
+        # Datos de posición media
+        if domain == project_domain:
+            # Para dominio del proyecto, usar manual_ai_results
+            cur.execute("""
+                SELECT 
+                    r.analysis_date,
+                    AVG(CASE WHEN r.domain_position IS NOT NULL THEN r.domain_position END) as avg_position
+                FROM manual_ai_results r
+                WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
+                    AND r.domain_mentioned = true
+                GROUP BY r.analysis_date
+                ORDER BY r.analysis_date
+            """, (project_id, start_date, end_date))
+        else:
+            # Para competidores, usar manual_ai_global_domains
+            cur.execute("""
+                SELECT 
+                    gd.analysis_date,
+                    AVG(gd.domain_position) as avg_position
+                FROM manual_ai_global_domains gd
+                JOIN manual_ai_results r ON gd.keyword_id = r.keyword_id AND gd.analysis_date = r.analysis_date
+                JOIN manual_ai_keywords k ON r.keyword_id = k.id
+                WHERE gd.project_id = %s 
+                AND gd.detected_domain = %s
+                AND gd.analysis_date >= %s 
+                AND gd.analysis_date <= %s
+                AND k.is_active = true
+                AND r.has_ai_overview = true
+                GROUP BY gd.analysis_date
+                ORDER BY gd.analysis_date
+            """, (project_id, domain, start_date, end_date))
+
+        position_results = cur.fetchall()
+        position_by_date = {str(row['analysis_date']): row['avg_position'] for row in position_results}
+
+        return visibility_by_date, position_by_date
+
+    @staticmethod
+    def _comparative_series_from_rollups(cur, project_id: int, project_domain: str, competitors: List[str],
+                                         start_date: date, end_date: date):
+        """
+        Visibilidad y posición media por fecha del proyecto y de todos sus
+        competidores, en dos consultas sobre los rollups diarios. Mismas
+        definiciones que `_comparative_series_from_results`.
+        """
+        visibility = {project_domain: {}}
+        position = {project_domain: {}}
+
+        cur.execute("""
+            SELECT
+                analysis_date,
+                (mentions::float / NULLIF(ai_keywords, 0)::float * 100) as visibility_percentage,
+                CASE WHEN mentions > 0
+                     THEN position_sum::numeric / NULLIF(position_count, 0)
+                END as avg_position
+            FROM manual_ai_daily_rollups
+            WHERE project_id = %s AND analysis_date >= %s AND analysis_date <= %s
+        """, (project_id, start_date, end_date))
+        for row in cur.fetchall():
+            visibility[project_domain][str(row['analysis_date'])] = row['visibility_percentage']
+            position[project_domain][str(row['analysis_date'])] = row['avg_position']
+
+        competitors = [c for c in competitors if c != project_domain]
+        if competitors:
+            cur.execute("""
+                SELECT
+                    dr.detected_domain,
+                    dr.analysis_date,
+                    CASE
+                        WHEN d.ai_keywords > 0
+                        THEN (dr.aio_keywords_mentioned::float / d.ai_keywords::float * 100)
+                        ELSE 0
+                    END as visibility_percentage,
+                    dr.aio_position_sum::numeric / NULLIF(dr.aio_position_count, 0) as avg_position
+                FROM manual_ai_domain_daily_rollups dr
+                LEFT JOIN manual_ai_daily_rollups d
+                    ON d.project_id = dr.project_id AND d.analysis_date = dr.analysis_date
+                WHERE dr.project_id = %s
+                    AND dr.detected_domain = ANY(%s)
+                    AND dr.analysis_date >= %s
+                    AND dr.analysis_date <= %s
+                    AND dr.aio_keywords_mentioned > 0
+            """, (project_id, competitors, start_date, end_date))
+            for row in cur.fetchall():
+                date_str = str(row['analysis_date'])
+                visibility.setdefault(row['detected_domain'], {})[date_str] = row['visibility_percentage']
+                position.setdefault(row['detected_domain'], {})[date_str] = row['avg_position']
+
+        return visibility, position
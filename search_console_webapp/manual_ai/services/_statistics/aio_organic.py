@@ -6,10 +6,26 @@ import logging
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 
 logger = logging.getLogger(__name__)
 
 
+def _with_blob_organic(rows) -> List[Dict]:
+    """
+    Completa `organic`/`refs` de las filas cuyo SERP está en `payload_blobs`
+    (el JSONB en línea es NULL, así que la extracción en SQL devuelve NULL) y
+    descarta las que siguen sin resultados orgánicos.
+    """
+    rows = hydrate_payloads(rows, 'raw_serp_data')
+    for row in rows:
+        serp = row.pop('raw_serp_data', None)
+        if row.get('organic') is None and isinstance(serp, dict):
+            row['organic'] = serp.get('organic_results')
+            row['refs'] = (serp.get('ai_overview') or {}).get('references')
+    return [row for row in rows if row.get('organic')]
+
+
 class _AioOrganicMixin:
 
     @staticmethod
@@ -113,22 +129,25 @@ class _AioOrganicMixin:
                         r.has_ai_overview,
                         r.domain_mentioned,
                         r.raw_serp_data->'organic_results' AS organic,
-                        r.raw_serp_data->'ai_overview'->'references' AS refs
+                        r.raw_serp_data->'ai_overview'->'references' AS refs,
+                        r.raw_serp_data_hash
                     FROM manual_ai_keywords k
                     LEFT JOIN manual_ai_results r ON k.id = r.keyword_id
                         AND r.analysis_date >= %s AND r.analysis_date <= %s
                     WHERE k.project_id = %s
                     ORDER BY k.id, r.analysis_date DESC
                 )
-                SELECT keyword, domain_mentioned, organic, refs
+                SELECT keyword, domain_mentioned, organic, refs, raw_serp_data_hash
                 FROM latest
                 WHERE has_ai_overview = TRUE
-                  AND jsonb_array_length(COALESCE(organic, '[]'::jsonb)) > 0
+                  AND (jsonb_array_length(COALESCE(organic, '[]'::jsonb)) > 0
+                       OR raw_serp_data_hash IS NOT NULL)
             """, (start_date, end_date, project_id))
             rows = cur.fetchall()
         finally:
             cur.close()
             conn.close()
+        rows = _with_blob_organic(rows)
 
         # Acumuladores globales
         total_aio_refs = 0
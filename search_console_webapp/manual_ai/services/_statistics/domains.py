@@ -6,6 +6,7 @@ import logging
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 
 logger = logging.getLogger(__name__)
 
@@ -106,13 +107,14 @@ class _DomainsMixin:
                     r.keyword_id,
                     r.keyword,
                     r.ai_analysis_data,
+                    r.ai_analysis_data_hash,
                     r.analysis_date
                 FROM manual_ai_results r
                 WHERE r.project_id = %s
                     AND r.analysis_date >= %s
                     AND r.analysis_date <= %s
                     AND r.has_ai_overview = true
-                    AND r.ai_analysis_data IS NOT NULL
+                    AND (r.ai_analysis_data IS NOT NULL OR r.ai_analysis_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
 
             results = cur.fetchall()
@@ -121,6 +123,7 @@ class _DomainsMixin:
                 conn.close()
             except Exception:
                 pass
+        results = hydrate_payloads(results, 'ai_analysis_data')
         
         # Contador de dominios: {domain: {mentions: int, positions: [], dates: set, keywords: set}}
         domain_stats = defaultdict(lambda: {
@@ -253,13 +256,14 @@ class _DomainsMixin:
                 SELECT
                     r.id,
                     r.keyword,
-                    r.ai_analysis_data
+                    r.ai_analysis_data,
+                    r.ai_analysis_data_hash
                 FROM manual_ai_results r
                 WHERE r.project_id = %s
                     AND r.analysis_date >= %s
                     AND r.analysis_date <= %s
                     AND r.has_ai_overview = true
-                    AND r.ai_analysis_data IS NOT NULL
+                    AND (r.ai_analysis_data IS NOT NULL OR r.ai_analysis_data_hash IS NOT NULL)
             """, (project_id, start_date, end_date))
 
             results = cur.fetchall()
@@ -268,6 +272,7 @@ class _DomainsMixin:
                 conn.close()
             except Exception:
                 pass
+        results = hydrate_payloads(results, 'ai_analysis_data')
 
         # Procesar referencias y agrupar URLs
         url_mentions = {}
@@ -6,6 +6,7 @@ import logging
 from datetime import date, timedelta
 from typing import List, Dict
 from database import get_db_connection
+from manual_ai.models.rollup_repository import RollupRepository
 
 logger = logging.getLogger(__name__)
 
@@ -40,9 +41,27 @@ class _OverviewMixin:
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
 
-            # Estadísticas principales - Solo cuenta resultados más recientes por keyword
-            cur.execute("""
-                WITH latest_results AS (
+            # Con rollups (manual_ai/models/rollup_repository.py) las consultas
+            # leen agregados por día y el último resultado de cada keyword en
+            # vez de recorrer manual_ai_results de toda la ventana.
+            use_rollups = RollupRepository.is_ready(cur, project_id)
+
+            if use_rollups:
+                latest_sql = """
+                    SELECT
+                        k.id as keyword_id,
+                        k.is_active,
+                        l.has_ai_overview,
+                        l.domain_mentioned,
+                        l.domain_position,
+                        l.analysis_date
+                    FROM manual_ai_keywords k
+                    LEFT JOIN manual_ai_keyword_latest l ON l.keyword_id = k.id
+                        AND l.analysis_date >= %s AND l.analysis_date <= %s
+                    WHERE k.project_id = %s
+                """
+            else:
+                latest_sql = """
                     SELECT DISTINCT ON (k.id)
                         k.id as keyword_id,
                         k.is_active,
@@ -55,7 +74,11 @@ class _OverviewMixin:
                         AND r.analysis_date >= %s AND r.analysis_date <= %s
                     WHERE k.project_id = %s
                     ORDER BY k.id, r.analysis_date DESC
-                )
+                """
+
+            # Estadísticas principales - Solo cuenta resultados más recientes por keyword
+            cur.execute(f"""
+                WITH latest_results AS ({latest_sql})
                 SELECT
                     COUNT(*) as total_keywords,
                     COUNT(CASE WHEN is_active = true THEN 1 END) as active_keywords,
@@ -73,7 +96,20 @@ class _OverviewMixin:
             active_keywords = int(main_stats.get('active_keywords') or 0)
 
             # Datos para gráfico de visibilidad por día
-            cur.execute("""
+            if use_rollups:
+                cur.execute("""
+                    SELECT
+                        analysis_date,
+                        keywords_analyzed as total_keywords_analyzed,
+                        ai_keywords,
+                        mentions,
+                        (mentions::float / NULLIF(ai_keywords, 0)::float * 100) as visibility_pct
+                    FROM manual_ai_daily_rollups
+                    WHERE project_id = %s AND analysis_date >= %s AND analysis_date <= %s
+                    ORDER BY analysis_date
+                """, (project_id, start_date, end_date))
+            else:
+                cur.execute("""
                 SELECT
                     r.analysis_date,
                     COUNT(DISTINCT r.keyword_id) as total_keywords_analyzed,
@@ -85,7 +121,7 @@ class _OverviewMixin:
                 WHERE r.project_id = %s AND r.analysis_date >= %s AND r.analysis_date <= %s
                 GROUP BY r.analysis_date
                 ORDER BY r.analysis_date
-            """, (project_id, start_date, end_date))
+                """, (project_id, start_date, end_date))
 
             visibility_data = [dict(row) for row in cur.fetchall()]
             # Filtrar días incompletos (evitar caídas por análisis parcial)
@@ -97,7 +133,16 @@ class _OverviewMixin:
             allowed_dates = {row['analysis_date'] for row in visibility_data if row.get('analysis_date')}
 
             # Datos para gráfico de posiciones
-            cur.execute("""
+            if use_rollups:
+                cur.execute("""
+                    SELECT analysis_date, pos_1_3, pos_4_10, pos_11_20, pos_21_plus
+                    FROM manual_ai_daily_rollups
+                    WHERE project_id = %s AND analysis_date >= %s AND analysis_date <= %s
+                        AND mentions > 0
+                    ORDER BY analysis_date
+                """, (project_id, start_date, end_date))
+            else:
+                cur.execute("""
                 SELECT
                     r.analysis_date,
                     COUNT(DISTINCT CASE WHEN r.domain_position BETWEEN 1 AND 3 THEN r.keyword_id END) as pos_1_3,
@@ -109,7 +154,7 @@ class _OverviewMixin:
                     AND r.domain_mentioned = true
                 GROUP BY r.analysis_date
                 ORDER BY r.analysis_date
-            """, (project_id, start_date, end_date))
+                """, (project_id, start_date, end_date))
 
             positions_data = [dict(row) for row in cur.fetchall()]
             if allowed_dates:
@@ -178,8 +223,21 @@ class _OverviewMixin:
         try:
             cur = conn.cursor()
 
-            cur.execute("""
-                WITH latest_results AS (
+            if RollupRepository.is_ready(cur, project_id):
+                latest_sql = """
+                    SELECT
+                        k.id AS keyword_id,
+                        l.has_ai_overview,
+                        l.domain_mentioned,
+                        l.domain_position,
+                        l.analysis_date
+                    FROM manual_ai_keywords k
+                    LEFT JOIN manual_ai_keyword_latest l ON l.keyword_id = k.id
+                    WHERE k.project_id = %s
+                    AND k.is_active = true
+                """
+            else:
+                latest_sql = """
                     SELECT DISTINCT ON (k.id)
                         k.id AS keyword_id,
                         r.has_ai_overview,
@@ -191,7 +249,10 @@ class _OverviewMixin:
                     WHERE k.project_id = %s
                     AND k.is_active = true
                     ORDER BY k.id, r.analysis_date DESC
-                )
+                """
+
+            cur.execute(f"""
+                WITH latest_results AS ({latest_sql})
                 SELECT
                     COUNT(*) as total_keywords,
                     COUNT(CASE WHEN has_ai_overview = true THEN 1 END) as total_ai_keywords,
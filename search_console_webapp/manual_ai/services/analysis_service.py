@@ -3,31 +3,45 @@ Servicio de análisis de keywords con AI Overview
 Motor principal del sistema Manual AI
 """
 
+import contextvars
+import functools
 import logging
 import json
 import time
 import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional
 from database import get_db_connection, pause_manual_ai_projects_for_quota
 from auth import get_user_by_id, get_current_user
-from quota_manager import get_user_quota_status
+from quota_manager import get_user_quota_status, reserve_quota
 from manual_ai.config import MANUAL_AI_KEYWORD_ANALYSIS_COST
 from manual_ai.models.project_repository import ProjectRepository
 from manual_ai.models.keyword_repository import KeywordRepository
 from manual_ai.models.result_repository import ResultRepository
+from manual_ai.models.rollup_repository import RollupRepository
 from manual_ai.utils.country_utils import convert_iso_to_internal_country
 from manual_ai.utils.decorators import with_backoff
 from manual_ai.services.domains_service import DomainsService
+from services import serp_store
+from services.bulk_writer import BufferedWriter
 
 logger = logging.getLogger(__name__)
 
 # Frescura de datos: forzar a SerpAPI a ignorar su caché de servidor para
 # obtener un SERP/AI Overview actual en cada análisis (objetividad por
 # mercado). Configurable por env para poder revertir sin redeploy si el
-# coste en RU lo requiere. Por defecto: activado.
+# coste en RU lo requiere. Por defecto: activado. Con el almacén compartido
+# (services/serp_store.py) equivale a "como mucho una descarga fresca por
+# búsqueda, país y día": el resto de análisis del día reutilizan esa SERP.
 SERP_NO_CACHE = os.getenv('SERP_NO_CACHE', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
 
+# Keywords de un mismo proyecto analizadas a la vez y separación mínima entre
+# arranques (límite por proyecto; 1 = ejecución secuencial).
+MANUAL_AI_KEYWORD_WORKERS = max(1, int(os.getenv('MANUAL_AI_KEYWORD_WORKERS', '4')))
+MANUAL_AI_KEYWORD_MIN_INTERVAL_SECONDS = float(os.getenv('MANUAL_AI_KEYWORD_MIN_INTERVAL_SECONDS', '0'))
+
 # Lazy imports para evitar problemas de orden
 try:
     from services.ai_cache import ai_cache
@@ -46,7 +60,7 @@ class AnalysisService:
         self.domains_service = DomainsService()
     
     def run_project_analysis(self, project_id: int, force_overwrite: bool = False, 
-                            user_id: Optional[int] = None) -> List[Dict]:
+                            user_id: Optional[int] = None, keyword_slots=None) -> List[Dict]:
         """
         Ejecutar análisis completo de todas las keywords activas de un proyecto
         
@@ -55,9 +69,13 @@ class AnalysisService:
             force_overwrite: Si True, sobreescribe resultados existentes del día (para análisis manual)
                            Si False, omite keywords ya analizadas hoy (para análisis automático)
             user_id: ID del usuario (opcional). Si no se proporciona, se obtiene de la sesión actual.
+            keyword_slots: FairSlotPool compartido (opcional). El cron lo usa para que
+                           todos los proyectos en curso compartan un presupuesto global
+                           de keywords en vuelo, repartido por turnos entre usuarios.
             
         Returns:
-            Lista de resultados o dict con error si falla
+            Lista de resultados o dict con error si falla. Con `quota_busy` la
+            cuota restante la retienen otras ejecuciones: se puede reintentar.
         """
         # Obtener usuario actual para validación de cuota
         if user_id:
@@ -122,9 +140,48 @@ class AnalysisService:
                     f"Error reanudando proyecto Manual AI {project_id} tras expiración de paused_until: {resume_error}"
                 )
 
-        # Validar cuota antes de empezar
-        quota_info = get_user_quota_status(current_user['id'])
-        if not quota_info.get('can_consume'):
+        today = date.today()
+        cost = MANUAL_AI_KEYWORD_ANALYSIS_COST
+
+        # Las keywords ya analizadas hoy se consultan una sola vez aquí; en modo
+        # automático se omiten y no cuentan para la reserva de cuota.
+        analyzed_today = self.result_repo.get_analyzed_keyword_ids(project_id, today)
+        pending = deque(
+            (index, keyword_data) for index, keyword_data in enumerate(keywords)
+            if force_overwrite or keyword_data['id'] not in analyzed_today
+        )
+        skipped = len(keywords) - len(pending)
+        if skipped:
+            logger.debug(f"{skipped} keywords already analyzed on {today}, skipping (auto mode)")
+        if not pending:
+            logger.info(f"All {len(keywords)} keywords of project {project_id} already analyzed on {today}")
+            return []
+
+        # Reservar cuota para las keywords pendientes antes de empezar: el bucle
+        # descuenta de la reserva en memoria y el consumo se liquida en bloque al
+        # final (quota_manager.reserve_quota), sin consultas de cuota por keyword.
+        reservation = reserve_quota(
+            current_user['id'],
+            len(pending) * cost,
+            source='manual_ai',
+            metadata={'project_id': project_id, 'force_overwrite': bool(force_overwrite)}
+        )
+        quota_info = reservation.quota_info
+        if reservation.granted < cost and quota_info.get('remaining', 0) >= cost:
+            # Al usuario le queda cuota, pero la retienen otras ejecuciones
+            # abiertas (otro proyecto del cron, un análisis manual en curso).
+            # No se pausa: si esas ejecuciones fallan o gastan menos de lo
+            # reservado, los RU vuelven a estar libres al liquidarlas.
+            logger.info(f"User {current_user['id']}: cuota retenida por otras ejecuciones, "
+                        f"proyecto {project_id} aplazado ({quota_info.get('remaining', 0)} RU restantes)")
+            return {
+                'success': False,
+                'error': 'Quota busy',
+                'quota_busy': True,
+                'retryable': True,
+                'quota_info': quota_info
+            }
+        if reservation.granted < cost:
             logger.warning(f"User {current_user['id']} sin cuota para iniciar análisis del proyecto {project_id}. "
                           f"Used: {quota_info.get('quota_used', 0)}/{quota_info.get('quota_limit', 0)} RU")
             paused_until = quota_info.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
@@ -139,11 +196,6 @@ class AnalysisService:
                 'paused_until': paused_until
             }
 
-        results = []
-        failed_keywords = 0
-        consumed_ru = 0
-        today = date.today()
-
         # NOTA (2026-04-09): Antes aquí abríamos conn + cur para usarlos
         # exclusivamente en la rama quota_error (la única que escribe con el
         # outer cursor). Esto dejaba una conexión idle-in-transaction durante
@@ -152,81 +204,88 @@ class AnalysisService:
         # la conn para quota_error se abre localmente en ese except, sólo
         # cuando hace falta.
 
+        # Todo el bucle corre dentro de `with reservation`: si algo falla a mitad
+        # (BD, volcado de resultados, el pool de slots del cron) la reserva se
+        # liquida igualmente con el consumo ya registrado, en lugar de retener
+        # los RU hasta que caduque.
+        with reservation:
+            return self._run_pending_keywords(
+                project_id, project, keywords, pending, analyzed_today, today,
+                force_overwrite, current_user, quota_info, reservation, keyword_slots
+            )
+
+    def _run_pending_keywords(self, project_id, project, keywords, pending, analyzed_today, today,
+                              force_overwrite, current_user, quota_info, reservation, keyword_slots):
+        """Bucle de análisis de `run_project_analysis` sobre las keywords pendientes."""
+        cost = MANUAL_AI_KEYWORD_ANALYSIS_COST
         analysis_mode = "MANUAL (with overwrite)" if force_overwrite else "AUTOMATIC (skip existing)"
-        logger.info(f"🚀 Starting {analysis_mode} analysis for project {project_id} with {len(keywords)} user-defined keywords")
-        
-        for keyword_data in keywords:
-            # Re-validar cuota en cada iteración
-            current_quota = get_user_quota_status(current_user['id'])
-            if not current_quota.get('can_consume') or current_quota.get('remaining', 0) < MANUAL_AI_KEYWORD_ANALYSIS_COST:
-                logger.warning(f"Análisis del proyecto {project_id} detenido por falta de cuota. "
-                              f"Keywords procesadas: {len(results)}. Keywords pendientes: {len(keywords) - len(results)}")
-                paused_until = current_quota.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
-                try:
-                    pause_manual_ai_projects_for_quota(current_user['id'], paused_until, reason='quota_exceeded')
-                except Exception as pause_exc:
-                    logger.warning(f"Could not auto-pause Manual AI projects for user {current_user['id']}: {pause_exc}")
-                break
-
-            keyword = keyword_data['keyword']
-            keyword_id = keyword_data['id']
-            
-            try:
-                # Verificar si ya existe análisis para hoy
-                existing_analysis = self.result_repo.result_exists_for_date(project_id, keyword_id, today)
-                
-                if existing_analysis and not force_overwrite:
-                    logger.debug(f"Analysis already exists for keyword '{keyword}' on {today}, skipping (auto mode)")
-                    continue
-                elif existing_analysis and force_overwrite:
-                    self.result_repo.delete_result_for_date(project_id, keyword_id, today)
-                    logger.info(f"🔄 Overwriting existing analysis for keyword '{keyword}' (manual mode)")
-                
-                # Ejecutar análisis
-                try:
-                    ai_result, serp_data = self._analyze_keyword(keyword, project, keyword_id)
-                    
-                    # Guardar resultado en base de datos
-                    self.result_repo.create_result(
-                        project_id=project_id,
-                        keyword_id=keyword_id,
-                        analysis_date=today,
-                        keyword=keyword,
-                        domain=project['domain'],
-                        ai_result=ai_result,
-                        serp_data=serp_data,
-                        country_code=project['country_code']
+        workers = max(1, min(MANUAL_AI_KEYWORD_WORKERS, len(pending)))
+        logger.info(f"🚀 Starting {analysis_mode} analysis for project {project_id} with {len(keywords)} "
+                    f"user-defined keywords, {len(pending)} pending ({workers} workers)")
+
+        # Ejecución acotada: como mucho `workers` keywords del proyecto en
+        # vuelo (límite por proyecto; el límite global de SerpAPI lo pone el
+        # cliente compartido de quota_middleware). Cada keyword en vuelo
+        # retiene 1 coste de la reserva antes de empezar, así que nunca se
+        # lanzan más keywords de las que la reserva puede pagar. Con
+        # MANUAL_AI_KEYWORD_WORKERS=1 el orden es exactamente el secuencial.
+        #
+        # Los resultados no se escriben keyword a keyword: el hilo principal
+        # los acumula en un BufferedWriter que los vuelca en bloque (una
+        # transacción cada RESULT_BULK_FLUSH_EVERY keywords).
+        writer = BufferedWriter(
+            functools.partial(self._persist_results, replace=force_overwrite),
+            label=f'manual_ai:{project_id}'
+        )
+        in_flight = {}
+        outcomes = {}
+        quota_error = None
+        stopped_for_quota = False
+        last_submit = 0.0
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'manual-ai-{project_id}') as executor:
+            while pending or in_flight:
+                while pending and quota_error is None and len(in_flight) < workers:
+                    # Cuota reservada agotada (contando lo que ya está en vuelo)
+                    if reservation.remaining - len(in_flight) * cost < cost:
+                        if not in_flight:
+                            stopped_for_quota = True
+                        break
+                    if MANUAL_AI_KEYWORD_MIN_INTERVAL_SECONDS > 0:
+                        wait_for = last_submit + MANUAL_AI_KEYWORD_MIN_INTERVAL_SECONDS - time.monotonic()
+                        if wait_for > 0:
+                            time.sleep(wait_for)
+                        last_submit = time.monotonic()
+                    if keyword_slots is not None:
+                        keyword_slots.acquire(current_user['id'])
+                    index, keyword_data = pending.popleft()
+                    # Cada tarea corre en una copia del contexto actual: si el
+                    # análisis viene de una petición, quota_middleware sigue
+                    # viendo al usuario de la sesión igual que en secuencial.
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        self._process_keyword, project_id, project, keyword_data, today,
+                        keyword_data['id'] in analyzed_today
                     )
-                    
-                    # Almacenar dominios globales detectados
-                    if ai_result.get('has_ai_overview', False):
-                        self.domains_service.store_global_domains_detected(
-                            project_id=project_id,
-                            keyword_id=keyword_id,
-                            keyword=keyword,
-                            project_domain=project['domain'],
-                            ai_analysis_data=ai_result,
-                            analysis_date=today,
-                            country_code=project['country_code'],
-                            selected_competitors=project.get('selected_competitors', [])
-                        )
-                    
-                    results.append({
-                        'keyword': keyword,
-                        'has_ai_overview': ai_result.get('has_ai_overview', False),
-                        'domain_mentioned': ai_result.get('domain_is_ai_source', False),
-                        'position': ai_result.get('domain_ai_source_position'),
-                        'impact_score': ai_result.get('impact_score', 0)
-                    })
-                    
-                    # Registrar consumo de RU
-                    try:
-                        from database import track_quota_consumption
-                        track_quota_consumption(
-                            user_id=current_user['id'],
-                            ru_consumed=MANUAL_AI_KEYWORD_ANALYSIS_COST,
-                            source='manual_ai',
-                            keyword=keyword,
+                    if keyword_slots is not None:
+                        future.add_done_callback(lambda _: keyword_slots.release())
+                    in_flight[future] = (index, keyword_data)
+
+                if stopped_for_quota or not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, keyword_data = in_flight.pop(future)
+                    status, value = future.result()
+                    if status == 'ok':
+                        summary, record = value
+                        outcomes[index] = ('ok', summary)
+                        writer.add(dict(record, index=index))
+                        # Registrar consumo de RU (en la reserva; se liquida al final)
+                        reservation.consume(
+                            cost,
+                            keyword=keyword_data['keyword'],
                             country_code=project['country_code'],
                             metadata={
                                 'project_id': project_id,
@@ -234,95 +293,78 @@ class AnalysisService:
                                 'domain': project['domain']
                             }
                         )
-                        consumed_ru += MANUAL_AI_KEYWORD_ANALYSIS_COST
-                    except Exception as track_error:
-                        logger.warning(f"Error registrando consumo de RU para '{keyword}': {track_error}")
-                    
-                    logger.debug(f"Analyzed keyword '{keyword}': AI={ai_result.get('has_ai_overview')}, "
-                               f"Mentioned={ai_result.get('domain_is_ai_source')}")
-                    
-                except Exception as analysis_error:
-                    # Manejar errores de quota específicamente
-                    if hasattr(analysis_error, 'is_quota_error') and analysis_error.is_quota_error:
-                        logger.warning(f"🚫 Keyword '{keyword}' bloqueada por quota: {analysis_error}")
-
-                        # Guardar marcador de quota_exceeded para esta keyword
-                        # en manual_ai_results. La tabla no tiene columna
-                        # error_details (verificado en producción), así que el
-                        # marcador se limita a has_ai_overview=False /
-                        # domain_mentioned=False; el detalle del error se loggea
-                        # arriba con logger.warning.
-                        # Conn local: abierta sólo para esta operación puntual,
-                        # cerrada inmediatamente. Evita mantener una conexión
-                        # outer abierta durante todo el loop (vulnerable al
-                        # idle_in_transaction_session_timeout de 15 min).
-                        quota_conn = get_db_connection()
-                        if quota_conn:
-                            try:
-                                quota_cur = quota_conn.cursor()
-                                quota_cur.execute('''
-                                    INSERT INTO manual_ai_results
-                                    (project_id, keyword_id, keyword, analysis_date, has_ai_overview,
-                                     domain_mentioned, country_code)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                                    ON CONFLICT (project_id, keyword_id, analysis_date)
-                                    DO NOTHING
-                                ''', (
-                                    project_id, keyword_id, keyword, today, False, False,
-                                    project['country_code']
-                                ))
-                                quota_conn.commit()
-                            finally:
-                                try:
-                                    quota_conn.close()
-                                except Exception:
-                                    pass
-
-                        # Terminar análisis y retornar información de quota
-                        quota_info = getattr(analysis_error, 'quota_info', {})
-                        action_required = getattr(analysis_error, 'action_required', 'upgrade')
-
-                        logger.error(f"🚫 Manual AI analysis stopped due to quota limit. "
-                                   f"Plan: {quota_info.get('plan', 'unknown')}, "
-                                   f"Used: {quota_info.get('quota_used', 0)}/{quota_info.get('quota_limit', 0)} RU")
-
-                        # Auto-pausar el proyecto para que el cron y otros endpoints
-                        # no sigan intentando consumir cuota hasta el reset.
-                        live_quota = get_user_quota_status(current_user['id'])
-                        paused_until = live_quota.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
-                        try:
-                            pause_manual_ai_projects_for_quota(
-                                current_user['id'], paused_until, reason='quota_exceeded'
-                            )
-                        except Exception as pause_exc:
-                            logger.warning(
-                                f"Could not auto-pause Manual AI projects for user {current_user['id']}: {pause_exc}"
-                            )
-
-                        return {
-                            'results': results,
-                            'quota_exceeded': True,
-                            'quota_info': quota_info,
-                            'action_required': action_required,
-                            'keywords_analyzed': len(results),
-                            'keywords_remaining': len(keywords) - len(results),
-                            'error': 'QUOTA_EXCEEDED',
-                            'paused_until': paused_until
-                        }
+                    elif status == 'quota_error':
+                        outcomes[index] = ('quota_error', value)
+                        if quota_error is None:
+                            quota_error = (keyword_data, value)
                     else:
-                        logger.error(f"Error analyzing keyword '{keyword}': {analysis_error}")
-                        failed_keywords += 1
-                        continue
-                
-            except Exception as e:
-                logger.error(f"Error analyzing keyword '{keyword}': {e}")
-                failed_keywords += 1
-                continue
+                        outcomes[index] = (status, value)
+
+        writer.flush()
+        # Keywords analizadas cuyo resultado no se pudo guardar ni en bloque ni sola
+        for record in writer.failed:
+            index = record['index']
+            outcomes[index] = ('failed', outcomes[index][1])
+
+        results = [value for _, (status, value) in sorted(outcomes.items()) if status == 'ok']
+        failed_keywords = sum(1 for status, _ in outcomes.values() if status == 'failed')
+
+        if stopped_for_quota and pending:
+            # Cuota reservada agotada: si la reserva cubría toda la cuota del
+            # usuario, pausar; si no, el resto lo retienen otras ejecuciones.
+            logger.warning(f"Análisis del proyecto {project_id} detenido por falta de cuota. "
+                          f"Keywords procesadas: {len(results)}. Keywords pendientes: {len(pending)}")
+            if reservation.exhausts_quota:
+                paused_until = quota_info.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
+                try:
+                    pause_manual_ai_projects_for_quota(current_user['id'], paused_until, reason='quota_exceeded')
+                except Exception as pause_exc:
+                    logger.warning(f"Could not auto-pause Manual AI projects for user {current_user['id']}: {pause_exc}")
+
+        if quota_error is not None:
+            keyword_data, analysis_error = quota_error
+            logger.warning(f"🚫 Keyword '{keyword_data['keyword']}' bloqueada por quota: {analysis_error}")
+            self._store_quota_exceeded_marker(project_id, project, keyword_data, today)
+
+            # Terminar análisis y retornar información de quota
+            reservation.settle()
+            quota_info = getattr(analysis_error, 'quota_info', {})
+            action_required = getattr(analysis_error, 'action_required', 'upgrade')
+
+            logger.error(f"🚫 Manual AI analysis stopped due to quota limit. "
+                       f"Plan: {quota_info.get('plan', 'unknown')}, "
+                       f"Used: {quota_info.get('quota_used', 0)}/{quota_info.get('quota_limit', 0)} RU")
+
+            # Auto-pausar el proyecto para que el cron y otros endpoints
+            # no sigan intentando consumir cuota hasta el reset.
+            live_quota = get_user_quota_status(current_user['id'])
+            paused_until = live_quota.get('reset_date') or (datetime.utcnow() + timedelta(days=30))
+            try:
+                pause_manual_ai_projects_for_quota(
+                    current_user['id'], paused_until, reason='quota_exceeded'
+                )
+            except Exception as pause_exc:
+                logger.warning(
+                    f"Could not auto-pause Manual AI projects for user {current_user['id']}: {pause_exc}"
+                )
+
+            return {
+                'results': results,
+                'quota_exceeded': True,
+                'quota_info': quota_info,
+                'action_required': action_required,
+                'keywords_analyzed': len(results),
+                'keywords_remaining': len(keywords) - len(results),
+                'error': 'QUOTA_EXCEEDED',
+                'paused_until': paused_until
+            }
 
         # Nota: no hay `conn.commit()/close()` aquí porque ya no abrimos una
         # conn outer al inicio del método. Todas las escrituras van por
-        # `result_repo`, `domains_service` y `track_quota_consumption`, que
-        # usan sus propias conexiones de vida corta con commit inmediato.
+        # `result_repo`, `domains_service` y la reserva de quota, que usan sus
+        # propias conexiones de vida corta con commit inmediato.
+        reservation.settle()
+        consumed_ru = reservation.consumed
 
         overwrite_info = " (with overwrite)" if force_overwrite else " (skipping existing)"
         logger.info(f"✅ Completed {analysis_mode} analysis for project {project_id}: "
@@ -333,6 +375,136 @@ class AnalysisService:
             logger.warning(f"⚠️ {failed_keywords} keywords failed analysis (check SERPAPI_KEY configuration)")
         
         return results
+
+    def _process_keyword(self, project_id: int, project: Dict, keyword_data: Dict, today: date,
+                         overwrite: bool) -> tuple:
+        """
+        Analizar una keyword (se ejecuta en un hilo del pool). No escribe en
+        BD: devuelve el registro que el llamador encola en el BufferedWriter.
+
+        Returns:
+            Tuple (estado, valor): ('ok', (resumen, registro)),
+            ('quota_error', excepción) o ('failed', excepción)
+        """
+        keyword = keyword_data['keyword']
+        keyword_id = keyword_data['id']
+
+        try:
+            if overwrite:
+                logger.info(f"🔄 Overwriting existing analysis for keyword '{keyword}' (manual mode)")
+
+            # Ejecutar análisis
+            ai_result, serp_data = self._analyze_keyword(keyword, project, keyword_id)
+
+            record = {
+                'result': {
+                    'project_id': project_id,
+                    'keyword_id': keyword_id,
+                    'analysis_date': today,
+                    'keyword': keyword,
+                    'domain': project['domain'],
+                    'ai_result': ai_result,
+                    'serp_data': serp_data,
+                    'country_code': project['country_code'],
+                },
+                'domain_rows': None,
+            }
+            # Dominios globales detectados (se guardan junto al resultado; una
+            # lista vacía borra los del día aunque hoy no haya referencias)
+            if ai_result.get('has_ai_overview', False):
+                record['domain_rows'] = self.domains_service.build_global_domain_rows(
+                    project_id=project_id,
+                    keyword_id=keyword_id,
+                    keyword=keyword,
+                    project_domain=project['domain'],
+                    ai_analysis_data=ai_result,
+                    analysis_date=today,
+                    country_code=project['country_code'],
+                    selected_competitors=project.get('selected_competitors', [])
+                )
+
+            logger.debug(f"Analyzed keyword '{keyword}': AI={ai_result.get('has_ai_overview')}, "
+                       f"Mentioned={ai_result.get('domain_is_ai_source')}")
+
+            return 'ok', ({
+                'keyword': keyword,
+                'has_ai_overview': ai_result.get('has_ai_overview', False),
+                'domain_mentioned': ai_result.get('domain_is_ai_source', False),
+                'position': ai_result.get('domain_ai_source_position'),
+                'impact_score': ai_result.get('impact_score', 0)
+            }, record)
+
+        except Exception as analysis_error:
+            # Manejar errores de quota específicamente
+            if getattr(analysis_error, 'is_quota_error', False):
+                return 'quota_error', analysis_error
+            logger.error(f"Error analyzing keyword '{keyword}': {analysis_error}")
+            return 'failed', analysis_error
+
+    def _persist_results(self, cur, records: List[Dict], replace: bool = False) -> None:
+        """
+        Escribir un lote de keywords analizadas en una transacción: resultados
+        (con sus payloads), dominios globales y rollups diarios. Un fallo en
+        los dominios o los rollups no tumba los resultados (SAVEPOINT).
+        """
+        results = [r['result'] for r in records]
+        self.result_repo.insert_results(cur, results, replace=replace)
+
+        domain_records = [r for r in records if r['domain_rows'] is not None]
+        if domain_records:
+            cur.execute('SAVEPOINT manual_ai_global_domains')
+            try:
+                self.domains_service.replace_global_domains(
+                    cur, [row for r in domain_records for row in r['domain_rows']],
+                    keywords=[(r['result']['project_id'], r['result']['keyword_id'], r['result']['analysis_date'])
+                              for r in domain_records]
+                )
+                cur.execute('RELEASE SAVEPOINT manual_ai_global_domains')
+            except Exception as e:
+                cur.execute('ROLLBACK TO SAVEPOINT manual_ai_global_domains')
+                logger.error(f"❌ Error storing global domains for {len(records)} keywords: {e}")
+
+        # Rollups diarios de los días y keywords del lote (misma transacción)
+        for project_id in {r['project_id'] for r in results}:
+            project_results = [r for r in results if r['project_id'] == project_id]
+            RollupRepository.refresh(
+                cur, project_id,
+                analysis_dates=[r['analysis_date'] for r in project_results],
+                keyword_ids=[r['keyword_id'] for r in project_results]
+            )
+
+    def _store_quota_exceeded_marker(self, project_id: int, project: Dict, keyword_data: Dict, today: date) -> None:
+        """
+        Guardar marcador de quota_exceeded para la keyword en manual_ai_results.
+
+        La tabla no tiene columna error_details (verificado en producción), así
+        que el marcador se limita a has_ai_overview=False / domain_mentioned=False;
+        el detalle del error se loggea en el llamador. Conn local: abierta sólo
+        para esta operación puntual y cerrada inmediatamente.
+        """
+        quota_conn = get_db_connection()
+        if not quota_conn:
+            return
+        try:
+            quota_cur = quota_conn.cursor()
+            quota_cur.execute('''
+                INSERT INTO manual_ai_results
+                (project_id, keyword_id, keyword, analysis_date, has_ai_overview,
+                 domain_mentioned, country_code)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (project_id, keyword_id, analysis_date)
+                DO NOTHING
+            ''', (
+                project_id, keyword_data['id'], keyword_data['keyword'], today, False, False,
+                project['country_code']
+            ))
+            RollupRepository.refresh(quota_cur, project_id, [today], [keyword_data['id']])
+            quota_conn.commit()
+        finally:
+            try:
+                quota_conn.close()
+            except Exception:
+                pass
     
     def _analyze_keyword(self, keyword: str, project: Dict, keyword_id: int) -> tuple:
         """
@@ -391,6 +563,9 @@ class AnalysisService:
                         # Re-analizar con el contenido completo.
                         ai_result = self._detect_ai_overview(serp_data, project['domain'])
                         logger.info(f"[Manual AI] ✅ AIO expanded successfully for '{keyword}'")
+                        # La SERP compartida del día pasa a llevar el AIO expandido
+                        serp_store.save_serp(self._build_serp_params(keyword, internal_country),
+                                             serp_data, source='manual_ai')
                     else:
                         logger.warning(
                             f"[Manual AI] Second call returned no expanded data for '{keyword}' "
@@ -416,15 +591,14 @@ class AnalysisService:
         
         return ai_result, serp_data
     
-    def _fetch_serp_data(self, keyword: str, internal_country: str) -> Dict:
-        """Obtener datos SERP con reintentos"""
+    def _build_serp_params(self, keyword: str, internal_country: str) -> Dict:
+        """Parámetros SerpAPI de la SERP base (compartidos por el fetch, la expansión y el almacén)"""
         try:
-            from services.serp_service import get_serp_json
             from services.country_config import get_country_config
         except Exception as e:
-            logger.error(f"❌ SERP service not available: {e}")
+            logger.error(f"❌ Country config not available: {e}")
             raise
-        
+
         api_key = os.getenv('SERPAPI_KEY')
         if not api_key:
             logger.error(f"❌ SERPAPI_KEY not configured")
@@ -448,10 +622,21 @@ class AnalysisService:
                 'google_domain': country_config['google_domain']
             })
             logger.debug(f"Using {country_config['name']} config for '{keyword}'")
+        return serp_params_base
+
+    def _fetch_serp_data(self, keyword: str, internal_country: str) -> Dict:
+        """Obtener datos SERP con reintentos (primero del almacén compartido del día)"""
+        try:
+            from services.serp_service import get_serp_json
+        except Exception as e:
+            logger.error(f"❌ SERP service not available: {e}")
+            raise
+        
+        serp_params_base = self._build_serp_params(keyword, internal_country)
         
         @with_backoff(max_attempts=3, base_delay_sec=1.0)
         def fetch_serp():
-            data = get_serp_json(dict(serp_params_base))
+            data = serp_store.fetch_serp(dict(serp_params_base), get_serp_json, source='manual_ai')
             
             if not data:
                 raise RuntimeError('No SERP data returned')
@@ -508,34 +693,12 @@ class AnalysisService:
         """
         try:
             from services.serp_service import get_serp_json
-            from services.country_config import get_country_config
         except Exception as e:
             logger.error(f"❌ SERP service not available for expansion: {e}")
             raise
 
-        api_key = os.getenv('SERPAPI_KEY')
-        if not api_key:
-            logger.error("❌ SERPAPI_KEY not configured (expansion)")
-            raise RuntimeError("SERPAPI_KEY not configured")
-
-        expanded_params = {
-            'engine': 'google',
-            'q': keyword,
-            'api_key': api_key,
-            'num': 20,
-            'page_token': page_token,  # ← única diferencia vs _fetch_serp_data
-        }
-        if SERP_NO_CACHE:
-            expanded_params['no_cache'] = True
-
-        country_config = get_country_config(internal_country)
-        if country_config:
-            expanded_params.update({
-                'location': country_config['serp_location'],
-                'gl': country_config['serp_gl'],
-                'hl': country_config['serp_hl'],
-                'google_domain': country_config['google_domain'],
-            })
+        expanded_params = self._build_serp_params(keyword, internal_country)
+        expanded_params['page_token'] = page_token  # ← única diferencia vs _fetch_serp_data
 
         return get_serp_json(expanded_params)
 
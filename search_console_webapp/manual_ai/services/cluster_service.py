@@ -3,9 +3,10 @@ Servicio para gestión de Topic Clusters en el sistema Manual AI
 """
 
 import logging
-import re
 from typing import List, Dict, Optional
 from database import get_db_connection
+from services.cluster_classifier import get_cluster_classifier
+from manual_ai.models.rollup_repository import RollupRepository
 
 logger = logging.getLogger(__name__)
 
@@ -142,63 +143,7 @@ class ClusterService:
         Returns:
             Lista de nombres de clusters donde clasifica la keyword
         """
-        if not clusters_config.get('enabled', False):
-            return []
-        
-        if not keyword:
-            return []
-        
-        keyword_lower = keyword.lower().strip()
-        matching_clusters = []
-        
-        for cluster in clusters_config.get('clusters', []):
-            cluster_name = cluster.get('name', '')
-            terms = cluster.get('terms', [])
-            match_method = cluster.get('match_method', 'contains')
-            
-            if not cluster_name or not terms:
-                continue
-            
-            # Verificar si la keyword coincide con algún término del cluster
-            for term in terms:
-                if not term:
-                    continue
-                
-                term_lower = term.lower().strip()
-                
-                if match_method == 'contains':
-                    # Coincidencia si la keyword contiene el término
-                    if term_lower in keyword_lower:
-                        if cluster_name not in matching_clusters:
-                            matching_clusters.append(cluster_name)
-                        break
-                
-                elif match_method == 'exact':
-                    # Coincidencia exacta
-                    if keyword_lower == term_lower:
-                        if cluster_name not in matching_clusters:
-                            matching_clusters.append(cluster_name)
-                        break
-                
-                elif match_method == 'starts_with':
-                    # Coincidencia si la keyword empieza con el término
-                    if keyword_lower.startswith(term_lower):
-                        if cluster_name not in matching_clusters:
-                            matching_clusters.append(cluster_name)
-                        break
-                
-                elif match_method == 'regex':
-                    # Coincidencia por expresión regular
-                    try:
-                        if re.search(term_lower, keyword_lower, re.IGNORECASE):
-                            if cluster_name not in matching_clusters:
-                                matching_clusters.append(cluster_name)
-                            break
-                    except re.error:
-                        logger.warning(f"Invalid regex pattern: {term}")
-                        continue
-        
-        return matching_clusters
+        return get_cluster_classifier(clusters_config).classify(keyword)
     
     @staticmethod
     def get_cluster_statistics(project_id: int, days: int = 30) -> Dict:
@@ -243,8 +188,22 @@ class ClusterService:
                 }
             
             # Obtener todas las keywords activas del proyecto con sus últimos resultados
-            cur.execute("""
-                WITH latest_results AS (
+            # (de manual_ai_keyword_latest si el proyecto tiene rollups)
+            if RollupRepository.is_ready(cur, project_id):
+                latest_sql = """
+                    SELECT
+                        k.id as keyword_id,
+                        k.keyword,
+                        l.has_ai_overview,
+                        l.domain_mentioned,
+                        l.analysis_date
+                    FROM manual_ai_keywords k
+                    LEFT JOIN manual_ai_keyword_latest l ON l.keyword_id = k.id
+                        AND l.analysis_date >= %s AND l.analysis_date <= %s
+                    WHERE k.project_id = %s AND k.is_active = true
+                """
+            else:
+                latest_sql = """
                     SELECT DISTINCT ON (k.id)
                         k.id as keyword_id,
                         k.keyword,
@@ -256,7 +215,9 @@ class ClusterService:
                         AND r.analysis_date >= %s AND r.analysis_date <= %s
                     WHERE k.project_id = %s AND k.is_active = true
                     ORDER BY k.id, r.analysis_date DESC
-                )
+                """
+            cur.execute(f"""
+                WITH latest_results AS ({latest_sql})
                 SELECT 
                     keyword_id,
                     keyword,
@@ -285,13 +246,14 @@ class ClusterService:
                     }
             
             # Clasificar keywords y calcular estadísticas
+            classifier = get_cluster_classifier(clusters_config)
             for kw_data in keywords_data:
                 keyword = kw_data['keyword']
                 has_ai_overview = kw_data['has_ai_overview'] or False
                 domain_mentioned = kw_data['domain_mentioned'] or False
                 
                 # Clasificar keyword
-                matching_clusters = ClusterService.classify_keyword(keyword, clusters_config)
+                matching_clusters = classifier.classify(keyword)
                 
                 if matching_clusters:
                     # Añadir a todos los clusters que coinciden
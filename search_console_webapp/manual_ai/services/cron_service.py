@@ -4,7 +4,10 @@ Servicio para análisis diario automático (Cron Jobs)
 
 import logging
 import json
+import os
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from database import get_db_connection
 from manual_ai.config import CRON_LOCK_CLASS_ID
@@ -12,9 +15,18 @@ from manual_ai.utils.helpers import now_utc_iso
 from manual_ai.services.analysis_service import AnalysisService
 from manual_ai.models.result_repository import ResultRepository
 from manual_ai.models.event_repository import EventRepository
+from manual_ai.services.pdf_report_cache import PdfReportCache
+from services.fair_slots import FairSlotPool
 
 logger = logging.getLogger(__name__)
 
+# Proyectos analizados a la vez por el cron (1 = secuencial) y presupuesto
+# global de keywords en vuelo entre todos ellos, repartido por turnos entre
+# usuarios. El límite de llamadas simultáneas a SerpAPI lo sigue poniendo el
+# cliente compartido de quota_middleware (SERPAPI_MAX_CONCURRENCY).
+MANUAL_AI_CRON_PROJECT_WORKERS = max(1, int(os.getenv('MANUAL_AI_CRON_PROJECT_WORKERS', '4')))
+MANUAL_AI_CRON_KEYWORD_SLOTS = max(1, int(os.getenv('MANUAL_AI_CRON_KEYWORD_SLOTS', '16')))
+
 
 class CronService:
     """Servicio para ejecutar análisis diario automático de todos los proyectos"""
@@ -130,6 +142,10 @@ class CronService:
             lock_cur.execute("SELECT pg_advisory_unlock(%s, %s)", (lock_class_id, lock_object_id))
             lock_cur.close()
             lock_conn.close()
+
+            # Pre-renderizar los PDF que los usuarios de estos proyectos
+            # descargan con regularidad (ya con los datos de hoy)
+            prerendered_pdfs = self._prerender_pdf_reports(stats['analyzed_project_ids'])
             
             elapsed_time = time.time() - started_at
             
@@ -141,6 +157,8 @@ class CronService:
                 "failed": stats['failed'],
                 "skipped": stats['skipped'],
                 "total_keywords": stats['total_keywords'],
+                "max_queue_wait_sec": stats['max_queue_wait_seconds'],
+                "prerendered_pdfs": prerendered_pdfs,
                 "elapsed_sec": round(elapsed_time, 2)
             }))
             
@@ -151,6 +169,8 @@ class CronService:
                 "failed": stats['failed'],
                 "skipped": stats['skipped'],
                 "total_keywords": stats['total_keywords'],
+                "max_queue_wait_seconds": stats['max_queue_wait_seconds'],
+                "prerendered_pdfs": prerendered_pdfs,
                 "elapsed_seconds": round(elapsed_time, 2)
             }
             self._send_completion_email(result)
@@ -176,6 +196,15 @@ class CronService:
             self._send_completion_email(result)
             return result
 
+    @staticmethod
+    def _prerender_pdf_reports(project_ids):
+        """Pre-renderiza los PDF de los proyectos analizados. Nunca afecta al run."""
+        try:
+            return PdfReportCache.prerender_for_projects(project_ids)
+        except Exception as e:
+            logger.warning(f"PDF pre-render failed (non-fatal): {e}")
+            return 0
+
     @staticmethod
     def _send_completion_email(stats):
         """Email de resumen del run (OK/WARNING/CRITICAL). Nunca afecta al run."""
@@ -244,129 +273,147 @@ class CronService:
         return projects
     
     def _process_projects(self, projects):
-        """Procesar lista de proyectos"""
+        """
+        Procesar lista de proyectos.
+
+        El estado de usuario (plan/facturación) y la ventana de frecuencia de
+        todos los proyectos se leen en una sola consulta. Los proyectos
+        pendientes se ordenan por turnos entre usuarios y se ejecutan en
+        paralelo (MANUAL_AI_CRON_PROJECT_WORKERS); todas sus keywords comparten
+        un presupuesto global de keywords en vuelo (MANUAL_AI_CRON_KEYWORD_SLOTS)
+        que también se reparte por turnos entre usuarios.
+        """
         successful_analyses = 0
         failed_analyses = 0
         skipped_analyses = 0
         total_keywords_processed = 0
-        
+
+        project_dicts = []
         for project in projects:
             # Convertir a dict si es necesario
             if isinstance(project, (tuple, list)):
-                project_dict = {
+                project_dicts.append({
                     'id': project[0],
                     'name': project[1],
                     'domain': project[2],
                     'country_code': project[3],
                     'user_id': project[4],
                     'keyword_count': project[5]
-                }
+                })
+            else:
+                project_dicts.append(dict(project))
+
+        states = self._prefetch_project_state([p['id'] for p in project_dicts])
+        if states is None:
+            logger.error("❌ No se pudo leer el estado de los proyectos; run abortado")
+            return {
+                'successful': 0,
+                'failed': len(project_dicts),
+                'skipped': 0,
+                'total_keywords': 0,
+                'max_queue_wait_seconds': 0.0,
+                'analyzed_project_ids': []
+            }
+
+        runnable = []
+        for project_dict in project_dicts:
+            state = states.get(project_dict['id'])
+            if not state:
+                logger.info(f"⏭️ Skipping project {project_dict['id']}: no longer eligible")
+                skipped_analyses += 1
+                continue
+
+            user_plan = state['plan']
+            user_billing = state['billing_status']
+            if user_plan == 'free' or user_billing in ('canceled',):
+                logger.info(f"⏭️ Skipping project {project_dict['id']} due to user "
+                          f"plan/billing status (plan={user_plan}, billing={user_billing})")
+                skipped_analyses += 1
+                continue
+
+            if state['existing_results'] > 0:
+                logger.info(f"⏭️ Project {project_dict['id']} ({project_dict['name']}) "
+                          f"already analyzed within last {state['frequency_days']} day(s) "
+                          f"with {state['existing_results']} results, skipping")
+                skipped_analyses += 1
+                continue
+
+            runnable.append(project_dict)
+
+        queue = self._interleave_by_user(runnable)
+        keyword_slots = FairSlotPool(MANUAL_AI_CRON_KEYWORD_SLOTS)
+        workers = max(1, min(MANUAL_AI_CRON_PROJECT_WORKERS, len(queue) or 1))
+        logger.info(f"🧵 {len(queue)} projects to analyze with {workers} project workers and "
+                    f"{keyword_slots.capacity} shared keyword slots")
+
+        queued_at = time.monotonic()
+        outcomes = []
+        if workers <= 1:
+            outcomes = [self._run_project(p, queued_at, keyword_slots) for p in queue]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='manual-ai-cron') as executor:
+                futures = [executor.submit(self._run_project, p, queued_at, keyword_slots) for p in queue]
+                outcomes = [future.result() for future in futures]
+
+        # Proyectos aplazados porque otro proyecto del mismo usuario retenía su
+        # cuota: se reintentan en secuencia cuando ya se han liquidado todas
+        # las reservas. Si siguen sin cuota libre, se omiten hasta el siguiente run.
+        deferred = [outcome['project_id'] for outcome in outcomes if outcome.get('quota_busy')]
+        if deferred:
+            logger.info(f"🔁 Retrying {len(deferred)} projects deferred by quota held by other runs")
+            by_id = {p['id']: p for p in queue}
+            outcomes = [outcome for outcome in outcomes if not outcome.get('quota_busy')] + [
+                self._run_project(by_id[project_id], queued_at, keyword_slots) for project_id in deferred
+            ]
+
+        for outcome in outcomes:
+            if outcome['success']:
+                successful_analyses += 1
+                total_keywords_processed += outcome['keywords']
+            elif outcome.get('quota_busy'):
+                skipped_analyses += 1
+            else:
+                failed_analyses += 1
+
+        return {
+            'successful': successful_analyses,
+            'failed': failed_analyses,
+            'skipped': skipped_analyses,
+            'total_keywords': total_keywords_processed,
+            'max_queue_wait_seconds': max((o['queue_wait_sec'] for o in outcomes), default=0.0),
+            'analyzed_project_ids': [o['project_id'] for o in outcomes if o['success']]
+        }
+
+    def _run_project(self, project_dict, queued_at, keyword_slots):
+        """Analizar un proyecto del cron (snapshot + evento). Nunca lanza."""
+        started = time.monotonic()
+        queue_wait = round(started - queued_at, 2)
+        outcome = {'project_id': project_dict['id'], 'success': False, 'keywords': 0,
+                   'queue_wait_sec': queue_wait}
+        try:
+            logger.info(f"🚀 Starting daily analysis for project {project_dict['id']} "
+                      f"({project_dict['name']}) - {project_dict['keyword_count']} keywords")
+
+            # Ejecutar análisis automático (sin sobreescritura)
+            results = self.analysis_service.run_project_analysis(
+                project_dict['id'],
+                force_overwrite=False,
+                user_id=project_dict['user_id'],
+                keyword_slots=keyword_slots
+            )
+
+            if isinstance(results, dict) and results.get('quota_busy'):
+                # La cuota del usuario la retiene otro de sus proyectos en curso
+                logger.info(f"⏳ Project {project_dict['id']}: quota held by other runs, deferred")
+                outcome['quota_busy'] = True
             else:
-                project_dict = dict(project)
-            
-            try:
-                # Verificar estado del usuario
-                conn = get_db_connection()
-                if not conn:
-                    raise Exception("No se pudo conectar a BD")
-
-                cur = None
-                existing_results = 0
-                user_plan = 'free'
-                user_billing = ''
-                try:
-                    cur = conn.cursor()
-                    today = date.today()
-
-                    # Verificar plan y facturación
-                    cur.execute("""
-                        SELECT COALESCE(plan, 'free') AS plan,
-                               COALESCE(billing_status, '') AS billing_status
-                        FROM users
-                        WHERE id = %s
-                    """, (project_dict['user_id'],))
-
-                    user_state = cur.fetchone() or {}
-                    user_plan = user_state.get('plan', 'free') if isinstance(user_state, dict) else (
-                        user_state[0] if user_state else 'free'
-                    )
-                    user_billing = user_state.get('billing_status', '') if isinstance(user_state, dict) else (
-                        user_state[1] if user_state and len(user_state) > 1 else ''
-                    )
-
-                    if user_plan == 'free' or user_billing in ('canceled',):
-                        logger.info(f"⏭️ Skipping project {project_dict['id']} due to user "
-                                  f"plan/billing status (plan={user_plan}, billing={user_billing})")
-                        skipped_analyses += 1
-                        continue  # inner finally closes conn before continuing the outer for
-
-                    # Frecuencia de análisis del proyecto (1 = cada tick del cron,
-                    # 7 = semanal). Fallback a 1 si la migración no ha corrido.
-                    frequency_days = 1
-                    try:
-                        cur.execute("""
-                            SELECT COALESCE(analysis_frequency_days, 1) AS freq
-                            FROM manual_ai_projects
-                            WHERE id = %s
-                        """, (project_dict['id'],))
-                        freq_row = cur.fetchone()
-                        if freq_row:
-                            freq_value = freq_row['freq'] if isinstance(freq_row, dict) else freq_row[0]
-                            frequency_days = max(int(freq_value or 1), 1)
-                    except Exception:
-                        conn.rollback()
-                        frequency_days = 1
-
-                    # Verificar si ya hay resultados dentro de la ventana de frecuencia
-                    cur.execute("""
-                        SELECT COUNT(*) as count
-                        FROM manual_ai_results
-                        WHERE project_id = %s AND analysis_date > %s - %s::integer
-                    """, (project_dict['id'], today, frequency_days))
-
-                    result_row = cur.fetchone()
-                    existing_results = result_row['count'] if result_row else 0
-                finally:
-                    # Always return the pooled connection — previously the
-                    # outer except (failed_analyses += 1; continue) leaked
-                    # conn whenever cur.execute or fetch raised, contributing
-                    # to the 2026-05-14 pool exhaustion incident.
-                    if cur is not None:
-                        try:
-                            cur.close()
-                        except Exception:
-                            pass
-                    try:
-                        conn.close()
-                    except Exception:
-                        pass
-
-                if existing_results > 0:
-                    logger.info(f"⏭️ Project {project_dict['id']} ({project_dict['name']}) "
-                              f"already analyzed within last {frequency_days} day(s) "
-                              f"with {existing_results} results, skipping")
-                    skipped_analyses += 1
-                    continue
-                
-                logger.info(f"🚀 Starting daily analysis for project {project_dict['id']} "
-                          f"({project_dict['name']}) - {project_dict['keyword_count']} keywords")
-                
-                # Ejecutar análisis automático (sin sobreescritura)
-                results = self.analysis_service.run_project_analysis(
-                    project_dict['id'],
-                    force_overwrite=False,
-                    user_id=project_dict['user_id']
-                )
-                
-                total_keywords_processed += len(results)
-                
                 # Crear snapshot diario
                 self.result_repo.create_snapshot(
                     project_id=project_dict['id'],
-                    snapshot_date=today,
+                    snapshot_date=date.today(),
                     metrics=self._calculate_snapshot_metrics(project_dict['id'])
                 )
-                
+
                 # Crear evento
                 self.event_repo.create_event(
                     project_id=project_dict['id'],
@@ -375,23 +422,115 @@ class CronService:
                     keywords_affected=len(results),
                     user_id=project_dict['user_id']
                 )
-                
+
                 logger.info(f"✅ Completed daily analysis for project {project_dict['id']}: "
                           f"{len(results)} keywords processed")
-                successful_analyses += 1
-                
-            except Exception as e:
-                logger.error(f"❌ Error analyzing project {project_dict['id']}: {e}")
-                failed_analyses += 1
-                continue
-        
-        return {
-            'successful': successful_analyses,
-            'failed': failed_analyses,
-            'skipped': skipped_analyses,
-            'total_keywords': total_keywords_processed
-        }
-    
+                outcome.update(success=True, keywords=len(results))
+
+        except Exception as e:
+            logger.error(f"❌ Error analyzing project {project_dict['id']}: {e}")
+
+        outcome['run_sec'] = round(time.monotonic() - started, 2)
+        logger.info(json.dumps({
+            "event": "cron_project_done",
+            "project_id": project_dict['id'],
+            "user_id": project_dict['user_id'],
+            "success": outcome['success'],
+            "keywords": outcome['keywords'],
+            "queue_wait_sec": outcome['queue_wait_sec'],
+            "run_sec": outcome['run_sec']
+        }))
+        return outcome
+
+    @staticmethod
+    def _interleave_by_user(projects):
+        """
+        Ordenar los proyectos por turnos entre usuarios (uno de cada usuario
+        por vuelta; dentro de cada usuario, los más pequeños primero), para
+        que un cliente con muchos proyectos no retrase a los demás.
+        """
+        by_user = OrderedDict()
+        for project in sorted(projects, key=lambda p: (p['keyword_count'], p['id'])):
+            by_user.setdefault(project['user_id'], deque()).append(project)
+
+        ordered = []
+        while by_user:
+            for user_id in list(by_user):
+                ordered.append(by_user[user_id].popleft())
+                if not by_user[user_id]:
+                    del by_user[user_id]
+        return ordered
+
+    def _prefetch_project_state(self, project_ids):
+        """
+        Plan/facturación del usuario, frecuencia de análisis y resultados ya
+        existentes dentro de esa ventana, para todos los proyectos en una
+        consulta. Devuelve {project_id: estado} o None si falla la BD.
+        """
+        if not project_ids:
+            return {}
+
+        conn = get_db_connection()
+        if not conn:
+            return None
+
+        cur = None
+        today = date.today()
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    SELECT p.id,
+                           COALESCE(u.plan, 'free') AS plan,
+                           COALESCE(u.billing_status, '') AS billing_status,
+                           GREATEST(COALESCE(p.analysis_frequency_days, 1), 1) AS frequency_days,
+                           (SELECT COUNT(*) FROM manual_ai_results r
+                            WHERE r.project_id = p.id
+                              AND r.analysis_date > %s - GREATEST(COALESCE(p.analysis_frequency_days, 1), 1)
+                           ) AS existing_results
+                    FROM manual_ai_projects p
+                    JOIN users u ON u.id = p.user_id
+                    WHERE p.id = ANY(%s)
+                """, (today, list(project_ids)))
+            except Exception:
+                # Frecuencia por proyecto no migrada: ventana de 1 día
+                conn.rollback()
+                cur.execute("""
+                    SELECT p.id,
+                           COALESCE(u.plan, 'free') AS plan,
+                           COALESCE(u.billing_status, '') AS billing_status,
+                           1 AS frequency_days,
+                           (SELECT COUNT(*) FROM manual_ai_results r
+                            WHERE r.project_id = p.id AND r.analysis_date > %s - 1
+                           ) AS existing_results
+                    FROM manual_ai_projects p
+                    JOIN users u ON u.id = p.user_id
+                    WHERE p.id = ANY(%s)
+                """, (today, list(project_ids)))
+
+            return {
+                row['id']: {
+                    'plan': row['plan'],
+                    'billing_status': row['billing_status'],
+                    'frequency_days': int(row['frequency_days'] or 1),
+                    'existing_results': int(row['existing_results'] or 0),
+                }
+                for row in cur.fetchall()
+            }
+        except Exception as e:
+            logger.error(f"❌ Error prefetching Manual AI project state: {e}")
+            return None
+        finally:
+            if cur is not None:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     def _calculate_snapshot_metrics(self, project_id: int) -> dict:
         """Calcular métricas para snapshot diario"""
         conn = get_db_connection()
@@ -3,8 +3,10 @@ Servicio para gestión de dominios globales detectados en AI Overview
 """
 
 import logging
+from collections import defaultdict
 from datetime import date
-from typing import Dict, List
+from typing import Dict, Iterable, List
+from psycopg2.extras import execute_values
 from database import get_db_connection
 from services.utils import normalize_search_console_url
 from manual_ai.utils.helpers import extract_domain_from_url
@@ -37,10 +39,17 @@ class DomainsService:
             country_code: Código de país
             selected_competitors: Lista de competidores seleccionados
         """
+        rows = DomainsService.build_global_domain_rows(
+            project_id, keyword_id, keyword, project_domain, ai_analysis_data,
+            analysis_date, country_code, selected_competitors
+        )
+        if not rows:
+            logger.debug(f"No references found in AI Overview for keyword '{keyword}' in project {project_id}")
+
         # Refactor 2026-05-25: explicit conn=None + try/except/finally so the
         # connection is GUARANTEED to return to the pool even on early return
-        # (no references_found) or any inner exception. Previous code closed
-        # conn only on the success path.
+        # or any inner exception. Previous code closed conn only on the
+        # success path.
         conn = None
         try:
             conn = get_db_connection()
@@ -48,81 +57,10 @@ class DomainsService:
                 logger.error(f"store_global_domains_detected({project_id}/{keyword_id}): no DB connection")
                 return
             cur = conn.cursor()
-
-            # Limpiar datos existentes del día para evitar duplicados
-            cur.execute("""
-                DELETE FROM manual_ai_global_domains
-                WHERE project_id = %s AND keyword_id = %s AND analysis_date = %s
-            """, (project_id, keyword_id, analysis_date))
-
-            # Extraer todos los dominios de debug_info.references_found
-            debug_info = ai_analysis_data.get('debug_info', {})
-            references_found = debug_info.get('references_found', [])
-
-            if not references_found:
-                logger.debug(f"No references found in AI Overview for keyword '{keyword}' in project {project_id}")
-                return
-
-            # Normalizar dominio del proyecto y competidores para comparación
-            normalized_project_domain = normalize_search_console_url(project_domain) or project_domain.lower()
-            normalized_competitors = [
-                normalize_search_console_url(comp) or comp.lower()
-                for comp in (selected_competitors or [])
-            ]
-
-            domains_stored = 0
-
-            for ref in references_found:
-                ref_link = ref.get('link', '')
-                ref_index = ref.get('index', 0)
-                ref_title = ref.get('title', '')
-                ref_source = ref.get('source', '')
-
-                if not ref_link:
-                    continue
-
-                # Extraer dominio de la URL
-                detected_domain = extract_domain_from_url(ref_link)
-                if not detected_domain:
-                    continue
-
-                # Determinar flags
-                is_project_domain = (detected_domain == normalized_project_domain)
-                is_selected_competitor = (detected_domain in normalized_competitors)
-
-                # Posición en AI Overview (index + 1 porque SERPAPI usa índice 0-based)
-                domain_position = ref_index + 1 if ref_index is not None else 1
-
-                try:
-                    # Insertar dominio detectado
-                    cur.execute("""
-                        INSERT INTO manual_ai_global_domains (
-                            project_id, keyword_id, analysis_date, keyword, project_domain,
-                            detected_domain, domain_position, domain_title, domain_source_url,
-                            country_code, is_project_domain, is_selected_competitor
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (project_id, keyword_id, analysis_date, detected_domain)
-                        DO UPDATE SET
-                            domain_position = EXCLUDED.domain_position,
-                            domain_title = EXCLUDED.domain_title,
-                            domain_source_url = EXCLUDED.domain_source_url,
-                            is_project_domain = EXCLUDED.is_project_domain,
-                            is_selected_competitor = EXCLUDED.is_selected_competitor
-                    """, (
-                        project_id, keyword_id, analysis_date, keyword, project_domain,
-                        detected_domain, domain_position, ref_title, ref_link,
-                        country_code, is_project_domain, is_selected_competitor
-                    ))
-
-                    domains_stored += 1
-
-                except Exception as insert_error:
-                    logger.warning(f"Error storing domain '{detected_domain}' for keyword '{keyword}': {insert_error}")
-                    continue
-
+            DomainsService.replace_global_domains(cur, rows, keywords=[(project_id, keyword_id, analysis_date)])
             conn.commit()
 
-            logger.debug(f"✅ Stored {domains_stored} global domains for keyword '{keyword}' in project {project_id}")
+            logger.debug(f"✅ Stored {len(rows)} global domains for keyword '{keyword}' in project {project_id}")
 
         except Exception as e:
             logger.error(f"❌ Error storing global domains for keyword '{keyword}' in project {project_id}: {e}")
@@ -134,3 +72,97 @@ class DomainsService:
                 except Exception:
                     pass
 
+    @staticmethod
+    def build_global_domain_rows(project_id: int, keyword_id: int, keyword: str,
+                                 project_domain: str, ai_analysis_data: Dict,
+                                 analysis_date: date, country_code: str,
+                                 selected_competitors: List[str]) -> List[tuple]:
+        """
+        Filas de `manual_ai_global_domains` para los dominios de
+        `debug_info.references_found` (mismos argumentos que
+        `store_global_domains_detected`). No toca la BD.
+        """
+        # Extraer todos los dominios de debug_info.references_found
+        debug_info = ai_analysis_data.get('debug_info', {})
+        references_found = debug_info.get('references_found', [])
+
+        if not references_found:
+            return []
+
+        # Normalizar dominio del proyecto y competidores para comparación
+        normalized_project_domain = normalize_search_console_url(project_domain) or project_domain.lower()
+        normalized_competitors = [
+            normalize_search_console_url(comp) or comp.lower()
+            for comp in (selected_competitors or [])
+        ]
+
+        rows = []
+        for ref in references_found:
+            ref_link = ref.get('link', '')
+            ref_index = ref.get('index', 0)
+            ref_title = ref.get('title', '')
+
+            if not ref_link:
+                continue
+
+            # Extraer dominio de la URL
+            detected_domain = extract_domain_from_url(ref_link)
+            if not detected_domain:
+                continue
+
+            # Determinar flags
+            is_project_domain = (detected_domain == normalized_project_domain)
+            is_selected_competitor = (detected_domain in normalized_competitors)
+
+            # Posición en AI Overview (index + 1 porque SERPAPI usa índice 0-based)
+            domain_position = ref_index + 1 if ref_index is not None else 1
+
+            rows.append((
+                project_id, keyword_id, analysis_date, keyword, project_domain,
+                detected_domain, domain_position, ref_title, ref_link,
+                country_code, is_project_domain, is_selected_competitor
+            ))
+        return rows
+
+    @staticmethod
+    def replace_global_domains(cur, rows: List[tuple], keywords: Iterable[tuple] = ()) -> None:
+        """
+        Sustituir (sin commit) los dominios del día de las keywords presentes en
+        `rows` (salida de `build_global_domain_rows`, de una o varias keywords)
+        y de las de `keywords` (`(project_id, keyword_id, analysis_date)`), que
+        se limpian aunque hoy no tengan referencias: un DELETE por proyecto/día
+        y un único INSERT multi-fila.
+        """
+        keyword_ids = defaultdict(set)
+        for project_id, keyword_id, analysis_date in keywords:
+            keyword_ids[(project_id, analysis_date)].add(keyword_id)
+        # Un mismo dominio citado dos veces en una keyword: gana la última
+        # referencia, como hacía el upsert fila a fila.
+        unique_rows = {}
+        for row in rows:
+            keyword_ids[(row[0], row[2])].add(row[1])
+            unique_rows[(row[0], row[1], row[2], row[5])] = row
+
+        # Limpiar datos existentes del día para evitar duplicados
+        for (project_id, analysis_date), ids in keyword_ids.items():
+            cur.execute("""
+                DELETE FROM manual_ai_global_domains
+                WHERE project_id = %s AND analysis_date = %s AND keyword_id = ANY(%s)
+            """, (project_id, analysis_date, sorted(ids)))
+
+        if not unique_rows:
+            return
+        execute_values(cur, """
+            INSERT INTO manual_ai_global_domains (
+                project_id, keyword_id, analysis_date, keyword, project_domain,
+                detected_domain, domain_position, domain_title, domain_source_url,
+                country_code, is_project_domain, is_selected_competitor
+            ) VALUES %s
+            ON CONFLICT (project_id, keyword_id, analysis_date, detected_domain)
+            DO UPDATE SET
+                domain_position = EXCLUDED.domain_position,
+                domain_title = EXCLUDED.domain_title,
+                domain_source_url = EXCLUDED.domain_source_url,
+                is_project_domain = EXCLUDED.is_project_domain,
+                is_selected_competitor = EXCLUDED.is_selected_competitor
+        """, list(unique_rows.values()))
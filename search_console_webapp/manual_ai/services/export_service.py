@@ -9,6 +9,7 @@ from io import BytesIO
 from datetime import datetime, date, timedelta
 from typing import Dict, Optional
 from database import get_db_connection
+from services.cluster_classifier import get_cluster_classifier
 
 logger = logging.getLogger(__name__)
 
@@ -692,6 +693,7 @@ class ExportService:
             
             # Clasificar keywords en clusters
             rows = []
+            classifier = get_cluster_classifier(clusters_config)
             for kw_data in keywords_data:
                 keyword = kw_data['keyword']
                 domain_mentioned = 'Yes' if kw_data.get('domain_mentioned') else 'No'
@@ -699,7 +701,7 @@ class ExportService:
                 last_analysis_str = str(last_analysis) if last_analysis else 'Never'
                 
                 # Clasificar keyword
-                matching_clusters = ClusterService.classify_keyword(keyword, clusters_config)
+                matching_clusters = classifier.classify(keyword)
                 
                 if matching_clusters:
                     # Añadir una fila por cada cluster al que pertenece
@@ -0,0 +1,443 @@
+"""
+Caché y generación en segundo plano del PDF de Manual AI
+
+ManualAiPdfExportService.generate_project_pdf lee todas las estadísticas y
+dibuja las gráficas con ReportLab: varios segundos por informe, dentro de la
+petición. Este módulo lo saca de la petición:
+
+- El PDF generado se guarda en `manual_ai_pdf_reports`, una fila por
+  (proyecto, días) con la huella de los datos con que se generó: fecha del
+  último análisis, número de resultados, `updated_at` del proyecto (clusters,
+  competidores) y día de generación (la ventana de días es relativa a hoy).
+  Mientras la huella no cambia, las descargas repetidas salen de la tabla sin
+  tocar ReportLab.
+- Si no hay PDF vigente, se genera en un executor propio
+  (MANUAL_AI_PDF_WORKERS). Una sola generación por (proyecto, días) en el
+  proceso, y entre workers la fila hace de reserva (`status = 'rendering'`).
+  La ruta espera hasta MANUAL_AI_PDF_WAIT_SECONDS; si aún no está, responde 202
+  y el navegador reintenta la misma URL.
+- Tras el análisis nocturno, el cron regenera los informes de los proyectos
+  cuyos usuarios exportan con regularidad (al menos
+  MANUAL_AI_PDF_PRERENDER_MIN_EXPORTS descargas, la última en los últimos
+  MANUAL_AI_PDF_PRERENDER_WINDOW_DAYS días), con los mismos días que pidieron.
+  Solo cuenta como descarga la petición que entrega el PDF, no los 202.
+
+Activación: MANUAL_AI_PDF_CACHE_ENABLED (por defecto true). Con false la ruta
+genera el PDF en la petición como antes.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+MANUAL_AI_PDF_CACHE_ENABLED = os.getenv('MANUAL_AI_PDF_CACHE_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+MANUAL_AI_PDF_WORKERS = max(1, int(os.getenv('MANUAL_AI_PDF_WORKERS', '2')))
+MANUAL_AI_PDF_WAIT_SECONDS = float(os.getenv('MANUAL_AI_PDF_WAIT_SECONDS', '20'))
+MANUAL_AI_PDF_PRERENDER_MIN_EXPORTS = int(os.getenv('MANUAL_AI_PDF_PRERENDER_MIN_EXPORTS', '2'))
+MANUAL_AI_PDF_PRERENDER_WINDOW_DAYS = int(os.getenv('MANUAL_AI_PDF_PRERENDER_WINDOW_DAYS', '30'))
+
+# Una reserva 'rendering' más antigua que esto se considera abandonada
+# (worker reiniciado a mitad de generación)
+_RENDER_STALE_SECONDS = 600
+_POLL_SECONDS = 1.0
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+_executor = ThreadPoolExecutor(max_workers=MANUAL_AI_PDF_WORKERS, thread_name_prefix='manual-ai-pdf')
+_inflight = {}                  # (project_id, days) -> Future
+_inflight_lock = threading.Lock()
+
+
+class PdfReportCache:
+    """Caché de informes PDF de Manual AI"""
+
+    @staticmethod
+    def ensure_pdf_cache_table() -> bool:
+        """Crea la tabla de informes PDF (idempotente)."""
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS manual_ai_pdf_reports (
+                    project_id INTEGER NOT NULL REFERENCES manual_ai_projects(id) ON DELETE CASCADE,
+                    days INTEGER NOT NULL,
+                    fingerprint VARCHAR(128),
+                    last_analysis_date DATE,
+                    status VARCHAR(16) NOT NULL DEFAULT 'empty',
+                    pdf BYTEA,
+                    size_bytes INTEGER,
+                    error TEXT,
+                    render_started_at TIMESTAMP,
+                    generated_at TIMESTAMP,
+                    request_count INTEGER NOT NULL DEFAULT 0,
+                    last_requested_at TIMESTAMP,
+                    PRIMARY KEY (project_id, days)
+                )
+            """)
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error creando la tabla manual_ai_pdf_reports: {e}")
+            return False
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _ensure_schema_once() -> bool:
+        global _schema_ready
+        if _schema_ready:
+            return True
+        with _schema_lock:
+            if not _schema_ready:
+                _schema_ready = PdfReportCache.ensure_pdf_cache_table()
+        return _schema_ready
+
+    # ================================
+    # Huella de los datos
+    # ================================
+
+    @staticmethod
+    def _fingerprint(cur, project_id: int) -> Tuple[Optional[date], Optional[str]]:
+        """(fecha del último análisis, huella) del proyecto; (None, None) si no existe."""
+        cur.execute("""
+            SELECT p.updated_at,
+                   MAX(r.analysis_date) AS last_analysis_date,
+                   COUNT(r.id) AS results
+            FROM manual_ai_projects p
+            LEFT JOIN manual_ai_results r ON r.project_id = p.id
+            WHERE p.id = %s
+            GROUP BY p.id, p.updated_at
+        """, (project_id,))
+        row = cur.fetchone()
+        if not row:
+            return None, None
+        updated_at = row['updated_at'].isoformat() if row['updated_at'] else ''
+        fingerprint = f"{date.today().isoformat()}|{row['last_analysis_date']}|{row['results']}|{updated_at}"
+        return row['last_analysis_date'], fingerprint
+
+    # ================================
+    # Descarga
+    # ================================
+
+    @staticmethod
+    def request_pdf(project_id: int, days: int,
+                    wait_seconds: Optional[float] = None) -> Tuple[str, Optional[bytes]]:
+        """
+        PDF del proyecto para una descarga: ('ready', bytes) o ('pending', None)
+        si la generación sigue en curso tras `wait_seconds`.
+
+        Solo cuenta como descarga (para el pre-renderizado nocturno) la petición
+        que entrega el PDF: los reintentos del navegador mientras se genera
+        responden 'pending' y no suman. Los errores de la generación se
+        propagan (ValueError si el proyecto no existe, ImportError sin ReportLab).
+        """
+        if wait_seconds is None:
+            wait_seconds = MANUAL_AI_PDF_WAIT_SECONDS
+        if not PdfReportCache._ensure_schema_once():
+            raise RuntimeError('manual_ai_pdf_reports no disponible')
+
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError('No DB connection')
+        try:
+            cur = conn.cursor()
+            _, fingerprint = PdfReportCache._fingerprint(cur, project_id)
+            if fingerprint is None:
+                raise ValueError(f"Project {project_id} not found")
+            cur.execute("""
+                SELECT status, fingerprint, pdf
+                FROM manual_ai_pdf_reports
+                WHERE project_id = %s AND days = %s
+            """, (project_id, days))
+            row = cur.fetchone()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+        if row and row['status'] == 'ready' and row['fingerprint'] == fingerprint and row['pdf'] is not None:
+            logger.info(f"[PDF Cache] Hit for project {project_id}, days={days}")
+            PdfReportCache._record_download(project_id, days)
+            return 'ready', bytes(row['pdf'])
+
+        key = (project_id, days)
+        future = PdfReportCache.submit_render(project_id, days)
+        try:
+            pdf_bytes = future.result(timeout=max(0.0, wait_seconds))
+        except FutureTimeoutError:
+            logger.info(f"[PDF Cache] Render still running for project {project_id}, days={days}")
+            return 'pending', None
+        except Exception:
+            # El error se entrega una vez; la siguiente descarga vuelve a intentarlo
+            with _inflight_lock:
+                if _inflight.get(key) is future:
+                    _inflight.pop(key, None)
+            raise
+        PdfReportCache._record_download(project_id, days)
+        return 'ready', pdf_bytes
+
+    @staticmethod
+    def _record_download(project_id: int, days: int) -> None:
+        """Suma una descarga servida de (proyecto, días). Nunca lanza."""
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO manual_ai_pdf_reports (project_id, days, request_count, last_requested_at)
+                VALUES (%s, %s, 1, NOW())
+                ON CONFLICT (project_id, days) DO UPDATE
+                SET request_count = manual_ai_pdf_reports.request_count + 1,
+                    last_requested_at = NOW()
+            """, (project_id, days))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"[PDF Cache] Could not record download for project {project_id}, days={days}: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def submit_render(project_id: int, days: int):
+        """Encola la generación de (proyecto, días); reutiliza la que esté en curso."""
+        key = (project_id, days)
+        with _inflight_lock:
+            future = _inflight.get(key)
+            if future is not None:
+                return future
+            future = _executor.submit(PdfReportCache.render, project_id, days)
+            _inflight[key] = future
+
+        def _forget(done):
+            # Los fallos se quedan para que el siguiente sondeo reciba el error
+            if done.exception() is None:
+                with _inflight_lock:
+                    if _inflight.get(key) is done:
+                        _inflight.pop(key, None)
+
+        future.add_done_callback(_forget)
+        return future
+
+    # ================================
+    # Generación
+    # ================================
+
+    @staticmethod
+    def _claim(project_id: int, days: int):
+        """
+        Reserva la generación de (proyecto, días) para la huella actual.
+
+        Returns:
+            ('ready', bytes) si ya hay un PDF vigente, ('claimed', huella) si la
+            reserva es nuestra o ('busy', huella) si otro worker está generando.
+        """
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError('No DB connection')
+        try:
+            cur = conn.cursor()
+            last_analysis_date, fingerprint = PdfReportCache._fingerprint(cur, project_id)
+            if fingerprint is None:
+                raise ValueError(f"Project {project_id} not found")
+            cur.execute("""
+                SELECT status, fingerprint, pdf
+                FROM manual_ai_pdf_reports
+                WHERE project_id = %s AND days = %s
+            """, (project_id, days))
+            row = cur.fetchone()
+            if row and row['status'] == 'ready' and row['fingerprint'] == fingerprint and row['pdf'] is not None:
+                return 'ready', bytes(row['pdf'])
+
+            cur.execute("""
+                INSERT INTO manual_ai_pdf_reports
+                    (project_id, days, fingerprint, last_analysis_date, status, render_started_at)
+                VALUES (%s, %s, %s, %s, 'rendering', NOW())
+                ON CONFLICT (project_id, days) DO UPDATE
+                SET fingerprint = EXCLUDED.fingerprint,
+                    last_analysis_date = EXCLUDED.last_analysis_date,
+                    status = 'rendering',
+                    error = NULL,
+                    render_started_at = NOW()
+                WHERE NOT (manual_ai_pdf_reports.status = 'rendering'
+                           AND manual_ai_pdf_reports.fingerprint = EXCLUDED.fingerprint
+                           AND manual_ai_pdf_reports.render_started_at > NOW() - make_interval(secs => %s))
+                RETURNING project_id
+            """, (project_id, days, fingerprint, last_analysis_date, _RENDER_STALE_SECONDS))
+            claimed = cur.fetchone() is not None
+            conn.commit()
+            return ('claimed' if claimed else 'busy'), fingerprint
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _wait_for_other_worker(project_id: int, days: int, fingerprint: str) -> Optional[bytes]:
+        """Sondea la fila mientras otro worker genera el mismo informe."""
+        deadline = time.monotonic() + _RENDER_STALE_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(_POLL_SECONDS)
+            conn = get_db_connection()
+            if not conn:
+                return None
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT status, fingerprint, pdf
+                    FROM manual_ai_pdf_reports
+                    WHERE project_id = %s AND days = %s
+                """, (project_id, days))
+                row = cur.fetchone()
+            finally:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            if not row or row['fingerprint'] != fingerprint:
+                return None
+            if row['status'] == 'ready' and row['pdf'] is not None:
+                return bytes(row['pdf'])
+            if row['status'] != 'rendering':
+                return None
+        return None
+
+    @staticmethod
+    def _store(project_id: int, days: int, fingerprint: str, pdf_bytes: Optional[bytes] = None,
+               error: Optional[str] = None) -> None:
+        """Guarda el PDF generado (o el error) si la reserva sigue siendo de esa huella."""
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            cur = conn.cursor()
+            if error is None:
+                cur.execute("""
+                    UPDATE manual_ai_pdf_reports
+                    SET status = 'ready', pdf = %s, size_bytes = %s, error = NULL, generated_at = NOW()
+                    WHERE project_id = %s AND days = %s AND fingerprint = %s
+                """, (pdf_bytes, len(pdf_bytes), project_id, days, fingerprint))
+            else:
+                cur.execute("""
+                    UPDATE manual_ai_pdf_reports
+                    SET status = 'error', error = %s
+                    WHERE project_id = %s AND days = %s AND fingerprint = %s
+                """, (error[:1000], project_id, days, fingerprint))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"[PDF Cache] Error storing report for project {project_id}, days={days}: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def render(project_id: int, days: int) -> bytes:
+        """Genera (o recupera) el PDF vigente de (proyecto, días) y lo guarda en la caché."""
+        from manual_ai.services.pdf_export_service import ManualAiPdfExportService
+
+        status, value = PdfReportCache._claim(project_id, days)
+        if status == 'ready':
+            return value
+        fingerprint = value
+        if status == 'busy':
+            pdf_bytes = PdfReportCache._wait_for_other_worker(project_id, days, fingerprint)
+            if pdf_bytes is not None:
+                return pdf_bytes
+            status, value = PdfReportCache._claim(project_id, days)
+            if status == 'ready':
+                return value
+            fingerprint = value
+
+        started = time.monotonic()
+        try:
+            pdf_bytes = ManualAiPdfExportService.generate_project_pdf(project_id=project_id, days=days).getvalue()
+        except Exception as e:
+            PdfReportCache._store(project_id, days, fingerprint, error=str(e) or e.__class__.__name__)
+            raise
+        PdfReportCache._store(project_id, days, fingerprint, pdf_bytes=pdf_bytes)
+        logger.info(f"[PDF Cache] Rendered project {project_id}, days={days} in "
+                    f"{time.monotonic() - started:.1f}s ({len(pdf_bytes) / 1024:.1f} KB)")
+        return pdf_bytes
+
+    # ================================
+    # Pre-renderizado (cron)
+    # ================================
+
+    @staticmethod
+    def prerender_for_projects(project_ids: Iterable[int]) -> int:
+        """
+        Regenera, en el hilo del llamador, los informes que los usuarios de
+        estos proyectos descargan con regularidad. Nunca lanza; devuelve el
+        número de informes generados.
+        """
+        project_ids = sorted(set(project_ids))
+        if not MANUAL_AI_PDF_CACHE_ENABLED or not project_ids or not PdfReportCache._ensure_schema_once():
+            return 0
+
+        conn = get_db_connection()
+        if not conn:
+            return 0
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT project_id, days
+                FROM manual_ai_pdf_reports
+                WHERE project_id = ANY(%s)
+                  AND request_count >= %s
+                  AND last_requested_at >= NOW() - make_interval(days => %s)
+                ORDER BY project_id, days
+            """, (project_ids, MANUAL_AI_PDF_PRERENDER_MIN_EXPORTS, MANUAL_AI_PDF_PRERENDER_WINDOW_DAYS))
+            targets = [(row['project_id'], row['days']) for row in cur.fetchall()]
+        except Exception as e:
+            logger.warning(f"[PDF Cache] Could not select reports to pre-render: {e}")
+            return 0
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+        rendered = 0
+        for project_id, days in targets:
+            try:
+                PdfReportCache.render(project_id, days)
+                rendered += 1
+            except Exception as e:
+                logger.warning(f"[PDF Cache] Pre-render failed for project {project_id}, days={days}: {e}")
+        if targets:
+            logger.info(f"[PDF Cache] Pre-rendered {rendered}/{len(targets)} reports")
+        return rendered
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Backfill de los rollups diarios de Manual AI (ver
+manual_ai/models/rollup_repository.py).
+
+Sin este script los rollups se construyen solos: el primer análisis de cada
+proyecto tras el deploy reconstruye su histórico. Mientras tanto el dashboard
+de ese proyecto sigue leyendo de manual_ai_results. Este script adelanta el
+trabajo para todos los proyectos de una vez.
+
+Seguridad de la migración
+-------------------------
+- IDEMPOTENTE: reconstruir un proyecto borra y recalcula sus rollups.
+- Un proyecto por transacción: un fallo solo revierte ese proyecto.
+- Puede ejecutarse con la aplicación en marcha.
+
+Uso (intencionadamente manual — NO se ejecuta en cada deploy):
+    python3 migrate_manual_ai_rollups.py                 # proyectos sin rollups
+    python3 migrate_manual_ai_rollups.py --all           # reconstruir todos
+    python3 migrate_manual_ai_rollups.py --project 29    # un proyecto concreto
+    python3 migrate_manual_ai_rollups.py --dry-run       # solo listar pendientes
+"""
+import sys
+
+from database import get_db_connection
+from manual_ai.models.rollup_repository import RollupRepository
+
+
+def _arg_value(name: str, default):
+    if name in sys.argv:
+        try:
+            return int(sys.argv[sys.argv.index(name) + 1])
+        except (IndexError, ValueError):
+            pass
+    return default
+
+
+def main() -> int:
+    dry_run = '--dry-run' in sys.argv
+    project_id = _arg_value('--project', None)
+
+    if not RollupRepository.ensure_rollup_tables():
+        print("❌ No se pudieron crear las tablas de rollups. Aborta.")
+        return 1
+
+    conn = get_db_connection()
+    if conn is None:
+        print("❌ Sin conexión a la base de datos. Aborta.")
+        return 1
+
+    rebuilt = errors = 0
+    try:
+        cur = conn.cursor()
+        if project_id is not None:
+            cur.execute("SELECT id FROM manual_ai_projects WHERE id = %s", (project_id,))
+        elif '--all' in sys.argv:
+            cur.execute("SELECT id FROM manual_ai_projects ORDER BY id")
+        else:
+            cur.execute("""
+                SELECT p.id
+                FROM manual_ai_projects p
+                LEFT JOIN manual_ai_rollup_state s ON s.project_id = p.id
+                WHERE s.project_id IS NULL
+                ORDER BY p.id
+            """)
+        project_ids = [row['id'] for row in cur.fetchall()]
+        print(f"Proyectos a reconstruir: {len(project_ids)}")
+        if dry_run:
+            print(f"(dry-run: no se escribió nada) {project_ids}")
+            return 0
+
+        for pid in project_ids:
+            try:
+                RollupRepository.rebuild_project(cur, pid)
+                conn.commit()
+                rebuilt += 1
+                print(f"  ✅ proyecto {pid}")
+            except Exception as e:
+                conn.rollback()
+                errors += 1
+                print(f"  ⚠️ Error reconstruyendo el proyecto {pid}: {e}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    print("─" * 60)
+    print(f"Proyectos reconstruidos: {rebuilt}")
+    print(f"Proyectos con error: {errors}")
+    return 0 if errors == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
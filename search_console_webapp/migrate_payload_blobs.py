@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Migración de almacenamiento: mover los payloads JSONB en línea de
+manual_ai_results (raw_serp_data, ai_analysis_data) y ai_mode_results
+(raw_ai_mode_data) a `payload_blobs` (ver services/payload_blobs.py).
+
+Seguridad de la migración
+-------------------------
+- IDEMPOTENTE: solo toca filas que aún tienen el JSONB en línea.
+- Por lotes: cada lote guarda los blobs, rellena `<columna>_hash` y pone el
+  JSONB a NULL en la misma transacción; un fallo solo revierte ese lote.
+- Los lectores aceptan filas antiguas y migradas, así que puede ejecutarse
+  con la aplicación en marcha y reanudarse si se interrumpe.
+- El espacio no se devuelve al sistema hasta el VACUUM (FULL) de la tabla.
+
+Uso (intencionadamente manual — NO se ejecuta en cada deploy):
+    python3 migrate_payload_blobs.py                 # migrar
+    python3 migrate_payload_blobs.py --dry-run       # solo contar filas pendientes
+    python3 migrate_payload_blobs.py --report        # tamaños y ratios, sin escribir
+    python3 migrate_payload_blobs.py --purge         # migrar y borrar blobs huérfanos
+    python3 migrate_payload_blobs.py --batch 1000    # tamaño de lote (por defecto 500)
+"""
+import sys
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection
+from services.payload_blobs import (
+    PAYLOAD_COLUMNS,
+    ensure_payload_blobs_schema,
+    get_payload_size_report,
+    hash_column,
+    purge_orphan_payloads,
+    store_payloads,
+)
+
+
+def _arg_value(name: str, default: int) -> int:
+    if name in sys.argv:
+        try:
+            return int(sys.argv[sys.argv.index(name) + 1])
+        except (IndexError, ValueError):
+            pass
+    return default
+
+
+def _print_report() -> None:
+    report = get_payload_size_report()
+    if report.get('error'):
+        print(f"⚠️ Informe incompleto: {report['error']}")
+    for table, stats in report['tables'].items():
+        print(f"{table}: {stats['total_bytes'] / 1024 / 1024:.1f} MB, {stats['rows']} filas")
+        for column in PAYLOAD_COLUMNS[table]:
+            print(f"  {column}: {stats[f'{column}_inline']} en línea, {stats[f'{column}_hashed']} por hash")
+    blobs = report.get('blobs') or {}
+    if blobs:
+        print(f"payload_blobs: {blobs['total_bytes'] / 1024 / 1024:.1f} MB, {blobs['blobs']} blobs, "
+              f"{blobs['references']} referencias")
+        print(f"  compresión x{blobs['compression_ratio']}, deduplicación x{blobs['dedup_ratio']}")
+
+
+def _migrate_table(conn, table: str, columns, batch_size: int, dry_run: bool):
+    inline = ' OR '.join(f'{column} IS NOT NULL' for column in columns)
+    cur = conn.cursor()
+    cur.execute(f'SELECT COUNT(*) AS pending FROM {table} WHERE {inline}')
+    pending = cur.fetchone()['pending']
+    print(f"{table}: {pending} filas con payload en línea")
+    if dry_run or not pending:
+        return 0, 0
+
+    assignments = ', '.join(
+        f'{hash_column(column)} = COALESCE(v.{hash_column(column)}, t.{hash_column(column)}), {column} = NULL'
+        for column in columns
+    )
+    value_columns = ', '.join(hash_column(column) for column in columns)
+
+    migrated = errors = 0
+    while True:
+        cur.execute(
+            f'SELECT id, {", ".join(columns)} FROM {table} WHERE {inline} ORDER BY id LIMIT %s',
+            (batch_size,)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            break
+        try:
+            hashes = store_payloads(cur, [row[column] for row in rows for column in columns])
+            width = len(columns)
+            values = [
+                (row['id'], *hashes[i * width:(i + 1) * width])
+                for i, row in enumerate(rows)
+            ]
+            execute_values(cur, f'''
+                UPDATE {table} AS t SET {assignments}
+                FROM (VALUES %s) AS v(id, {value_columns})
+                WHERE t.id = v.id
+            ''', values, template='(' + ', '.join(['%s'] + ['%s::char(64)'] * width) + ')')
+            conn.commit()
+            migrated += len(rows)
+            print(f"  {migrated}/{pending}")
+        except Exception as e:
+            conn.rollback()
+            errors += 1
+            print(f"  ⚠️ Error migrando lote de {table} desde id={rows[0]['id']}: {e}")
+            break
+    return migrated, errors
+
+
+def main() -> int:
+    if '--report' in sys.argv:
+        _print_report()
+        return 0
+
+    dry_run = '--dry-run' in sys.argv
+    batch_size = max(1, _arg_value('--batch', 500))
+
+    if not ensure_payload_blobs_schema():
+        print("❌ No se pudo crear el esquema de payload_blobs. Aborta.")
+        return 1
+
+    conn = get_db_connection()
+    if conn is None:
+        print("❌ Sin conexión a la base de datos. Aborta.")
+        return 1
+
+    total_migrated = total_errors = 0
+    try:
+        for table, columns in PAYLOAD_COLUMNS.items():
+            cur = conn.cursor()
+            cur.execute('SELECT to_regclass(%s) AS reg', (f'public.{table}',))
+            if not cur.fetchone()['reg']:
+                print(f"{table}: no existe, se omite")
+                continue
+            migrated, errors = _migrate_table(conn, table, columns, batch_size, dry_run)
+            total_migrated += migrated
+            total_errors += errors
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    print("─" * 60)
+    if dry_run:
+        print("(dry-run: no se escribió nada)")
+        return 0
+    print(f"Filas migradas: {total_migrated}")
+    print(f"Lotes con error: {total_errors}")
+    if '--purge' in sys.argv:
+        print(f"Blobs huérfanos borrados: {purge_orphan_payloads()}")
+    _print_report()
+    return 0 if total_errors == 0 else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -11,9 +11,13 @@ Maneja toda la lógica de quotas incluyendo:
 """
 
 import os
+import json
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from database import get_db_connection, resume_quota_pauses_for_user
+from psycopg2.extras import execute_values
+from database import get_db_connection, ensure_quota_table_exists, resume_quota_pauses_for_user
 
 logger = logging.getLogger(__name__)
 
@@ -143,6 +147,42 @@ def _quota_status_fail_open(reason: str) -> dict:
     }
 
 
+def _quota_status_from_row(user) -> dict:
+    """Estado de quota a partir de la fila de `users` (plan, quota_used, límites, reset)."""
+    # user es un RealDictRow, usar como diccionario
+    plan = user['plan']
+    quota_used = user['quota_used']
+    custom_quota_limit = user['custom_quota_limit']
+    quota_limit = user['quota_limit']
+    quota_reset_date = user['quota_reset_date']
+    
+    # Determinar límite efectivo (asegurar conversión a int)
+    is_custom = custom_quota_limit is not None
+    if is_custom:
+        effective_limit = int(custom_quota_limit or 0)
+    elif quota_limit is not None and quota_limit > 0:
+        effective_limit = int(quota_limit)
+    else:
+        effective_limit = PLAN_LIMITS.get(plan, 0)
+    
+    # Calcular estadísticas (asegurar conversión a int)
+    used = int(quota_used or 0)
+    remaining = max(0, effective_limit - used)
+    percentage = round((used / effective_limit * 100), 1) if effective_limit > 0 else 0
+    can_consume = remaining > 0
+    
+    return {
+        'quota_limit': effective_limit,
+        'quota_used': used,
+        'remaining': remaining,
+        'percentage': percentage,
+        'can_consume': can_consume,
+        'plan': plan,
+        'is_custom': is_custom,
+        'reset_date': quota_reset_date
+    }
+
+
 def get_user_quota_status(user_id):
     """
     Obtiene el estado completo de quota de un usuario
@@ -178,38 +218,7 @@ def get_user_quota_status(user_id):
                 'reset_date': None,
             }
         
-        # user es un RealDictRow, usar como diccionario
-        plan = user['plan']
-        quota_used = user['quota_used']
-        custom_quota_limit = user['custom_quota_limit']
-        quota_limit = user['quota_limit']
-        quota_reset_date = user['quota_reset_date']
-        
-        # Determinar límite efectivo (asegurar conversión a int)
-        is_custom = custom_quota_limit is not None
-        if is_custom:
-            effective_limit = int(custom_quota_limit or 0)
-        elif quota_limit is not None and quota_limit > 0:
-            effective_limit = int(quota_limit)
-        else:
-            effective_limit = PLAN_LIMITS.get(plan, 0)
-        
-        # Calcular estadísticas (asegurar conversión a int)
-        used = int(quota_used or 0)
-        remaining = max(0, effective_limit - used)
-        percentage = round((used / effective_limit * 100), 1) if effective_limit > 0 else 0
-        can_consume = remaining > 0
-        
-        return {
-            'quota_limit': effective_limit,
-            'quota_used': used,
-            'remaining': remaining,
-            'percentage': percentage,
-            'can_consume': can_consume,
-            'plan': plan,
-            'is_custom': is_custom,
-            'reset_date': quota_reset_date
-        }
+        return _quota_status_from_row(user)
         
     except Exception as e:
         # Same FAIL-OPEN policy as the no-connection path above — a transient
@@ -607,5 +616,384 @@ def reset_user_quota(user_id, admin_id=None):
         if conn:
             conn.close()
 
+# ================================
+# Reservas de cuota por ejecución
+# ================================
+#
+# Un análisis por lotes (p. ej. Manual AI) reserva al empezar los RU que puede
+# necesitar (`reserve_quota`), descuenta en memoria por keyword
+# (`QuotaReservation.consume`) y liquida al final (`settle`): eventos de
+# quota_usage_events + quota_used del usuario en una sola transacción. Así el
+# bucle no hace dos round-trips por keyword.
+#
+# La reserva no toca users.quota_used: solo retiene RU frente a otras
+# reservas abiertas del mismo usuario (se calcula bajo `SELECT ... FOR UPDATE`
+# de su fila). Cada QUOTA_LEDGER_FLUSH_EVERY keywords o
+# QUOTA_LEDGER_FLUSH_SECONDS se vuelca lo consumido y se renueva el latido
+# de la reserva. Mientras la ejecución está abierta (`with reservation`) un
+# hilo renueva además el latido cada QUOTA_RESERVATION_HEARTBEAT_SECONDS si no
+# ha habido volcado, para que una ejecución esperando slots o sin consumir no
+# se dé por muerta. Si el proceso muere, solo queda sin cobrar el tramo no
+# volcado, y la reserva se da por expirada cuando su latido supera
+# QUOTA_RESERVATION_STALE_MINUTES (en la siguiente reserva del usuario o en
+# `reconcile_stale_quota_reservations`, que se ejecuta al arrancar). Una
+# reserva que descubre que la han expirado deja de conceder trabajo nuevo:
+# sus RU ya se liberaron para otras reservas.
+
+QUOTA_LEDGER_FLUSH_EVERY = int(os.getenv('QUOTA_LEDGER_FLUSH_EVERY', '50'))
+QUOTA_LEDGER_FLUSH_SECONDS = float(os.getenv('QUOTA_LEDGER_FLUSH_SECONDS', '60'))
+QUOTA_RESERVATION_STALE_MINUTES = int(os.getenv('QUOTA_RESERVATION_STALE_MINUTES', '30'))
+QUOTA_RESERVATION_HEARTBEAT_SECONDS = float(os.getenv('QUOTA_RESERVATION_HEARTBEAT_SECONDS', '300'))
+
+_reservations_table_lock = threading.Lock()
+_reservations_table_ready = False
+
+
+def ensure_quota_reservations_table():
+    """Crea la tabla quota_reservations si no existe (idempotente)."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS quota_reservations (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+                source VARCHAR(50) NOT NULL,
+                reserved_ru INTEGER NOT NULL,
+                consumed_ru INTEGER NOT NULL DEFAULT 0,
+                status VARCHAR(20) NOT NULL DEFAULT 'open',
+                metadata JSONB,
+                created_at TIMESTAMPTZ DEFAULT NOW(),
+                heartbeat_at TIMESTAMPTZ DEFAULT NOW(),
+                settled_at TIMESTAMPTZ,
+                CONSTRAINT chk_reservation_status CHECK (status IN ('open', 'settled', 'expired'))
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_quota_reservations_open
+            ON quota_reservations(user_id) WHERE status = 'open'
+        ''')
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error creando tabla quota_reservations: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _ensure_reservations_table_once():
+    global _reservations_table_ready
+    if _reservations_table_ready:
+        return True
+    with _reservations_table_lock:
+        if not _reservations_table_ready:
+            _reservations_table_ready = ensure_quota_reservations_table() and ensure_quota_table_exists()
+    return _reservations_table_ready
+
+
+class QuotaReservation:
+    """
+    RU reservados para una ejecución. `consume()` descuenta en memoria y
+    `settle()` registra el consumo real y libera el resto. Thread-safe.
+
+    Usable como context manager: mientras está abierta renueva el latido en
+    segundo plano y al salir siempre se liquida.
+    """
+
+    def __init__(self, user_id, source, granted, reservation_id=None, quota_info=None):
+        self.user_id = user_id
+        self.source = source
+        self.granted = int(granted)
+        self.reservation_id = reservation_id
+        self.quota_info = quota_info or {}
+        self.consumed = 0
+        self.settled = False
+        self.expired = False
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._closed = threading.Event()
+
+    @property
+    def remaining(self):
+        """RU disponibles para trabajo nuevo (0 si la reserva se expiró)."""
+        return 0 if self.expired else self.granted - self.consumed
+
+    @property
+    def exhausts_quota(self):
+        """True si la reserva cubre toda la cuota que le quedaba al usuario."""
+        if self.quota_info.get('error') or self.expired:
+            return False
+        return self.quota_info.get('remaining', 0) <= self.granted
+
+    def consume(self, ru_amount, keyword=None, country_code=None, metadata=None):
+        """
+        Descuenta `ru_amount` de la reserva. False si no queda suficiente.
+        Con la reserva expirada se sigue cobrando el trabajo ya lanzado, pero
+        `remaining` es 0 y no se debe empezar nada más.
+        """
+        with self._lock:
+            if self.settled or self.granted - self.consumed < ru_amount:
+                return False
+            self.consumed += ru_amount
+            event_metadata = dict(metadata or {})
+            if self.reservation_id is not None:
+                event_metadata['reservation_id'] = self.reservation_id
+            self._pending.append((ru_amount, keyword, country_code, event_metadata))
+            due = (len(self._pending) >= QUOTA_LEDGER_FLUSH_EVERY
+                   or time.monotonic() - self._last_flush >= QUOTA_LEDGER_FLUSH_SECONDS)
+        if due:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Vuelca el consumo pendiente y renueva el latido de la reserva."""
+        return self._write(final=False)
+
+    def heartbeat(self):
+        """Renueva el latido sin volcar consumo. False si la reserva ya no está abierta."""
+        if self.reservation_id is None or self.settled:
+            return True
+        conn = get_db_connection()
+        if not conn:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('''
+                UPDATE quota_reservations
+                SET heartbeat_at = NOW()
+                WHERE id = %s AND status = 'open'
+            ''', (self.reservation_id,))
+            conn.commit()
+            if cur.rowcount == 0:
+                self._mark_expired()
+                return False
+            return True
+        except Exception as e:
+            logger.warning(f"Error renovando el latido de la reserva {self.reservation_id}: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return True
+        finally:
+            conn.close()
+
+    def _heartbeat_loop(self):
+        while not self._closed.wait(QUOTA_RESERVATION_HEARTBEAT_SECONDS):
+            # Un volcado reciente ya renovó el latido
+            if time.monotonic() - self._last_flush < QUOTA_RESERVATION_HEARTBEAT_SECONDS:
+                continue
+            if not self.heartbeat():
+                return
+
+    def _mark_expired(self):
+        with self._lock:
+            if self.expired:
+                return
+            self.expired = True
+        logger.warning(f"🧾 Reserva de quota {self.reservation_id} expirada mientras seguía en uso - "
+                       f"Usuario {self.user_id}: no se lanza más trabajo con ella")
+
+    def settle(self):
+        """Registra el consumo pendiente, libera los RU no usados y cierra la reserva."""
+        if self.settled:
+            return True
+        ok = self._write(final=True)
+        if ok:
+            logger.info(f"🧾 Reserva de quota {self.reservation_id} liquidada - Usuario {self.user_id}: "
+                        f"{self.consumed}/{self.granted} RU ({self.source})")
+        return ok
+
+    def _write(self, final):
+        with self._lock:
+            if self.settled:
+                return True
+            pending = self._pending
+            self._pending = []
+            self._last_flush = time.monotonic()
+
+        if not pending and self.reservation_id is None:
+            if final:
+                self.settled = True
+            return True
+
+        conn = get_db_connection()
+        if not conn:
+            logger.error(f"No se pudo conectar a la base de datos para liquidar la reserva {self.reservation_id}")
+            self._requeue(pending)
+            return False
+        try:
+            cur = conn.cursor()
+            ru_total = sum(event[0] for event in pending)
+            if pending:
+                execute_values(cur, '''
+                    INSERT INTO quota_usage_events (
+                        user_id, ru_consumed, source, keyword, country_code, metadata, timestamp
+                    ) VALUES %s
+                ''', [
+                    (self.user_id, ru, self.source, keyword, country_code,
+                     json.dumps(metadata) if metadata else None)
+                    for ru, keyword, country_code, metadata in pending
+                ], template='(%s, %s, %s, %s, %s, %s, NOW())')
+                cur.execute('''
+                    UPDATE users
+                    SET quota_used = COALESCE(quota_used, 0) + %s,
+                        updated_at = NOW()
+                    WHERE id = %s
+                ''', (ru_total, self.user_id))
+            expired = False
+            if self.reservation_id is not None:
+                cur.execute('''
+                    UPDATE quota_reservations
+                    SET consumed_ru = consumed_ru + %s,
+                        heartbeat_at = NOW(),
+                        status = CASE WHEN %s AND status = 'open' THEN 'settled' ELSE status END,
+                        settled_at = CASE WHEN %s AND status = 'open' THEN NOW() ELSE settled_at END
+                    WHERE id = %s
+                    RETURNING status
+                ''', (ru_total, final, final, self.reservation_id))
+                row = cur.fetchone()
+                expired = bool(row) and row['status'] == 'expired'
+            conn.commit()
+            if expired:
+                self._mark_expired()
+            if final:
+                self.settled = True
+            return True
+        except Exception as e:
+            logger.error(f"Error liquidando la reserva de quota {self.reservation_id}: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self._requeue(pending)
+            return False
+        finally:
+            conn.close()
+
+    def _requeue(self, pending):
+        with self._lock:
+            self._pending = pending + self._pending
+
+    def __enter__(self):
+        if self.reservation_id is not None and QUOTA_RESERVATION_HEARTBEAT_SECONDS > 0:
+            threading.Thread(target=self._heartbeat_loop, daemon=True,
+                             name=f'quota-heartbeat-{self.reservation_id}').start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._closed.set()
+        self.settle()
+        return False
+
+
+def reserve_quota(user_id, ru_amount, source, metadata=None):
+    """
+    Reserva hasta `ru_amount` RU para una ejecución por lotes. Concede lo que
+    quede libre (cuota restante menos otras reservas abiertas del usuario),
+    que puede ser 0. Devuelve una `QuotaReservation` con el estado de quota en
+    `quota_info`. Si la BD falla aplica la misma política FAIL-OPEN que
+    `get_user_quota_status`.
+    """
+    if not _ensure_reservations_table_once():
+        return QuotaReservation(user_id, source, ru_amount,
+                                quota_info=_quota_status_fail_open('reservations_table_unavailable'))
+    conn = get_db_connection()
+    if not conn:
+        logger.error(f"reserve_quota({user_id}): no DB connection — returning FAIL-OPEN")
+        return QuotaReservation(user_id, source, ru_amount, quota_info=_quota_status_fail_open('no_db_connection'))
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT plan, quota_used, custom_quota_limit, quota_limit, quota_reset_date
+            FROM users
+            WHERE id = %s
+            FOR UPDATE
+        ''', (user_id,))
+        user = cur.fetchone()
+        if not user:
+            conn.rollback()
+            logger.warning(f"reserve_quota({user_id}): user not found in DB")
+            return QuotaReservation(user_id, source, 0, quota_info={
+                'quota_limit': 0, 'quota_used': 0, 'remaining': 0,
+                'percentage': 0, 'can_consume': False,
+                'plan': 'unknown', 'is_custom': False,
+                'reset_date': None,
+            })
+
+        quota_info = _quota_status_from_row(user)
+        _expire_stale_reservations(cur, user_id)
+        cur.execute('''
+            SELECT COALESCE(SUM(reserved_ru - consumed_ru), 0) AS held
+            FROM quota_reservations
+            WHERE user_id = %s AND status = 'open'
+        ''', (user_id,))
+        held = max(0, int(cur.fetchone()['held']))
+        granted = max(0, min(int(ru_amount), quota_info['remaining'] - held))
+        if not granted:
+            conn.commit()
+            return QuotaReservation(user_id, source, 0, quota_info=quota_info)
+
+        cur.execute('''
+            INSERT INTO quota_reservations (user_id, source, reserved_ru, metadata)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id
+        ''', (user_id, source, granted, json.dumps(metadata) if metadata else None))
+        reservation_id = cur.fetchone()['id']
+        conn.commit()
+        logger.info(f"🧾 Reserva de quota {reservation_id} - Usuario {user_id}: {granted}/{ru_amount} RU "
+                    f"({source}, retenidos por otras reservas: {held})")
+        return QuotaReservation(user_id, source, granted, reservation_id=reservation_id, quota_info=quota_info)
+    except Exception as e:
+        logger.error(f"Error reservando quota para usuario {user_id}: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return QuotaReservation(user_id, source, ru_amount, quota_info=_quota_status_fail_open(str(e)))
+    finally:
+        conn.close()
+
+
+def _expire_stale_reservations(cur, user_id=None):
+    user_filter = 'AND user_id = %s' if user_id is not None else ''
+    cur.execute(f'''
+        UPDATE quota_reservations
+        SET status = 'expired', settled_at = NOW()
+        WHERE status = 'open'
+          AND heartbeat_at < NOW() - make_interval(mins => %s)
+          {user_filter}
+    ''', (QUOTA_RESERVATION_STALE_MINUTES,) + ((user_id,) if user_id is not None else ()))
+    return cur.rowcount
+
+
+def reconcile_stale_quota_reservations():
+    """
+    Expira las reservas abiertas sin latido reciente (ejecuciones que murieron
+    sin liquidar). Lo ya volcado sigue cobrado; se libera el resto.
+    """
+    if not _ensure_reservations_table_once():
+        return 0
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cur = conn.cursor()
+        expired = _expire_stale_reservations(cur)
+        conn.commit()
+        if expired:
+            logger.info(f"🧾 Expiradas {expired} reservas de quota sin liquidar")
+        return expired
+    except Exception as e:
+        logger.warning(f"Error reconciliando reservas de quota: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
 if __name__ == "__main__":
     test_quota_manager()
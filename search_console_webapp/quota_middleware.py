@@ -15,6 +15,7 @@ Flujo:
 
 import os
 import logging
+import threading
 import time
 import hashlib
 from collections import OrderedDict
@@ -28,6 +29,8 @@ from quota_manager import (
     get_user_access_permissions
 )
 from database import track_quota_consumption
+from services.serp_async_client import AdaptiveConcurrencyLimiter, SerpAsyncClient
+from services.serp_single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +42,19 @@ CALL_CACHE = OrderedDict()
 CACHE_DURATION = int(os.getenv('SERP_CALL_CACHE_TTL_SECONDS', '3600'))  # 1 hora
 CALL_CACHE_MAX = int(os.getenv('SERP_CALL_CACHE_MAX', '5000'))
 
+# Cliente SerpAPI asíncrono compartido por el proceso (concurrencia adaptativa).
+# SERPAPI_ASYNC_CLIENT=false vuelve al cliente síncrono GoogleSearch.
+SERPAPI_ASYNC_CLIENT = os.getenv('SERPAPI_ASYNC_CLIENT', 'true').lower() == 'true'
+_serp_client = None
+_serp_client_lock = threading.Lock()
+
+# Single-flight: llamadas idénticas simultáneas (en el proceso y, con Redis, entre
+# workers) comparten una sola descarga. SERP_SINGLE_FLIGHT=false lo desactiva.
+SERP_SINGLE_FLIGHT = os.getenv('SERP_SINGLE_FLIGHT', 'true').lower() == 'true'
+_serp_flight = None
+_flight_redis = None
+_flight_redis_checked = False
+
 def _get_cache_key(params: dict) -> str:
     """Genera una clave de caché única para los parámetros SERP"""
     # Excluir api_key del cache key por seguridad
@@ -92,6 +108,49 @@ def _should_retry_serp_error(error_message: str) -> bool:
     ]
     return any(marker in msg for marker in transient_markers)
 
+def get_serp_client() -> SerpAsyncClient:
+    """Cliente SerpAPI asíncrono del proceso (se crea en la primera llamada)."""
+    global _serp_client
+    with _serp_client_lock:
+        if _serp_client is None:
+            limiter = AdaptiveConcurrencyLimiter(
+                initial=int(os.getenv('SERPAPI_INITIAL_CONCURRENCY', '8')),
+                minimum=int(os.getenv('SERPAPI_MIN_CONCURRENCY', '2')),
+                maximum=int(os.getenv('SERPAPI_MAX_CONCURRENCY', '48')),
+            )
+            _serp_client = SerpAsyncClient(
+                limiter=limiter,
+                timeout=float(os.getenv('SERPAPI_TIMEOUT_SECONDS', '60')),
+                max_attempts=int(os.getenv('SERPAPI_RETRY_ATTEMPTS', '3')),
+                backoff_seconds=float(os.getenv('SERPAPI_RETRY_BACKOFF_SECONDS', '1.0')),
+                should_retry=_should_retry_serp_error,
+            )
+        return _serp_client
+
+def _get_flight_redis():
+    global _flight_redis, _flight_redis_checked
+    if not _flight_redis_checked:
+        from services.ai_cache import create_redis_client
+        _flight_redis = create_redis_client(decode_responses=False)
+        _flight_redis_checked = True
+    return _flight_redis
+
+def get_serp_flight() -> SingleFlight:
+    """Coordinador single-flight del proceso (se crea en la primera llamada)."""
+    global _serp_flight
+    with _serp_client_lock:
+        if _serp_flight is None:
+            wait_seconds = float(os.getenv('SERP_SINGLE_FLIGHT_WAIT_SECONDS', '120'))
+            _serp_flight = SingleFlight(
+                redis_getter=_get_flight_redis,
+                lock_ttl=int(wait_seconds),
+                result_ttl=int(os.getenv('SERP_SINGLE_FLIGHT_RESULT_TTL_SECONDS', '60')),
+                wait_timeout=wait_seconds,
+                # Solo los éxitos se comparten con otros workers
+                shareable=lambda result: bool(result[0]),
+            )
+        return _serp_flight
+
 def get_current_user_id() -> Optional[int]:
     """Obtiene el ID del usuario actual desde la sesión Flask"""
     try:
@@ -277,11 +336,11 @@ def quota_protected_serp_call(params: dict, call_type: str = "json") -> Tuple[bo
     
     success, result = _execute_serp_call(params, call_type)
     
-    # 🔍 PASO 5: Registrar consumo si fue exitosa
+    # 🔍 PASO 5: Registrar consumo si fue exitosa (el plan sale del estado de
+    # quota leído en la validación: sin otra lectura de BD por llamada)
     if success:
         try:
-            status = get_user_quota_status(user_id)
-            update_user_quota = enforce_quotas and status.get('plan') != 'free'
+            update_user_quota = quota_validation['quota_info'].get('plan') != 'free'
             track_quota_consumption(
                 user_id=user_id,
                 ru_consumed=1,
@@ -308,7 +367,24 @@ def quota_protected_serp_call(params: dict, call_type: str = "json") -> Tuple[bo
     return success, result
 
 def _execute_serp_call(params: dict, call_type: str) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Ejecuta la llamada a SerpAPI. Con SERP_SINGLE_FLIGHT, las llamadas idénticas
+    que coinciden en el tiempo esperan a la que ya está en vuelo y comparten su
+    resultado (el cobro de RU de cada llamador no cambia).
+    """
+    if not SERP_SINGLE_FLIGHT:
+        return _fetch_serp_upstream(params, call_type)
+    success, result = get_serp_flight().do(
+        f"{call_type}:{_get_cache_key(params)}",
+        lambda: _fetch_serp_upstream(params, call_type)
+    )
+    return success, result
+
+def _fetch_serp_upstream(params: dict, call_type: str) -> Tuple[bool, Dict[str, Any]]:
     """Ejecuta la llamada real a SerpAPI"""
+    if call_type == "json" and SERPAPI_ASYNC_CLIENT:
+        return get_serp_client().fetch_json(params)
+
     max_attempts = int(os.getenv('SERPAPI_RETRY_ATTEMPTS', '3'))
     base_delay = float(os.getenv('SERPAPI_RETRY_BACKOFF_SECONDS', '1.0'))
     
@@ -2,6 +2,7 @@
 import logging
 import re
 import unicodedata
+from functools import lru_cache
 from .utils import urls_match, normalize_search_console_url, extract_domain
 
 logger = logging.getLogger(__name__)
@@ -305,7 +306,87 @@ def check_brand_mention(text, domain, brand_variations):
     
     return False, None
 
-def detect_ai_overview_elements(serp_data, site_url=None):
+class BrandMatcher:
+    """
+    Detector de menciones de un sitio precompilado una sola vez.
+
+    Guarda el dominio normalizado, sus variaciones de marca y las regex de
+    cada variación (con y sin acentos), y memoriza `urls_match` por URL: las
+    mismas fuentes se repiten entre keywords de un mismo análisis. `check()`
+    devuelve exactamente lo mismo que `check_brand_mention`.
+
+    Usar `get_brand_matcher(site_url)` para compartir la instancia en todo el lote.
+    """
+
+    _URL_CACHE_MAX = 4096
+
+    def __init__(self, site_url):
+        self.site_url = site_url
+        self.normalized_site_url = normalize_search_console_url(site_url) if site_url else ''
+        self.brand_variations = extract_brand_variations(self.normalized_site_url)
+        self._domain_lower = self.normalized_site_url.lower()
+        self._variations = []
+        for variation in self.brand_variations:
+            if len(variation) < 3:
+                continue
+            variation_lower = variation.lower()
+            variation_no_accents = remove_accents(variation_lower)
+            self._variations.append((
+                variation,
+                variation_lower,
+                variation_no_accents,
+                re.compile(r'\b' + re.escape(variation_lower) + r'\b'),
+                re.compile(r'\b' + re.escape(variation_no_accents) + r'\b'),
+            ))
+        self._url_matches = {}
+
+    def check(self, text):
+        """(found, method) con la misma prioridad que `check_brand_mention`."""
+        if not text or not self._domain_lower:
+            return False, None
+
+        text_lower = text.lower()
+        text_lower_no_accents = remove_accents(text_lower)
+
+        if self._domain_lower in text_lower or self._domain_lower in text_lower_no_accents:
+            return True, "full_domain"
+
+        for variation, variation_lower, variation_no_accents, pattern, pattern_no_accents in self._variations:
+            # Las regex de palabra completa solo pueden casar si hay substring
+            in_text = variation_lower in text_lower
+            in_text_no_accents = variation_no_accents in text_lower_no_accents
+            if not in_text and not in_text_no_accents:
+                continue
+            if in_text and pattern.search(text_lower):
+                return True, f"brand_exact_match:{variation}"
+            if in_text_no_accents and pattern_no_accents.search(text_lower_no_accents):
+                return True, f"brand_accent_match:{variation}"
+            if in_text:
+                return True, f"brand_partial_match:{variation}"
+            return True, f"brand_partial_accent_match:{variation}"
+
+        return False, None
+
+    def url_matches(self, url):
+        """`urls_match(url, dominio)` memorizado por URL."""
+        if not url or not self.normalized_site_url:
+            return False
+        cached = self._url_matches.get(url)
+        if cached is None:
+            cached = urls_match(url, self.normalized_site_url)
+            if len(self._url_matches) >= self._URL_CACHE_MAX:
+                self._url_matches.clear()
+            self._url_matches[url] = cached
+        return cached
+
+
+@lru_cache(maxsize=256)
+def get_brand_matcher(site_url):
+    """`BrandMatcher` compartido por sitio (se construye una vez por proceso)."""
+    return BrandMatcher(site_url)
+
+
+def detect_ai_overview_elements(serp_data, site_url=None, brand_matcher=None):
     """
     Detecta elementos de AI Overview con cálculo CORRECTO de posiciones visuales.
     
@@ -332,8 +413,15 @@ def detect_ai_overview_elements(serp_data, site_url=None):
     MÉTODO 3 - Híbrido AGRESIVO con posiciones CORREGIDAS:
     Cuando reference_indexes están incompletos, calcula la posición visual real
     basándose en el patrón observado del usuario.
+
+    `brand_matcher` (opcional) es el `BrandMatcher` del sitio; en lotes de
+    keywords se reutiliza el de `get_brand_matcher(site_url)` en lugar de
+    recalcular variaciones y regex en cada llamada. Los diagnósticos por
+    bloque/referencia solo se emiten con el logger en DEBUG.
     """
-    logger.info("[AI ANALYSIS] === INICIANDO DETECCIÓN AI OVERVIEW (POSICIONES CORREGIDAS) ===")
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug("[AI ANALYSIS] === INICIANDO DETECCIÓN AI OVERVIEW (POSICIONES CORREGIDAS) ===")
     
     # Estructura de retorno compatible con legacy
     ai_elements = {
@@ -360,19 +448,21 @@ def detect_ai_overview_elements(serp_data, site_url=None):
     raw_site_url = site_url
     
     if site_url:
-        normalized_site_url = normalize_search_console_url(site_url)
-        
-        # ✅ NUEVO: Extraer variaciones de marca del dominio
-        brand_variations = extract_brand_variations(normalized_site_url)
+        # ✅ NUEVO: Variaciones de marca y regex precompiladas, compartidas por sitio
+        if brand_matcher is None:
+            brand_matcher = get_brand_matcher(site_url)
+        normalized_site_url = brand_matcher.normalized_site_url
+        brand_variations = brand_matcher.brand_variations
         
-        logger.info(f"[AI ANALYSIS] Sitio a analizar: {site_url} → {normalized_site_url}")
-        logger.info(f"[AI ANALYSIS] Variaciones de marca detectadas: {brand_variations}")
+        if debug:
+            logger.debug(f"[AI ANALYSIS] Sitio a analizar: {site_url} → {normalized_site_url}")
+            logger.debug(f"[AI ANALYSIS] Variaciones de marca detectadas: {brand_variations}")
     
     # Buscar AI Overview en los datos SERP
     ai_overview_data = serp_data.get('ai_overview')
     
     if not ai_overview_data:
-        logger.info("[AI ANALYSIS] No se encontró 'ai_overview' en datos SERP")
+        logger.debug("[AI ANALYSIS] No se encontró 'ai_overview' en datos SERP")
         ai_elements['debug_info']['available_keys'] = list(serp_data.keys())
         ai_elements['debug_info']['ai_overview_found'] = False
         return ai_elements
@@ -385,7 +475,7 @@ def detect_ai_overview_elements(serp_data, site_url=None):
     
     # Verificar si requiere petición adicional (collapsed AI Overview)
     if 'page_token' in ai_overview_data and not ai_overview_data.get('text_blocks') and not ai_overview_data.get('references'):
-        logger.info(f"[AI ANALYSIS] AI Overview requiere petición adicional con page_token (collapsed)")
+        logger.debug("[AI ANALYSIS] AI Overview requiere petición adicional con page_token (collapsed)")
         ai_elements['has_ai_overview'] = True  # AI Overview EXISTS even if collapsed
         ai_elements['debug_info']['requires_additional_request'] = True
         ai_elements['debug_info']['page_token'] = ai_overview_data.get('page_token', '')
@@ -396,20 +486,21 @@ def detect_ai_overview_elements(serp_data, site_url=None):
     
     # ✅ AI OVERVIEW DETECTADO
     ai_elements['has_ai_overview'] = True
-    logger.info("[AI ANALYSIS] ✅ AI Overview encontrado!")
+    logger.debug("[AI ANALYSIS] ✅ AI Overview encontrado!")
 
     # Fix #2: Detect AIO position in SERP (top/middle/bottom)
     # SerpAPI places ai_overview as a top-level key; we infer position from SERP structure
     aio_serp_position = _detect_aio_serp_position(serp_data)
     ai_elements['aio_serp_position'] = aio_serp_position
-    logger.info(f"[AI ANALYSIS] AIO SERP position: {aio_serp_position}")
+    logger.debug(f"[AI ANALYSIS] AIO SERP position: {aio_serp_position}")
 
     # Analizar estructura completa
     text_blocks = ai_overview_data.get('text_blocks', [])
     references = ai_overview_data.get('references', [])
     organic_results = serp_data.get('organic_results', [])  # Para caso híbrido
 
-    logger.info(f"[AI ANALYSIS] Estructura: {len(text_blocks)} text_blocks, {len(references)} references, {len(organic_results)} organic_results")
+    if debug:
+        logger.debug(f"[AI ANALYSIS] Estructura: {len(text_blocks)} text_blocks, {len(references)} references, {len(organic_results)} organic_results")
     
     # Contadores para estadísticas y compatibilidad legacy
     total_content_length = 0
@@ -426,11 +517,12 @@ def detect_ai_overview_elements(serp_data, site_url=None):
         total_content_length += len(snippet)
         total_reference_indexes.update(reference_indexes)
         
-        logger.debug(f"[AI ANALYSIS] Text block {i+1}: type={block_type}, snippet_length={len(snippet)}, references={reference_indexes}")
+        if debug:
+            logger.debug(f"[AI ANALYSIS] Text block {i+1}: type={block_type}, snippet_length={len(snippet)}, references={reference_indexes}")
         
         # ✅ NUEVO: Buscar menciones de marca en el contenido del AI Overview
         if snippet and normalized_site_url:
-            found, method = check_brand_mention(snippet, normalized_site_url, brand_variations)
+            found, method = brand_matcher.check(snippet)
             if found:
                 text_block_mentions.append({
                     'block_index': i,
@@ -438,7 +530,8 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                     'snippet_preview': snippet[:100] + '...' if len(snippet) > 100 else snippet,
                     'reference_indexes': reference_indexes
                 })
-                logger.info(f"[AI ANALYSIS] 🎯 Mención encontrada en text_block {i+1} via {method}: '{snippet[:150]}...'")
+                if debug:
+                    logger.debug(f"[AI ANALYSIS] 🎯 Mención encontrada en text_block {i+1} via {method}: '{snippet[:150]}...'")
         
         # Añadir a la lista de elementos detectados (compatibilidad legacy)
         ai_elements['ai_overview_detected'].append({
@@ -456,11 +549,12 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                 total_reference_indexes.update(item_refs)
                 item_snippet = list_item.get('snippet', '')
                 total_content_length += len(item_snippet)
-                logger.debug(f"[AI ANALYSIS]   List item {j+1}: references={item_refs}")
+                if debug:
+                    logger.debug(f"[AI ANALYSIS]   List item {j+1}: references={item_refs}")
                 
                 # ✅ NUEVO: Buscar menciones en list items también
                 if item_snippet and normalized_site_url:
-                    found, method = check_brand_mention(item_snippet, normalized_site_url, brand_variations)
+                    found, method = brand_matcher.check(item_snippet)
                     if found:
                         text_block_mentions.append({
                             'block_index': f"{i}.{j}",
@@ -468,15 +562,17 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                             'snippet_preview': item_snippet[:100] + '...' if len(item_snippet) > 100 else item_snippet,
                             'reference_indexes': item_refs
                         })
-                        logger.info(f"[AI ANALYSIS] 🎯 Mención encontrada en list item {i}.{j} via {method}: '{item_snippet[:150]}...'")
+                        if debug:
+                            logger.debug(f"[AI ANALYSIS] 🎯 Mención encontrada en list item {i}.{j} via {method}: '{item_snippet[:150]}...'")
     
     # Asignar valores de compatibilidad legacy
     ai_elements['total_elements'] = len(text_blocks)
     ai_elements['elements_before_organic'] = len(text_blocks)
     ai_elements['impact_score'] = min(40 * len(text_blocks), 100)  # Máximo 100
     
-    logger.info(f"[AI ANALYSIS] Total content length: {total_content_length}")
-    logger.info(f"[AI ANALYSIS] Unique reference indexes: {sorted(total_reference_indexes)}")
+    if debug:
+        logger.debug(f"[AI ANALYSIS] Total content length: {total_content_length}")
+        logger.debug(f"[AI ANALYSIS] Unique reference indexes: {sorted(total_reference_indexes)}")
     
     # 🧠 LÓGICA HÍBRIDA CON POSICIONES CORREGIDAS
     domain_found = False
@@ -488,7 +584,7 @@ def detect_ai_overview_elements(serp_data, site_url=None):
         # MÉTODO 1: Buscar en ai_overview.references (oficial) - MÁXIMA PRIORIDAD
         # Las referencias oficiales con posición específica son más valiosas que menciones en contenido
         if references:
-            logger.info(f"[AI ANALYSIS] 🔍 MÉTODO OFICIAL: Buscando en {len(references)} referencias oficiales...")
+            logger.debug(f"[AI ANALYSIS] 🔍 MÉTODO OFICIAL: Buscando en {len(references)} referencias oficiales...")
             
             for ref in references:
                 ref_index = ref.get('index')
@@ -496,15 +592,16 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                 ref_link = ref.get('link', '')
                 ref_source = ref.get('source', '')
                 
-                logger.debug(f"[AI ANALYSIS] Referencia {ref_index}: {ref_title[:50]}... → {ref_link}")
+                if debug:
+                    logger.debug(f"[AI ANALYSIS] Referencia {ref_index}: {ref_title[:50]}... → {ref_link}")
                 
                 # Verificar coincidencia de dominio
-                if ref_link and urls_match(ref_link, normalized_site_url):
+                if ref_link and brand_matcher.url_matches(ref_link):
                     domain_found = True
                     domain_position = ref_index + 1  # Posición 1-based
                     domain_link = ref_link
                     detection_method = "official_references"
-                    logger.info(f"[AI ANALYSIS] ✅ MÉTODO OFICIAL: Dominio encontrado en posición {domain_position}")
+                    logger.debug(f"[AI ANALYSIS] ✅ MÉTODO OFICIAL: Dominio encontrado en posición {domain_position}")
                     break
                 
                 # ✅ CORREGIDO: Verificar URLs en source y title de forma más precisa
@@ -513,17 +610,19 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                 
                 if ref_source:
                     # ✅ INTELIGENTE: Buscar dominio y variaciones de marca en source
-                    found, method = check_brand_mention(ref_source, normalized_site_url, brand_variations)
+                    found, method = brand_matcher.check(ref_source)
                     if found:
                         source_has_domain = True
-                        logger.info(f"[AI ANALYSIS] 🎯 Mención encontrada en source via {method}: '{ref_source[:100]}...'")
+                        if debug:
+                            logger.debug(f"[AI ANALYSIS] 🎯 Mención encontrada en source via {method}: '{ref_source[:100]}...'")
                 
                 if ref_title and not source_has_domain:
                     # ✅ INTELIGENTE: Buscar dominio y variaciones de marca en title
-                    found, method = check_brand_mention(ref_title, normalized_site_url, brand_variations)
+                    found, method = brand_matcher.check(ref_title)
                     if found:
                         title_has_domain = True
-                        logger.info(f"[AI ANALYSIS] 🎯 Mención encontrada en title via {method}: '{ref_title[:100]}...'")
+                        if debug:
+                            logger.debug(f"[AI ANALYSIS] 🎯 Mención encontrada en title via {method}: '{ref_title[:100]}...'")
                 
                 if source_has_domain or title_has_domain:
                     domain_found = True
@@ -531,13 +630,13 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                     domain_link = ref_link
                     detection_method = "official_source_title_precise"
                     location = "source" if source_has_domain else "title"
-                    logger.info(f"[AI ANALYSIS] ✅ MÉTODO OFICIAL: Dominio encontrado en {location} posición {domain_position}")
+                    logger.debug(f"[AI ANALYSIS] ✅ MÉTODO OFICIAL: Dominio encontrado en {location} posición {domain_position}")
                     break
         
         # ✅ MÉTODO 1.5: Buscar menciones en contenido de text_blocks (FALLBACK)
         # Solo si no se encontró en referencias oficiales
         if not domain_found and text_block_mentions:
-            logger.info(f"[AI ANALYSIS] 🎯 MÉTODO CONTENIDO (FALLBACK): Encontradas {len(text_block_mentions)} menciones en text_blocks")
+            logger.debug(f"[AI ANALYSIS] 🎯 MÉTODO CONTENIDO (FALLBACK): Encontradas {len(text_block_mentions)} menciones en text_blocks")
             
             # Usar la primera mención encontrada (la más relevante)
             first_mention = text_block_mentions[0]
@@ -546,13 +645,14 @@ def detect_ai_overview_elements(serp_data, site_url=None):
             domain_link = None  # No hay link específico para menciones en contenido
             detection_method = f"text_content_{first_mention['method']}"
             
-            logger.info(f"[AI ANALYSIS] ✅ MÉTODO CONTENIDO: Mención encontrada en text_block {first_mention['block_index']}")
-            logger.info(f"[AI ANALYSIS] 📝 Contenido: '{first_mention['snippet_preview']}'")
+            if debug:
+                logger.debug(f"[AI ANALYSIS] ✅ MÉTODO CONTENIDO: Mención encontrada en text_block {first_mention['block_index']}")
+                logger.debug(f"[AI ANALYSIS] 📝 Contenido: '{first_mention['snippet_preview']}'")
         
         # MÉTODO 2: Buscar en organic_results usando reference_indexes (híbrido ULTRA-ESTRICTO)
         # SOLO cuenta si el organic_result coincide exactamente con una referencia oficial
         if not domain_found and total_reference_indexes and organic_results and references:
-            logger.info(f"[AI ANALYSIS] 🔍 MÉTODO HÍBRIDO ULTRA-ESTRICTO: Validando organic_results contra referencias oficiales")
+            logger.debug("[AI ANALYSIS] 🔍 MÉTODO HÍBRIDO ULTRA-ESTRICTO: Validando organic_results contra referencias oficiales")
             
             # Crear mapeo de reference_indexes a enlaces oficiales para validación estricta
             official_links_by_index = {}
@@ -562,7 +662,8 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                 if ref_index is not None and ref_link:
                     official_links_by_index[ref_index] = ref_link
             
-            logger.info(f"[AI ANALYSIS] 🔗 Referencias oficiales mapeadas: {list(official_links_by_index.keys())}")
+            if debug:
+                logger.debug(f"[AI ANALYSIS] 🔗 Referencias oficiales mapeadas: {list(official_links_by_index.keys())}")
             
             # Crear lista ordenada de reference_indexes para calcular posición visual correcta
             sorted_ref_indexes = sorted(total_reference_indexes)
@@ -570,7 +671,7 @@ def detect_ai_overview_elements(serp_data, site_url=None):
             for ref_idx in sorted_ref_indexes:
                 # VALIDACIÓN ESTRICTA: Solo continuar si este reference_index tiene una referencia oficial
                 if ref_idx not in official_links_by_index:
-                    logger.info(f"[AI ANALYSIS] ⚠️ Reference_index {ref_idx} NO tiene referencia oficial - SALTANDO")
+                    logger.debug(f"[AI ANALYSIS] ⚠️ Reference_index {ref_idx} NO tiene referencia oficial - SALTANDO")
                     continue
                 
                 # Buscar en organic_results usando el reference_index validado
@@ -581,30 +682,32 @@ def detect_ai_overview_elements(serp_data, site_url=None):
                     result_source = result.get('source', '')
                     official_link = official_links_by_index[ref_idx]
                     
-                    logger.info(f"[AI ANALYSIS] 🔍 Evaluando organic_result {ref_idx}: {result_source}")
-                    logger.info(f"[AI ANALYSIS] 🔗 Comparando: organic='{result_link}' vs oficial='{official_link}'")
+                    if debug:
+                        logger.debug(f"[AI ANALYSIS] 🔍 Evaluando organic_result {ref_idx}: {result_source}")
+                        logger.debug(f"[AI ANALYSIS] 🔗 Comparando: organic='{result_link}' vs oficial='{official_link}'")
                     
                     # VALIDACIÓN ADICIONAL: El organic_result debe coincidir con la referencia oficial
                     if not urls_match(result_link, official_link):
-                        logger.info(f"[AI ANALYSIS] ⚠️ Organic_result {ref_idx} NO coincide con referencia oficial - SALTANDO")
+                        logger.debug(f"[AI ANALYSIS] ⚠️ Organic_result {ref_idx} NO coincide con referencia oficial - SALTANDO")
                         continue
                     
                     # Verificar coincidencia con nuestro dominio
-                    if result_link and urls_match(result_link, normalized_site_url):
+                    if result_link and brand_matcher.url_matches(result_link):
                         domain_found = True
                         # Posición en la lista ordenada de referencias
                         visual_position = sorted_ref_indexes.index(ref_idx) + 1
                         domain_position = visual_position
                         domain_link = result_link
                         detection_method = "hybrid_ultra_strict_validated"
-                        logger.info(f"[AI ANALYSIS] ✅ MÉTODO HÍBRIDO ULTRA-ESTRICTO: Dominio encontrado en posición visual {domain_position}")
+                        logger.debug(f"[AI ANALYSIS] ✅ MÉTODO HÍBRIDO ULTRA-ESTRICTO: Dominio encontrado en posición visual {domain_position}")
                         break
 
         
         # Si no se encontró nada, loggear el resultado
         if not domain_found:
-            logger.info(f"[AI ANALYSIS] 🚫 NO ENCONTRADO: No hay menciones del dominio en AI Overview")
-            logger.info(f"[AI ANALYSIS] 📋 BUSCADO: {normalized_site_url} + variaciones {brand_variations}")
+            if debug:
+                logger.debug("[AI ANALYSIS] 🚫 NO ENCONTRADO: No hay menciones del dominio en AI Overview")
+                logger.debug(f"[AI ANALYSIS] 📋 BUSCADO: {normalized_site_url} + variaciones {brand_variations}")
     
     # Asignar resultados del dominio
     ai_elements['domain_is_ai_source'] = domain_found
@@ -656,12 +759,13 @@ def detect_ai_overview_elements(serp_data, site_url=None):
         # Bonus extra por corrección de posición aplicada
         if ai_elements['debug_info'].get('position_correction_applied'):
             ai_elements['impact_score'] += 5
-            logger.info(f"[AI ANALYSIS] 🎯 CORRECCIÓN DE POSICIÓN APLICADA: Posición corregida para coincidir con realidad visual")
+            logger.debug("[AI ANALYSIS] 🎯 CORRECCIÓN DE POSICIÓN APLICADA: Posición corregida para coincidir con realidad visual")
     else:
         logger.info("[AI ANALYSIS] ❌ RESULTADO FINAL: Dominio NO encontrado en ningún método")
     
-    logger.info(f"[AI ANALYSIS] Summary: {ai_elements['total_elements']} elements, impact_score={ai_elements['impact_score']}")
-    logger.info("[AI ANALYSIS] === DETECCIÓN AI OVERVIEW COMPLETADA ===")
+    if debug:
+        logger.debug(f"[AI ANALYSIS] Summary: {ai_elements['total_elements']} elements, impact_score={ai_elements['impact_score']}")
+        logger.debug("[AI ANALYSIS] === DETECCIÓN AI OVERVIEW COMPLETADA ===")
     
     return ai_elements
 
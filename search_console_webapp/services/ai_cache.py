@@ -4,15 +4,159 @@ import os
 import redis
 import json
 import logging
+import zlib
 import hashlib
-from datetime import timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
 from typing import Dict, Optional, Any
 
 logger = logging.getLogger(__name__)
 
+
+def create_redis_client(decode_responses: bool = True):
+    """Crea un cliente Redis desde REDIS_URL (Railway) con fallback a localhost.
+
+    Devuelve None si Redis no responde al ping: los llamadores funcionan sin caché.
+    Compartido por todas las cachés del proyecto para no duplicar la configuración.
+    """
+    try:
+        common_kwargs = dict(
+            decode_responses=decode_responses,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+            retry_on_timeout=True,
+            health_check_interval=30,
+        )
+
+        redis_url = os.getenv('REDIS_URL', '').strip()
+        if redis_url:
+            # Producción/staging (Railway) o cualquier entorno con REDIS_URL.
+            client = redis.Redis.from_url(redis_url, **common_kwargs)
+            logger.info("🔧 Redis configurado desde REDIS_URL")
+        else:
+            # Fallback para desarrollo local sin REDIS_URL.
+            client = redis.Redis(
+                host=os.getenv('REDIS_HOST', 'localhost'),
+                port=int(os.getenv('REDIS_PORT', '6379')),
+                db=int(os.getenv('REDIS_DB', '0')),
+                **common_kwargs
+            )
+            logger.info("🔧 Redis configurado en localhost (sin REDIS_URL)")
+
+        # Verificar conexión
+        client.ping()
+        logger.info("✅ Sistema de caché Redis conectado correctamente")
+        return client
+
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        logger.warning(f"⚠️ Redis no disponible, funcionando sin caché: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Error configurando Redis: {e}")
+        return None
+
+
+class _LocalLRU:
+    """LRU en memoria acotado por número de entradas y bytes, con TTL por entrada.
+
+    Guarda el JSON ya descomprimido (bytes): cada lectura devuelve objetos
+    nuevos, así que los llamadores pueden mutar el resultado sin contaminar
+    la caché.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()   # key -> (expira_en, payload)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, payload: bytes, ttl_seconds: Optional[int] = None):
+        if not self.enabled or len(payload) > self.max_bytes:
+            return
+        ttl = min(self.ttl_seconds, ttl_seconds) if ttl_seconds else self.ttl_seconds
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def delete(self, keys) -> int:
+        with self._lock:
+            present = [k for k in keys if k in self._entries]
+            for key in present:
+                self._pop(key)
+            return len(present)
+
+    def delete_where(self, predicate) -> int:
+        """Borra las entradas cuyo payload JSON cumple `predicate(dict)`."""
+        with self._lock:
+            doomed = []
+            for key, (_, payload) in self._entries.items():
+                try:
+                    if predicate(json.loads(payload)):
+                        doomed.append(key)
+                except ValueError:
+                    doomed.append(key)
+            for key in doomed:
+                self._pop(key)
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+
 class AIOverviewCache:
-    """Sistema de caché inteligente para análisis de AI Overview"""
-    
+    """Sistema de caché inteligente para análisis de AI Overview
+
+    Dos niveles:
+
+    - Local: LRU en memoria del proceso (`AI_CACHE_LOCAL_MAX_ENTRIES`,
+      `AI_CACHE_LOCAL_MAX_MB`, `AI_CACHE_LOCAL_TTL_SECONDS`). Evita la ida a
+      Redis y la descompresión cuando la misma keyword se repite entre
+      análisis cercanos.
+    - Redis: compartido entre workers. Los payloads a partir de
+      `AI_CACHE_COMPRESS_MIN_BYTES` (la SERP completa suele superar los
+      100 KB) se guardan comprimidos con zlib; los pequeños, como JSON plano.
+      Las entradas antiguas en JSON plano se siguen leyendo sin migración.
+
+    `prefetch()` trae una lista entera de keywords con un solo MGET y calienta
+    el nivel local antes de lanzar los hilos del análisis.
+    """
+
     def __init__(self):
         """Inicializa el cliente Redis leyendo REDIS_URL (Railway) con fallback local.
 
@@ -21,47 +165,28 @@ class AIOverviewCache:
         re-consultaba SerpAPI, coste de pago duplicado). Ahora se usa REDIS_URL si
         está definida; si no, se cae a localhost para desarrollo local.
         """
-        try:
-            common_kwargs = dict(
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
-                retry_on_timeout=True,
-                health_check_interval=30,
-            )
+        # Configuraciones de caché
+        self.cache_duration = timedelta(hours=24)  # Caché de 24 horas
+        self.short_cache_duration = timedelta(hours=6)  # Para errores/fallos
+        self.compress_min_bytes = int(os.getenv('AI_CACHE_COMPRESS_MIN_BYTES', '1024'))
 
-            redis_url = os.getenv('REDIS_URL', '').strip()
-            if redis_url:
-                # Producción/staging (Railway) o cualquier entorno con REDIS_URL.
-                self.redis_client = redis.Redis.from_url(redis_url, **common_kwargs)
-                logger.info("🔧 Redis configurado desde REDIS_URL")
-            else:
-                # Fallback para desarrollo local sin REDIS_URL.
-                self.redis_client = redis.Redis(
-                    host=os.getenv('REDIS_HOST', 'localhost'),
-                    port=int(os.getenv('REDIS_PORT', '6379')),
-                    db=int(os.getenv('REDIS_DB', '0')),
-                    **common_kwargs
-                )
-                logger.info("🔧 Redis configurado en localhost (sin REDIS_URL)")
-
-            # Configuraciones de caché
-            self.cache_duration = timedelta(hours=24)  # Caché de 24 horas
-            self.short_cache_duration = timedelta(hours=6)  # Para errores/fallos
-
-            # Verificar conexión
-            self.redis_client.ping()
-            self.cache_available = True
-            logger.info("✅ Sistema de caché Redis conectado correctamente")
-            
-        except (redis.ConnectionError, redis.TimeoutError) as e:
-            logger.warning(f"⚠️ Redis no disponible, funcionando sin caché: {e}")
-            self.redis_client = None
-            self.cache_available = False
-        except Exception as e:
-            logger.error(f"❌ Error configurando Redis: {e}")
-            self.redis_client = None
-            self.cache_available = False
+        self.local = _LocalLRU(
+            max_entries=int(os.getenv('AI_CACHE_LOCAL_MAX_ENTRIES', '2000')),
+            max_bytes=int(float(os.getenv('AI_CACHE_LOCAL_MAX_MB', '128')) * 1024 * 1024),
+            ttl_seconds=int(os.getenv('AI_CACHE_LOCAL_TTL_SECONDS', '900')),
+        )
+
+        # Binario: los payloads grandes se guardan comprimidos con zlib
+        self.redis_client = create_redis_client(decode_responses=False)
+        self.cache_available = self.redis_client is not None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            tier: {'hits': 0, 'misses': 0, 'payload_bytes': 0, 'decode_seconds': 0.0}
+            for tier in ('local', 'redis')
+        }
+        self._stats['redis'].update({'stores': 0, 'stored_bytes': 0, 'stored_raw_bytes': 0,
+                                     'mget_calls': 0, 'errors': 0})
     
     def _generate_cache_key(self, keyword: str, site_url: str, country: str) -> str:
         """Genera una clave única para el caché basada en los parámetros"""
@@ -75,30 +200,134 @@ class AIOverviewCache:
         content_hash = hashlib.md5(content.encode()).hexdigest()[:12]
         
         return f"ai_analysis:{content_hash}:{keyword_normalized[:20]}"
+
+    def _record(self, tier: str, **deltas):
+        with self._stats_lock:
+            stats = self._stats[tier]
+            for name, delta in deltas.items():
+                stats[name] += delta
+
+    def _encode(self, cached_data: Dict[str, Any]) -> tuple:
+        """Devuelve (json_bytes, payload_redis): zlib solo si compensa."""
+        raw = json.dumps(cached_data, ensure_ascii=False).encode('utf-8')
+        if len(raw) < self.compress_min_bytes:
+            return raw, raw
+        return raw, zlib.compress(raw, 6)
+
+    @staticmethod
+    def _decompress(payload: bytes) -> bytes:
+        # JSON plano (entradas pequeñas o anteriores a la compresión) empieza por '{'
+        if payload[:1] == b'{':
+            return payload
+        return zlib.decompress(payload)
+
+    def _duration_for(self, analysis: Dict[str, Any]) -> timedelta:
+        if analysis.get('ai_analysis', {}).get('has_ai_overview', False):
+            return self.cache_duration  # 24 horas para resultados positivos
+        return self.short_cache_duration  # 6 horas para resultados negativos
+
+    @staticmethod
+    def _wrap(analysis: Dict[str, Any], keyword: str, site_url: str, country: str) -> Dict[str, Any]:
+        return {
+            'analysis': analysis,
+            'cached_at': str(timedelta(seconds=0)),  # Timestamp relativo
+            'keyword': keyword,
+            'site_url': site_url,
+            'country': country,
+            'cache_version': '1.0'
+        }
+
+    def _read_local(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        payload = self.local.get(cache_key)
+        if payload is None:
+            if self.local.enabled:
+                self._record('local', misses=1)
+            return None
+        started = time.perf_counter()
+        data = json.loads(payload)
+        self._record('local', hits=1, payload_bytes=len(payload),
+                     decode_seconds=time.perf_counter() - started)
+        return data
+
+    def _accept_redis_payload(self, cache_key: str, payload: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """Decodifica un payload leído de Redis y lo sube al nivel local."""
+        if payload is None:
+            self._record('redis', misses=1)
+            return None
+        started = time.perf_counter()
+        raw = self._decompress(payload)
+        data = json.loads(raw)
+        self._record('redis', hits=1, payload_bytes=len(payload),
+                     decode_seconds=time.perf_counter() - started)
+        self.local.set(cache_key, raw)
+        return data
     
     def get_cached_analysis(self, keyword: str, site_url: str, country: str) -> Optional[Dict[str, Any]]:
         """Obtiene un análisis desde el caché si existe y es válido"""
+        cache_key = self._generate_cache_key(keyword, site_url, country)
+        data = self._read_local(cache_key)
+        if data is not None:
+            logger.info(f"💾 Cache HIT (local) para keyword: {keyword[:20]}...")
+            return data
+
         if not self.cache_available:
             return None
             
         try:
-            cache_key = self._generate_cache_key(keyword, site_url, country)
-            cached_data = self.redis_client.get(cache_key)
+            data = self._accept_redis_payload(cache_key, self.redis_client.get(cache_key))
             
-            if cached_data:
-                data = json.loads(cached_data)
+            if data is not None:
                 logger.info(f"💾 Cache HIT para keyword: {keyword[:20]}...")
                 return data
             else:
                 logger.debug(f"💾 Cache MISS para keyword: {keyword[:20]}...")
                 return None
                 
-        except (redis.ConnectionError, json.JSONDecodeError) as e:
+        except (redis.ConnectionError, zlib.error, ValueError) as e:
+            self._record('redis', errors=1)
             logger.warning(f"Error leyendo del caché: {e}")
             return None
         except Exception as e:
+            self._record('redis', errors=1)
             logger.error(f"Error inesperado en caché: {e}")
             return None
+
+    def prefetch(self, items: list) -> int:
+        """
+        Calienta el nivel local para una lista de `(keyword, site_url, country)`
+        con un único MGET. Devuelve cuántas entradas quedaron disponibles en
+        local (ya estaban o se trajeron de Redis).
+        """
+        keys = list(dict.fromkeys(self._generate_cache_key(*item) for item in items))
+        missing = [key for key in keys if self.local.get(key) is None]
+        available = len(keys) - len(missing)
+        if not missing or not self.cache_available or not self.local.enabled:
+            return available
+
+        try:
+            payloads = self.redis_client.mget(missing)
+            self._record('redis', mget_calls=1)
+        except Exception as e:
+            self._record('redis', errors=1)
+            logger.warning(f"Error en MGET del caché: {e}")
+            return available
+
+        for cache_key, payload in zip(missing, payloads):
+            try:
+                if self._accept_redis_payload(cache_key, payload) is not None:
+                    available += 1
+            except (zlib.error, ValueError) as e:
+                self._record('redis', errors=1)
+                logger.warning(f"Entrada de caché ilegible ({cache_key}): {e}")
+        logger.info(f"💾 Prefetch de caché: {available}/{len(keys)} keywords disponibles")
+        return available
+
+    def _store(self, target, cache_key: str, cached_data: Dict[str, Any], duration: timedelta):
+        raw, payload = self._encode(cached_data)
+        ttl = int(duration.total_seconds())
+        target.setex(cache_key, ttl, payload)
+        self.local.set(cache_key, raw, ttl)
+        self._record('redis', stores=1, stored_bytes=len(payload), stored_raw_bytes=len(raw))
     
     def cache_analysis(self, keyword: str, site_url: str, country: str, analysis: Dict[str, Any]) -> bool:
         """Guarda un análisis en el caché con metadatos adicionales"""
@@ -108,28 +337,11 @@ class AIOverviewCache:
         try:
             cache_key = self._generate_cache_key(keyword, site_url, country)
             
-            # Añadir metadatos al análisis
-            cached_data = {
-                'analysis': analysis,
-                'cached_at': str(timedelta(seconds=0)),  # Timestamp relativo
-                'keyword': keyword,
-                'site_url': site_url,
-                'country': country,
-                'cache_version': '1.0'
-            }
-            
             # Determinar duración del caché basada en el resultado
-            if analysis.get('ai_analysis', {}).get('has_ai_overview', False):
-                duration = self.cache_duration  # 24 horas para resultados positivos
-            else:
-                duration = self.short_cache_duration  # 6 horas para resultados negativos
+            duration = self._duration_for(analysis)
             
-            # Guardar en Redis
-            self.redis_client.setex(
-                cache_key,
-                int(duration.total_seconds()),
-                json.dumps(cached_data, ensure_ascii=False)
-            )
+            # Guardar en Redis (y en el nivel local)
+            self._store(self.redis_client, cache_key, self._wrap(analysis, keyword, site_url, country), duration)
             
             logger.info(f"💾 Análisis cacheado para {keyword[:20]}... por {duration.total_seconds()/3600:.1f}h")
             return True
@@ -159,27 +371,8 @@ class AIOverviewCache:
                     continue
                 
                 cache_key = self._generate_cache_key(keyword, site_url, country)
-                
-                cached_data = {
-                    'analysis': analysis,
-                    'cached_at': str(timedelta(seconds=0)),
-                    'keyword': keyword,
-                    'site_url': site_url,
-                    'country': country,
-                    'cache_version': '1.0'
-                }
-                
-                # Duración basada en resultado
-                if analysis.get('ai_analysis', {}).get('has_ai_overview', False):
-                    duration = self.cache_duration
-                else:
-                    duration = self.short_cache_duration
-                
-                pipe.setex(
-                    cache_key,
-                    int(duration.total_seconds()),
-                    json.dumps(cached_data, ensure_ascii=False)
-                )
+                self._store(pipe, cache_key, self._wrap(analysis, keyword, site_url, country),
+                            self._duration_for(analysis))
                 cached_count += 1
             
             # Ejecutar pipeline
@@ -190,27 +383,46 @@ class AIOverviewCache:
         except Exception as e:
             logger.error(f"Error en caché por lotes: {e}")
             return 0
+
+    def get_tier_stats(self) -> Dict[str, Any]:
+        """Hit ratio, bytes y tiempo de decodificación por nivel (este proceso)."""
+        with self._stats_lock:
+            tiers = {tier: dict(stats) for tier, stats in self._stats.items()}
+        for stats in tiers.values():
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+            stats['avg_payload_bytes'] = int(stats['payload_bytes'] / stats['hits']) if stats['hits'] else 0
+            stats['avg_decode_ms'] = round(stats['decode_seconds'] * 1000 / stats['hits'], 3) if stats['hits'] else 0.0
+            stats['decode_seconds'] = round(stats['decode_seconds'], 4)
+        redis_stats = tiers['redis']
+        redis_stats['compression_ratio'] = (
+            round(redis_stats['stored_bytes'] / redis_stats['stored_raw_bytes'], 4)
+            if redis_stats['stored_raw_bytes'] else None
+        )
+        tiers['local'].update(self.local.usage())
+        return tiers
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del sistema de caché"""
         if not self.cache_available:
-            return {'cache_available': False, 'message': 'Redis no disponible'}
+            return {'cache_available': False, 'message': 'Redis no disponible', 'tiers': self.get_tier_stats()}
         
         try:
             info = self.redis_client.info()
             
             # Contar claves específicas de AI Overview
-            pattern = "ai_analysis:*"
-            ai_keys = self.redis_client.keys(pattern)
+            ai_keys = sum(1 for _ in self.redis_client.scan_iter(match="ai_analysis:*", count=500))
             
             return {
                 'cache_available': True,
                 'redis_version': info.get('redis_version', 'unknown'),
                 'used_memory': info.get('used_memory_human', 'unknown'),
                 'connected_clients': info.get('connected_clients', 0),
-                'ai_analyses_cached': len(ai_keys),
+                'ai_analyses_cached': ai_keys,
                 'total_keys': info.get('db0', {}).get('keys', 0) if 'db0' in info else 0,
-                'uptime_seconds': info.get('uptime_in_seconds', 0)
+                'uptime_seconds': info.get('uptime_in_seconds', 0),
+                'tiers': self.get_tier_stats(),
+                'gsc_responses': gsc_cache.get_stats()
             }
             
         except Exception as e:
@@ -219,11 +431,12 @@ class AIOverviewCache:
     
     def clear_cache(self, pattern: str = "ai_analysis:*") -> int:
         """Limpia el caché de AI Overview (útil para mantenimiento)"""
+        self.local.clear()
         if not self.cache_available:
             return 0
             
         try:
-            keys = self.redis_client.keys(pattern)
+            keys = list(self.redis_client.scan_iter(match=pattern, count=500))
             if keys:
                 deleted = self.redis_client.delete(*keys)
                 logger.info(f"💾 Limpiadas {deleted} entradas del caché")
@@ -236,6 +449,8 @@ class AIOverviewCache:
     
     def invalidate_site_cache(self, site_url: str) -> int:
         """Invalida todo el caché relacionado con un sitio específico"""
+        site_lower = site_url.lower()
+        self.local.delete_where(lambda data: data.get('site_url', '').lower() == site_lower)
         if not self.cache_available:
             return 0
             
@@ -243,20 +458,21 @@ class AIOverviewCache:
             # Buscar todas las claves que puedan contener el sitio
             # Nota: esto es una implementación simplificada
             # En producción sería mejor mantener un índice por sitio
-            pattern = "ai_analysis:*"
-            keys = self.redis_client.keys(pattern)
+            keys = list(self.redis_client.scan_iter(match="ai_analysis:*", count=500))
             
             deleted_count = 0
-            for key in keys:
-                try:
-                    data = self.redis_client.get(key)
-                    if data:
-                        cached_data = json.loads(data)
-                        if cached_data.get('site_url', '').lower() == site_url.lower():
+            for start in range(0, len(keys), 200):
+                chunk = keys[start:start + 200]
+                for key, payload in zip(chunk, self.redis_client.mget(chunk)):
+                    try:
+                        if payload is None:
+                            continue
+                        cached_data = json.loads(self._decompress(payload))
+                        if cached_data.get('site_url', '').lower() == site_lower:
                             self.redis_client.delete(key)
                             deleted_count += 1
-                except:
-                    continue
+                    except Exception:
+                        continue
             
             logger.info(f"💾 Invalidadas {deleted_count} entradas de caché para {site_url}")
             return deleted_count
@@ -265,5 +481,185 @@ class AIOverviewCache:
             logger.error(f"Error invalidando caché del sitio: {e}")
             return 0
 
+
+class GSCResponseCache:
+    """Caché Redis de respuestas de `searchanalytics.query` de Search Console.
+
+    Los datos de GSC de hace más de `GSC_SETTLING_DAYS` días ya no cambian, así
+    que los rangos cerrados se guardan con un TTL largo y solo los últimos días
+    ("todavía asentándose") se vuelven a pedir a Google con un TTL corto.
+
+    Cuando la consulta incluye la dimensión `date` y el rango cruza el corte, se
+    parte en dos tramos: el cerrado se sirve de caché y solo se descarga la cola.
+    Con otras dimensiones las métricas no se pueden sumar por tramos, así que la
+    respuesta completa se guarda con el TTL corto.
+
+    Las claves incluyen un `scope` derivado de las credenciales OAuth para que
+    una cuenta de Google nunca lea datos cacheados por otra.
+    """
+
+    def __init__(self):
+        self.settling_days = int(os.getenv('GSC_SETTLING_DAYS', '3'))
+        self.immutable_duration = timedelta(days=int(os.getenv('GSC_CACHE_IMMUTABLE_DAYS', '30')))
+        self.settling_duration = timedelta(minutes=int(os.getenv('GSC_CACHE_SETTLING_MINUTES', '60')))
+        # Respuestas comprimidas mayores que esto no se guardan (evita llenar Redis)
+        self.max_payload_bytes = int(os.getenv('GSC_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+        # Binario: los payloads se guardan comprimidos con zlib
+        self.redis_client = create_redis_client(decode_responses=False)
+        self.cache_available = self.redis_client is not None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'partial_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0, 'bypassed': 0}
+
+    @staticmethod
+    def normalize_filters(filters) -> list:
+        """Forma canónica de `dimensionFilterGroups` (el orden de grupos/filtros no importa)."""
+        groups = []
+        for group in filters or []:
+            group_filters = sorted(
+                json.dumps(f, sort_keys=True, ensure_ascii=False) for f in group.get('filters', [])
+            )
+            groups.append(json.dumps(
+                {'groupType': group.get('groupType', 'and'), 'filters': group_filters},
+                sort_keys=True, ensure_ascii=False
+            ))
+        return sorted(groups)
+
+    def _generate_cache_key(self, scope: str, site_url: str, dimensions: list, filters,
+                            start_date: str, end_date: str, max_rows=None) -> str:
+        """Genera la clave para (cuenta, propiedad, dimensiones, filtros, rango)."""
+        content = json.dumps({
+            'scope': scope,
+            'site': site_url.strip().lower(),
+            'dims': list(dimensions or []),
+            'filters': self.normalize_filters(filters),
+            'max_rows': max_rows,
+        }, sort_keys=True, ensure_ascii=False)
+        content_hash = hashlib.sha256(content.encode()).hexdigest()[:24]
+        return f"gsc_rows:{content_hash}:{start_date}:{end_date}"
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def settling_cutoff(self) -> date:
+        """Último día cuyo dato de GSC se considera definitivo."""
+        return datetime.now(timezone.utc).date() - timedelta(days=self.settling_days)
+
+    def _get(self, key: str) -> Optional[list]:
+        try:
+            payload = self.redis_client.get(key)
+            if payload is None:
+                return None
+            return json.loads(zlib.decompress(payload))
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Error leyendo respuesta GSC del caché: {e}")
+            return None
+
+    def _set(self, key: str, rows: list, duration: timedelta) -> bool:
+        try:
+            payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+            if len(payload) > self.max_payload_bytes:
+                logger.info(f"💾 Respuesta GSC de {len(payload)} bytes no cacheada (supera el límite)")
+                return False
+            self.redis_client.setex(key, int(duration.total_seconds()), payload)
+            self._count('stores')
+            return True
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Error guardando respuesta GSC en caché: {e}")
+            return False
+
+    def _segment(self, key_args: tuple, start: str, end: str, duration: timedelta, fetch, on_cached):
+        """Sirve un tramo de caché o lo descarga y guarda. Devuelve (filas, era_hit)."""
+        scope, site_url, dimensions, filters, max_rows = key_args
+        key = self._generate_cache_key(scope, site_url, dimensions, filters, start, end, max_rows)
+        rows = self._get(key)
+        if rows is not None:
+            if on_cached and rows:
+                on_cached(rows)
+            return rows, True
+        rows = fetch(start, end)
+        self._set(key, rows, duration)
+        return rows, False
+
+    def get_or_fetch(self, scope: Optional[str], site_url: str, start_date: str, end_date: str,
+                     dimensions: list, filters, fetch, max_rows=None, on_cached=None) -> list:
+        """
+        Devuelve las filas de la consulta usando la caché siempre que sea posible.
+
+        `fetch(start_date, end_date)` descarga un rango de GSC y devuelve sus filas.
+        `on_cached(rows)` (opcional) recibe las filas servidas desde caché, para que
+        los llamadores en streaming puedan emitirlas igual que las descargadas.
+        """
+        if not self.cache_available:
+            return fetch(start_date, end_date)
+        if not scope:
+            self._count('bypassed')
+            return fetch(start_date, end_date)
+
+        try:
+            start = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            self._count('bypassed')
+            return fetch(start_date, end_date)
+
+        key_args = (scope, site_url, dimensions, filters, max_rows)
+        cutoff = self.settling_cutoff()
+
+        # 1) Rango completamente cerrado: TTL largo
+        if end <= cutoff:
+            rows, hit = self._segment(key_args, start_date, end_date, self.immutable_duration, fetch, on_cached)
+            self._count('hits' if hit else 'misses')
+            return rows
+
+        # 2) Rango que cruza el corte con dimensión 'date': tramo cerrado + cola fresca
+        if start <= cutoff and 'date' in (dimensions or []):
+            closed_rows, hit = self._segment(
+                key_args, start_date, cutoff.strftime('%Y-%m-%d'), self.immutable_duration, fetch, on_cached
+            )
+            tail_start = (cutoff + timedelta(days=1)).strftime('%Y-%m-%d')
+            tail_rows, tail_hit = self._segment(
+                key_args, tail_start, end_date, self.settling_duration, fetch, on_cached
+            )
+            if hit and tail_hit:
+                self._count('hits')
+            elif hit:
+                self._count('partial_hits')
+            else:
+                self._count('misses')
+            return closed_rows + tail_rows
+
+        # 3) Rango aún asentándose: se cachea entero con TTL corto
+        rows, hit = self._segment(key_args, start_date, end_date, self.settling_duration, fetch, on_cached)
+        self._count('hits' if hit else 'misses')
+        return rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de hit/miss de este proceso."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['partial_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['partial_hits']) / lookups, 4) if lookups else 0.0
+        stats['cache_available'] = self.cache_available
+        stats['settling_days'] = self.settling_days
+        return stats
+
+    def clear_cache(self, pattern: str = "gsc_rows:*") -> int:
+        """Limpia las respuestas de GSC cacheadas."""
+        if not self.cache_available:
+            return 0
+        try:
+            keys = list(self.redis_client.scan_iter(match=pattern, count=500))
+            return self.redis_client.delete(*keys) if keys else 0
+        except Exception as e:
+            logger.error(f"Error limpiando caché de GSC: {e}")
+            return 0
+
+
 # Instancia global del caché
-ai_cache = AIOverviewCache() 
\ No newline at end of file
+ai_cache = AIOverviewCache()
+gsc_cache = GSCResponseCache() 
\ No newline at end of file
@@ -0,0 +1,395 @@
+"""
+Resultados de /get-data persistidos en servidor y consultados por páginas.
+
+/get-data guarda las tablas completas (URLs y keywords) bajo un `analysis_id`
+y responde solo con las métricas agregadas, la primera página de cada tabla
+y los top movers. Las tablas Grid.js (modo server) piden el resto con
+`GET /api/analysis/<analysis_id>/<tabla>`: paginación, orden y filtros se
+resuelven aquí, sobre la tabla completa. El Excel se genera también desde el
+resultado guardado.
+
+Los filtros de keywords replican los del panel: búsqueda por keyword y por
+URL, términos del Keyword Filter (contains/equals/notContains/notEquals),
+presets de oportunidades y grupos de posición de los modales de keywordStats.
+
+Las tablas se guardan comprimidas en Redis con TTL y, decodificadas, en una
+pequeña LRU en memoria para no descomprimir en cada página. Sin Redis se usa
+solo la memoria del proceso.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from services.ai_cache import create_redis_client
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_RESULTS_TTL_SECONDS = int(os.getenv('ANALYSIS_RESULTS_TTL_SECONDS', '7200'))
+ANALYSIS_RESULTS_MEMORY_ITEMS = int(os.getenv('ANALYSIS_RESULTS_MEMORY_ITEMS', '16'))
+ANALYSIS_FIRST_PAGE_SIZE = int(os.getenv('ANALYSIS_FIRST_PAGE_SIZE', '10'))
+MAX_PAGE_SIZE = 500
+MOVERS_COUNT = 10
+_REDIS_PREFIX = 'analysis_rows:'
+
+# Tabla → clave del payload de /get-data y orden por defecto (desc)
+TABLES = {
+    'keywords': {'source': 'keyword_comparison_data', 'default_sort': 'clicks_m1'},
+    'pages': {'source': 'pages', 'default_sort': 'clicks_p1'},
+}
+_TEXT_COLUMNS = {'keyword', 'url'}
+
+KEYWORD_FILTER_METHODS = ('contains', 'equals', 'notContains', 'notEquals')
+KEYWORD_PRESETS = ('easyWins', 'longTail', 'aiSeasonalityAffected', 'cannibalization', 'decayRisk')
+# Grupos de los modales de keywordStats (mismos cortes que gsc_aggregation._bucket)
+KEYWORD_GROUPS = ('top3', 'top10', 'top20', 'top20plus', 'improved', 'worsened', 'same', 'new', 'lost')
+
+# CTR esperado (%) por posición para el preset Easy Wins
+_EXPECTED_CTR = [(1, 28), (2, 15), (3, 10), (4, 7), (5, 5.5), (6, 4.3), (7, 3.5), (8, 2.9),
+                 (9, 2.5), (10, 2.2), (12, 1.8), (15, 1.4), (20, 0.9)]
+
+_memory = OrderedDict()     # analysis_id -> {'user_id', 'tables': {tabla: DataFrame}}
+_memory_lock = threading.Lock()
+_redis = None
+_redis_checked = False
+
+
+def _get_redis():
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis = create_redis_client(decode_responses=False)
+        _redis_checked = True
+    return _redis
+
+
+# ================================
+# Tablas
+# ================================
+
+def _numbers(values):
+    """Lista de valores → float64, NaN para nulos y texto ('New', 'Lost', ...)."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _position(values):
+    """Posiciones válidas (> 0); el resto, NaN."""
+    positions = _numbers(values)
+    positions[~(positions > 0)] = np.nan
+    return positions
+
+
+def _url_text(value):
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('page') or ''
+    return str(value or '').strip().lower()
+
+
+def _cannibalization_url(value):
+    """URL sin fragmento, query ni barra final (como el preset del panel)."""
+    url = _url_text(value).split('#')[0].split('?')[0]
+    return url.rstrip('/') if len(url) > 1 else url
+
+
+def _keywords_frame(rows):
+    keywords, urls, url_counts = [], [], []
+    for row in rows:
+        keywords.append(str(row.get('keyword') or row.get('query') or ''))
+        candidates = [row.get('url'), row.get('page')] + list(row.get('top_urls') or [])
+        urls.append('\n'.join(dict.fromkeys(u for u in map(_url_text, candidates) if u)))
+        url_counts.append(len({u for u in map(_cannibalization_url, candidates) if u}))
+
+    def column(name):
+        return [row.get(name) for row in rows]
+
+    frame = pd.DataFrame({
+        '_row': pd.Series(rows, dtype=object),
+        'keyword': keywords,
+        'url': [row.get('url') or '' for row in rows],
+        '_urls': urls,
+        '_url_count': np.asarray(url_counts, dtype=int),
+        '_top_urls_count': _numbers(column('top_urls_count')),
+        'delta_clicks_percent': _numbers(column('delta_clicks_percent')),
+    })
+    for metric in ('clicks', 'impressions', 'ctr'):
+        for period in ('m1', 'm2'):
+            frame[f'{metric}_{period}'] = _numbers(column(f'{metric}_{period}'))
+    frame['position_m1'] = _position(column('position_m1'))
+    frame['position_m2'] = _position(column('position_m2'))
+    # Deltas como los muestra la tabla: P1 - P2 con 0 donde falta el valor
+    for metric in ('clicks', 'impressions', 'ctr', 'position'):
+        frame[f'delta_{metric}'] = (np.nan_to_num(frame[f'{metric}_m1'].to_numpy())
+                                    - np.nan_to_num(frame[f'{metric}_m2'].to_numpy()))
+    return frame
+
+
+def _page_periods(row):
+    """(P1, P2) de una URL: P1 el período más reciente; P2 None sin comparación."""
+    metrics = list(row.get('Metrics') or [])
+    if not metrics:
+        return {}, None
+    if len(metrics) == 1:
+        return metrics[0], None
+    if all(m.get('StartDate') for m in metrics):
+        metrics.sort(key=lambda m: m['StartDate'])
+    return metrics[-1], metrics[0]
+
+
+def _pages_frame(rows):
+    periods = [_page_periods(row) for row in rows]
+    frame = pd.DataFrame({
+        '_row': pd.Series(rows, dtype=object),
+        'url': [str(row.get('URL') or '') for row in rows],
+    })
+    for suffix, index in (('p1', 0), ('p2', 1)):
+        metrics = [pair[index] or {} for pair in periods]
+        frame[f'clicks_{suffix}'] = np.nan_to_num(_numbers([m.get('Clicks') for m in metrics]))
+        frame[f'impressions_{suffix}'] = np.nan_to_num(_numbers([m.get('Impressions') for m in metrics]))
+        frame[f'ctr_{suffix}'] = np.nan_to_num(_numbers([m.get('CTR') for m in metrics])) * 100
+        frame[f'position_{suffix}'] = _position([m.get('Position') for m in metrics])
+    for metric in ('clicks', 'impressions', 'ctr', 'position'):
+        frame[f'delta_{metric}'] = (np.nan_to_num(frame[f'{metric}_p1'].to_numpy())
+                                    - np.nan_to_num(frame[f'{metric}_p2'].to_numpy()))
+    # % de cambio de clics solo con comparación y clics previos (top movers)
+    has_previous = np.array([pair[1] is not None for pair in periods], dtype=bool)
+    clicks_p2 = frame['clicks_p2'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (frame['clicks_p1'].to_numpy() / clicks_p2 - 1) * 100
+    frame['delta_clicks_percent'] = np.where(has_previous & (clicks_p2 > 0), change, np.nan)
+    return frame
+
+
+_FRAME_BUILDERS = {'keywords': _keywords_frame, 'pages': _pages_frame}
+
+
+def _to_frames(raw_tables):
+    return {name: _FRAME_BUILDERS[name](raw_tables.get(name) or []) for name in TABLES}
+
+
+# ================================
+# Almacenamiento
+# ================================
+
+def _remember(analysis_id, user_id, tables):
+    with _memory_lock:
+        _memory[analysis_id] = {'user_id': user_id, 'tables': tables}
+        _memory.move_to_end(analysis_id)
+        while len(_memory) > ANALYSIS_RESULTS_MEMORY_ITEMS:
+            _memory.popitem(last=False)
+
+
+def save_result_set(user_id, payload):
+    """Guarda las tablas de un payload de /get-data y devuelve su `analysis_id`."""
+    analysis_id = uuid.uuid4().hex
+    raw_tables = {name: payload.get(spec['source']) or [] for name, spec in TABLES.items()}
+    _remember(analysis_id, user_id, _to_frames(raw_tables))
+
+    client = _get_redis()
+    if client is not None:
+        try:
+            blob = zlib.compress(json.dumps({'user_id': user_id, 'tables': raw_tables}, default=str).encode('utf-8'))
+            client.setex(_REDIS_PREFIX + analysis_id, ANALYSIS_RESULTS_TTL_SECONDS, blob)
+        except Exception as e:
+            logger.warning(f"[ANALYSIS ROWS] No se pudo guardar {analysis_id} en Redis: {e}")
+    return analysis_id
+
+
+def _load_tables(analysis_id, user_id):
+    with _memory_lock:
+        entry = _memory.get(analysis_id)
+        if entry is not None:
+            _memory.move_to_end(analysis_id)
+    if entry is None:
+        client = _get_redis()
+        if client is None:
+            return None
+        try:
+            blob = client.get(_REDIS_PREFIX + analysis_id)
+        except Exception as e:
+            logger.warning(f"[ANALYSIS ROWS] No se pudo leer {analysis_id} de Redis: {e}")
+            return None
+        if not blob:
+            return None
+        stored = json.loads(zlib.decompress(blob).decode('utf-8'))
+        entry = {'user_id': stored['user_id'], 'tables': _to_frames(stored['tables'])}
+        _remember(analysis_id, entry['user_id'], entry['tables'])
+    if entry['user_id'] != user_id:
+        return None
+    return entry['tables']
+
+
+def load_result_set(analysis_id, user_id):
+    """Filas completas de un análisis (`pages`, `keyword_comparison_data`). None si no existe o no es del usuario."""
+    tables = _load_tables(analysis_id, user_id)
+    if tables is None:
+        return None
+    return {spec['source']: tables[name]['_row'].tolist() for name, spec in TABLES.items()}
+
+
+# ================================
+# Filtros y consulta
+# ================================
+
+def _expected_ctr(positions):
+    conditions = [positions <= limit for limit, _ in _EXPECTED_CTR]
+    return np.select(conditions, [ctr for _, ctr in _EXPECTED_CTR], 0.5)
+
+
+def _high_impressions_threshold(frame):
+    """Percentil 65 de las impresiones > 0 (mínimo 30), como el panel."""
+    impressions = np.sort(frame['impressions_m1'].to_numpy()[frame['impressions_m1'].to_numpy() > 0])
+    if not len(impressions):
+        return 30
+    p65 = impressions[int((len(impressions) - 1) * 0.65)]
+    return max(30, int(np.floor(p65 + 0.5)))
+
+
+def _preset_mask(frame, preset):
+    clicks_1 = np.nan_to_num(frame['clicks_m1'].to_numpy())
+    clicks_2 = np.nan_to_num(frame['clicks_m2'].to_numpy())
+    impressions_1 = np.nan_to_num(frame['impressions_m1'].to_numpy())
+    impressions_2 = np.nan_to_num(frame['impressions_m2'].to_numpy())
+    pos_1 = np.nan_to_num(frame['position_m1'].to_numpy())
+    pos_2 = np.nan_to_num(frame['position_m2'].to_numpy())
+
+    if preset == 'easyWins':
+        ctr = np.nan_to_num(frame['ctr_m1'].to_numpy())
+        ctr = np.where(ctr <= 1, ctr * 100, ctr)
+        expected = _expected_ctr(pos_1)
+        return ((pos_1 >= 8) & (pos_1 <= 15) & (impressions_1 >= _high_impressions_threshold(frame))
+                & (ctr < expected * 0.8))
+    if preset == 'longTail':
+        return (frame['keyword'].str.split().str.len().fillna(0) >= 4).to_numpy()
+    if preset == 'aiSeasonalityAffected':
+        valid = (clicks_2 > 0) & (impressions_2 > 0) & (pos_2 > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            clicks_drop = (clicks_1 - clicks_2) / clicks_2
+        return valid & (impressions_1 >= impressions_2) & (pos_1 > 0) & (pos_1 <= pos_2) & (clicks_drop < -0.05)
+    if preset == 'cannibalization':
+        return (np.nan_to_num(frame['_top_urls_count'].to_numpy()) >= 2) | (frame['_url_count'].to_numpy() >= 2)
+    if preset == 'decayRisk':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            decay = (pos_1 - pos_2) / pos_2
+        return (pos_1 > 0) & (pos_2 > 0) & (decay > 0.15)
+    return np.ones(len(frame), dtype=bool)
+
+
+def _group_mask(frame, group):
+    pos_1 = frame['position_m1'].to_numpy()
+    pos_2 = frame['position_m2'].to_numpy()
+    has_1, has_2 = ~np.isnan(pos_1), ~np.isnan(pos_2)
+    with np.errstate(invalid='ignore'):
+        masks = {
+            'top3': has_1 & (pos_1 <= 3),
+            'top10': has_1 & (pos_1 > 3) & (pos_1 <= 10),
+            'top20': has_1 & (pos_1 > 10) & (pos_1 <= 20),
+            'top20plus': has_1 & (pos_1 > 20),
+            'improved': has_1 & has_2 & (pos_1 < pos_2),
+            'worsened': has_1 & has_2 & (pos_1 > pos_2),
+            'same': has_1 & has_2 & (pos_1 == pos_2),
+            'new': has_1 & ~has_2,
+            'lost': ~has_1 & has_2,
+        }
+    return masks.get(group, np.ones(len(frame), dtype=bool))
+
+
+def _terms_mask(frame, terms, method):
+    keywords = frame['keyword'].str.lower()
+    if method in ('equals', 'notEquals'):
+        found = keywords.isin(terms).to_numpy()
+    else:
+        pattern = '|'.join(re.escape(t) for t in terms)
+        found = keywords.str.contains(pattern, regex=True).to_numpy()
+    return ~found if method.startswith('not') else found
+
+
+def query_table(frame, table, page=0, limit=ANALYSIS_FIRST_PAGE_SIZE, sort=None, order='desc',
+                search=None, url_search=None, terms=None, method='contains', preset=None, group=None):
+    """
+    Devuelve `(filas, total)` de una tabla: filtros, orden por `sort`
+    (asc|desc, nulos al final) y página `page` (base 0) de tamaño `limit`.
+
+    `search` filtra por keyword (o por URL en `pages`); el resto de filtros
+    solo aplica a `keywords`.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    page = max(0, int(page))
+    if frame.empty:
+        return [], 0
+
+    mask = np.ones(len(frame), dtype=bool)
+    needle = (search or '').strip().lower()
+    if needle:
+        text = frame['keyword'] if table == 'keywords' else frame['url']
+        mask &= text.str.lower().str.contains(needle, regex=False).to_numpy()
+    if table == 'keywords':
+        url_needle = (url_search or '').strip().lower()
+        if url_needle:
+            mask &= frame['_urls'].str.contains(url_needle, regex=False).to_numpy()
+        terms = [t.strip().lower() for t in (terms or []) if t and t.strip()]
+        if terms and method in KEYWORD_FILTER_METHODS:
+            mask &= _terms_mask(frame, terms, method)
+        if preset in KEYWORD_PRESETS:
+            mask &= _preset_mask(frame, preset)
+        if group in KEYWORD_GROUPS:
+            mask &= _group_mask(frame, group)
+    if not mask.all():
+        frame = frame[mask]
+
+    if sort is None or sort.startswith('_') or sort not in frame.columns:
+        sort = TABLES[table]['default_sort']
+    if len(frame) > 1:
+        keys = frame[sort].str.lower() if sort in _TEXT_COLUMNS else frame[sort]
+        frame = frame.assign(_key=keys.to_numpy()).sort_values(
+            '_key', ascending=(order == 'asc'), na_position='last', kind='stable'
+        )
+
+    window = frame['_row'].iloc[page * limit:(page + 1) * limit]
+    return window.tolist(), len(frame)
+
+
+def query_rows(analysis_id, user_id, table, **params):
+    """Consulta paginada de una tabla guardada. None si no existe, caducó o no es del usuario."""
+    if table not in TABLES:
+        return None
+    tables = _load_tables(analysis_id, user_id)
+    if tables is None:
+        return None
+    return query_table(tables[table], table, **params)
+
+
+def _movers(frame):
+    """Top subidas y bajadas por % de cambio de clics (solo valores numéricos)."""
+    delta = frame['delta_clicks_percent']
+    winners = frame[delta > 0].sort_values('delta_clicks_percent', ascending=False, kind='stable')
+    losers = frame[delta < 0].sort_values('delta_clicks_percent', ascending=True, kind='stable')
+    return {
+        'winners': winners['_row'].iloc[:MOVERS_COUNT].tolist(),
+        'losers': losers['_row'].iloc[:MOVERS_COUNT].tolist(),
+    }
+
+
+def paginate_response(payload, user_id, page_size=ANALYSIS_FIRST_PAGE_SIZE):
+    """
+    Guarda las tablas completas del payload y las recorta a su primera página
+    (orden por defecto). Añade `paging` (analysis_id, totales) y `movers`.
+    """
+    analysis_id = save_result_set(user_id, payload)
+    tables = _load_tables(analysis_id, user_id)
+    paging = {'analysis_id': analysis_id, 'page_size': page_size, 'tables': {}}
+    movers = {}
+    for name, spec in TABLES.items():
+        rows, total = query_table(tables[name], name, page=0, limit=page_size)
+        payload[spec['source']] = rows
+        paging['tables'][name] = {'total': total, 'default_sort': spec['default_sort']}
+        movers[name] = _movers(tables[name])
+    payload['paging'] = paging
+    payload['movers'] = movers
+    return payload
@@ -0,0 +1,156 @@
+"""
+Pool persistente de navegadores Playwright para renderizar capturas.
+
+La API síncrona de Playwright ata cada navegador al hilo que lo creó, así que
+el pool son N hilos de trabajo, cada uno con su Chromium ya arrancado. Las
+peticiones se encolan y las atiende el primer hilo libre: la concurrencia
+queda acotada a N navegadores y la cola a `queue_max` trabajos (si se llena,
+`render` lanza `BrowserPoolBusy` en vez de acumular peticiones).
+
+Cada trabajo recibe el navegador y debe abrir y cerrar su propio contexto
+(`browser.new_context()`), que es barato y aísla cookies/estado entre
+capturas. Los navegadores se reciclan tras `max_renders` trabajos y se
+relanzan si se han caído.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolBusy(RuntimeError):
+    """La cola del pool está llena."""
+
+
+def _launch_chromium():
+    from playwright.sync_api import sync_playwright
+    playwright = sync_playwright().start()
+    try:
+        return playwright, playwright.chromium.launch()
+    except Exception:
+        playwright.stop()
+        raise
+
+
+class BrowserPool:
+    """
+    `render(fn)` ejecuta `fn(browser)` en uno de los `size` hilos del pool y
+    devuelve su resultado (o relanza su excepción). `launcher()` devuelve
+    `(playwright, browser)`; por defecto arranca Chromium.
+    """
+
+    def __init__(self, size=2, max_renders=50, queue_max=20, launcher=None):
+        self.size = max(1, int(size))
+        self.max_renders = max(1, int(max_renders))
+        self._launcher = launcher or _launch_chromium
+        self._jobs = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'renders': 0, 'errors': 0, 'launches': 0, 'recycled': 0, 'rejected': 0}
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update(workers=len(self._threads), queued=self._jobs.qsize())
+        return stats
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.size):
+                thread = threading.Thread(target=self._worker, name=f'browser-pool-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def render(self, fn, timeout=None):
+        self._ensure_started()
+        future = Future()
+        try:
+            self._jobs.put_nowait((fn, future))
+        except queue.Full:
+            self._count('rejected')
+            raise BrowserPoolBusy('Demasiadas capturas en cola')
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # El hilo lo descartará al llegar a él (o terminará y se ignora)
+            future.cancel()
+            raise
+
+    def shutdown(self, timeout=10):
+        """Cierra los navegadores y detiene los hilos."""
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Hilo de trabajo
+    # ------------------------------------------------------------------
+
+    def _worker(self):
+        playwright = browser = None
+        renders = 0
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    if browser is None:
+                        playwright, browser = self._launcher()
+                        renders = 0
+                        self._count('launches')
+                    result = fn(browser)
+                except BaseException as e:
+                    self._count('errors')
+                    future.set_exception(e)
+                    if browser is not None and not _is_connected(browser):
+                        logger.warning(f"[BROWSER POOL] Navegador caído, se relanzará: {e}")
+                        _close(playwright, browser)
+                        playwright = browser = None
+                    continue
+
+                self._count('renders')
+                future.set_result(result)
+                renders += 1
+                if renders >= self.max_renders:
+                    self._count('recycled')
+                    _close(playwright, browser)
+                    playwright = browser = None
+        finally:
+            _close(playwright, browser)
+
+
+def _is_connected(browser):
+    try:
+        return browser.is_connected()
+    except Exception:
+        return False
+
+
+def _close(playwright, browser):
+    for closer in (getattr(browser, 'close', None), getattr(playwright, 'stop', None)):
+        if closer is None:
+            continue
+        try:
+            closer()
+        except Exception as e:
+            logger.debug(f"[BROWSER POOL] Error cerrando navegador: {e}")
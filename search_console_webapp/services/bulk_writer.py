@@ -0,0 +1,103 @@
+# services/bulk_writer.py - Escritura de resultados por lotes
+"""
+Buffer de escritura para los motores de análisis (Manual AI, AI Mode).
+
+En lugar de abrir una conexión por keyword y escribir fila a fila, el motor
+acumula un registro por keyword analizada y `BufferedWriter` los vuelca cada
+`flush_every` registros llamando a `flush_fn(cur, items)` en UNA transacción;
+`flush_fn` escribe el lote con INSERTs multi-fila (`execute_values`).
+
+Si el lote falla, se reintenta registro a registro (cada uno en su propia
+transacción) para que una fila mala no arrastre al resto; los que fallan
+también solos quedan en `failed`.
+
+Configuración: RESULT_BULK_FLUSH_EVERY (por defecto 25 keywords por lote).
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Callable, List
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+RESULT_BULK_FLUSH_EVERY = max(1, int(os.getenv('RESULT_BULK_FLUSH_EVERY', '25')))
+
+
+class BufferedWriter:
+    """
+    `add(item)` encola un registro; `flush()` vuelca lo pendiente. Es seguro
+    entre hilos y se puede usar como context manager (vuelca al salir).
+    """
+
+    def __init__(self, flush_fn: Callable[[Any, List[Any]], None],
+                 flush_every: int = None, label: str = 'results'):
+        self.flush_fn = flush_fn
+        self.flush_every = max(1, int(flush_every or RESULT_BULK_FLUSH_EVERY))
+        self.label = label
+        self.written = 0
+        self.flushes = 0
+        self.failed: List[Any] = []
+        self._pending: List[Any] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, item: Any) -> None:
+        with self._lock:
+            self._pending.append(item)
+            full = len(self._pending) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Vuelca los registros pendientes; devuelve cuántos se escribieron."""
+        with self._flush_lock:
+            with self._lock:
+                items, self._pending = self._pending, []
+            if not items:
+                return 0
+            written = self._write(items)
+            if not written and len(items) > 1:
+                written = sum(self._write([item]) for item in items)
+            self.written += written
+            return written
+
+    def _write(self, items: List[Any]) -> int:
+        conn = get_db_connection()
+        if not conn:
+            logger.error(f"[BULK WRITER] {self.label}: no DB connection")
+            if len(items) == 1:
+                self.failed.extend(items)
+            return 0
+        try:
+            cur = conn.cursor()
+            self.flush_fn(cur, items)
+            conn.commit()
+            self.flushes += 1
+            return len(items)
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            if len(items) == 1:
+                logger.error(f"[BULK WRITER] {self.label}: error escribiendo registro: {e}")
+                self.failed.extend(items)
+            else:
+                logger.warning(f"[BULK WRITER] {self.label}: lote de {len(items)} falló ({e}); "
+                               f"reintentando registro a registro")
+            return 0
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
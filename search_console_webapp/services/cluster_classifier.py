@@ -0,0 +1,264 @@
+# services/cluster_classifier.py - Clasificador compilado de Topic Clusters
+"""
+Clasificación de keywords en Topic Clusters compartida por el análisis de AI
+Overview (app.py), Manual AI y AI Mode.
+
+Antes cada módulo recorría, por cada keyword, todos los clusters × todos sus
+términos (lower/strip en cada vuelta y `re.search` sin compilar). Con cientos
+de términos y miles de keywords eso domina las estadísticas y los exports.
+`ClusterClassifier` se compila una vez por configuración:
+
+- contains / notContains: autómata Aho-Corasick sobre todos los términos; una
+  pasada por la keyword encuentra todos los términos que contiene.
+- starts_with: el mismo trie recorrido desde la raíz sin enlaces de fallo.
+- exact / equals / notEquals: diccionario término → clusters.
+- regex: patrones precompilados (los inválidos se descartan al compilar).
+
+`get_cluster_classifier(config)` memoiza el clasificador por hash de la
+configuración, así que llamarlo keyword a keyword sigue siendo barato.
+
+El método se lee de cada cluster (`match_method`, formato de Manual AI / AI
+Mode) o, si no lo tiene, del nivel superior (`method`, formato del análisis de
+AI Overview). Keyword y términos se comparan en minúsculas y sin espacios en
+los extremos; los clusters sin nombre y los términos vacíos se ignoran.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_CACHE_MAX_ENTRIES = 64
+_cache: OrderedDict = OrderedDict()   # hash de la config -> ClusterClassifier
+_cache_lock = threading.Lock()
+
+_METHOD_ALIASES = {'equals': 'exact'}
+
+
+class _TermAutomaton:
+    """Trie de términos con enlaces de fallo (Aho-Corasick). Devuelve ids de término."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[frozenset] = [frozenset()]
+        self._terminal: List[Optional[int]] = [None]
+
+    def add(self, term: str, term_id: int) -> None:
+        node = 0
+        for ch in term:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(frozenset())
+                self._terminal.append(None)
+            node = nxt
+        self._terminal[node] = term_id
+
+    def build(self) -> None:
+        """Calcula los enlaces de fallo y las salidas acumuladas (BFS)."""
+        goto, fail, out, terminal = self._goto, self._fail, self._out, self._terminal
+        out[0] = frozenset() if terminal[0] is None else frozenset((terminal[0],))
+        queue = []
+        for child in goto[0].values():
+            fail[child] = 0
+            out[child] = frozenset() if terminal[child] is None else frozenset((terminal[child],))
+            queue.append(child)
+        for node in queue:
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(ch, 0)
+                own = frozenset() if terminal[child] is None else frozenset((terminal[child],))
+                out[child] = own | out[fail[child]]
+                queue.append(child)
+
+    def find_all(self, text: str) -> set:
+        """Ids de todos los términos contenidos en `text`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+    def prefixes(self, text: str) -> set:
+        """Ids de los términos que son prefijo de `text`."""
+        goto, terminal = self._goto, self._terminal
+        found = set()
+        node = 0
+        for ch in text:
+            node = goto[node].get(ch)
+            if node is None:
+                break
+            if terminal[node] is not None:
+                found.add(terminal[node])
+        return found
+
+
+_BACKREFERENCE = re.compile(r'\\\d|\(\?P=')
+
+
+def _combine_patterns(patterns: List[re.Pattern]) -> tuple:
+    """
+    Une los patrones de un cluster en una sola alternancia (una búsqueda por
+    keyword). Si alguno usa referencias a grupos, la numeración cambiaría al
+    unirlos y se dejan por separado.
+    """
+    if len(patterns) == 1 or any(_BACKREFERENCE.search(p.pattern) for p in patterns):
+        return tuple(patterns)
+    try:
+        return (re.compile('|'.join(f'(?:{p.pattern})' for p in patterns), re.IGNORECASE),)
+    except re.error:
+        return tuple(patterns)
+
+
+class ClusterClassifier:
+    """Clasificador compilado a partir de una configuración de Topic Clusters."""
+
+    def __init__(self, clusters_config: Optional[Dict]):
+        self.names: List[str] = []
+        self._contains = _TermAutomaton()
+        self._prefix = _TermAutomaton()
+        self._contains_ids: Dict[str, int] = {}
+        self._prefix_ids: Dict[str, int] = {}
+        # id de término -> índices de cluster (solo métodos positivos)
+        self._contains_clusters: Dict[int, List[int]] = {}
+        self._prefix_clusters: Dict[int, List[int]] = {}
+        self._exact_clusters: Dict[str, List[int]] = {}
+        self._regex_clusters: List[tuple] = []
+        self._not_contains: List[tuple] = []
+        self._not_equals: List[tuple] = []
+
+        if not clusters_config or not clusters_config.get('enabled', False):
+            return
+
+        default_method = clusters_config.get('method', 'contains')
+        for cluster in clusters_config.get('clusters', []) or []:
+            if not isinstance(cluster, dict):
+                continue
+            name = cluster.get('name', '')
+            method = cluster.get('match_method') or default_method
+            method = _METHOD_ALIASES.get(method, method)
+            terms = [str(t).lower().strip() for t in (cluster.get('terms') or []) if t]
+            terms = [t for t in dict.fromkeys(terms) if t]
+            if not name or not terms:
+                continue
+            self._add_cluster(len(self.names), method, terms)
+            self.names.append(name)
+
+        self._contains.build()
+
+    def _term_id(self, ids: Dict[str, int], automaton: _TermAutomaton, term: str) -> int:
+        term_id = ids.get(term)
+        if term_id is None:
+            term_id = ids[term] = len(ids)
+            automaton.add(term, term_id)
+        return term_id
+
+    def _add_cluster(self, index: int, method: str, terms: List[str]) -> None:
+        if method == 'contains':
+            for term in terms:
+                tid = self._term_id(self._contains_ids, self._contains, term)
+                self._contains_clusters.setdefault(tid, []).append(index)
+        elif method == 'starts_with':
+            for term in terms:
+                tid = self._term_id(self._prefix_ids, self._prefix, term)
+                self._prefix_clusters.setdefault(tid, []).append(index)
+        elif method == 'exact':
+            for term in terms:
+                self._exact_clusters.setdefault(term, []).append(index)
+        elif method == 'regex':
+            patterns = []
+            for term in terms:
+                try:
+                    patterns.append(re.compile(term, re.IGNORECASE))
+                except re.error:
+                    logger.warning(f"Invalid regex pattern: {term}")
+            if patterns:
+                self._regex_clusters.append((index, _combine_patterns(patterns)))
+        elif method == 'notContains':
+            # Coincide si la keyword NO contiene al menos uno de los términos
+            tids = frozenset(self._term_id(self._contains_ids, self._contains, term) for term in terms)
+            self._not_contains.append((index, tids))
+        elif method == 'notEquals':
+            # Coincide si la keyword es distinta de al menos uno de los términos
+            self._not_equals.append((index, frozenset(terms)))
+        else:
+            logger.warning(f"Unknown cluster match method: {method}")
+
+    def classify(self, keyword: str) -> List[str]:
+        """Nombres de los clusters de `keyword`, en el orden de la configuración."""
+        if not keyword or not self.names:
+            return []
+        text = str(keyword).lower().strip()
+        matched = set()
+
+        if self._contains_ids:
+            found = self._contains.find_all(text)
+            for tid in found:
+                matched.update(self._contains_clusters.get(tid, ()))
+            for index, tids in self._not_contains:
+                if not tids <= found:
+                    matched.add(index)
+        if self._prefix_ids:
+            for tid in self._prefix.prefixes(text):
+                matched.update(self._prefix_clusters[tid])
+        if self._exact_clusters:
+            matched.update(self._exact_clusters.get(text, ()))
+        for index, terms in self._not_equals:
+            if terms != {text}:
+                matched.add(index)
+        for index, patterns in self._regex_clusters:
+            if index not in matched and any(p.search(text) for p in patterns):
+                matched.add(index)
+
+        names = self.names
+        return list(dict.fromkeys(names[i] for i in sorted(matched)))
+
+    def classify_many(self, keywords: Iterable[str]) -> List[List[str]]:
+        """Clasifica un lote de keywords en una pasada."""
+        classify = self.classify
+        return [classify(keyword) for keyword in keywords]
+
+
+def _config_hash(clusters_config: Dict) -> str:
+    raw = json.dumps(clusters_config, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_cluster_classifier(clusters_config: Optional[Dict]) -> ClusterClassifier:
+    """Clasificador compilado para `clusters_config`, memoizado por hash de la config."""
+    if not clusters_config or not clusters_config.get('enabled', False):
+        return ClusterClassifier(None)
+    key = _config_hash(clusters_config)
+    with _cache_lock:
+        classifier = _cache.get(key)
+        if classifier is not None:
+            _cache.move_to_end(key)
+            return classifier
+    classifier = ClusterClassifier(clusters_config)
+    with _cache_lock:
+        _cache[key] = classifier
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return classifier
+
+
+def classify_keyword(keyword: str, clusters_config: Optional[Dict]) -> List[str]:
+    """Atajo para clasificar una sola keyword."""
+    return get_cluster_classifier(clusters_config).classify(keyword)
@@ -0,0 +1,74 @@
+# services/fair_slots.py - Presupuesto global de concurrencia repartido por turnos
+"""
+Semáforo con reparto justo entre dueños (usuarios).
+
+El cron de Manual AI ejecuta varios proyectos a la vez y cada proyecto lanza
+sus keywords en paralelo. Sin un límite común, los proyectos enormes acaparan
+SerpAPI y el resto espera. `FairSlotPool` es el presupuesto global de keywords
+en vuelo: cuando hay varios usuarios esperando hueco, los huecos que se liberan
+se conceden por turnos (round-robin) entre usuarios y, dentro de cada usuario,
+por orden de llegada. Un usuario con 2.000 keywords no retrasa al que tiene 20:
+cada uno recibe un hueco por vuelta.
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict
+
+
+class FairSlotPool:
+    """
+    `acquire(owner)` bloquea hasta conceder un hueco a `owner`; `release()` lo
+    devuelve. Es seguro entre hilos.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._available = self.capacity
+        self._cond = threading.Condition()
+        # Turno de dueños con peticiones pendientes y cola FIFO de cada uno
+        self._rotation = deque()
+        self._tickets: Dict[Any, deque] = {}
+        self.granted: Dict[Any, int] = {}
+
+    def acquire(self, owner: Any) -> None:
+        ticket = object()
+        with self._cond:
+            queue = self._tickets.get(owner)
+            if queue is None:
+                queue = self._tickets[owner] = deque()
+                self._rotation.append(owner)
+            queue.append(ticket)
+
+            while not (self._available > 0 and self._rotation[0] == owner and queue[0] is ticket):
+                self._cond.wait()
+
+            self._available -= 1
+            queue.popleft()
+            self._rotation.popleft()
+            if queue:
+                # Le quedan peticiones: vuelve al final del turno
+                self._rotation.append(owner)
+            else:
+                del self._tickets[owner]
+            self.granted[owner] = self.granted.get(owner, 0) + 1
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._available = min(self.capacity, self._available + 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, owner: Any):
+        self.acquire(owner)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self.capacity - self._available
@@ -0,0 +1,274 @@
+"""
+Modo job asíncrono para /get-data.
+
+Los análisis grandes (modo propiedad con miles de páginas + comparación)
+ocupaban un hilo del servidor durante toda la descarga y los móviles acababan
+en timeout. Con `async=true` la petición devuelve un `job_id` al instante, el
+análisis corre en un executor de fondo y el progreso (páginas descargadas,
+keywords procesadas) se emite por Server-Sent Events. El resultado final se
+guarda en memoria y en Redis (comprimido, con TTL) para recuperarlo por id.
+
+El cálculo en sí sigue siendo la vista `get_data` de app.py: el job la ejecuta
+con una copia del contexto de la petición, y la vista informa del progreso con
+`current_progress()`, que fuera de un job devuelve un reporter que no hace nada.
+
+/api/analyze-ai-overview usa el mismo mecanismo (con su propio executor): cada
+keyword analizada se publica como evento `result` para que el navegador pinte
+resultados parciales sin esperar al final del análisis.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g
+
+from services.ai_cache import create_redis_client
+
+logger = logging.getLogger(__name__)
+
+GET_DATA_JOB_WORKERS = int(os.getenv('GET_DATA_JOB_WORKERS', '4'))
+GET_DATA_JOB_TTL_SECONDS = int(os.getenv('GET_DATA_JOB_TTL_SECONDS', '3600'))
+SSE_KEEPALIVE_SECONDS = 15
+_MAX_JOBS = 200
+_REDIS_PREFIX = 'get_data_job:'
+
+_JOBS = {}
+_JOBS_LOCK = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=GET_DATA_JOB_WORKERS, thread_name_prefix='get-data-job')
+_redis = None
+_redis_checked = False
+
+
+class GetDataJob:
+    """Estado de un análisis en segundo plano (thread-safe)."""
+
+    def __init__(self, job_id, user_id):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.status = 'queued'          # queued | running | done | error
+        self.phase = 'En cola'
+        self.progress = {}
+        self.events = []                # [{'seq', 'event', 'data'}]
+        self.result = None
+        self.http_status = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    def _emit(self, event, data):
+        # Llamar con self._cond adquirido
+        self.events.append({'seq': len(self.events) + 1, 'event': event, 'data': data})
+        self._cond.notify_all()
+
+    def _snapshot(self):
+        return {'status': self.status, 'phase': self.phase, 'progress': dict(self.progress)}
+
+    def set_phase(self, phase):
+        with self._cond:
+            self.phase = phase
+            self._emit('progress', self._snapshot())
+
+    def advance(self, **counters):
+        """Suma contadores de progreso (p.ej. pages_fetched=120) y emite un evento."""
+        with self._cond:
+            for name, value in counters.items():
+                self.progress[name] = self.progress.get(name, 0) + value
+            self._emit('progress', self._snapshot())
+
+    def set_counters(self, **counters):
+        with self._cond:
+            self.progress.update(counters)
+            self._emit('progress', self._snapshot())
+
+    def publish(self, event, data, **counters):
+        """Emite un evento propio (p.ej. `result`) con el progreso actualizado."""
+        with self._cond:
+            self.progress.update(counters)
+            self._emit(event, {**self._snapshot(), **data})
+
+    def start(self, phase='Descargando datos de Search Console'):
+        with self._cond:
+            self.status = 'running'
+            self.phase = phase
+            self._emit('progress', self._snapshot())
+
+    def finish(self, result, http_status):
+        with self._cond:
+            self.result = result
+            self.http_status = http_status
+            self.status = 'done' if http_status < 300 else 'error'
+            if self.status == 'error':
+                self.error = (result or {}).get('error') if isinstance(result, dict) else None
+            self.phase = 'Completado' if self.status == 'done' else 'Error'
+            self.finished = time.time()
+            self._emit(self.status, self.to_dict())
+
+    def fail(self, error):
+        with self._cond:
+            self.status = 'error'
+            self.error = error
+            self.http_status = 500
+            self.phase = 'Error'
+            self.finished = time.time()
+            self._emit('error', self.to_dict())
+
+    def wait_for_events(self, after_seq, timeout):
+        """Bloquea hasta que haya eventos posteriores a `after_seq` (o timeout)."""
+        with self._cond:
+            if len(self.events) <= after_seq and self.status not in ('done', 'error'):
+                self._cond.wait(timeout)
+            return self.events[after_seq:]
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'phase': self.phase,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'elapsed': round((self.finished or time.time()) - self.created, 1),
+        }
+
+
+class _NullProgress:
+    """Reporter usado cuando /get-data se ejecuta en modo síncrono."""
+
+    def set_phase(self, phase):
+        pass
+
+    def advance(self, **counters):
+        pass
+
+    def set_counters(self, **counters):
+        pass
+
+
+_NULL_PROGRESS = _NullProgress()
+
+
+def current_progress():
+    """Reporter de progreso del job en curso (o uno nulo fuera de un job)."""
+    return g.get('get_data_job') or _NULL_PROGRESS
+
+
+def _get_redis():
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis = create_redis_client(decode_responses=False)
+        _redis_checked = True
+    return _redis
+
+
+def _store_result(job):
+    """Cachea el resultado en Redis para servirlo tras un reinicio o desde otro worker."""
+    client = _get_redis()
+    if client is None or job.result is None:
+        return
+    try:
+        payload = zlib.compress(json.dumps({
+            'user_id': job.user_id,
+            'job': job.to_dict(),
+            'http_status': job.http_status,
+            'result': job.result,
+        }, default=str).encode('utf-8'))
+        client.setex(_REDIS_PREFIX + job.job_id, GET_DATA_JOB_TTL_SECONDS, payload)
+    except Exception as e:
+        logger.warning(f"[GET-DATA JOB] No se pudo cachear el resultado de {job.job_id}: {e}")
+
+
+def _load_result(job_id):
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        raw = client.get(_REDIS_PREFIX + job_id)
+        return json.loads(zlib.decompress(raw).decode('utf-8')) if raw else None
+    except Exception as e:
+        logger.warning(f"[GET-DATA JOB] No se pudo leer el resultado de {job_id}: {e}")
+        return None
+
+
+def _prune_jobs():
+    """Elimina de memoria los jobs terminados caducados (llamar con _JOBS_LOCK)."""
+    now = time.time()
+    for job_id in [k for k, j in _JOBS.items() if j.finished and now - j.finished > GET_DATA_JOB_TTL_SECONDS]:
+        _JOBS.pop(job_id, None)
+    if len(_JOBS) >= _MAX_JOBS:
+        finished = sorted((j for j in _JOBS.values() if j.finished), key=lambda j: j.finished)
+        for job in finished[:max(1, len(_JOBS) - _MAX_JOBS + 1)]:
+            _JOBS.pop(job.job_id, None)
+
+
+def submit_job(user_id, run, phase=None, executor=None):
+    """
+    Encola un análisis. `run(job)` debe devolver `(payload, http_status)`;
+    se ejecuta en `executor` (por defecto el de /get-data) con `phase` como
+    fase inicial.
+    """
+    job = GetDataJob(uuid.uuid4().hex, user_id)
+    with _JOBS_LOCK:
+        _prune_jobs()
+        _JOBS[job.job_id] = job
+
+    def _worker():
+        if phase:
+            job.start(phase)
+        else:
+            job.start()
+        try:
+            payload, http_status = run(job)
+            job.finish(payload, http_status)
+            _store_result(job)
+        except Exception as e:
+            logger.error(f"[GET-DATA JOB] Error en job {job.job_id}: {e}", exc_info=True)
+            job.fail('Internal server error')
+
+    (executor or _executor).submit(_worker)
+    logger.info(f"[GET-DATA JOB] Job {job.job_id} encolado para usuario {user_id}")
+    return job
+
+
+def get_job(job_id, user_id):
+    """Job en memoria del usuario, o None."""
+    job = _JOBS.get(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def get_job_result(job_id, user_id):
+    """
+    Estado y resultado de un job: `(job_dict, payload, http_status)`.
+    Busca primero en memoria y después en Redis. None si no existe o no es del usuario.
+    """
+    job = get_job(job_id, user_id)
+    if job is not None:
+        return job.to_dict(), job.result, job.http_status
+    cached = _load_result(job_id)
+    if not cached or cached.get('user_id') != user_id:
+        return None
+    return cached['job'], cached['result'], cached['http_status']
+
+
+def stream_events(job, after_seq=0):
+    """Generador de Server-Sent Events del job hasta que termina."""
+    seq = after_seq
+    while True:
+        events = job.wait_for_events(seq, SSE_KEEPALIVE_SECONDS)
+        if not events:
+            if job.status in ('done', 'error'):
+                return
+            yield ': keepalive\n\n'
+            continue
+        for item in events:
+            seq = item['seq']
+            yield f"id: {seq}\nevent: {item['event']}\ndata: {json.dumps(item['data'], default=str)}\n\n"
+            if item['event'] in ('done', 'error'):
+                return
@@ -0,0 +1,378 @@
+"""
+Agregación columnar de filas de Search Console para /get-data.
+
+Antes `get_data()` construía dicts anidados fila a fila (`period_data[url].append`,
+fusión de keywords, ordenación de listas de dicts) y después los recorría otra
+vez para calcular las comparativas. Aquí todo se hace sobre columnas de
+pandas/NumPy: agregación por keyword (y keyword+URL), cruce de períodos,
+deltas, buckets de posición y ordenación de URLs. Solo al final se generan los
+dicts que espera el frontend, con tipos nativos de Python (serializables a JSON).
+
+El formato de salida es idéntico al de la implementación anterior; ver
+tests/test_gsc_aggregation_performance.py (equivalencia + benchmark).
+"""
+
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+_METRICS = ['clicks', 'impressions', 'ctr', 'position']
+_KEYS_GETTER = itemgetter('keys')
+_KEYWORD_COLUMNS = ['key', 'keyword', 'url', 'top_urls', 'top_urls_count',
+                    'clicks', 'impressions', 'ctr_sum', 'pos_sum', 'count']
+_POSITION_BUCKETS = [('pos1_3', 'top3'), ('pos4_10', 'top10'), ('pos11_20', 'top20'), ('pos20_plus', 'top20plus')]
+
+
+def rows_to_frame(rows, key_names):
+    """
+    Convierte filas de GSC (`{'keys': [...], 'clicks': ...}`) en un DataFrame con
+    una columna por dimensión (`key_names`) y las métricas. Se descartan las filas
+    con menos claves de las esperadas. El orden de las filas se conserva.
+    """
+    n_keys = len(key_names)
+    # map + itemgetter recorre las filas en C (mucho más rápido que un bucle Python)
+    try:
+        keys = list(map(_KEYS_GETTER, rows))
+    except KeyError:
+        keys = [r.get('keys', ()) for r in rows]
+    if keys and min(map(len, keys)) < n_keys:
+        rows = [r for r, k in zip(rows, keys) if len(k) >= n_keys]
+        keys = [k for k in keys if len(k) >= n_keys]
+    if not rows:
+        return pd.DataFrame({name: pd.Series(dtype=object) for name in key_names}
+                            | {metric: pd.Series(dtype=float) for metric in _METRICS})
+    data = {name: list(map(itemgetter(i), keys)) for i, name in enumerate(key_names)}
+    for metric in _METRICS:
+        try:
+            values = map(itemgetter(metric), rows)
+            data[metric] = np.fromiter(values, dtype=float, count=len(rows))
+        except KeyError:
+            data[metric] = np.array([r.get(metric, 0) for r in rows], dtype=float)
+    return pd.DataFrame(data, columns=key_names + _METRICS)
+
+
+# ================================
+# Métricas por URL (tabla de páginas y summary)
+# ================================
+
+def page_metrics_frame(rows):
+    """Filas de GSC con dimensión ['page'] → DataFrame page + métricas (una fila por fila de GSC)."""
+    return rows_to_frame(rows, ['page'])
+
+
+def property_summary_frame(rows, property_url):
+    """
+    Totales de la propiedad a partir de filas por día: clicks e impresiones
+    sumados, CTR y posición ponderados por impresiones. Vacío si no hay filas.
+    """
+    frame = rows_to_frame(rows, ['date'])
+    if frame.empty:
+        return page_metrics_frame([])
+    clicks = frame['clicks'].sum()
+    impressions = frame['impressions'].sum()
+    ctr = (frame['ctr'] * frame['impressions']).sum() / impressions if impressions > 0 else 0
+    position = (frame['position'] * frame['impressions']).sum() / impressions if impressions > 0 else 0
+    return pd.DataFrame({
+        'page': [property_url], 'clicks': [clicks], 'impressions': [impressions],
+        'ctr': [ctr], 'position': [position]
+    })
+
+
+def _period_entries(frame, period):
+    """Lista de dicts 'Metrics' de un período (tipos nativos)."""
+    label, start, end = period['label'], period['start'], period['end']
+    return [
+        {'Period': label, 'StartDate': start, 'EndDate': end,
+         'Clicks': c, 'Impressions': i, 'CTR': ctr, 'Position': pos}
+        for c, i, ctr, pos in zip(frame['clicks'].tolist(), frame['impressions'].tolist(),
+                                  frame['ctr'].tolist(), frame['position'].tolist())
+    ]
+
+
+def _zero_entry(period):
+    return {'Period': period['label'], 'StartDate': period['start'], 'EndDate': period['end'],
+            'Clicks': 0, 'Impressions': 0, 'CTR': 0.0, 'Position': 0.0}
+
+
+def build_metrics_payload(current, current_period, comparison=None, comparison_period=None):
+    """
+    Une los períodos por URL y genera `[{'URL': url, 'Metrics': [...]}]`.
+
+    Con comparación, cada URL lleva las entradas del período actual seguidas de
+    las de comparación; si falta un período se rellena con una entrada a 0.
+    `*_period` son dicts con `label`, `start` y `end` (YYYY-MM-DD).
+    """
+    has_comparison = comparison_period is not None
+    pages = [current['page']]
+    entries = [_period_entries(current, current_period)]
+    if has_comparison:
+        pages.append(comparison['page'])
+        entries.append(_period_entries(comparison, comparison_period))
+
+    all_pages = pd.concat(pages, ignore_index=True)
+    if all_pages.empty:
+        return []
+    codes, uniques = pd.factorize(all_pages)
+    n_current = len(current)
+    per_url = [[[], []] for _ in range(len(uniques))]
+    flat_entries = entries[0] + (entries[1] if has_comparison else [])
+    for pos, (code, entry) in enumerate(zip(codes.tolist(), flat_entries)):
+        per_url[code][0 if pos < n_current else 1].append(entry)
+
+    payload = []
+    for url, (cur_entries, cmp_entries) in zip(uniques.tolist(), per_url):
+        if has_comparison:
+            metrics = (cur_entries or [_zero_entry(current_period)]) + \
+                      (cmp_entries or [_zero_entry(comparison_period)])
+        else:
+            metrics = cur_entries
+        payload.append({'URL': url, 'Metrics': metrics})
+    return payload
+
+
+# ================================
+# Keywords
+# ================================
+
+def _empty_keywords():
+    return pd.DataFrame({c: pd.Series(dtype=object if c in ('key', 'keyword', 'url', 'top_urls') else float)
+                         for c in _KEYWORD_COLUMNS})
+
+
+def aggregate_keywords(rows, by_page):
+    """
+    Agrega filas de GSC por keyword.
+
+    - `by_page=False` (modo propiedad, keys `[query, page]`): una fila por keyword;
+      `url` es la landing con más clicks (desempate por impresiones) y `top_urls`
+      todas sus landings en ese orden. Se ignoran keywords vacías.
+    - `by_page=True` (modo URL, keys `[page, query]`): una fila por combinación
+      keyword+URL, con clave `keyword|||url`.
+
+    Columnas: key, keyword, url, top_urls, top_urls_count, clicks, impressions,
+    ctr_sum y pos_sum (ponderados por impresiones) y count (= impresiones).
+    """
+    frame = rows_to_frame(rows, ['page', 'query'] if by_page else ['query', 'page'])
+    if not by_page:
+        frame = frame[frame['query'].astype(bool)]
+    if frame.empty:
+        return _empty_keywords()
+
+    frame = frame.assign(ctr_sum=frame['ctr'] * frame['impressions'],
+                         pos_sum=frame['position'] * frame['impressions'])
+    sums = ['clicks', 'impressions', 'ctr_sum', 'pos_sum']
+
+    if by_page:
+        grouped = frame.groupby(['query', 'page'], sort=False)[sums].sum().reset_index()
+        result = pd.DataFrame({
+            'key': grouped['query'] + '|||' + grouped['page'],
+            'keyword': grouped['query'],
+            'url': grouped['page'],
+            'top_urls': [[p] for p in grouped['page'].tolist()],
+            'top_urls_count': 1,
+        })
+        for col in sums:
+            result[col] = grouped[col].to_numpy()
+        result['count'] = grouped['impressions'].to_numpy()
+        return result[_KEYWORD_COLUMNS]
+
+    totals = frame.groupby('query', sort=False)[sums].sum()
+    result = pd.DataFrame({'key': totals.index, 'keyword': totals.index})
+    for col in sums:
+        result[col] = totals[col].to_numpy()
+    result['count'] = totals['impressions'].to_numpy()
+
+    # Landings por keyword ordenadas por (clicks, impresiones) desc; a igualdad,
+    # orden de aparición (misma regla que el sort estable de la versión anterior)
+    pages = frame[frame['page'].astype(bool)]
+    top_urls = [[] for _ in range(len(result))]
+    if not pages.empty:
+        per_page = pages.groupby(['query', 'page'], sort=False)[['clicks', 'impressions']].sum().reset_index()
+        per_page['kw'] = pd.Index(totals.index).get_indexer(per_page['query'])
+        per_page['seen'] = np.arange(len(per_page))
+        per_page = per_page.sort_values(['kw', 'clicks', 'impressions', 'seen'],
+                                        ascending=[True, False, False, True], kind='stable')
+        kw_codes = per_page['kw'].to_numpy()
+        page_list = per_page['page'].tolist()
+        bounds = np.flatnonzero(np.diff(kw_codes)) + 1
+        starts = np.concatenate(([0], bounds)).tolist()
+        ends = np.concatenate((bounds, [len(kw_codes)])).tolist()
+        for kw, start, end in zip(kw_codes[starts].tolist(), starts, ends):
+            top_urls[kw] = page_list[start:end]
+    result['top_urls'] = top_urls
+    result['url'] = [urls[0] if urls else '' for urls in top_urls]
+    result['top_urls_count'] = [len(urls) for urls in top_urls]
+    return result[_KEYWORD_COLUMNS]
+
+
+def _positions(keywords):
+    """Posición media por clave de las keywords con impresiones (Series indexada por key)."""
+    valid = keywords[keywords['count'] > 0]
+    return pd.Series((valid['pos_sum'] / valid['count']).to_numpy(), index=valid['key'].to_numpy())
+
+
+def _bucket(positions):
+    values = positions.to_numpy()
+    return pd.Series(np.select([values <= 3, values <= 10, values <= 20],
+                               ['pos1_3', 'pos4_10', 'pos11_20'], 'pos20_plus'),
+                     index=positions.index)
+
+
+def keyword_stats(current, comparison=None):
+    """Estadísticas de keywords por bucket de posición (`keywordStats` del frontend)."""
+    cur_pos = _positions(current)
+    cur_bucket = _bucket(cur_pos)
+    total = len(cur_pos)
+    stats = {
+        'overall': {'total': total},
+        'total': {'current': total},
+    }
+    for bucket, label in _POSITION_BUCKETS:
+        stats[label] = {'current': int((cur_bucket == bucket).sum())}
+
+    if comparison is not None and len(comparison) > 0:
+        cmp_pos = _positions(comparison)
+        cmp_bucket = _bucket(cmp_pos)
+        joined = pd.concat([cur_bucket.rename('cur'), cmp_bucket.rename('cmp')], axis=1)
+        in_cur = joined['cur'].notna()
+        in_cmp = joined['cmp'].notna()
+
+        def _changes(cur_mask, cmp_mask):
+            stay = int((cur_mask & cmp_mask).sum())
+            return {
+                'previous': int(cmp_mask.sum()),
+                'new': int(cur_mask.sum()) - stay,
+                'lost': int(cmp_mask.sum()) - stay,
+                'stay': stay
+            }
+
+        stats['total'].update(_changes(in_cur, in_cmp))
+        for bucket, label in _POSITION_BUCKETS:
+            stats[label].update(_changes(joined['cur'] == bucket, joined['cmp'] == bucket))
+
+        common = pd.concat([cur_pos.rename('cur'), cmp_pos.rename('cmp')], axis=1, join='inner')
+        stats['overall'] = {
+            'total': total,
+            'improved': int((common['cur'] < common['cmp']).sum()),
+            'worsened': int((common['cur'] > common['cmp']).sum()),
+            'same': int((common['cur'] == common['cmp']).sum()),
+            'new': int((in_cur & ~in_cmp).sum()),
+            'lost': int((in_cmp & ~in_cur).sum())
+        }
+    else:
+        for label in ['total', 'top3', 'top10', 'top20', 'top20plus']:
+            stats[label].update({'previous': 0, 'new': 0, 'lost': 0, 'stay': stats[label]['current']})
+        stats['overall'].update({'improved': 0, 'worsened': 0, 'same': 0, 'new': total, 'lost': 0})
+    return stats
+
+
+def _ratio(numerator, denominator, scale=1.0, empty=0):
+    """numerator / denominator * scale, con `empty` donde denominator <= 0 (array object)."""
+    out = np.full(len(numerator), empty, dtype=object)
+    valid = denominator > 0
+    out[valid] = (numerator[valid] / denominator[valid] * scale).astype(object)
+    return out
+
+
+def _percentage_change(new, old):
+    """(new / old - 1) * 100; si old == 0: 'Infinity' si new > 0, si no 0."""
+    out = np.empty(len(new), dtype=object)
+    zero = old == 0
+    out[~zero] = ((new[~zero] / old[~zero] - 1) * 100).astype(object)
+    out[zero & (new > 0)] = 'Infinity'
+    out[zero & ~(new > 0)] = 0
+    return out
+
+
+def keyword_comparison(current, comparison=None):
+    """Filas de `keyword_comparison_data` (P1 = período actual, P2 = comparación)."""
+    if comparison is None or len(comparison) == 0:
+        count = current['count'].to_numpy()
+        n = len(current)
+        columns = {
+            'keyword': current['keyword'].tolist(),
+            'url': current['url'].tolist(),
+            'top_urls': current['top_urls'].tolist(),
+            'top_urls_count': current['top_urls_count'].tolist(),
+            'clicks_m1': current['clicks'].tolist(),
+            'impressions_m1': current['impressions'].tolist(),
+            'ctr_m1': _ratio(current['ctr_sum'].to_numpy(), count, 100).tolist(),
+            'position_m1': _ratio(current['pos_sum'].to_numpy(), count, empty=None).tolist(),
+        }
+        constants = {
+            'clicks_m2': 0, 'delta_clicks_percent': 'New',
+            'impressions_m2': 0, 'delta_impressions_percent': 'New',
+            'ctr_m2': 0, 'delta_ctr_percent': 'New',
+            'position_m2': None, 'delta_position_absolute': 'New'
+        }
+        order = ['keyword', 'url', 'top_urls', 'top_urls_count', 'clicks_m1', 'clicks_m2', 'delta_clicks_percent',
+                 'impressions_m1', 'impressions_m2', 'delta_impressions_percent', 'ctr_m1', 'ctr_m2',
+                 'delta_ctr_percent', 'position_m1', 'position_m2', 'delta_position_absolute']
+        return [
+            {name: (columns[name][i] if name in columns else constants[name]) for name in order}
+            for i in range(n)
+        ]
+
+    merged = current.merge(comparison, on='key', how='outer', suffixes=('_1', '_2'), sort=False, indicator=True)
+    in_cur = (merged['_merge'] != 'right_only').to_numpy()
+    in_cmp = (merged['_merge'] != 'left_only').to_numpy()
+
+    def _num(col):
+        return merged[col].fillna(0).to_numpy(dtype=float)
+
+    def _text(col, present):
+        values = merged[col].to_numpy(dtype=object)
+        return np.where(present, values, '')
+
+    count_1, count_2 = _num('count_1'), _num('count_2')
+    clicks_1, clicks_2 = _num('clicks_1'), _num('clicks_2')
+    impr_1, impr_2 = _num('impressions_1'), _num('impressions_2')
+    ctr_1 = _ratio(_num('ctr_sum_1'), count_1, 100)
+    ctr_2 = _ratio(_num('ctr_sum_2'), count_2, 100)
+    pos_1 = _ratio(_num('pos_sum_1'), count_1, empty=None)
+    pos_2 = _ratio(_num('pos_sum_2'), count_2, empty=None)
+
+    has_pos_1 = count_1 > 0
+    has_pos_2 = count_2 > 0
+    delta_pos = np.where(has_pos_1, 'New', 'Lost').astype(object)
+    both = has_pos_1 & has_pos_2
+    delta_pos[both] = (pos_1[both].astype(float) - pos_2[both].astype(float)).astype(object)
+
+    # Keyword/URL: las del período actual y, si faltan, las de comparación
+    keyword_1, keyword_2 = _text('keyword_1', in_cur), _text('keyword_2', in_cmp)
+    url_1, url_2 = _text('url_1', in_cur), _text('url_2', in_cmp)
+    keyword = np.where(keyword_1 != '', keyword_1, keyword_2)
+    url = np.where(url_1 != '', url_1, url_2)
+    top_1 = merged['top_urls_1'].tolist()
+    top_2 = merged['top_urls_2'].tolist()
+    top_count_1 = merged['top_urls_count_1'].fillna(0).astype(int).tolist()
+    top_count_2 = merged['top_urls_count_2'].fillna(0).astype(int).tolist()
+
+    rows = []
+    for i, (kw, u, c1, c2, d_c, i1, i2, d_i, r1, r2, p1, p2, d_p) in enumerate(zip(
+            keyword.tolist(), url.tolist(), clicks_1.tolist(), clicks_2.tolist(),
+            _percentage_change(clicks_1, clicks_2).tolist(), impr_1.tolist(), impr_2.tolist(),
+            _percentage_change(impr_1, impr_2).tolist(), ctr_1.tolist(), ctr_2.tolist(),
+            pos_1.tolist(), pos_2.tolist(), delta_pos.tolist())):
+        tops = top_1[i] if isinstance(top_1[i], list) and top_1[i] else \
+            (top_2[i] if isinstance(top_2[i], list) else [])
+        rows.append({
+            'keyword': kw,
+            'url': u,
+            'top_urls': tops,
+            'top_urls_count': top_count_1[i] or top_count_2[i],
+            'clicks_m1': c1,
+            'clicks_m2': c2,
+            'delta_clicks_percent': d_c,
+            'impressions_m1': i1,
+            'impressions_m2': i2,
+            'delta_impressions_percent': d_i,
+            'ctr_m1': r1,
+            'ctr_m2': r2,
+            'delta_ctr_percent': r1 - r2,
+            'position_m1': p1,
+            'position_m2': p2,
+            'delta_position_absolute': d_p
+        })
+    return rows
@@ -0,0 +1,194 @@
+"""
+Inventario de propiedades de Search Console por usuario para /get-properties.
+
+El listado se sirve siempre de lo ya guardado (`gsc_properties`, cacheado en
+Redis por usuario) sin llamar a Google en la petición. Cada conexión OAuth
+guarda cuándo se sincronizó por última vez (`properties_synced_at`); si han
+pasado más de `GSC_PROPERTIES_TTL_SECONDS`, o el usuario lo pide con
+`?refresh=true`, se lanza un `sites().list()` en segundo plano y el siguiente
+listado ya incluye los cambios.
+
+Una conexión cuyo refresco falla (token revocado, cuota) no se reintenta hasta
+pasados `REFRESH_FAILURE_BACKOFF_SECONDS` para no llamar a Google en cada carga
+del dashboard.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from database import (
+    get_gsc_properties_sync_state,
+    get_oauth_connection_by_id,
+    list_gsc_properties_for_user,
+    upsert_gsc_properties_for_connection,
+)
+from services.ai_cache import create_redis_client
+
+logger = logging.getLogger(__name__)
+
+GSC_PROPERTIES_TTL_SECONDS = int(os.getenv('GSC_PROPERTIES_TTL_SECONDS', '21600'))
+# Vida del listado en Redis: acota lo que puede durar una escritura de caché que
+# compita con la invalidación de un refresco recién terminado
+GSC_PROPERTIES_CACHE_SECONDS = 300
+REFRESH_FAILURE_BACKOFF_SECONDS = 900
+_REDIS_PREFIX = 'gsc_properties:'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gsc-properties')
+_in_flight = set()          # connection_id con refresco en curso en este proceso
+_failed_at = {}             # connection_id -> time.time() del último fallo
+_state_lock = threading.Lock()
+_redis = None
+_redis_checked = False
+
+
+def _get_redis():
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis = create_redis_client(decode_responses=True)
+        _redis_checked = True
+    return _redis
+
+
+def _format_properties(props_db):
+    """Filas de `gsc_properties` → contrato de /get-properties (siteUrl + campos extra)."""
+    props = []
+    for p in props_db:
+        site_url = p.get('site_url') or p.get('siteUrl')
+        if not site_url:
+            continue
+        props.append({
+            'siteUrl': site_url,
+            'googleEmail': p.get('google_email'),
+            'googleAccountId': p.get('google_account_id'),
+            'connectionId': p.get('connection_id'),
+            'permissionLevel': p.get('permission_level')
+        })
+    return props
+
+
+def _load_inventory(user_id):
+    """Listado y estado de sincronización del usuario: Redis si está, si no Postgres."""
+    client = _get_redis()
+    if client is not None:
+        try:
+            raw = client.get(f'{_REDIS_PREFIX}{user_id}')
+            if raw:
+                return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"[GSC PROPERTIES] No se pudo leer la caché del usuario {user_id}: {e}")
+
+    now = time.time()
+    inventory = {
+        'properties': _format_properties(list_gsc_properties_for_user(user_id) or []),
+        # connection_id (str, clave JSON) -> epoch de la última sincronización o None.
+        # La antigüedad la calcula Postgres para no depender de la zona horaria del TIMESTAMP.
+        'synced': {
+            str(row['id']): now - float(row['synced_age_seconds']) if row.get('synced_age_seconds') is not None else None
+            for row in get_gsc_properties_sync_state(user_id)
+        },
+    }
+    if client is not None:
+        try:
+            client.setex(f'{_REDIS_PREFIX}{user_id}', GSC_PROPERTIES_CACHE_SECONDS, json.dumps(inventory))
+        except Exception as e:
+            logger.warning(f"[GSC PROPERTIES] No se pudo cachear el listado del usuario {user_id}: {e}")
+    return inventory
+
+
+def invalidate_user_properties(user_id):
+    """Descarta el listado cacheado del usuario (tras sincronizar, vincular o borrar conexiones)."""
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(f'{_REDIS_PREFIX}{user_id}')
+    except Exception as e:
+        logger.warning(f"[GSC PROPERTIES] No se pudo invalidar la caché del usuario {user_id}: {e}")
+
+
+def refresh_connection_properties(connection):
+    """
+    Sincroniza las propiedades de una conexión con `sites().list()`.
+    Devuelve el número de propiedades guardadas, o None si la conexión
+    necesita reautenticación. Los errores de la API se propagan.
+    """
+    from auth import get_authenticated_service_for_connection
+
+    service = get_authenticated_service_for_connection(connection, 'searchconsole', 'v1')
+    if not service:
+        return None
+    resp = service.sites().list().execute()
+    site_entries = resp.get('siteEntry', []) if resp else []
+    count = upsert_gsc_properties_for_connection(connection['user_id'], connection['id'], site_entries)
+    invalidate_user_properties(connection['user_id'])
+    return count
+
+
+def _refresh_in_background(user_id, connection_id):
+    try:
+        connection = get_oauth_connection_by_id(connection_id)
+        if not connection or connection['user_id'] != user_id:
+            return
+        count = refresh_connection_properties(connection)
+        if count is None:
+            raise RuntimeError('la conexión requiere reautenticación')
+        with _state_lock:
+            _failed_at.pop(connection_id, None)
+        logger.info(f"[GSC PROPERTIES] Conexión {connection_id} sincronizada: {count} propiedades")
+    except Exception as e:
+        with _state_lock:
+            _failed_at[connection_id] = time.time()
+        logger.warning(f"[GSC PROPERTIES] Falló el refresco de la conexión {connection_id}: {e}")
+    finally:
+        with _state_lock:
+            _in_flight.discard(connection_id)
+
+
+def schedule_refresh(user_id, connection_ids, force=False):
+    """
+    Encola el refresco de las conexiones que no estén ya refrescándose (ni en
+    espera tras un fallo, salvo `force`). Devuelve las encoladas.
+    """
+    scheduled = []
+    now = time.time()
+    with _state_lock:
+        for connection_id in connection_ids:
+            if connection_id in _in_flight:
+                continue
+            if not force and now - _failed_at.get(connection_id, 0) < REFRESH_FAILURE_BACKOFF_SECONDS:
+                continue
+            _in_flight.add(connection_id)
+            scheduled.append(connection_id)
+    for connection_id in scheduled:
+        _executor.submit(_refresh_in_background, user_id, connection_id)
+    return scheduled
+
+
+def get_user_properties(user_id, force_refresh=False):
+    """
+    Propiedades del usuario para /get-properties y metadatos del inventario
+    (`synced_at`: sincronización más antigua entre sus conexiones; `refreshing`:
+    si hay un refresco en segundo plano en curso).
+    """
+    inventory = _load_inventory(user_id)
+    now = time.time()
+    stale = [
+        int(connection_id) for connection_id, synced in inventory['synced'].items()
+        if force_refresh or synced is None or now - synced > GSC_PROPERTIES_TTL_SECONDS
+    ]
+    if stale:
+        schedule_refresh(user_id, stale, force=force_refresh)
+    with _state_lock:
+        refreshing = any(int(connection_id) in _in_flight for connection_id in inventory['synced'])
+
+    synced_values = [s for s in inventory['synced'].values() if s is not None]
+    meta = {
+        'synced_at': datetime.fromtimestamp(min(synced_values), timezone.utc).isoformat() if synced_values else None,
+        'refreshing': refreshing,
+    }
+    return inventory['properties'], meta
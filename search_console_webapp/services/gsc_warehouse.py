@@ -0,0 +1,604 @@
+# services/gsc_warehouse.py - Warehouse local de datos de Search Console
+"""
+Copia local en Postgres de los datos diarios de GSC para las propiedades que
+los usuarios analizan a menudo, de modo que `/get-data` y `/api/url-keywords`
+puedan responder en milisegundos sin llamar a Google.
+
+Tablas (una fila por día):
+- gsc_wh_site_daily:  date × country                (métricas de propiedad)
+- gsc_wh_page_daily:  date × page × country         (totales por página)
+- gsc_wh_query_daily: date × page × query × country (detalle keyword-URL)
+
+Se guardan las tres porque GSC no es aditivo entre dimensiones: las queries
+anonimizadas no aparecen en query×page, pero sí cuentan en los totales de
+página y de propiedad. La posición se guarda como `position_sum`
+(posición × impresiones) para poder promediarla ponderada en cualquier rango.
+
+Ciclo de vida de una propiedad (`gsc_wh_sync_state`, una fila por propiedad
+con el progreso de la carga; los datos de GSC son los mismos para todos los
+usuarios con acceso):
+1. `register_property()` la da de alta la primera vez que se analiza y anota
+   qué usuario y conexión OAuth la pidieron (`gsc_wh_property_users`, una fila
+   por usuario y propiedad). La sincronización usa la conexión del último
+   usuario que la pidió y, si no vale, la de los demás.
+2. `sync_property()` carga los días nuevos (re-sincronizando los últimos
+   GSC_SETTLING_DAYS, que Google todavía corrige) y continúa el backfill hacia
+   atrás hasta GSC_WAREHOUSE_BACKFILL_DAYS dentro de un presupuesto de tiempo.
+3. `sync_all_properties()` (cron diario) recorre las propiedades consultadas en
+   los últimos GSC_WAREHOUSE_IDLE_DAYS días.
+
+Activación: GSC_WAREHOUSE_ENABLED=true.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection, get_oauth_connection_by_id, get_connection_for_site
+
+logger = logging.getLogger(__name__)
+
+GSC_WAREHOUSE_ENABLED = os.getenv('GSC_WAREHOUSE_ENABLED', 'false').lower() == 'true'
+GSC_WAREHOUSE_BACKFILL_DAYS = int(os.getenv('GSC_WAREHOUSE_BACKFILL_DAYS', '480'))  # ~16 meses
+GSC_WAREHOUSE_IDLE_DAYS = int(os.getenv('GSC_WAREHOUSE_IDLE_DAYS', '30'))
+GSC_WAREHOUSE_MAX_ROWS_PER_DAY = int(os.getenv('GSC_WAREHOUSE_MAX_ROWS_PER_DAY', '50000'))
+GSC_WAREHOUSE_SYNC_BUDGET_SECONDS = int(os.getenv('GSC_WAREHOUSE_SYNC_BUDGET_SECONDS', '900'))
+GSC_SETTLING_DAYS = int(os.getenv('GSC_SETTLING_DAYS', '3'))
+# Cada cuánto se refresca como mucho `last_requested_at` de un usuario y propiedad
+GSC_WAREHOUSE_TOUCH_SECONDS = int(os.getenv('GSC_WAREHOUSE_TOUCH_SECONDS', '3600'))
+# Google publica los datos con ~2 días de retraso
+GSC_DATA_LAG_DAYS = 2
+
+# Namespacing de advisory locks: manual_ai=4242, ai_mode=4243, llm=4244, warehouse=4245, payload_blobs=4246
+GSC_WAREHOUSE_LOCK_CLASS_ID = 4245
+
+# Dimensiones de cada tabla de hechos (en el orden de las columnas)
+_TABLES = {
+    'gsc_wh_site_daily': ['date', 'country'],
+    'gsc_wh_page_daily': ['date', 'page', 'country'],
+    'gsc_wh_query_daily': ['date', 'page', 'query', 'country'],
+}
+
+_SUPPORTED_OPERATORS = {'equals', 'notEquals', 'contains', 'notContains', 'includingRegex', 'excludingRegex'}
+
+# Registros ya anotados por este proceso: (site_url, user_id) -> (connection_id, instante)
+_registered_lock = threading.Lock()
+_registered: Dict[Tuple[str, int], Tuple[int, float]] = {}
+
+
+# ================================
+# Esquema
+# ================================
+
+def ensure_gsc_warehouse_tables() -> bool:
+    """Crea las tablas del warehouse si no existen (idempotente)."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS gsc_wh_sync_state (
+                site_url TEXT PRIMARY KEY,
+                backfill_from DATE,
+                synced_through DATE,
+                status VARCHAR(20) DEFAULT 'pending',
+                last_synced_at TIMESTAMP,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS gsc_wh_property_users (
+                site_url TEXT NOT NULL REFERENCES gsc_wh_sync_state(site_url) ON DELETE CASCADE,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                connection_id INTEGER REFERENCES oauth_connections(id) ON DELETE SET NULL,
+                last_requested_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (site_url, user_id)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS gsc_wh_site_daily (
+                site_url TEXT NOT NULL,
+                date DATE NOT NULL,
+                country VARCHAR(3) NOT NULL,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                position_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                PRIMARY KEY (site_url, date, country)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS gsc_wh_page_daily (
+                site_url TEXT NOT NULL,
+                date DATE NOT NULL,
+                page TEXT NOT NULL,
+                country VARCHAR(3) NOT NULL,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                position_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                PRIMARY KEY (site_url, date, page, country)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS gsc_wh_query_daily (
+                site_url TEXT NOT NULL,
+                date DATE NOT NULL,
+                page TEXT NOT NULL,
+                query TEXT NOT NULL,
+                country VARCHAR(3) NOT NULL,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                impressions INTEGER NOT NULL DEFAULT 0,
+                position_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+                PRIMARY KEY (site_url, date, page, query, country)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_gsc_wh_query_site_date_query ON gsc_wh_query_daily(site_url, date, query)')
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error creando tablas del warehouse GSC: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
+# ================================
+# Estado de sincronización
+# ================================
+
+def _data_cutoff() -> date:
+    """Último día que Google ya publica."""
+    return datetime.now(timezone.utc).date() - timedelta(days=GSC_DATA_LAG_DAYS)
+
+
+def get_sync_state(site_url: str) -> Optional[Dict[str, Any]]:
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM gsc_wh_sync_state WHERE site_url = %s', (site_url,))
+        row = cur.fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        logger.warning(f"Error leyendo estado del warehouse para {site_url}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _update_sync_state(site_url: str, **fields):
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        assignments = ', '.join(f"{k} = %s" for k in fields)
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE gsc_wh_sync_state SET {assignments}, updated_at = NOW() WHERE site_url = %s",
+            (*fields.values(), site_url)
+        )
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Error actualizando estado del warehouse para {site_url}: {e}")
+    finally:
+        conn.close()
+
+
+def register_property(user_id: int, site_url: str, connection_id: int, start_backfill: bool = True) -> bool:
+    """
+    Da de alta la propiedad en el warehouse y anota que `user_id` la pide con
+    `connection_id`. Devuelve True si la propiedad es nueva.
+
+    No escribe en cada petición: si este proceso ya anotó al mismo usuario con
+    la misma conexión hace menos de GSC_WAREHOUSE_TOUCH_SECONDS no toca la BD,
+    y el upsert solo reescribe la fila si cambió la conexión o está caducada.
+
+    Si la propiedad es nueva y `start_backfill`, lanza la primera
+    sincronización en un hilo de este proceso. Es "como mucho una vez": solo
+    la lanza el proceso que creó la fila, y si el proceso muere o falla a
+    medias nadie la reintenta en el momento; el cron diario
+    (`sync_all_properties`) continúa la carga desde donde se quedó.
+    """
+    key = (site_url, user_id)
+    with _registered_lock:
+        seen = _registered.get(key)
+    if seen and seen[0] == connection_id and time.monotonic() - seen[1] < GSC_WAREHOUSE_TOUCH_SECONDS:
+        return False
+
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            INSERT INTO gsc_wh_sync_state (site_url) VALUES (%s)
+            ON CONFLICT (site_url) DO NOTHING
+            RETURNING site_url
+        ''', (site_url,))
+        is_new = cur.fetchone() is not None
+        cur.execute('''
+            INSERT INTO gsc_wh_property_users (site_url, user_id, connection_id, last_requested_at)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (site_url, user_id)
+            DO UPDATE SET connection_id = EXCLUDED.connection_id,
+                          last_requested_at = NOW()
+            WHERE gsc_wh_property_users.connection_id IS DISTINCT FROM EXCLUDED.connection_id
+               OR gsc_wh_property_users.last_requested_at < NOW() - make_interval(secs => %s)
+        ''', (site_url, user_id, connection_id, GSC_WAREHOUSE_TOUCH_SECONDS))
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Error registrando {site_url} en el warehouse: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+    with _registered_lock:
+        if len(_registered) > 10000:
+            _registered.clear()
+        _registered[key] = (connection_id, time.monotonic())
+
+    if is_new and start_backfill:
+        threading.Thread(
+            target=sync_property, args=(site_url,), daemon=True, name='gsc-wh-backfill'
+        ).start()
+    return is_new
+
+
+def _property_users(site_url: str) -> List[Dict[str, Any]]:
+    """Usuarios que han pedido la propiedad, el más reciente primero."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT user_id, connection_id FROM gsc_wh_property_users
+            WHERE site_url = %s
+            ORDER BY last_requested_at DESC
+        ''', (site_url,))
+        return [dict(row) for row in cur.fetchall()]
+    except Exception as e:
+        logger.warning(f"Error leyendo los usuarios del warehouse para {site_url}: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def covers(state: Optional[Dict[str, Any]], start: date, end: date) -> bool:
+    """¿El warehouse tiene cargado todo el rango [start, end] para la propiedad?"""
+    if not state or not state.get('backfill_from') or not state.get('synced_through'):
+        return False
+    return state['backfill_from'] <= start and end <= state['synced_through']
+
+
+def freshness_info(state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Indicador de frescura para la respuesta de la API."""
+    if not state:
+        return {'source': 'gsc_api'}
+    last_synced = state.get('last_synced_at')
+    synced_through = state.get('synced_through')
+    return {
+        'source': 'warehouse',
+        'synced_through': synced_through.isoformat() if synced_through else None,
+        'last_synced_at': last_synced.isoformat() if last_synced else None,
+        # Los últimos días aún pueden cambiar en GSC
+        'settling_from': (synced_through - timedelta(days=GSC_SETTLING_DAYS - 1)).isoformat() if synced_through else None,
+    }
+
+
+# ================================
+# Lectura (mismo formato de filas que la API de GSC)
+# ================================
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _filter_sql(f: Dict[str, Any], columns: List[str]):
+    """Traduce un filtro de GSC a SQL. Devuelve (sql, params) o None si no es traducible."""
+    dimension = f.get('dimension')
+    operator = f.get('operator', 'equals')
+    expression = f.get('expression', '')
+    if dimension not in columns or operator not in _SUPPORTED_OPERATORS:
+        return None
+    if dimension == 'country':
+        expression = expression.lower()
+    if operator == 'equals':
+        return f"{dimension} = %s", [expression]
+    if operator == 'notEquals':
+        return f"{dimension} <> %s", [expression]
+    if operator == 'contains':
+        return f"{dimension} ILIKE %s", [f"%{_escape_like(expression)}%"]
+    if operator == 'notContains':
+        return f"{dimension} NOT ILIKE %s", [f"%{_escape_like(expression)}%"]
+    if operator == 'includingRegex':
+        return f"{dimension} ~ %s", [expression]
+    return f"{dimension} !~ %s", [expression]
+
+
+def _pick_table(dimensions: List[str], filters) -> Optional[str]:
+    needed = set(dimensions)
+    for group in filters or []:
+        for f in group.get('filters', []):
+            needed.add(f.get('dimension'))
+    for table, columns in _TABLES.items():
+        if needed <= set(columns):
+            return table
+    return None
+
+
+def build_query(site_url: str, start_date: str, end_date: str, dimensions: List[str],
+                filters=None, row_limit: Optional[int] = None):
+    """
+    Construye la consulta SQL equivalente a un `searchanalytics.query`.
+    Devuelve (sql, params) o None si la consulta no se puede responder desde el warehouse.
+    """
+    table = _pick_table(dimensions, filters)
+    if not table or not dimensions:
+        return None
+    columns = _TABLES[table]
+
+    where = ['site_url = %s', 'date BETWEEN %s AND %s']
+    params: List[Any] = [site_url, start_date, end_date]
+    for group in filters or []:
+        if group.get('groupType', 'and') != 'and':
+            return None
+        for f in group.get('filters', []):
+            translated = _filter_sql(f, columns)
+            if translated is None:
+                return None
+            where.append(translated[0])
+            params.extend(translated[1])
+
+    keys_sql = ', '.join(dimensions)
+    sql = (
+        f"SELECT {keys_sql}, SUM(clicks) AS clicks, SUM(impressions) AS impressions, "
+        f"SUM(position_sum) AS position_sum FROM {table} "
+        f"WHERE {' AND '.join(where)} GROUP BY {keys_sql} "
+        f"ORDER BY SUM(clicks) DESC, SUM(impressions) DESC"
+    )
+    if row_limit:
+        sql += " LIMIT %s"
+        params.append(row_limit)
+    return sql, params
+
+
+def _row_to_gsc(row: Dict[str, Any], dimensions: List[str]) -> Dict[str, Any]:
+    impressions = int(row['impressions'] or 0)
+    clicks = int(row['clicks'] or 0)
+    keys = []
+    for d in dimensions:
+        value = row[d]
+        keys.append(value.isoformat() if isinstance(value, date) else value)
+    return {
+        'keys': keys,
+        'clicks': clicks,
+        'impressions': impressions,
+        'ctr': clicks / impressions if impressions else 0.0,
+        'position': float(row['position_sum'] or 0) / impressions if impressions else 0.0,
+    }
+
+
+def query_rows(site_url: str, start_date: str, end_date: str, dimensions: List[str],
+               filters=None, row_limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    Responde una consulta de GSC desde el warehouse.
+    Devuelve None si no es traducible o hay un error (el llamador cae a la API).
+    """
+    built = build_query(site_url, start_date, end_date, dimensions, filters, row_limit)
+    if built is None:
+        return None
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute(*built)
+        return [_row_to_gsc(r, dimensions) for r in cur.fetchall()]
+    except Exception as e:
+        logger.warning(f"[GSC WAREHOUSE] Consulta fallida para {site_url}, se usará la API: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+# ================================
+# Sincronización
+# ================================
+
+def _load_day(service, site_url: str, day: date):
+    """Descarga un día completo de GSC y lo reemplaza en las tablas de hechos."""
+    from services.search_console import fetch_searchconsole_data_multi
+
+    day_str = day.strftime('%Y-%m-%d')
+    rows_by_table = fetch_searchconsole_data_multi(service, site_url, [
+        {
+            'key': table,
+            'start_date': day_str,
+            'end_date': day_str,
+            'dimensions': columns,
+            'max_rows': GSC_WAREHOUSE_MAX_ROWS_PER_DAY,
+        }
+        for table, columns in _TABLES.items()
+    ], use_cache=False)
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Sin conexión a BD para cargar el warehouse")
+    try:
+        cur = conn.cursor()
+        for table, columns in _TABLES.items():
+            cur.execute(f"DELETE FROM {table} WHERE site_url = %s AND date = %s", (site_url, day))
+            values = []
+            for r in rows_by_table.get(table, []):
+                keys = dict(zip(columns, r['keys']))
+                keys['date'] = day
+                keys['country'] = (keys.get('country') or 'zzz').lower()
+                values.append(
+                    (site_url, *[keys[c] for c in columns],
+                     r['clicks'], r['impressions'], r['position'] * r['impressions'])
+                )
+            if values:
+                execute_values(
+                    cur,
+                    f"INSERT INTO {table} (site_url, {', '.join(columns)}, clicks, impressions, position_sum) "
+                    f"VALUES %s ON CONFLICT DO NOTHING",
+                    values,
+                    page_size=1000
+                )
+        conn.commit()
+        return sum(len(v) for v in rows_by_table.values())
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _service_for_state(state: Dict[str, Any]):
+    from auth import get_authenticated_service_for_connection
+
+    for registration in _property_users(state['site_url']):
+        connection = None
+        if registration.get('connection_id'):
+            connection = get_oauth_connection_by_id(registration['connection_id'])
+        if not connection:
+            connection = get_connection_for_site(registration['user_id'], state['site_url'])
+        service = get_authenticated_service_for_connection(connection, 'searchconsole', 'v1') if connection else None
+        if service:
+            return service
+    return None
+
+
+def sync_property(site_url: str, budget_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Sincroniza incrementalmente una propiedad: primero los días nuevos (más los
+    últimos GSC_SETTLING_DAYS, que Google aún corrige) y después sigue el
+    backfill hacia atrás mientras quede presupuesto de tiempo.
+    """
+    budget_seconds = GSC_WAREHOUSE_SYNC_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    deadline = time.monotonic() + budget_seconds
+    summary = {'site_url': site_url, 'days_loaded': 0, 'rows_loaded': 0, 'status': 'skipped'}
+
+    lock_conn = get_db_connection()
+    if not lock_conn:
+        summary['status'] = 'no_db'
+        return summary
+    lock_acquired = False
+    try:
+        # session-level lock → autocommit para no quedar idle-in-transaction
+        lock_conn.autocommit = True
+        lock_cur = lock_conn.cursor()
+        lock_cur.execute(
+            "SELECT pg_try_advisory_lock(%s, hashtext(%s)) AS acquired",
+            (GSC_WAREHOUSE_LOCK_CLASS_ID, site_url)
+        )
+        row = lock_cur.fetchone()
+        lock_acquired = bool(row['acquired']) if row else False
+        if not lock_acquired:
+            logger.info(f"[GSC WAREHOUSE] {site_url} ya se está sincronizando — omitiendo")
+            summary['status'] = 'locked'
+            return summary
+
+        state = get_sync_state(site_url)
+        if not state:
+            summary['status'] = 'not_registered'
+            return summary
+
+        service = _service_for_state(state)
+        if not service:
+            _update_sync_state(site_url, status='error', last_error='Sin conexión OAuth válida')
+            summary['status'] = 'no_credentials'
+            return summary
+
+        cutoff = _data_cutoff()
+        target_from = cutoff - timedelta(days=GSC_WAREHOUSE_BACKFILL_DAYS - 1)
+        synced_through = state.get('synced_through')
+        backfill_from = state.get('backfill_from')
+
+        try:
+            # 1) Tramo incremental (hacia delante)
+            if synced_through:
+                _update_sync_state(site_url, status='syncing')
+                day = max(synced_through - timedelta(days=GSC_SETTLING_DAYS - 1), backfill_from)
+                while day <= cutoff and time.monotonic() < deadline:
+                    summary['rows_loaded'] += _load_day(service, site_url, day)
+                    summary['days_loaded'] += 1
+                    if day > synced_through:
+                        synced_through = day
+                        _update_sync_state(site_url, synced_through=day)
+                    day += timedelta(days=1)
+            else:
+                # Primera carga: se empieza por el día más reciente
+                _update_sync_state(site_url, status='backfilling')
+                summary['rows_loaded'] += _load_day(service, site_url, cutoff)
+                summary['days_loaded'] += 1
+                synced_through = backfill_from = cutoff
+                _update_sync_state(site_url, synced_through=cutoff, backfill_from=cutoff)
+
+            # 2) Backfill (hacia atrás)
+            while backfill_from > target_from and time.monotonic() < deadline:
+                day = backfill_from - timedelta(days=1)
+                summary['rows_loaded'] += _load_day(service, site_url, day)
+                summary['days_loaded'] += 1
+                backfill_from = day
+                _update_sync_state(site_url, backfill_from=day)
+
+            status = 'ready' if backfill_from <= target_from and synced_through >= cutoff else 'partial'
+            _update_sync_state(site_url, status=status, last_synced_at=datetime.utcnow(), last_error=None)
+            summary['status'] = status
+        except Exception as e:
+            logger.error(f"[GSC WAREHOUSE] Error sincronizando {site_url}: {e}", exc_info=True)
+            _update_sync_state(site_url, status='error', last_error=str(e)[:500])
+            summary['status'] = 'error'
+
+        logger.info(
+            f"[GSC WAREHOUSE] {site_url}: {summary['days_loaded']} días, "
+            f"{summary['rows_loaded']} filas, estado={summary['status']}"
+        )
+        return summary
+    finally:
+        try:
+            if lock_acquired:
+                lock_conn.cursor().execute(
+                    "SELECT pg_advisory_unlock(%s, hashtext(%s))",
+                    (GSC_WAREHOUSE_LOCK_CLASS_ID, site_url)
+                )
+        except Exception as _unlock_err:
+            logger.warning(f"No se pudo liberar el advisory lock del warehouse: {_unlock_err}")
+        finally:
+            lock_conn.close()
+
+
+def sync_all_properties() -> List[Dict[str, Any]]:
+    """Cron diario: sincroniza las propiedades consultadas recientemente."""
+    conn = get_db_connection()
+    if not conn:
+        return []
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT site_url FROM gsc_wh_property_users
+            GROUP BY site_url
+            HAVING MAX(last_requested_at) >= NOW() - (%s || ' days')::interval
+            ORDER BY MAX(last_requested_at) DESC
+        ''', (str(GSC_WAREHOUSE_IDLE_DAYS),))
+        site_urls = [r['site_url'] for r in cur.fetchall()]
+    except Exception as e:
+        logger.error(f"Error listando propiedades del warehouse: {e}")
+        return []
+    finally:
+        conn.close()
+
+    logger.info(f"[GSC WAREHOUSE] Sincronizando {len(site_urls)} propiedades")
+    return [sync_property(site_url) for site_url in site_urls]
@@ -0,0 +1,297 @@
+# services/payload_blobs.py - Payloads JSON direccionados por contenido
+"""
+Almacén de payloads crudos (SERP de SerpAPI, análisis AIO, respuesta de AI
+Mode) fuera de las tablas de resultados.
+
+Cada payload se serializa de forma canónica, se comprime con zlib y se guarda
+una sola vez en `payload_blobs` bajo su sha256; la fila de resultados solo
+guarda el hash (`<columna>_hash`) y deja la columna JSONB a NULL. Los
+proyectos que comparten keyword y mercado el mismo día (SERP del almacén
+compartido, services/serp_store.py) acaban apuntando al mismo blob.
+
+Las consultas de estadísticas que no necesitan el payload ya no lo arrastran;
+las que sí lo necesitan piden el hash y llaman a `hydrate_payloads`, que
+carga todos los blobs de un lote en una consulta. Las filas antiguas con el
+JSONB en línea siguen funcionando tal cual (ver migrate_payload_blobs.py).
+
+Los escritores y `purge_orphan_payloads` se coordinan con un advisory lock
+de transacción: cada escritura lo toma compartido (el blob y la fila que lo
+referencia se confirman juntos) y la purga lo toma exclusivo, así que nunca
+borra un blob que una transacción en curso acaba de insertar o reutilizar.
+
+Activación: PAYLOAD_BLOBS_ENABLED (por defecto true).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_BLOBS_ENABLED = os.getenv('PAYLOAD_BLOBS_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Tabla de resultados → columnas JSONB que pasan a `payload_blobs`
+PAYLOAD_COLUMNS = {
+    'manual_ai_results': ('raw_serp_data', 'ai_analysis_data'),
+    'ai_mode_results': ('raw_ai_mode_data',),
+}
+
+# Advisory lock escritores/purga (namespacing de locks en services/gsc_warehouse.py)
+PAYLOAD_BLOBS_LOCK_CLASS_ID = 4246
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def hash_column(column: str) -> str:
+    return f'{column}_hash'
+
+
+# ================================
+# Esquema
+# ================================
+
+def ensure_payload_blobs_schema() -> bool:
+    """Crea `payload_blobs` y las columnas `<columna>_hash` de las tablas de resultados (idempotente)."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS payload_blobs (
+                content_hash CHAR(64) PRIMARY KEY,
+                payload BYTEA NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                stored_bytes INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+        for table, columns in PAYLOAD_COLUMNS.items():
+            cur.execute('SELECT to_regclass(%s) AS reg', (f'public.{table}',))
+            if not cur.fetchone()['reg']:
+                continue
+            for column in columns:
+                cur.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {hash_column(column)} CHAR(64)')
+                cur.execute(f'''
+                    CREATE INDEX IF NOT EXISTS idx_{table}_{hash_column(column)}
+                    ON {table}({hash_column(column)})
+                ''')
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error creando el esquema de payload_blobs: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _ensure_schema_once() -> bool:
+    global _schema_ready
+    if _schema_ready:
+        return True
+    with _schema_lock:
+        if not _schema_ready:
+            _schema_ready = ensure_payload_blobs_schema()
+    return _schema_ready
+
+
+# ================================
+# Escritura
+# ================================
+
+def encode_payload(payload: Any) -> Tuple[str, int, bytes]:
+    """(sha256, bytes sin comprimir, blob zlib) de la serialización canónica del payload."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest(), len(raw), zlib.compress(raw, 6)
+
+
+def store_payloads(cur, payloads: Iterable[Any]) -> List[Optional[str]]:
+    """
+    Guarda los payloads con el cursor del llamador (misma transacción que la
+    fila que los referencia) y devuelve sus hashes; None para payloads None.
+    Toma el advisory lock compartido hasta el final de esa transacción.
+    """
+    blobs = {}
+    hashes = []
+    for payload in payloads:
+        if payload is None:
+            hashes.append(None)
+            continue
+        content_hash, raw_bytes, blob = encode_payload(payload)
+        blobs[content_hash] = (content_hash, blob, raw_bytes, len(blob))
+        hashes.append(content_hash)
+    if blobs:
+        cur.execute('SELECT pg_advisory_xact_lock_shared(%s, 0)', (PAYLOAD_BLOBS_LOCK_CLASS_ID,))
+        execute_values(cur, '''
+            INSERT INTO payload_blobs (content_hash, payload, raw_bytes, stored_bytes)
+            VALUES %s
+            ON CONFLICT (content_hash) DO NOTHING
+        ''', list(blobs.values()))
+    return hashes
+
+
+def pack_payloads(cur, payloads: Iterable[Any]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Valores (columna JSONB, columna hash) para insertar cada payload: el hash
+    con el JSONB a NULL, o el JSON en línea si el almacén está desactivado.
+    """
+    payloads = list(payloads)
+    if PAYLOAD_BLOBS_ENABLED and _ensure_schema_once():
+        return [(None, content_hash) for content_hash in store_payloads(cur, payloads)]
+    return [(json.dumps(payload) if payload is not None else None, None) for payload in payloads]
+
+
+# ================================
+# Lectura
+# ================================
+
+def load_payloads(hashes: Iterable[str]) -> Dict[str, Any]:
+    """Payloads por hash, en una sola consulta. Los hashes desconocidos se omiten."""
+    hashes = sorted({h for h in hashes if h})
+    if not hashes:
+        return {}
+    conn = get_db_connection()
+    if not conn:
+        logger.error("load_payloads: no DB connection")
+        return {}
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            'SELECT content_hash, payload FROM payload_blobs WHERE content_hash = ANY(%s)',
+            (hashes,)
+        )
+        return {
+            row['content_hash']: json.loads(zlib.decompress(bytes(row['payload'])))
+            for row in cur.fetchall()
+        }
+    except Exception as e:
+        logger.error(f"Error cargando {len(hashes)} payloads: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def hydrate_payloads(rows: Iterable[Dict], *columns: str) -> List[Dict]:
+    """
+    Rellena `columna` desde `payload_blobs` en las filas que solo traen
+    `<columna>_hash`. Devuelve las filas como dicts; las que ya traen el
+    JSONB en línea no se tocan. Los payloads repetidos se comparten entre
+    filas: tratarlos como solo lectura.
+    """
+    rows = [dict(row) for row in rows]
+    pending = {
+        row[hash_column(column)]
+        for row in rows for column in columns
+        if row.get(column) is None and row.get(hash_column(column))
+    }
+    if not pending:
+        return rows
+    loaded = load_payloads(pending)
+    if len(loaded) < len(pending):
+        logger.warning(f"hydrate_payloads: {len(pending) - len(loaded)} blobs no encontrados")
+    for row in rows:
+        for column in columns:
+            if row.get(column) is None and row.get(hash_column(column)):
+                row[column] = loaded.get(row[hash_column(column)])
+    return rows
+
+
+# ================================
+# Mantenimiento e informe
+# ================================
+
+def purge_orphan_payloads() -> int:
+    """
+    Borra los blobs que ya no referencia ninguna fila de resultados. Espera a
+    que terminen las escrituras en curso (advisory lock exclusivo).
+    """
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cur = conn.cursor()
+        references = []
+        for table, columns in PAYLOAD_COLUMNS.items():
+            cur.execute('SELECT to_regclass(%s) AS reg', (f'public.{table}',))
+            if not cur.fetchone()['reg']:
+                continue
+            references += [
+                f'SELECT 1 FROM {table} t WHERE t.{hash_column(column)} = b.content_hash'
+                for column in columns
+            ]
+        if not references:
+            return 0
+        cur.execute('SELECT pg_advisory_xact_lock(%s, 0)', (PAYLOAD_BLOBS_LOCK_CLASS_ID,))
+        cur.execute(f'''
+            DELETE FROM payload_blobs b
+            WHERE {' AND '.join(f'NOT EXISTS ({ref})' for ref in references)}
+        ''')
+        deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        logger.warning(f"Error purgando payloads huérfanos: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def get_payload_size_report() -> Dict[str, Any]:
+    """
+    Tamaño en disco de las tablas de resultados y de `payload_blobs`, filas
+    con payload en línea/por hash y ratio de compresión y deduplicación.
+    """
+    report = {'enabled': PAYLOAD_BLOBS_ENABLED, 'tables': {}, 'blobs': {}}
+    conn = get_db_connection()
+    if not conn:
+        report['error'] = 'no_db_connection'
+        return report
+    try:
+        cur = conn.cursor()
+        for table, columns in PAYLOAD_COLUMNS.items():
+            cur.execute('SELECT to_regclass(%s) AS reg', (f'public.{table}',))
+            if not cur.fetchone()['reg']:
+                continue
+            counts = ', '.join(
+                f'COUNT({column}) AS {column}_inline, COUNT({hash_column(column)}) AS {column}_hashed'
+                for column in columns
+            )
+            cur.execute(f'''
+                SELECT pg_total_relation_size('{table}') AS total_bytes, COUNT(*) AS rows, {counts}
+                FROM {table}
+            ''')
+            report['tables'][table] = {k: int(v or 0) for k, v in cur.fetchone().items()}
+
+        cur.execute('''
+            SELECT COUNT(*) AS blobs,
+                   COALESCE(SUM(raw_bytes), 0) AS raw_bytes,
+                   COALESCE(SUM(stored_bytes), 0) AS stored_bytes,
+                   pg_total_relation_size('payload_blobs') AS total_bytes
+            FROM payload_blobs
+        ''')
+        blobs = {k: int(v or 0) for k, v in cur.fetchone().items()}
+        references = sum(
+            stats.get(f'{column}_hashed', 0)
+            for table, stats in report['tables'].items()
+            for column in PAYLOAD_COLUMNS[table]
+        )
+        blobs['references'] = references
+        blobs['compression_ratio'] = round(blobs['raw_bytes'] / blobs['stored_bytes'], 2) if blobs['stored_bytes'] else 0.0
+        blobs['dedup_ratio'] = round(references / blobs['blobs'], 2) if blobs['blobs'] else 0.0
+        report['blobs'] = blobs
+        return report
+    except Exception as e:
+        logger.warning(f"Error generando el informe de payload_blobs: {e}")
+        report['error'] = str(e)
+        return report
+    finally:
+        conn.close()
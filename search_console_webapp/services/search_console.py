@@ -1,11 +1,20 @@
 import os
+import queue
+import hashlib
+import time
+import logging
+import threading
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from services.ai_cache import gsc_cache
+
+logger = logging.getLogger(__name__)
 
 # Cargar variables de entorno (ruta a client_secret.json y token.json)
 load_dotenv('serpapi.env')
@@ -14,6 +23,22 @@ SCOPES = ['https://www.googleapis.com/auth/webmasters.readonly']
 CLIENT_SECRETS_FILE = os.getenv('CLIENT_SECRETS_FILE', 'client_secret.json')
 TOKEN_FILE          = os.getenv('TOKEN_FILE', 'token.json')
 
+# Límites del motor de descarga de GSC.
+# - GSC_PAGE_SIZE: filas por página (25.000 es el máximo que acepta la API).
+# - GSC_MAX_ROWS: tope de filas por consulta para no descargar sin fin en
+#   propiedades enormes (query×page puede superar los cientos de miles).
+# - GSC_MAX_WORKERS: consultas simultáneas por petición.
+# - GSC_QPS_PER_PROPERTY: peticiones/segundo por propiedad y proceso
+#   (la cuota de Google es 1.200 QPM por site; dejamos margen para otros workers).
+# - GSC_QPS_PER_USER: peticiones/segundo por cuenta de Google y proceso; la
+#   cuota por usuario se comparte entre todas sus propiedades y sub-consultas.
+GSC_PAGE_SIZE = 25000
+GSC_MAX_ROWS = int(os.getenv('GSC_MAX_ROWS', '100000'))
+GSC_MAX_WORKERS = int(os.getenv('GSC_MAX_WORKERS', '4'))
+GSC_QPS_PER_PROPERTY = float(os.getenv('GSC_QPS_PER_PROPERTY', '5'))
+GSC_QPS_PER_USER = float(os.getenv('GSC_QPS_PER_USER', '10'))
+
+
 def authenticate():
     """Autentica con Google Search Console y devuelve el objeto service."""
     creds = None
@@ -31,20 +56,311 @@ def authenticate():
     service = build('searchconsole', 'v1', credentials=creds)
     return service
 
+
+class PropertyRateLimiter:
+    """Token bucket por clave (thread-safe, compartido por el proceso).
+
+    Cada `acquire(key)` consume un token; si no quedan, bloquea el hilo
+    hasta que se repongan. Con `qps <= 0` el limitador queda desactivado.
+    Se usa con la propiedad de GSC como clave y con la cuenta de Google.
+    """
+
+    def __init__(self, qps: float):
+        self.qps = qps
+        self._lock = threading.Lock()
+        self._tokens = {}       # site_url -> tokens disponibles
+        self._updated = {}      # site_url -> último instante de reposición
+
+    def acquire(self, site_url: str) -> float:
+        """Espera a tener un token para `site_url`. Devuelve los segundos esperados."""
+        if self.qps <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = self._tokens.get(site_url, self.qps)
+                last = self._updated.get(site_url, now)
+                tokens = min(self.qps, tokens + (now - last) * self.qps)
+                self._updated[site_url] = now
+                if tokens >= 1:
+                    self._tokens[site_url] = tokens - 1
+                    return waited
+                self._tokens[site_url] = tokens
+                sleep_for = (1 - tokens) / self.qps
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+gsc_rate_limiter = PropertyRateLimiter(GSC_QPS_PER_PROPERTY)
+gsc_user_rate_limiter = PropertyRateLimiter(GSC_QPS_PER_USER)
+
+
+def _new_thread_http(service):
+    """Crea un transporte HTTP propio para el hilo actual.
+
+    httplib2 no es thread-safe, así que cada worker necesita su propio
+    `AuthorizedHttp` con las mismas credenciales del service. Devuelve None si
+    el service no expone credenciales (p.ej. un mock); en ese caso el llamador
+    debe usar el transporte compartido sin paralelizar.
+    """
+    creds = getattr(getattr(service, '_http', None), 'credentials', None)
+    if creds is None:
+        return None
+    try:
+        import httplib2
+        import google_auth_httplib2
+        return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    except ImportError:
+        return None
+
+
+def _total_row_cap(row_limit, max_rows):
+    """Tope total de filas: el `row_limit` del llamador y, por encima, GSC_MAX_ROWS."""
+    max_rows = GSC_MAX_ROWS if max_rows is None else max_rows
+    caps = [cap for cap in (row_limit, max_rows) if cap]
+    return min(caps) if caps else None
+
+
+def iter_searchconsole_pages(service, site_url, start_date, end_date, dimensions,
+                             filters=None, row_limit=None, max_rows=None, http=None,
+                             page_size=GSC_PAGE_SIZE):
+    """
+    Recorre `searchanalytics.query` siguiendo `startRow` hasta agotar resultados.
+    Genera una lista de filas por página recibida (streaming).
+
+    `row_limit` es el total de filas que quiere el llamador (como el `rowLimit`
+    de la API antes de paginar; None = todas). `max_rows` (GSC_MAX_ROWS por
+    defecto) es el tope de seguridad y avisa en el log si trunca. `page_size`
+    son las filas por petición.
+    """
+    page_size = min(page_size or GSC_PAGE_SIZE, GSC_PAGE_SIZE)
+    cap = _total_row_cap(row_limit, max_rows)
+    start_row = 0
+    user_scope = _cache_scope(service)
+
+    while True:
+        request_size = min(page_size, cap - start_row) if cap else page_size
+        body = {
+            'startDate': start_date,
+            'endDate':   end_date,
+            'dimensions': dimensions,
+            'rowLimit':  request_size,
+            'startRow':  start_row
+        }
+        if filters:
+            body['dimensionFilterGroups'] = filters
+
+        gsc_rate_limiter.acquire(site_url)
+        if user_scope:
+            gsc_user_rate_limiter.acquire(user_scope)
+        request = service.searchanalytics().query(siteUrl=site_url, body=body)
+        resp = request.execute(http=http) if http is not None else request.execute()
+        rows = resp.get('rows', [])
+        if rows:
+            yield rows
+
+        start_row += len(rows)
+        if len(rows) < request_size:
+            break
+        if cap and start_row >= cap:
+            if not row_limit or row_limit > cap:
+                logger.warning(
+                    f"[GSC] Tope de {cap} filas alcanzado para {site_url} "
+                    f"({dimensions}, {start_date}→{end_date}); resultado truncado"
+                )
+            break
+
+
+def _cache_scope(service):
+    """Identifica la cuenta de Google del service para aislar la caché por cuenta.
+
+    Devuelve None si no hay credenciales reconocibles (la caché se omite).
+    """
+    creds = getattr(getattr(service, '_http', None), 'credentials', None)
+    secret = getattr(creds, 'refresh_token', None) or getattr(creds, 'token', None)
+    if not secret:
+        return None
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+
+def _fetch_rows(service, site_url, start_date, end_date, dimensions, filters=None,
+                row_limit=None, max_rows=None, http=None, on_page=None, use_cache=True):
+    """
+    Descarga todas las filas de una consulta pasando por la caché de respuestas.
+    `on_page(rows)` recibe cada página según llega (descargada o desde caché).
+    Con `use_cache=False` se va siempre a la API (p.ej. sincronización del warehouse).
+    """
+    def _fetch(range_start, range_end):
+        rows = []
+        for page in iter_searchconsole_pages(service, site_url, range_start, range_end, dimensions,
+                                             filters, row_limit=row_limit, max_rows=max_rows, http=http):
+            if on_page:
+                on_page(page)
+            rows.extend(page)
+        return rows
+
+    if not use_cache:
+        return _fetch(start_date, end_date)
+    return gsc_cache.get_or_fetch(
+        _cache_scope(service), site_url, start_date, end_date, dimensions, filters,
+        _fetch, max_rows=_total_row_cap(row_limit, max_rows), on_cached=on_page
+    )
+
+
 def fetch_searchconsole_data_single_call(service, site_url, start_date, end_date,
-                                         dimensions, filters=None, row_limit=25000):
+                                         dimensions, filters=None, row_limit=None, max_rows=None, http=None):
     """
     Llama al endpoint searchanalytics.query de GSC.
     Devuelve una lista de filas (cada fila es un dict con keys: keys, clicks, impressions, ctr, position).
+
+    Pagina automáticamente con `startRow` de GSC_PAGE_SIZE en GSC_PAGE_SIZE filas.
+    `row_limit` sigue siendo el total de filas pedidas (None = todas); sin él,
+    la descarga solo se corta en `max_rows` (GSC_MAX_ROWS por defecto), por lo
+    que ya no se trunca en silencio a las primeras 25.000 filas. Los rangos
+    cerrados se sirven desde `gsc_cache` (ver services/ai_cache.py).
+    Desde un hilo secundario hay que pasar `http` (ver `run_concurrent_fetches`).
+    """
+    return _fetch_rows(service, site_url, start_date, end_date, dimensions, filters,
+                       row_limit=row_limit, max_rows=max_rows, http=http)
+
+
+_STREAM_DONE = object()
+
+
+class _StreamCancelled(Exception):
+    """El consumidor dejó de leer el stream; los workers abandonan la consulta."""
+
+
+def stream_searchconsole_queries(service, site_url, queries, max_workers=None, use_cache=True, http=None):
     """
-    body = {
-        'startDate': start_date,
-        'endDate':   end_date,
-        'dimensions': dimensions,
-        'rowLimit':  row_limit
-    }
-    if filters:
-        body['dimensionFilterGroups'] = filters
-
-    resp = service.searchanalytics().query(siteUrl=site_url, body=body).execute()
-    return resp.get('rows', [])
+    Ejecuta varias consultas de GSC en paralelo y va devolviendo filas según llegan.
+
+    `queries` es una lista de dicts con claves `key`, `start_date`, `end_date`,
+    `dimensions` y opcionalmente `filters` / `max_rows`. Genera tuplas
+    `(key, rows)` por cada página recibida, en orden de llegada. Un error en
+    cualquier consulta se relanza en el consumidor. `http` es el transporte
+    del hilo llamador, usado cuando las consultas se ejecutan en secuencia.
+    """
+    if not queries:
+        return
+
+    max_workers = max(1, min(max_workers or GSC_MAX_WORKERS, len(queries)))
+    # Sin transporte propio por hilo no es seguro compartir el service
+    if max_workers > 1 and _new_thread_http(service) is None:
+        max_workers = 1
+
+    if max_workers == 1:
+        for q in queries:
+            rows = _fetch_rows(
+                service, site_url, q['start_date'], q['end_date'], q['dimensions'],
+                q.get('filters'), max_rows=q.get('max_rows'), http=http, use_cache=use_cache
+            )
+            if rows:
+                yield q['key'], rows
+        return
+
+    results = queue.Queue()
+    local = threading.local()
+    cancelled = threading.Event()
+
+    def _worker(q):
+        try:
+            if not hasattr(local, 'http'):
+                local.http = _new_thread_http(service)
+
+            def _emit(page):
+                if cancelled.is_set():
+                    raise _StreamCancelled()
+                results.put((q['key'], page))
+
+            _fetch_rows(
+                service, site_url, q['start_date'], q['end_date'], q['dimensions'],
+                q.get('filters'), max_rows=q.get('max_rows'), http=local.http, on_page=_emit,
+                use_cache=use_cache
+            )
+        except _StreamCancelled:
+            pass
+        except Exception as e:
+            results.put((q['key'], e))
+        finally:
+            results.put((q['key'], _STREAM_DONE))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gsc')
+    try:
+        for q in queries:
+            executor.submit(_worker, q)
+        pending = len(queries)
+        while pending:
+            key, item = results.get()
+            if item is _STREAM_DONE:
+                pending -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield key, item
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_searchconsole_data_multi(service, site_url, queries, max_workers=None, use_cache=True, http=None):
+    """
+    Versión agregada de `stream_searchconsole_queries`: devuelve
+    `{key: [filas]}` con todas las filas de cada consulta (listas vacías si no hay datos).
+    """
+    rows_by_key = {q['key']: [] for q in queries}
+    for key, page in stream_searchconsole_queries(service, site_url, queries, max_workers, use_cache, http):
+        rows_by_key[key].extend(page)
+    return rows_by_key
+
+
+def run_concurrent_fetches(service, tasks, max_workers=None):
+    """
+    Ejecuta en paralelo varias descargas independientes sobre el mismo service
+    (p.ej. período actual y de comparación de /get-data).
+
+    `tasks` es un dict `{nombre: callable(http)}`; cada callable recibe el
+    transporte HTTP de su hilo y debe pasarlo a las funciones de descarga.
+    Devuelve `(resultados, tiempos)`, ambos indexados por nombre; los tiempos
+    son los segundos que tardó cada tarea. El primer error se relanza.
+    Las cuotas se siguen respetando con los limitadores por propiedad y cuenta.
+    """
+    results, timings = {}, {}
+    if not tasks:
+        return results, timings
+
+    max_workers = max(1, min(max_workers or GSC_MAX_WORKERS, len(tasks)))
+    # Sin transporte propio por hilo no es seguro compartir el service
+    if max_workers > 1 and _new_thread_http(service) is None:
+        max_workers = 1
+
+    def _run(name, fn, http):
+        started = time.perf_counter()
+        try:
+            return fn(http)
+        finally:
+            timings[name] = round(time.perf_counter() - started, 3)
+
+    if max_workers == 1:
+        for name, fn in tasks.items():
+            results[name] = _run(name, fn, None)
+        return results, timings
+
+    local = threading.local()
+
+    def _worker(name, fn):
+        if not hasattr(local, 'http'):
+            local.http = _new_thread_http(service)
+        return _run(name, fn, local.http)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gsc-task') as executor:
+        futures = {name: executor.submit(_worker, name, fn) for name, fn in tasks.items()}
+        try:
+            for name, future in futures.items():
+                results[name] = future.result()
+        except Exception:
+            for future in futures.values():
+                future.cancel()
+            raise
+    return results, timings
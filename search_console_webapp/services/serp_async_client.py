@@ -0,0 +1,193 @@
+"""
+Cliente asíncrono de SerpAPI con concurrencia adaptativa.
+
+Todas las llamadas JSON de `quota_middleware._execute_serp_call` se ejecutan en
+un único event loop de fondo con un `httpx.AsyncClient` compartido (conexiones
+keep-alive reutilizadas). Los hilos que llaman (workers de AI Overview, crons,
+rutas) solo esperan el resultado, de modo que el número de peticiones en vuelo
+lo decide el limitador y no el número de hilos.
+
+El limitador sigue un esquema AIMD (aumento aditivo, reducción multiplicativa):
+
+- Cada respuesta sana con latencia dentro de `latency_tolerance` veces la
+  latencia típica sube el límite en 1/límite (≈ +1 por "ronda" completa).
+- Un 429, un 5xx, un timeout/error de red o una latencia disparada lo reduce a
+  la mitad, como mucho una vez por ronda para no desplomarlo con una ráfaga de
+  429 de la misma tanda.
+
+Así una cuenta con margen llega a decenas de peticiones simultáneas y, cuando
+SerpAPI empieza a limitar, la presión baja sola sin tocar configuración.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SERPAPI_SEARCH_URL = 'https://serpapi.com/search.json'
+
+
+class AdaptiveConcurrencyLimiter:
+    """Límite de peticiones en vuelo ajustado por latencia y sobrecarga (AIMD)."""
+
+    def __init__(self, initial=8, minimum=2, maximum=48, latency_tolerance=2.0,
+                 latency_smoothing=0.05, clock=time.monotonic):
+        self.minimum = max(1, int(minimum))
+        self.maximum = max(self.minimum, int(maximum))
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.latency_smoothing = latency_smoothing
+        self.latency_ewma = None    # latencia típica de una llamada sana (segundos)
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = None
+        self._cond = asyncio.Condition()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def record_success(self, latency):
+        """Ajusta el límite tras una respuesta válida que tardó `latency` segundos."""
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        if latency > self.latency_ewma * self.latency_tolerance:
+            self.record_overload()
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self.latency_ewma += self.latency_smoothing * (latency - self.latency_ewma)
+
+    def record_overload(self):
+        """Reduce el límite a la mitad (429, 5xx, timeout o latencia disparada)."""
+        now = self._clock()
+        window = self.latency_ewma or 1.0
+        if self._last_decrease is not None and now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit / 2)
+        logger.info(f"[SERPAPI ASYNC] Sobrecarga detectada: concurrencia → {self.current_limit}")
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+
+    async def release(self, latency=None, overloaded=False):
+        async with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.record_overload()
+            elif latency is not None:
+                self.record_success(latency)
+            self._cond.notify_all()
+
+
+class SerpAsyncClient:
+    """
+    Cliente SerpAPI JSON sobre un event loop propio en un hilo daemon.
+
+    `fetch_json`/`fetch_many` son síncronos para los llamadores actuales y
+    devuelven `(success, data)` con el mismo contrato que
+    `quota_middleware._execute_serp_call`. `should_retry(mensaje)` decide qué
+    errores de SerpAPI devueltos en el cuerpo son transitorios; los 429/5xx y
+    los errores de red se reintentan siempre.
+    """
+
+    def __init__(self, limiter=None, base_url=SERPAPI_SEARCH_URL, timeout=60.0,
+                 max_attempts=3, backoff_seconds=1.0, should_retry=None, transport=None):
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_seconds = backoff_seconds
+        self.should_retry = should_retry
+        self._transport = transport
+        self._loop = None
+        self._http = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='serpapi-async', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _get_http(self):
+        # Solo se usa desde el event loop de fondo
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.limiter.maximum,
+                                    max_keepalive_connections=self.limiter.maximum),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def fetch(self, params):
+        """Una búsqueda SerpAPI con reintentos; respeta el límite adaptativo."""
+        http = self._get_http()
+        data = {}
+        for attempt in range(1, self.max_attempts + 1):
+            await self.limiter.acquire()
+            started = time.monotonic()
+            latency = None
+            overloaded = False
+            try:
+                response = await http.get(self.base_url, params=params)
+                latency = time.monotonic() - started
+                overloaded = response.status_code == 429 or response.status_code >= 500
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    data = {'error': f'HTTP {response.status_code}: respuesta no JSON de SerpAPI'}
+                elif response.status_code >= 400 and 'error' not in data:
+                    data = {**data, 'error': f'HTTP {response.status_code}'}
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                overloaded = True
+                data = {'error': f'{e.__class__.__name__}: {e}'.rstrip(': ')}
+            except Exception as e:
+                data = {'error': str(e)}
+            finally:
+                await self.limiter.release(latency, overloaded)
+
+            error_msg = data.get('error')
+            if not error_msg:
+                return True, data
+
+            logger.warning(f"SerpAPI error: {error_msg}")
+            retryable = overloaded or (self.should_retry is not None and self.should_retry(str(error_msg)))
+            if attempt < self.max_attempts and retryable:
+                delay = self.backoff_seconds * (2 ** (attempt - 1))
+                logger.info(f"⏳ Reintentando SerpAPI JSON en {delay:.1f}s (intento {attempt}/{self.max_attempts})")
+                await asyncio.sleep(delay)
+                continue
+            return False, data
+        return False, data
+
+    async def _fetch_all(self, params_list):
+        return await asyncio.gather(*(self.fetch(params) for params in params_list))
+
+    def fetch_many(self, params_list):
+        """Lanza todas las búsquedas a la vez y devuelve sus `(success, data)` en orden."""
+        if not params_list:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(list(params_list)), self._ensure_loop())
+        return future.result()
+
+    def fetch_json(self, params):
+        return self.fetch_many([params])[0]
+
+    def stats(self):
+        return {
+            'concurrency_limit': self.limiter.current_limit,
+            'in_flight': self.limiter.in_flight,
+            'latency_ewma_seconds': round(self.limiter.latency_ewma, 3) if self.limiter.latency_ewma else None,
+        }
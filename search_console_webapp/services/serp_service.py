@@ -1,12 +1,16 @@
 # services/serp_service.py
+import atexit
 import time
 import hashlib
 import logging
 import os
+import threading
 from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from serpapi import GoogleSearch
-from playwright.sync_api import sync_playwright
 from flask import Response
+from .ai_cache import create_redis_client
+from .browser_pool import BrowserPool, BrowserPoolBusy
 from .utils import normalize_search_console_url
 from .country_config import get_country_config # Importar get_country_config
 import json # Importar json para los logs de depuración
@@ -16,29 +20,106 @@ from quota_middleware import quota_protected_serp_call
 
 logger = logging.getLogger(__name__)
 
-# Caché en memoria para capturas de pantalla (LRU + TTL)
+# Caché de capturas: PNG en Redis (compartido entre workers) + LRU local con TTL.
+# Clave: keyword + país + dominio resaltado.
 SCREENSHOT_CACHE = OrderedDict()
 CACHE_DURATION = int(os.getenv("SCREENSHOT_CACHE_TTL_SECONDS", "3600"))
 SCREENSHOT_CACHE_MAX = int(os.getenv("SCREENSHOT_CACHE_MAX", "200"))
+_SCREENSHOT_REDIS_PREFIX = "serp_screenshot:"
+_screenshot_cache_lock = threading.Lock()
+_redis = None
+_redis_checked = False
+
+# Pool de navegadores Playwright ya arrancados (services/browser_pool.py)
+SCREENSHOT_BROWSER_POOL_SIZE = int(os.getenv("SCREENSHOT_BROWSER_POOL_SIZE", "2"))
+SCREENSHOT_BROWSER_MAX_RENDERS = int(os.getenv("SCREENSHOT_BROWSER_MAX_RENDERS", "50"))
+SCREENSHOT_QUEUE_MAX = int(os.getenv("SCREENSHOT_QUEUE_MAX", "20"))
+SCREENSHOT_RENDER_TIMEOUT_SECONDS = int(os.getenv("SCREENSHOT_RENDER_TIMEOUT_SECONDS", "90"))
+_browser_pool = None
+_browser_pool_lock = threading.Lock()
+
+def _get_redis():
+    global _redis, _redis_checked
+    if not _redis_checked:
+        _redis = create_redis_client(decode_responses=False)
+        _redis_checked = True
+    return _redis
+
+def get_browser_pool() -> BrowserPool:
+    global _browser_pool
+    if _browser_pool is None:
+        with _browser_pool_lock:
+            if _browser_pool is None:
+                _browser_pool = BrowserPool(
+                    size=SCREENSHOT_BROWSER_POOL_SIZE,
+                    max_renders=SCREENSHOT_BROWSER_MAX_RENDERS,
+                    queue_max=SCREENSHOT_QUEUE_MAX,
+                )
+                atexit.register(_browser_pool.shutdown)
+    return _browser_pool
+
+def screenshot_cache_key(keyword: str, country: str, domain_norm: str) -> str:
+    return hashlib.md5(f"screenshot:{keyword}:{domain_norm}:{country or 'default'}".encode()).hexdigest()
 
 def _get_cached_screenshot(cache_key: str, now: float):
-    cached = SCREENSHOT_CACHE.get(cache_key)
-    if not cached:
+    """PNG cacheado o None. Un hit en Redis se copia al LRU local."""
+    with _screenshot_cache_lock:
+        cached = SCREENSHOT_CACHE.get(cache_key)
+        if cached:
+            png, created_at = cached
+            if now - created_at < CACHE_DURATION:
+                # LRU: mover a la derecha en hit
+                SCREENSHOT_CACHE.move_to_end(cache_key)
+                return png
+            SCREENSHOT_CACHE.pop(cache_key, None)
+
+    client = _get_redis()
+    if client is None:
         return None
-    response, created_at = cached
-    if now - created_at >= CACHE_DURATION:
-        SCREENSHOT_CACHE.pop(cache_key, None)
+    try:
+        png = client.get(_SCREENSHOT_REDIS_PREFIX + cache_key)
+    except Exception as e:
+        logger.warning(f"[SCREENSHOT CACHE] Error leyendo de Redis: {e}")
         return None
-    # LRU: mover a la derecha en hit
-    SCREENSHOT_CACHE.move_to_end(cache_key)
-    return response
+    if png:
+        _set_local_screenshot(cache_key, png, now)
+    return png
 
-def _set_cached_screenshot(cache_key: str, response: Response, now: float):
-    SCREENSHOT_CACHE[cache_key] = (response, now)
-    SCREENSHOT_CACHE.move_to_end(cache_key)
-    # Evict LRU si excede el máximo
-    while SCREENSHOT_CACHE_MAX > 0 and len(SCREENSHOT_CACHE) > SCREENSHOT_CACHE_MAX:
-        SCREENSHOT_CACHE.popitem(last=False)
+def _set_local_screenshot(cache_key: str, png: bytes, now: float):
+    with _screenshot_cache_lock:
+        SCREENSHOT_CACHE[cache_key] = (png, now)
+        SCREENSHOT_CACHE.move_to_end(cache_key)
+        # Evict LRU si excede el máximo
+        while SCREENSHOT_CACHE_MAX > 0 and len(SCREENSHOT_CACHE) > SCREENSHOT_CACHE_MAX:
+            SCREENSHOT_CACHE.popitem(last=False)
+
+def _set_cached_screenshot(cache_key: str, png: bytes, now: float):
+    _set_local_screenshot(cache_key, png, now)
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.setex(_SCREENSHOT_REDIS_PREFIX + cache_key, CACHE_DURATION, png)
+    except Exception as e:
+        logger.warning(f"[SCREENSHOT CACHE] Error guardando en Redis: {e}")
+
+def clear_screenshot_cache() -> int:
+    """Vacía la caché de capturas (local y Redis). Devuelve las entradas borradas."""
+    with _screenshot_cache_lock:
+        deleted = len(SCREENSHOT_CACHE)
+        SCREENSHOT_CACHE.clear()
+    client = _get_redis()
+    if client is not None:
+        try:
+            keys = list(client.scan_iter(match=_SCREENSHOT_REDIS_PREFIX + '*', count=500))
+            if keys:
+                deleted += client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"[SCREENSHOT CACHE] Error limpiando Redis: {e}")
+    return deleted
+
+def _png_response(png: bytes) -> Response:
+    return Response(png, mimetype='image/png')
 
 def get_serp_json(params: dict) -> dict:
     """
@@ -163,16 +244,15 @@ def get_page_screenshot(keyword: str, site_url_to_highlight: str, api_key: str,
     logger.info(f"Params: {json.dumps(_loggable_params, indent=2)}")
     logger.info(f"========================")
 
-    # Crear cache key que incluya el país y site_url (para cache dinámico)
+    # Cache key: keyword + país (ya resuelto si era dinámico) + dominio resaltado
     domain_norm = normalize_search_console_url(site_url_to_highlight)
-    site_key = site_url or 'no-site'
-    cache_key_hash = hashlib.md5(f"screenshot:{keyword}:{domain_norm}:{country or 'default'}:{site_key}".encode()).hexdigest()
+    cache_key_hash = screenshot_cache_key(keyword, country, domain_norm)
     now = time.time()
 
-    cached_response = _get_cached_screenshot(cache_key_hash, now)
-    if cached_response:
+    cached_png = _get_cached_screenshot(cache_key_hash, now)
+    if cached_png:
         logger.info(f"📥 Screenshot desde caché para keyword '{keyword}', domain '{domain_norm}' (país: {country or 'España'})")
-        return cached_response
+        return _png_response(cached_png)
 
     logger.info(f"🛠️  Generando nuevo screenshot para keyword '{keyword}', domain '{domain_norm}' (país: {country or 'España'})")
     
@@ -255,12 +335,11 @@ def get_page_screenshot(keyword: str, site_url_to_highlight: str, api_key: str,
     </body>
     </html>"""
 
-    # 4. Capturar screenshot con Playwright
-    img_bytes = None
-    try:
-        with sync_playwright() as pw:
-            browser = pw.chromium.launch()
-            page = browser.new_page(viewport={'width': 1200, 'height': 800})
+    # 4. Capturar screenshot con un navegador del pool (ya arrancado)
+    def render(browser):
+        context = browser.new_context(viewport={'width': 1200, 'height': 800})
+        try:
+            page = context.new_page()
             page.set_content(enhanced_html, wait_until='networkidle', timeout=60000)
             
             # ✅ NUEVO: Scroll a la parte superior de la página
@@ -269,8 +348,16 @@ def get_page_screenshot(keyword: str, site_url_to_highlight: str, api_key: str,
             # ✅ NUEVO: Esperar un breve momento para que el scroll se complete y la página se estabilice
             page.wait_for_timeout(1000)
 
-            img_bytes = page.screenshot(type='png', full_page=True)
-            browser.close()
+            return page.screenshot(type='png', full_page=True)
+        finally:
+            context.close()
+
+    img_bytes = None
+    try:
+        img_bytes = get_browser_pool().render(render, timeout=SCREENSHOT_RENDER_TIMEOUT_SECONDS)
+    except (BrowserPoolBusy, FutureTimeoutError) as e:
+        logger.warning(f"[PLAYWRIGHT SERVICE] Pool de navegadores saturado para keyword '{keyword}': {e!r}")
+        return Response("Screenshot service busy, please retry in a few seconds", status=503, mimetype='text/plain')
     except Exception as e:
         logger.error(f"[PLAYWRIGHT SERVICE] Error al capturar screenshot para keyword '{keyword}': {e}", exc_info=True)
         return Response(f"Error al capturar screenshot con Playwright para keyword: {keyword}", status=500, mimetype='text/plain')
@@ -279,9 +366,8 @@ def get_page_screenshot(keyword: str, site_url_to_highlight: str, api_key: str,
         logger.error(f"Playwright no generó bytes de imagen para keyword '{keyword}'")
         return Response("Error: Playwright no generó imagen.", status=500, mimetype='text/plain')
 
-    # 5. Devolver la imagen y cachear
-    resp = Response(img_bytes, mimetype='image/png')
-    _set_cached_screenshot(cache_key_hash, resp, now)
+    # 5. Cachear el PNG y devolver la imagen
+    _set_cached_screenshot(cache_key_hash, img_bytes, now)
     logger.info(f"✅ Screenshot generado y cacheado para keyword '{keyword}', domain '{domain_norm}' (país: {country or 'España'})")
-    return resp
+    return _png_response(img_bytes)
 
@@ -0,0 +1,163 @@
+"""
+Single-flight para llamadas SerpAPI idénticas simultáneas.
+
+Cuando varios hilos o usuarios piden la misma SERP a la vez (p. ej. dos crons
+solapados o el mismo análisis lanzado por dos personas), solo uno la descarga
+y el resto espera y comparte su resultado:
+
+- En el proceso: el primer hilo de cada clave es el "líder"; los siguientes
+  esperan a que termine y reciben una copia de su resultado (incluidos los
+  errores: si la llamada del líder ya falló tras sus reintentos, repetirla en
+  ese mismo instante no ayuda).
+- Entre workers: el líder toma un lock en Redis (`SET NX` con TTL). Si otro
+  proceso ya lo tiene, espera sondeando hasta que ese proceso publique el
+  resultado (solo los éxitos se publican, con TTL corto) o suelte el lock; en
+  ese caso hace la llamada él mismo. Sin Redis se degrada a single-flight solo
+  del proceso.
+
+Los resultados deben ser serializables a JSON para compartirse entre workers.
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    `do(key, fn)` ejecuta `fn()` una sola vez por clave entre las llamadas
+    concurrentes. `shareable(result)` decide si un resultado se publica para
+    otros workers; `redis_getter()` devuelve un cliente Redis binario o None.
+    """
+
+    def __init__(self, redis_getter=None, namespace='serp_flight', lock_ttl=90, result_ttl=60,
+                 wait_timeout=90.0, poll_interval=0.2, shareable=None):
+        self._redis_getter = redis_getter
+        self.namespace = namespace
+        self.lock_ttl = int(lock_ttl)
+        self.result_ttl = int(result_ttl)
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.shareable = shareable or (lambda result: True)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'leader_calls': 0, 'coalesced_local': 0, 'coalesced_remote': 0,
+                       'remote_wait_timeouts': 0, 'redis_errors': 0}
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self._stats[stat] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._lock:
+            stats['in_flight'] = len(self._flights)
+        return stats
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            flight.done.wait()
+            self._count('coalesced_local')
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        result = None
+        try:
+            result = self._run_across_workers(key, fn)
+            return result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                waiters = flight.waiters
+            if waiters and flight.error is None:
+                # Copia propia: el llamador líder puede mutar `result` mientras
+                # los demás hacen su copia
+                flight.result = copy.deepcopy(result)
+            flight.done.set()
+
+    # ------------------------------------------------------------------
+    # Coordinación entre workers
+    # ------------------------------------------------------------------
+
+    def _run_across_workers(self, key, fn):
+        client = self._redis_getter() if self._redis_getter else None
+        if client is None:
+            self._count('leader_calls')
+            return fn()
+
+        lock_key = f'{self.namespace}:lock:{key}'
+        result_key = f'{self.namespace}:result:{key}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        waiting = False
+        while True:
+            try:
+                if waiting:
+                    payload = client.get(result_key)
+                    if payload is not None:
+                        self._count('coalesced_remote')
+                        return json.loads(zlib.decompress(payload))
+                if client.set(lock_key, token, nx=True, ex=self.lock_ttl):
+                    break
+            except Exception as e:
+                self._count('redis_errors')
+                logger.warning(f"[SINGLE FLIGHT] Redis no disponible, llamada sin coordinar: {e}")
+                self._count('leader_calls')
+                return fn()
+            if time.monotonic() >= deadline:
+                self._count('remote_wait_timeouts')
+                logger.warning(f"[SINGLE FLIGHT] Espera agotada para {key}; se hace la llamada")
+                self._count('leader_calls')
+                return fn()
+            waiting = True
+            time.sleep(self.poll_interval)
+
+        self._count('leader_calls')
+        try:
+            result = fn()
+            if self.shareable(result):
+                try:
+                    payload = zlib.compress(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+                    client.setex(result_key, self.result_ttl, payload)
+                except Exception as e:
+                    self._count('redis_errors')
+                    logger.warning(f"[SINGLE FLIGHT] No se pudo publicar el resultado de {key}: {e}")
+            return result
+        finally:
+            try:
+                current = client.get(lock_key)
+                if current is not None and (current.decode() if isinstance(current, bytes) else current) == token:
+                    client.delete(lock_key)
+            except Exception as e:
+                self._count('redis_errors')
+                logger.warning(f"[SINGLE FLIGHT] No se pudo soltar el lock de {key}: {e}")
@@ -0,0 +1,398 @@
+# services/serp_store.py - Almacén compartido de SERPs del día
+"""
+Almacén en Postgres de respuestas SerpAPI por (búsqueda, país, día).
+
+Manual AI, AI Mode y `/api/analyze-ai-overview` consultan aquí antes de llamar
+a SerpAPI: la misma keyword en el mismo mercado se descarga como mucho una vez
+al día aunque aparezca en varios proyectos o usuarios. `SERP_NO_CACHE` sigue
+aplicándose a esa primera descarga (SerpAPI no sirve su propia caché), así que
+su semántica pasa a ser "como mucho una descarga fresca por clave y día".
+
+La clave es un hash de los parámetros de búsqueda normalizados (engine, q en
+minúsculas, location, gl, hl, google_domain, num...) sin `api_key` ni
+`no_cache`; dos llamadores solo comparten fila si piden exactamente la misma
+SERP. Las llamadas con `page_token` (expansión de un AI Overview colapsado) no
+se guardan por separado: el llamador vuelve a guardar la SERP base con el
+AI Overview ya expandido (`save_serp`), de modo que los siguientes tampoco
+pagan la segunda llamada.
+
+Las respuestas con error o bloqueadas por cuota nunca se guardan. El cobro de
+RU al usuario no cambia (se hace por keyword en cada módulo); lo que se ahorra
+son llamadas a SerpAPI, que `reuse_count` contabiliza para el informe.
+
+La lectura es un SELECT sin escritura: las reutilizaciones se acumulan en el
+proceso y se suman a `reuse_count` en lote (en la transacción del siguiente
+`save_serp`, o con un UPDATE propio cada SERP_STORE_REUSE_FLUSH_EVERY lecturas
+o SERP_STORE_REUSE_FLUSH_SECONDS segundos). Si el proceso muere se pierden como
+mucho esas lecturas del informe; las SERPs guardadas no se ven afectadas. Una
+lectura sin conexión libre en el pool acaba en SerpAPI; se cuenta aparte
+(`unavailable`) para que se vea en el informe.
+
+Activación: SERP_STORE_ENABLED (por defecto true).
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+SERP_STORE_ENABLED = os.getenv('SERP_STORE_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+SERP_STORE_RETENTION_DAYS = int(os.getenv('SERP_STORE_RETENTION_DAYS', '7'))
+SERP_STORE_REUSE_FLUSH_EVERY = int(os.getenv('SERP_STORE_REUSE_FLUSH_EVERY', '50'))
+SERP_STORE_REUSE_FLUSH_SECONDS = float(os.getenv('SERP_STORE_REUSE_FLUSH_SECONDS', '60'))
+
+# Parámetros que no cambian qué SERP devuelve Google
+_IGNORED_PARAMS = {'api_key', 'no_cache', 'async', 'output'}
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0, 'unavailable': 0}
+# Reutilizaciones aún no sumadas a reuse_count: (serp_key, serp_date) -> lecturas
+_reuse_lock = threading.Lock()
+_pending_reuses: Dict[Tuple[str, date], int] = {}
+_pending_since = None
+_table_lock = threading.Lock()
+_table_ready = False
+_last_purge_day = None
+
+
+# ================================
+# Esquema
+# ================================
+
+def ensure_serp_store_table() -> bool:
+    """Crea la tabla del almacén si no existe (idempotente)."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS serp_daily_results (
+                serp_key VARCHAR(32) NOT NULL,
+                serp_date DATE NOT NULL,
+                engine VARCHAR(40) NOT NULL,
+                keyword TEXT NOT NULL,
+                country VARCHAR(100),
+                payload BYTEA NOT NULL,
+                payload_bytes INTEGER NOT NULL DEFAULT 0,
+                fetched_by VARCHAR(30),
+                fetched_at TIMESTAMP DEFAULT NOW(),
+                reuse_count INTEGER NOT NULL DEFAULT 0,
+                last_reused_at TIMESTAMP,
+                PRIMARY KEY (serp_key, serp_date)
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_serp_daily_results_date ON serp_daily_results(serp_date)')
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Error creando la tabla serp_daily_results: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def _ensure_table_once() -> bool:
+    global _table_ready
+    if _table_ready:
+        return True
+    with _table_lock:
+        if not _table_ready:
+            _table_ready = ensure_serp_store_table()
+    return _table_ready
+
+
+# ================================
+# Claves
+# ================================
+
+def _normalize_keyword(keyword: str) -> str:
+    return re.sub(r'\s+', ' ', str(keyword or '')).strip().lower()
+
+
+def serp_store_key(params: Dict[str, Any]) -> str:
+    """Hash de los parámetros que determinan la SERP (sin credenciales ni flags de caché)."""
+    canonical = {
+        k: (_normalize_keyword(v) if k == 'q' else str(v).strip().lower())
+        for k, v in params.items()
+        if k not in _IGNORED_PARAMS and v is not None
+    }
+    content = json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def _storable(data) -> bool:
+    return isinstance(data, dict) and bool(data) and not data.get('error') and not data.get('quota_blocked')
+
+
+def _count(stat: str):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+# ================================
+# Lectura / escritura
+# ================================
+
+def get_serp(params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """SERP ya descargada hoy para estos parámetros, o None. Anota la reutilización."""
+    if not _ensure_table_once():
+        return None
+    conn = get_db_connection()
+    if not conn:
+        _count('unavailable')
+        logger.warning(f"Almacén de SERPs sin conexión para '{params.get('q')}'; se descarga de SerpAPI")
+        return None
+    key, day = serp_store_key(params), _today()
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT payload FROM serp_daily_results
+            WHERE serp_key = %s AND serp_date = %s
+        ''', (key, day))
+        row = cur.fetchone()
+        if not row:
+            return None
+        data = json.loads(zlib.decompress(bytes(row['payload'])))
+    except Exception as e:
+        _count('errors')
+        logger.warning(f"Error leyendo SERP compartida para '{params.get('q')}': {e}")
+        return None
+    finally:
+        conn.close()
+    _note_reuse(key, day)
+    return data
+
+
+def save_serp(params: Dict[str, Any], data: Dict[str, Any], source: str) -> bool:
+    """Guarda (o sustituye) la SERP de hoy; en la misma transacción vuelca las reutilizaciones pendientes."""
+    if not SERP_STORE_ENABLED or params.get('page_token') or not _storable(data):
+        return False
+    if not _ensure_table_once():
+        return False
+    conn = get_db_connection()
+    if not conn:
+        _count('unavailable')
+        return False
+    reuses = _take_pending_reuses()
+    try:
+        payload = zlib.compress(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        cur = conn.cursor()
+        cur.execute('''
+            INSERT INTO serp_daily_results
+                (serp_key, serp_date, engine, keyword, country, payload, payload_bytes, fetched_by)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (serp_key, serp_date)
+            DO UPDATE SET payload = EXCLUDED.payload,
+                          payload_bytes = EXCLUDED.payload_bytes
+        ''', (
+            serp_store_key(params), _today(), params.get('engine', 'google'),
+            _normalize_keyword(params.get('q')), params.get('gl') or params.get('location'),
+            payload, len(payload), source,
+        ))
+        _write_reuses(cur, reuses)
+        conn.commit()
+        _count('stores')
+        _purge_once_a_day()
+        return True
+    except Exception as e:
+        _count('errors')
+        _restore_pending_reuses(reuses)
+        logger.warning(f"Error guardando SERP compartida para '{params.get('q')}': {e}")
+        return False
+    finally:
+        conn.close()
+
+
+# ================================
+# Reutilizaciones (reuse_count en lote)
+# ================================
+
+def _note_reuse(key: str, day: date):
+    global _pending_since
+    with _reuse_lock:
+        _pending_reuses[(key, day)] = _pending_reuses.get((key, day), 0) + 1
+        if _pending_since is None:
+            _pending_since = time.monotonic()
+        due = (sum(_pending_reuses.values()) >= SERP_STORE_REUSE_FLUSH_EVERY
+               or time.monotonic() - _pending_since >= SERP_STORE_REUSE_FLUSH_SECONDS)
+    if due:
+        flush_reuse_counts()
+
+
+def _take_pending_reuses() -> Dict[Tuple[str, date], int]:
+    global _pending_reuses, _pending_since
+    with _reuse_lock:
+        taken, _pending_reuses, _pending_since = _pending_reuses, {}, None
+    return taken
+
+
+def _restore_pending_reuses(reuses: Dict[Tuple[str, date], int]):
+    global _pending_since
+    if not reuses:
+        return
+    with _reuse_lock:
+        for key, n in reuses.items():
+            _pending_reuses[key] = _pending_reuses.get(key, 0) + n
+        if _pending_since is None:
+            _pending_since = time.monotonic()
+
+
+def _write_reuses(cur, reuses: Dict[Tuple[str, date], int]):
+    if not reuses:
+        return
+    execute_values(cur, '''
+        UPDATE serp_daily_results AS s
+        SET reuse_count = s.reuse_count + v.n, last_reused_at = NOW()
+        FROM (VALUES %s) AS v(serp_key, serp_date, n)
+        WHERE s.serp_key = v.serp_key AND s.serp_date = v.serp_date
+    ''', [(key, day, n) for (key, day), n in reuses.items()], template='(%s, %s::date, %s)')
+
+
+def flush_reuse_counts() -> int:
+    """Suma a `reuse_count` las reutilizaciones pendientes. Devuelve cuántas escribió."""
+    reuses = _take_pending_reuses()
+    if not reuses:
+        return 0
+    conn = get_db_connection()
+    if not conn:
+        _restore_pending_reuses(reuses)
+        return 0
+    try:
+        cur = conn.cursor()
+        _write_reuses(cur, reuses)
+        conn.commit()
+        return sum(reuses.values())
+    except Exception as e:
+        _restore_pending_reuses(reuses)
+        logger.warning(f"Error actualizando reuse_count del almacén de SERPs: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def fetch_serp(params: Dict[str, Any], fetch: Callable[[Dict[str, Any]], Dict[str, Any]],
+               source: str) -> Dict[str, Any]:
+    """
+    Devuelve la SERP del día desde el almacén o, si no está, la descarga con
+    `fetch(params)` y la guarda. `source` identifica al módulo en el informe.
+    """
+    if not SERP_STORE_ENABLED or params.get('page_token'):
+        return fetch(params)
+
+    stored = get_serp(params)
+    if stored is not None:
+        _count('hits')
+        logger.info(f"🗄️ SERP compartida reutilizada para '{params.get('q')}' ({source})")
+        return stored
+
+    _count('misses')
+    data = fetch(params)
+    save_serp(params, data, source)
+    return data
+
+
+# ================================
+# Mantenimiento e informe
+# ================================
+
+def purge_old_serps(retention_days: int = SERP_STORE_RETENTION_DAYS) -> int:
+    """Borra las SERPs con más de `retention_days` días. Devuelve las filas borradas."""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    try:
+        cur = conn.cursor()
+        cur.execute('DELETE FROM serp_daily_results WHERE serp_date < %s',
+                    (_today() - timedelta(days=retention_days),))
+        deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    except Exception as e:
+        logger.warning(f"Error purgando SERPs antiguas: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def _purge_once_a_day():
+    global _last_purge_day
+    today = _today()
+    if _last_purge_day == today:
+        return
+    _last_purge_day = today
+    deleted = purge_old_serps()
+    if deleted:
+        logger.info(f"🗄️ Purgadas {deleted} SERPs compartidas antiguas")
+
+
+def get_serp_store_report(days: int = 7) -> Dict[str, Any]:
+    """
+    Llamadas a SerpAPI ahorradas por día y engine (`saved_calls` = lecturas
+    servidas desde el almacén) más los contadores de este proceso.
+    """
+    with _stats_lock:
+        process_stats = dict(_stats)
+    report = {'enabled': SERP_STORE_ENABLED, 'process': process_stats, 'days': [], 'totals': {}}
+    if not SERP_STORE_ENABLED or not _ensure_table_once():
+        return report
+
+    flush_reuse_counts()
+    conn = get_db_connection()
+    if not conn:
+        return report
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT serp_date, engine,
+                   COUNT(*) AS fetched_serps,
+                   COALESCE(SUM(reuse_count), 0) AS saved_calls,
+                   COALESCE(SUM(payload_bytes), 0) AS stored_bytes
+            FROM serp_daily_results
+            WHERE serp_date >= %s
+            GROUP BY serp_date, engine
+            ORDER BY serp_date DESC, engine
+        ''', (_today() - timedelta(days=max(days, 1) - 1),))
+        rows = [{
+            'date': row['serp_date'].isoformat(),
+            'engine': row['engine'],
+            'fetched_serps': int(row['fetched_serps']),
+            'saved_calls': int(row['saved_calls']),
+            'stored_bytes': int(row['stored_bytes']),
+        } for row in cur.fetchall()]
+        fetched = sum(r['fetched_serps'] for r in rows)
+        saved = sum(r['saved_calls'] for r in rows)
+        report['days'] = rows
+        report['totals'] = {
+            'fetched_serps': fetched,
+            'saved_calls': saved,
+            'saved_ratio': round(saved / (fetched + saved), 4) if fetched + saved else 0.0,
+        }
+        return report
+    except Exception as e:
+        logger.warning(f"Error generando el informe del almacén de SERPs: {e}")
+        report['error'] = str(e)
+        return report
+    finally:
+        conn.close()
+
+
+# Las lecturas anotadas y aún no volcadas se escriben al cerrar el proceso
+atexit.register(flush_reuse_counts)
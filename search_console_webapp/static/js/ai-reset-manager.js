@@ -329,8 +329,9 @@ class AIResetManager {
       let siteUrl = null;
 
       // Intentar obtener datos desde window.currentData (datos del análisis principal)
-      if (window.currentData && window.currentData.keyword_comparison_data) {
-        keywordData = window.currentData.keyword_comparison_data;
+      // (aiKeywordPool: keywords por Clicks P1 cuando las tablas se paginan en servidor)
+      if (window.currentData && (window.currentData.aiKeywordPool || window.currentData.keyword_comparison_data)) {
+        keywordData = window.currentData.aiKeywordPool || window.currentData.keyword_comparison_data;
         console.log('📊 Datos de keywords obtenidos desde currentData:', keywordData?.length);
       }
 
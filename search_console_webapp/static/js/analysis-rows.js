@@ -0,0 +1,184 @@
+// static/js/analysis-rows.js - Filas de /get-data paginadas en servidor
+//
+// /get-data guarda las tablas completas (keywords y URLs) y devuelve solo la
+// primera página junto con `paging`. El resto se pide a
+// /api/analysis/<analysis_id>/<tabla> (page, limit, sort, order y filtros);
+// estas utilidades montan el modo `server` de Grid.js sobre ese endpoint.
+
+import { showToast } from './ui-ai-overview-utils.js';
+
+// Tamaño máximo de página que acepta el servidor (MAX_PAGE_SIZE)
+export const ANALYSIS_MAX_PAGE_SIZE = 500;
+
+const EXPIRED_MESSAGE = 'This analysis has expired. Run the analysis again to keep browsing the results.';
+
+let expiredNotified = false;
+
+/**
+ * Información de paginado del análisis actual o null si la respuesta trae
+ * las tablas completas.
+ */
+export function getAnalysisPaging() {
+    const paging = window.currentData && window.currentData.paging;
+    return paging && paging.analysis_id ? paging : null;
+}
+
+function appendParams(url, params) {
+    const query = new URLSearchParams();
+    Object.entries(params || {}).forEach(([key, value]) => {
+        if (value === undefined || value === null || value === '') return;
+        if (Array.isArray(value) && value.length === 0) return;
+        query.append(key, Array.isArray(value) ? value.join(',') : String(value));
+    });
+    const queryString = query.toString();
+    if (!queryString) return url;
+    return `${url}${url.includes('?') ? '&' : '?'}${queryString}`;
+}
+
+function analysisRowsUrl(table, params = {}) {
+    const paging = getAnalysisPaging();
+    if (!paging) return null;
+    return appendParams(`/api/analysis/${encodeURIComponent(paging.analysis_id)}/${table}`, params);
+}
+
+async function fetchRowsPage(url) {
+    const resp = await fetch(url, { credentials: 'same-origin' });
+    const body = await resp.json().catch(() => ({}));
+    if (!resp.ok) {
+        const error = new Error(body.expired ? EXPIRED_MESSAGE : (body.error || `HTTP ${resp.status}`));
+        error.expired = !!body.expired;
+        throw error;
+    }
+    return body;
+}
+
+function notifyExpired(error) {
+    if (!error || !error.expired) return;
+    document.dispatchEvent(new CustomEvent('analysisResultsExpired', { detail: { message: error.message } }));
+}
+
+/**
+ * Pide una página de filas al servidor.
+ * @param {string} table - 'keywords' o 'pages'
+ * @param {Object} params - page, limit, sort, order, search, url_search, terms, method, preset, group
+ * @returns {Promise<{results: Array, total: number}>}
+ */
+export async function fetchAnalysisRows(table, params = {}) {
+    const url = analysisRowsUrl(table, params);
+    if (!url) return { results: [], total: 0 };
+    try {
+        return await fetchRowsPage(url);
+    } catch (error) {
+        notifyExpired(error);
+        throw error;
+    }
+}
+
+/**
+ * Todas las filas de una tabla, en páginas de ANALYSIS_MAX_PAGE_SIZE
+ * (export JSON). El orden es el por defecto de la tabla.
+ */
+export async function fetchAllAnalysisRows(table, params = {}) {
+    const rows = [];
+    for (let page = 0; ; page++) {
+        const { results, total } = await fetchAnalysisRows(table, { ...params, page, limit: ANALYSIS_MAX_PAGE_SIZE });
+        rows.push(...results);
+        if (!results.length || rows.length >= total) return rows;
+    }
+}
+
+/**
+ * Configuración de Grid.js en modo server para una tabla del análisis.
+ *
+ * La primera página llega en la respuesta de /get-data y se sirve sin volver
+ * a pedirla mientras no cambien filtros, orden ni página.
+ *
+ * @param {Object} options
+ * @param {string} options.table - 'keywords' o 'pages'
+ * @param {Object} [options.params] - Filtros fijos de la tabla (search, preset, group...)
+ * @param {Array} [options.firstPage] - Filas ya recibidas para esos filtros (página 0)
+ * @param {number} [options.total] - Total de filas de `firstPage`
+ * @param {Function} options.mapRows - Filas del servidor → filas de Grid.js
+ * @param {Array} options.sortFields - Por índice de columna: null (sin orden en servidor)
+ *   o [campo, descendenteAlPrimerClic]
+ * @param {number} [options.limit] - Filas por página
+ * @param {boolean} [options.search] - Usar la búsqueda nativa de Grid.js como `search`
+ * @returns {Object} Claves `server`, `pagination`, `sort` y `search` para gridjs.Grid
+ */
+export function buildServerGridConfig({
+    table,
+    params = {},
+    firstPage = null,
+    total = 0,
+    mapRows,
+    sortFields = [],
+    limit = null,
+    search = false
+}) {
+    const paging = getAnalysisPaging();
+    const pageSize = limit || (paging && paging.page_size) || 10;
+    const baseUrl = analysisRowsUrl(table, params);
+    const firstPageUrl = appendParams(baseUrl, { page: 0, limit: pageSize });
+
+    const config = {
+        server: {
+            url: baseUrl,
+            data: async (opts) => {
+                if (firstPage && opts.url === firstPageUrl) {
+                    return { data: mapRows(firstPage), total };
+                }
+                try {
+                    const body = await fetchRowsPage(opts.url);
+                    return { data: mapRows(body.results || []), total: body.total || 0 };
+                } catch (error) {
+                    notifyExpired(error);
+                    throw error;
+                }
+            }
+        },
+        pagination: {
+            enabled: true,
+            limit: pageSize,
+            summary: true,
+            server: {
+                url: (prev, page, pageLimit) => appendParams(prev, { page, limit: pageLimit })
+            }
+        },
+        sort: {
+            multiColumn: false,
+            server: {
+                url: (prev, columns) => {
+                    if (!columns || !columns.length) return prev;
+                    const { index, direction } = columns[0];
+                    const field = sortFields[index];
+                    if (!field) return prev;
+                    const [sortField, descFirst] = field;
+                    // Grid.js: 1 = primer clic; las métricas empiezan por el mayor
+                    const ascending = (direction === 1) !== !!descFirst;
+                    return appendParams(prev, { sort: sortField, order: ascending ? 'asc' : 'desc' });
+                }
+            }
+        }
+    };
+
+    if (search) {
+        config.search = {
+            server: {
+                url: (prev, keyword) => appendParams(prev, { search: keyword })
+            }
+        };
+    }
+
+    return config;
+}
+
+// Aviso único cuando el servidor ya no tiene el análisis
+document.addEventListener('analysisResultsExpired', (event) => {
+    if (expiredNotified) return;
+    expiredNotified = true;
+    showToast(event.detail.message, 'warning', 6000);
+});
+
+document.addEventListener('newAnalysisStarted', () => {
+    expiredNotified = false;
+});
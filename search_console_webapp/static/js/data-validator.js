@@ -225,6 +225,11 @@ export class DataValidator {
             return;
         }
 
+        // Con paginado en servidor solo se tiene la primera página de cada tabla
+        if (data.paging) {
+            return;
+        }
+
         // Calcular totales de páginas
         const pagesTotals = this.calculatePageTotals(data.pages);
         
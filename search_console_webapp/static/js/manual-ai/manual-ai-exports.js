@@ -164,11 +164,19 @@ export async function handleDownloadPDF() {
         const projectName = project?.name || 'Unknown';
         const competitorsCount = project?.selected_competitors?.length || 0;
 
-        // Request the PDF from the server (may take 5-15s for large projects)
-        const response = await fetch(
-            `/manual-ai/api/projects/${projectId}/export/pdf?days=${days}`,
-            { method: 'GET' }
-        );
+        // Request the PDF from the server. Cached reports come back at once;
+        // otherwise the server renders in the background and answers 202
+        // until the file is ready, so we retry the same URL.
+        const pdfUrl = `/manual-ai/api/projects/${projectId}/export/pdf?days=${days}`;
+        let response = await fetch(pdfUrl, { method: 'GET' });
+        for (let attempt = 0; response.status === 202 && attempt < 60; attempt++) {
+            const pending = await response.json().catch(() => ({}));
+            await new Promise(resolve => setTimeout(resolve, (pending.retry_after || 3) * 1000));
+            response = await fetch(pdfUrl, { method: 'GET' });
+        }
+        if (response.status === 202) {
+            throw new Error('PDF generation is taking longer than expected. Please try again in a few minutes.');
+        }
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({ error: 'Error generating PDF file' }));
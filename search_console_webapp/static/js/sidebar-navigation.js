@@ -3,6 +3,8 @@
   Sistema de navegacion lateral para mejorar UX
 =============================================*/
 
+import { fetchAllAnalysisRows } from './analysis-rows.js';
+
 // Lightweight toast helper for sidebar — follows Clicandseo brandbook
 function _sidebarShowToast(message, type, duration) {
   type = type || 'info';
@@ -779,14 +781,20 @@ class SidebarNavigation {
 
     const siteUrlSelect = document.getElementById('siteUrlSelect');
 
-    // Optimizado: enviar solo los campos que excel_generator.py realmente usa
-    const prunedData = {
-      pages: window.currentData.pages || [],
-      keyword_comparison_data: window.currentData.keyword_comparison_data || [],
-      selected_country: window.currentData.selected_country || ''
-    };
+    // Optimizado: enviar solo los campos que excel_generator.py realmente usa.
+    // Con paginado en servidor las tablas completas las carga /download-excel
+    // a partir de analysis_id
+    const paging = window.currentData.paging;
+    const prunedData = paging
+      ? { selected_country: window.currentData.selected_country || '' }
+      : {
+        pages: window.currentData.pages || [],
+        keyword_comparison_data: window.currentData.keyword_comparison_data || [],
+        selected_country: window.currentData.selected_country || ''
+      };
 
     const payload = {
+      ...(paging ? { analysis_id: paging.analysis_id } : {}),
       data: prunedData,
       ai_overview_data: aiOverviewDataToDownload,
       metadata: {
@@ -860,6 +868,15 @@ class SidebarNavigation {
       // JSON export: usar datos completos (no podados como para Excel)
       if (window.currentData) {
         payload.data = window.currentData;
+        // Con paginado en servidor, currentData solo trae la primera página
+        if (window.currentData.paging) {
+          const [pages, keywords] = await Promise.all([
+            fetchAllAnalysisRows('pages'),
+            fetchAllAnalysisRows('keywords')
+          ]);
+          payload.data = { ...window.currentData, pages, keyword_comparison_data: keywords };
+          delete payload.analysis_id;
+        }
       }
 
       const jsonBlob = new Blob([JSON.stringify(payload, null, 2)], {
@@ -516,6 +516,10 @@ export function resetAIOverlay() {
         clearTimeout(window.aiProgressTimeout);
     }
     
+    // ✅ NUEVO: Vaciar la lista de keywords del modo job
+    clearLiveResults();
+    liveStats = null;
+    
     // 🆕 NUEVO: Resetear variables de progreso fidedigno
     totalEstimatedTime = 0;
     currentPhase = 0;
@@ -602,13 +606,88 @@ async function runAIOverviewAnalysisWithProgress(keywordData, siteUrl) {
         aiProgressTimer = null;
     }
     
-    // El progreso ya se inició en startSimpleProgress(), 
-    // aquí solo ejecutamos el análisis real
-    const result = await runAIOverviewAnalysis(currentKeywordData, currentSiteUrl);
+    // El progreso ya se inició en startSimpleProgress(); si el servidor trabaja
+    // en modo job, los eventos SSE lo sustituyen por el progreso real
+    liveStats = { startedAt: Date.now(), withAIO: 0, cited: 0 };
+    clearLiveResults();
+    const result = await runAIOverviewAnalysis(currentKeywordData, currentSiteUrl, null, null, {
+        onResult: handleLiveResult,
+        onProgress: handleLiveProgress
+    });
     
     return result;
 }
 
+/**
+ * ✅ NUEVO: Progreso real del modo job (SSE). El primer resultado detiene la
+ * animación estimada; desde ahí el porcentaje y el tiempo restante salen del
+ * ritmo real y se listan las últimas keywords analizadas.
+ */
+const LIVE_RESULTS_SHOWN = 5;
+let liveStats = null;
+
+function stopEstimatedProgress() {
+    if (aiProgressTimer) { clearTimeout(aiProgressTimer); aiProgressTimer = null; }
+    if (smoothAnimationId) { cancelAnimationFrame(smoothAnimationId); smoothAnimationId = null; }
+    if (window.simpleProgressTimeout) { clearTimeout(window.simpleProgressTimeout); window.simpleProgressTimeout = null; }
+}
+
+function handleLiveResult(result, progress) {
+    if (!liveStats) liveStats = { startedAt: Date.now(), withAIO: 0, cited: 0 };
+    if (result.has_ai_overview) liveStats.withAIO += 1;
+    if (result.domain_is_ai_source) liveStats.cited += 1;
+
+    const total = progress.keywords_total || 1;
+    const done = Math.max(1, Math.min(progress.keywords_done || 0, total));
+
+    stopEstimatedProgress();
+    startTime = liveStats.startedAt;
+    totalEstimatedTime = (Date.now() - liveStats.startedAt) / done * total;
+    smoothCurrentPct = 5 + 90 * done / total;
+    updateProgressSmooth(
+        smoothCurrentPct,
+        `Analyzed ${done} of ${total} keywords`,
+        `AI Overview in ${liveStats.withAIO} · your domain cited in ${liveStats.cited}`,
+        done < total ? 2 : 3
+    );
+    appendLiveResult(result);
+}
+
+function handleLiveProgress(progress) {
+    const total = progress.keywords_total || 0;
+    if (total && (progress.keywords_done || 0) >= total) {
+        stopEstimatedProgress();
+        smoothCurrentPct = 96;
+        updateProgressSmooth(96, 'Finalizing analysis...', 'Calculating competitors and summary', 4);
+    }
+}
+
+function appendLiveResult(result) {
+    const list = document.getElementById('aiLiveResults');
+    if (!list || !result) return;
+
+    const item = document.createElement('li');
+    const keyword = document.createElement('span');
+    keyword.className = 'ai-live-keyword';
+    keyword.textContent = result.keyword || '';
+    const badge = document.createElement('span');
+    badge.className = 'ai-live-badge' + (result.has_ai_overview ? ' has-aio' : '');
+    badge.textContent = result.error ? 'Error'
+        : result.domain_is_ai_source ? 'AIO · cited'
+        : result.has_ai_overview ? 'AIO' : 'No AIO';
+    item.append(keyword, badge);
+
+    list.prepend(item);
+    while (list.children.length > LIVE_RESULTS_SHOWN) {
+        list.lastElementChild.remove();
+    }
+}
+
+function clearLiveResults() {
+    const list = document.getElementById('aiLiveResults');
+    if (list) list.innerHTML = '';
+}
+
 /**
  * Verifica si el análisis está en curso
  */
@@ -81,10 +81,57 @@ function getCountryForAIAnalysis() {
     return countryToUse;
 }
 
+/**
+ * Sigue un job de AI Overview por Server-Sent Events.
+ * Llama a handlers.onResult(result, progress) con cada keyword terminada y a
+ * handlers.onProgress(progress, phase) con los cambios de fase; resuelve con el
+ * resultado final (mismo formato que la respuesta síncrona).
+ */
+function followAIOverviewJob(job, handlers = {}) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        let finished = false;
+
+        const finish = async () => {
+            if (finished) return;
+            finished = true;
+            source.close();
+            try {
+                const statusResponse = await fetch(job.status_url);
+                const statusData = await statusResponse.json();
+                if (!statusResponse.ok) {
+                    throw new Error(statusData.error || `HTTP ${statusResponse.status}`);
+                }
+                if (statusData.status !== 'done') {
+                    throw new Error((statusData.result && statusData.result.error) || statusData.error || 'Analysis error');
+                }
+                resolve(statusData.result);
+            } catch (error) {
+                reject(error);
+            }
+        };
+
+        source.addEventListener('result', (event) => {
+            const data = JSON.parse(event.data);
+            if (handlers.onResult) handlers.onResult(data.result, data.progress || {});
+        });
+        source.addEventListener('progress', (event) => {
+            const data = JSON.parse(event.data);
+            if (handlers.onProgress) handlers.onProgress(data.progress || {}, data.phase);
+        });
+        source.addEventListener('done', finish);
+        // 'error' llega tanto del servidor (job fallido) como por un corte de conexión:
+        // en un corte EventSource reconecta solo (Last-Event-ID); si ya no puede, se consulta el estado
+        source.addEventListener('error', (event) => {
+            if (event.data || source.readyState === EventSource.CLOSED) finish();
+        });
+    });
+}
+
 /**
  * Nueva función para el fetch de análisis AI
  */
-async function analyzeAIOverview(keywords, siteUrl, keywordCount = null) {
+async function analyzeAIOverview(keywords, siteUrl, keywordCount = null, handlers = {}) {
     // Usar la lógica de país principal del negocio
     const countryToUse = window.getCountryToUse ? window.getCountryToUse() : 'esp';
     
@@ -159,6 +206,12 @@ async function analyzeAIOverview(keywords, siteUrl, keywordCount = null) {
         }
     }
     
+    // ✅ NUEVO: Modo job: el servidor responde 202 y emite cada keyword por SSE
+    const useJob = typeof window.EventSource === 'function';
+    if (useJob) {
+        payload.async = true;
+    }
+    
     const response = await fetch('/api/analyze-ai-overview', {
         method: 'POST',
         headers: {
@@ -191,6 +244,12 @@ async function analyzeAIOverview(keywords, siteUrl, keywordCount = null) {
         throw new Error(errorData.error || `Error del servidor: ${response.status}`);
     }
     
+    if (response.status === 202) {
+        const job = await response.json();
+        console.log(`📡 Análisis AI Overview en segundo plano (job ${job.job_id})`);
+        return followAIOverviewJob(job, handlers);
+    }
+    
     return response.json();
 }
 
@@ -200,8 +259,9 @@ async function analyzeAIOverview(keywords, siteUrl, keywordCount = null) {
  * @param {string} siteUrl - The site URL for the analysis.
  * @param {HTMLElement} [buttonElement=null] - The button element that triggered the analysis, for loading state.
  * @param {HTMLElement} [statusElement=null] - The element to display status messages.
+ * @param {Object} [handlers={}] - Optional onResult/onProgress callbacks for per-keyword partial results.
  */
-export async function runAIOverviewAnalysis(keywordData, siteUrl, buttonElement = null, statusElement = null) {
+export async function runAIOverviewAnalysis(keywordData, siteUrl, buttonElement = null, statusElement = null, handlers = {}) {
   console.log('[AI OVERVIEW] 🚀 Iniciando análisis completo...', { 
     keywordCount: keywordData?.length, 
     siteUrl,
@@ -325,7 +385,7 @@ export async function runAIOverviewAnalysis(keywordData, siteUrl, buttonElement
     if (statusElement) statusElement.textContent = `Analyzing ${topKeywords.length} keywords...`;
     
     // ✅ LLAMADA AL ANÁLISIS REAL con cantidad seleccionada
-    const analysisData = await analyzeAIOverview(topKeywords, siteUrl, selectedCount);
+    const analysisData = await analyzeAIOverview(topKeywords, siteUrl, selectedCount, handlers);
 
     if (analysisData.error) {
       throw new Error(analysisData.error);
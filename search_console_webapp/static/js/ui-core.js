@@ -28,6 +28,7 @@ import {
 } from './ui-sticky-actions.js';
 import { isMobileDevice, getDeviceType, optimizeForMobile, showMobileOptimizationNotice, getAdaptiveTimeouts } from './utils.js';
 import { renderOverviewMovers } from './ui-overview-movers.js';
+import { fetchAnalysisRows, ANALYSIS_MAX_PAGE_SIZE } from './analysis-rows.js';
 import { showToast } from './ui-ai-overview-utils.js';
 
 // ✅ NUEVO: Funciones del sidebar ahora están disponibles globalmente
@@ -334,8 +335,12 @@ export async function handleFormSubmit(e) {
       analysisMode: data.analysis_mode
     });
 
+    // ✅ NUEVO: Con `paging` las tablas llegan con su primera página y el resto
+    // se pide a /api/analysis/<analysis_id>/... (Grid.js en modo server)
+    const paging = data.paging || null;
+
     // ✅ NUEVO: Actualizar datos globales de keywords para los modales
-    updateGlobalKeywordData(data.keyword_comparison_data || []);
+    updateGlobalKeywordData(data.keyword_comparison_data || [], paging, data.keywordStats);
 
     // ✅ MODIFICADO: Usar datos de summary para métricas agregadas, pages para tabla
     const summaryData = data.summary && data.summary.length > 0 ? data.summary : data.pages;
@@ -345,10 +350,25 @@ export async function handleFormSubmit(e) {
     renderKeywords(data.keywordStats);
     
     // ✅ CAMBIO PRINCIPAL: Pasar también la información de períodos
-    renderKeywordComparisonTable(data.keyword_comparison_data || [], data.periods);
+    renderKeywordComparisonTable(data.keyword_comparison_data || [], data.periods, paging);
+
+    // ✅ NUEVO: AI Overview elige las keywords con más clics; con paginado se
+    // piden las primeras ANALYSIS_MAX_PAGE_SIZE por Clicks P1
+    let keywordData = data.keyword_comparison_data || [];
+    if (paging && paging.tables.keywords.total > keywordData.length) {
+      try {
+        const { results } = await fetchAnalysisRows('keywords', {
+          sort: 'clicks_m1', order: 'desc', limit: ANALYSIS_MAX_PAGE_SIZE
+        });
+        keywordData = results;
+      } catch (e) {
+        console.warn('⚠️ No se pudieron cargar las keywords para AI Overview:', e);
+      }
+    }
+    data.aiKeywordPool = keywordData;
 
     const siteUrlForAI = elems.siteUrlSelect ? elems.siteUrlSelect.value : '';
-    enableAIOverviewAnalysis(data.keyword_comparison_data || [], siteUrlForAI);
+    enableAIOverviewAnalysis(keywordData, siteUrlForAI);
 
     renderInsights(summary);
     
@@ -356,23 +376,29 @@ export async function handleFormSubmit(e) {
     window.currentData = data;
     
     // ✅ NUEVO: Renderizar tabla de URLs con nueva lógica
-    await renderTable(data.pages);
+    await renderTable(data.pages, paging);
+
+    // ✅ NUEVO: Con paginado los Top Movers los calcula el servidor sobre todas las filas
+    const moverPages = data.movers ? [...data.movers.pages.winners, ...data.movers.pages.losers] : data.pages;
+    const moverKeywords = data.movers
+      ? [...data.movers.keywords.winners, ...data.movers.keywords.losers]
+      : (data.keyword_comparison_data || []);
 
     // ✅ NUEVO: Generar estadísticas adicionales de URLs si hay comparación
-    const urlsCompData = processUrlsForComparison(data.pages, data.periods);
-    if (hasUrlComparison(data.pages)) {
+    const urlsCompData = processUrlsForComparison(moverPages, data.periods);
+    if (hasUrlComparison(moverPages)) {
       const urlsStats = generateUrlsStats(urlsCompData);
       console.log('📋 Estadísticas de URLs generadas:', urlsStats);
     }
 
     // ✅ NUEVO: Renderizar Top Movers + Position Distribution
     renderOverviewMovers(
-      data.keyword_comparison_data || [],
+      moverKeywords,
       urlsCompData,
-      data.periods?.has_comparison || false
+      data.periods?.has_comparison || false,
+      paging ? data.keywordStats : null
     );
 
-    const keywordData = data.keyword_comparison_data || [];
     updateStickyData(keywordData, siteUrlForAI);
     
     // ✅ NUEVO: Actualizar datos del overlay AI
@@ -37,7 +37,7 @@ function getAnalysisType(keywordData, periods = null) {
 
 // ✅ REMOVIDO: Funciones de parsing duplicadas - ahora se usan las del módulo centralizado
 
-export function renderKeywordComparisonTable(keywordData, periods = null) {
+export function renderKeywordComparisonTable(keywordData, periods = null, paging = null) {
   const container = document.getElementById('keywordComparisonBlock');
   if (!container) return;
   const gridMount = getKeywordComparisonGridMount(container);
@@ -58,6 +58,11 @@ export function renderKeywordComparisonTable(keywordData, periods = null) {
   const analysisType = getAnalysisType(keywordData, periods);
   console.log(`📊 Tipo de análisis: ${analysisType}, Keywords: ${keywordData ? keywordData.length : 0}`);
 
+  // ✅ NUEVO: Con paginado en servidor keywordData es solo la primera página
+  const serverSource = paging && paging.tables && paging.tables.keywords
+    ? { total: paging.tables.keywords.total }
+    : null;
+
   if (!keywordData || keywordData.length === 0) {
     // Mostrar mensaje de no hay datos
     if (quickFiltersHost) quickFiltersHost.innerHTML = '';
@@ -81,7 +86,7 @@ export function renderKeywordComparisonTable(keywordData, periods = null) {
     });
     
     // Crear Grid.js table
-    keywordComparisonGridTable = createKeywordsGridTable(keywordData, analysisType, container);
+    keywordComparisonGridTable = createKeywordsGridTable(keywordData, analysisType, container, serverSource);
     // Guardar referencia global para restaurar tras Clear All
     window.lastKeywordsData = keywordData;
     window.lastKeywordsAnalysisType = analysisType;
@@ -1,6 +1,7 @@
 // static/js/ui-keywords-gridjs.js - Tabla Grid.js para Keywords del panel principal
 
 import { formatInteger, formatPercentage, formatPercentageChange, formatPosition, formatPositionDelta, formatAbsoluteDelta, calculateAbsoluteDelta, parsePositionValue, parseIntegerValue, parseNumericValue } from './number-utils.js';
+import { buildServerGridConfig } from './analysis-rows.js';
 
 // =============================
 // UI state y helpers para Keyword Filter
@@ -14,7 +15,26 @@ const kwFilterState = {
     presetContext: null,
     currentGrid: null,
     currentKeywordsData: [],
-    currentAnalysisType: 'comparison'
+    currentAnalysisType: 'comparison',
+    serverSource: null
+};
+
+// Orden en servidor por columna: [campo de /api/analysis, descendente al primer clic].
+// Las columnas Δ muestran P1 - P2, que en servidor son los campos delta_*.
+const KEYWORD_SERVER_SORT_FIELDS = {
+    keyword: ['keyword', false],
+    clicks_m1: ['clicks_m1', true],
+    clicks_m2: ['clicks_m2', true],
+    delta_clicks_percent: ['delta_clicks', true],
+    impressions_m1: ['impressions_m1', true],
+    impressions_m2: ['impressions_m2', true],
+    delta_impressions_percent: ['delta_impressions', true],
+    ctr_m1: ['ctr_m1', true],
+    ctr_m2: ['ctr_m2', true],
+    delta_ctr_percent: ['delta_ctr', true],
+    position_m1: ['position_m1', false],
+    position_m2: ['position_m2', false],
+    delta_position_absolute: ['delta_position', false]
 };
 
 const kwPresetDefinitions = {
@@ -212,11 +232,49 @@ function clearAllKwFilterTerms() {
     renderMainKeywordsGridWithFilter();
 }
 
-function setMainKeywordsGridContext(grid, keywordsData, analysisType) {
+function setMainKeywordsGridContext(grid, keywordsData, analysisType, serverSource = null) {
     kwFilterState.currentGrid = grid || null;
     kwFilterState.currentKeywordsData = Array.isArray(keywordsData) ? keywordsData : [];
     kwFilterState.currentAnalysisType = analysisType || 'comparison';
-    kwFilterState.presetContext = buildKeywordPresetContext(kwFilterState.currentKeywordsData);
+    kwFilterState.serverSource = serverSource;
+    // En modo servidor los presets se evalúan sobre todas las filas en el backend
+    kwFilterState.presetContext = serverSource ? null : buildKeywordPresetContext(kwFilterState.currentKeywordsData);
+}
+
+// Filtros de la tabla principal como parámetros de /api/analysis/<id>/keywords
+function getMainKeywordsServerParams() {
+    const { method, terms } = getKeywordFilterConfig();
+    return {
+        terms,
+        method: terms.length ? method : '',
+        preset: kwFilterState.activePreset,
+        search: kwFilterState.keywordSearchTerm,
+        url_search: kwFilterState.urlSearchTerm
+    };
+}
+
+function hasServerFilters(params) {
+    return Object.values(params || {}).some((value) => (Array.isArray(value) ? value.length > 0 : !!value));
+}
+
+/**
+ * Configuración Grid.js (server, pagination, sort) de una tabla de keywords
+ * paginada en servidor.
+ * @param {string} analysisType - 'single' o 'comparison'
+ * @param {Object} params - Filtros (search, url_search, terms, method, preset, group, sort, order)
+ * @param {Array|null} firstPage - Primera página ya recibida para esos filtros
+ * @param {number} total - Total de filas de firstPage
+ */
+function buildKeywordsServerConfig(analysisType, params, firstPage = null, total = 0) {
+    const { columns } = processKeywordsDataForGrid([], analysisType);
+    return buildServerGridConfig({
+        table: 'keywords',
+        params,
+        firstPage,
+        total,
+        mapRows: (rows) => processKeywordsDataForGrid(rows, analysisType).data,
+        sortFields: columns.map((column) => KEYWORD_SERVER_SORT_FIELDS[column.id] || null)
+    });
 }
 
 function normalizeUrlCandidate(urlValue) {
@@ -480,7 +538,7 @@ function setupMainKeywordsPresetControls(containerEl) {
     });
 }
 
-function setupScopedKeywordsSearchControls(containerEl, grid, keywordsData, analysisType, fallbackSortColumn = 0) {
+function setupScopedKeywordsSearchControls(containerEl, grid, keywordsData, analysisType, fallbackSortColumn = 0, serverSource = null) {
     if (!containerEl || !grid) return;
 
     const keywordInput = containerEl.querySelector('.keywords-text-search-input');
@@ -491,6 +549,12 @@ function setupScopedKeywordsSearchControls(containerEl, grid, keywordsData, anal
     let urlTerm = '';
 
     const applyScopedFilters = () => {
+        if (serverSource) {
+            const params = { ...(serverSource.params || {}), search: keywordTerm, url_search: urlTerm };
+            grid.updateConfig(buildKeywordsServerConfig(analysisType, params)).forceRender();
+            return;
+        }
+
         let filtered = Array.isArray(keywordsData) ? keywordsData : [];
 
         if (keywordTerm) {
@@ -536,6 +600,12 @@ function renderMainKeywordsGridWithFilter() {
     if (!grid || typeof grid.updateConfig !== 'function') return false;
 
     try {
+        if (kwFilterState.serverSource) {
+            const config = buildKeywordsServerConfig(kwFilterState.currentAnalysisType, getMainKeywordsServerParams());
+            grid.updateConfig(config).forceRender();
+            return true;
+        }
+
         const filtered = applyKeywordAndSearchFilters(kwFilterState.currentKeywordsData) || [];
         const processed = processKeywordsDataForGrid(filtered, kwFilterState.currentAnalysisType) || { data: [], defaultSortColumn: 0 };
         const safeData = sortRowsByColumnDesc(processed.data, processed.defaultSortColumn);
@@ -757,9 +827,11 @@ function renderKeywordPresetChips() {
  * @param {Array} keywordsData - Datos de keywords procesados
  * @param {string} analysisType - Tipo de análisis ('single' o 'comparison')
  * @param {HTMLElement} container - Contenedor donde renderizar la tabla
+ * @param {Object|null} serverSource - Tabla paginada en servidor: { total, params }.
+ *   keywordsData es entonces la primera página (o [] si no se tiene)
  * @returns {Object|null} Instancia de Grid.js o null si hay error
  */
-export function createKeywordsGridTable(keywordsData, analysisType = 'comparison', container) {
+export function createKeywordsGridTable(keywordsData, analysisType = 'comparison', container, serverSource = null) {
     console.log('🏗️ Creating Keywords Grid.js table with:', {
         keywords: keywordsData?.length || 0,
         analysisType: analysisType
@@ -785,7 +857,8 @@ export function createKeywordsGridTable(keywordsData, analysisType = 'comparison
     const useInlineDualSearchControls = isRangeModalGrid || (isMainGrid && !hasExternalMainControls);
     const disableNativeSearch = isMainGrid || isRangeModalGrid;
 
-    if (!keywordsData || keywordsData.length === 0) {
+    const hasRows = serverSource ? serverSource.total > 0 : !!(keywordsData && keywordsData.length > 0);
+    if (!hasRows) {
         displayNoKeywordsMessage(gridMountContainer);
         return null;
     }
@@ -796,14 +869,32 @@ export function createKeywordsGridTable(keywordsData, analysisType = 'comparison
     }
     ensureKeywordUrlPopoverSetup();
     const sourceKeywords = Array.isArray(keywordsData) ? keywordsData : [];
-    if (isMainGrid) {
+    if (isMainGrid && !serverSource) {
         kwFilterState.presetContext = buildKeywordPresetContext(sourceKeywords);
     }
-    const filteredKeywords = isMainGrid ? applyKeywordAndSearchFilters(sourceKeywords) : sourceKeywords;
+    const filteredKeywords = isMainGrid && !serverSource ? applyKeywordAndSearchFilters(sourceKeywords) : sourceKeywords;
 
     // Procesar datos para Grid.js
     const { columns, data, defaultSortColumn } = processKeywordsDataForGrid(filteredKeywords, analysisType);
-    const initialSortedData = sortRowsByColumnDesc(data, defaultSortColumn);
+
+    // Origen de filas: servidor (paginado) o datos en memoria ordenados por Clicks P1
+    let gridSource;
+    if (serverSource) {
+        const serverParams = isMainGrid ? getMainKeywordsServerParams() : (serverSource.params || {});
+        // La primera página recibida solo vale si no hay filtros activos
+        const firstPage = isMainGrid && hasServerFilters(serverParams) ? null : (sourceKeywords.length ? sourceKeywords : null);
+        gridSource = buildKeywordsServerConfig(analysisType, serverParams, firstPage, serverSource.total);
+    } else {
+        gridSource = {
+            data: sortRowsByColumnDesc(data, defaultSortColumn),
+            sort: true, // ✅ MEJORADO: Simplificar para evitar conflictos (igual que URLs)
+            pagination: {
+                enabled: true,
+                limit: 10,
+                summary: true
+            }
+        };
+    }
 
     // Crear contenedor para la tabla con ID único y consistente
     const uniqueId = `keywords-grid-table-${Date.now()}`;
@@ -867,18 +958,12 @@ export function createKeywordsGridTable(keywordsData, analysisType = 'comparison
     // Crear instancia de Grid.js
     const grid = new gridjs.Grid({
         columns: columns,
-        data: initialSortedData,
-        sort: true, // ✅ MEJORADO: Simplificar para evitar conflictos (igual que URLs)
+        ...gridSource,
         search: disableNativeSearch ? false : {
             enabled: true,
             placeholder: 'Search keywords...',
             selector: (cell) => (typeof cell === 'string' ? cell : '')
         },
-        pagination: {
-            enabled: true,
-            limit: 10,
-            summary: true
-        },
         language: {
             search: {
                 placeholder: 'Search keywords...'
@@ -948,14 +1033,15 @@ export function createKeywordsGridTable(keywordsData, analysisType = 'comparison
 
         // Asociar contexto de filtros solo para la tabla principal (evita stale closures)
         if (isMainGrid) {
-            setMainKeywordsGridContext(grid, keywordsData, analysisType);
+            setMainKeywordsGridContext(grid, keywordsData, analysisType, serverSource);
         } else if (isRangeModalGrid) {
-            setupScopedKeywordsSearchControls(tableContainer, grid, sourceKeywords, analysisType, defaultSortColumn);
+            setupScopedKeywordsSearchControls(tableContainer, grid, sourceKeywords, analysisType, defaultSortColumn, serverSource);
         }
         
         // Mantener orden visual por Clicks P1 desc en la tabla principal.
         // En modales se evita este re-render extra para mejorar rendimiento.
-        if (isMainGrid) {
+        // En modo servidor las filas ya llegan ordenadas.
+        if (isMainGrid && !serverSource) {
             setTimeout(() => {
                 try {
                     if (grid && grid.config && grid.config.data) {
@@ -64,10 +64,13 @@ function truncate(str, maxLen = 45) {
  * Called from ui-core.js after data loads.
  *
  * @param {Array} keywordData  — window.currentData.keyword_comparison_data
+ *                               (with server paging: data.movers.keywords winners + losers)
  * @param {Array} urlsData     — processUrlsForComparison(data.pages, data.periods)
  * @param {boolean} hasComparison — data.periods?.has_comparison
+ * @param {Object} [keywordStats] — data.keywordStats; when given, the position
+ *                               distribution is read from it instead of counting keywordData
  */
-export function renderOverviewMovers(keywordData, urlsData, hasComparison) {
+export function renderOverviewMovers(keywordData, urlsData, hasComparison, keywordStats = null) {
   const moversSection = document.getElementById('moversSection');
   const posDistSection = document.getElementById('positionDistSection');
 
@@ -88,7 +91,7 @@ export function renderOverviewMovers(keywordData, urlsData, hasComparison) {
   // ── Render Position Distribution ──
   if (posDistSection) {
     posDistSection.style.display = 'block';
-    renderPositionDistribution(keywordData, hasComparison);
+    renderPositionDistribution(keywordData, hasComparison, keywordStats);
   }
 }
 
@@ -233,7 +236,7 @@ function renderMoversTable(containerId, rows, type, direction) {
 
 // ── Position Distribution Chart ─────────────────────────────
 
-function renderPositionDistribution(keywordData, hasComparison) {
+function renderPositionDistribution(keywordData, hasComparison, keywordStats = null) {
   const canvas = document.getElementById('positionDistChart');
   if (!canvas) return;
 
@@ -256,30 +259,41 @@ function renderPositionDistribution(keywordData, hasComparison) {
   let totalP1 = 0;
   let totalP2 = 0;
 
-  (keywordData || []).forEach(kw => {
-    const pos1 = kw.position_m1;
-    const pos2 = kw.position_m2;
-
-    if (pos1 !== null && pos1 !== undefined && Number.isFinite(pos1)) {
-      totalP1++;
-      for (let i = 0; i < buckets.length; i++) {
-        if (pos1 >= buckets[i].min && pos1 <= buckets[i].max) {
-          countsP1[i]++;
-          break;
+  // keywordStats uses the same buckets (top3 / top10 / top20 / top20plus)
+  const statsKeys = ['top3', 'top10', 'top20', 'top20plus'];
+  if (keywordStats && statsKeys.every(key => keywordStats[key])) {
+    statsKeys.forEach((key, i) => {
+      countsP1[i] = Number(keywordStats[key].current) || 0;
+      countsP2[i] = hasComparison ? (Number(keywordStats[key].previous) || 0) : 0;
+    });
+    totalP1 = countsP1.reduce((sum, n) => sum + n, 0);
+    totalP2 = countsP2.reduce((sum, n) => sum + n, 0);
+  } else {
+    (keywordData || []).forEach(kw => {
+      const pos1 = kw.position_m1;
+      const pos2 = kw.position_m2;
+
+      if (pos1 !== null && pos1 !== undefined && Number.isFinite(pos1)) {
+        totalP1++;
+        for (let i = 0; i < buckets.length; i++) {
+          if (pos1 >= buckets[i].min && pos1 <= buckets[i].max) {
+            countsP1[i]++;
+            break;
+          }
         }
       }
-    }
 
-    if (hasComparison && pos2 !== null && pos2 !== undefined && Number.isFinite(pos2)) {
-      totalP2++;
-      for (let i = 0; i < buckets.length; i++) {
-        if (pos2 >= buckets[i].min && pos2 <= buckets[i].max) {
-          countsP2[i]++;
-          break;
+      if (hasComparison && pos2 !== null && pos2 !== undefined && Number.isFinite(pos2)) {
+        totalP2++;
+        for (let i = 0; i < buckets.length; i++) {
+          if (pos2 >= buckets[i].min && pos2 <= buckets[i].max) {
+            countsP2[i]++;
+            break;
+          }
         }
       }
-    }
-  });
+    });
+  }
 
   // Append "Total" bucket
   countsP1.push(totalP1);
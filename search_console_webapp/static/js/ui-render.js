@@ -105,15 +105,39 @@ const KEYWORD_MODAL_META = {
   }
 };
 
+// ✅ NUEVO: Con paginado en servidor cada modal pide su grupo a /api/analysis
+// (`group`), con el mismo orden que la clasificación en cliente
+const KEYWORD_MODAL_SERVER_PARAMS = {
+  top3: { group: 'top3' },
+  top10: { group: 'top10' },
+  top20: { group: 'top20' },
+  top20plus: { group: 'top20plus' },
+  improved: { group: 'improved', sort: 'delta_position', order: 'asc' },
+  worsened: { group: 'worsened', sort: 'delta_position', order: 'desc' },
+  same: { group: 'same' },
+  new: { group: 'new' },
+  lost: { group: 'lost', sort: 'clicks_m2', order: 'desc' }
+};
+
 function createInitialKeywordModalState() {
   return Object.fromEntries(
     Object.keys(KEYWORD_MODAL_META).map((key) => ([
       key,
-      { keywords: [], gridTable: null, analysisType: 'single', isLoading: false }
+      { keywords: [], gridTable: null, analysisType: 'single', isLoading: false, server: null }
     ]))
   );
 }
 
+// Número de keywords de cada modal según keywordStats (mismos buckets que el servidor)
+function keywordModalTotal(modalKey, keywordStats) {
+  if (!keywordStats) return 0;
+  const bucket = keywordStats[modalKey];
+  if (bucket && typeof bucket === 'object' && bucket.current !== undefined) {
+    return Number(bucket.current) || 0;
+  }
+  return Number(keywordStats.overall && keywordStats.overall[modalKey]) || 0;
+}
+
 // ✅ REMOVIDO: Funciones de formateo - ahora se usan las del módulo centralizado number-utils.js
 
 // ✅ NUEVA función para determinar el tipo de análisis para URLs
@@ -1032,7 +1056,7 @@ function ensureTableStructure() {
 }
 
 // ✅ MIGRADO A GRID.JS: renderTable para manejar comparación de URLs
-export async function renderTable(pages) {
+export async function renderTable(pages, paging = null) {
   console.log('🚀 Renderizando tabla de URLs con Grid.js...', { 
     pagesCount: pages?.length, 
     pagesType: typeof pages, 
@@ -1102,8 +1126,13 @@ export async function renderTable(pages) {
       rowsCount: urlsData.length
     });
     
+    // ✅ NUEVO: Con paginado en servidor `pages` es solo la primera página
+    const serverSource = paging && paging.tables && paging.tables.pages
+      ? { total: paging.tables.pages.total, firstPage: pages, prepareRows: processUrlsData }
+      : null;
+
     // Crear Grid.js table
-    urlsGridTable = createUrlsGridTable(urlsData, analysisType, elems.resultsSection);
+    urlsGridTable = createUrlsGridTable(urlsData, analysisType, elems.resultsSection, serverSource);
     
     if (urlsGridTable) {
       console.log('✅ Tabla Grid.js creada exitosamente');
@@ -1285,7 +1314,8 @@ function openKeywordModal(modalKey, label = '') {
   const fallbackLabel = KEYWORD_MODAL_META[modalKey]?.title || modalKey;
   const modalLabel = label || fallbackLabel;
   
-  if (data.keywords.length === 0) {
+  const keywordCount = data.server ? data.server.total : data.keywords.length;
+  if (keywordCount === 0) {
     console.log('⚠️  No keywords in this selected keyword group');
     return;
   }
@@ -1308,11 +1338,11 @@ function openKeywordModal(modalKey, label = '') {
   }
   
   // Verificar que la Grid.js tabla está lista
-  if (!data.gridTable && !data.isLoading && data.keywords.length > 0) {
+  if (!data.gridTable && !data.isLoading) {
     console.log('🔄 Grid.js table not ready, creating...');
     data.isLoading = true;
     // No usar await aquí para mantener la apertura instantánea del modal
-    createGridTableForRange(modalKey, data.keywords, data.analysisType).catch(error => {
+    createGridTableForRange(modalKey, data.keywords, data.analysisType, data.server).catch(error => {
       console.error(`❌ Error creating Grid.js table for ${modalKey}:`, error);
     }).finally(() => {
       data.isLoading = false;
@@ -1328,7 +1358,7 @@ function openKeywordModal(modalKey, label = '') {
   modal.classList.add('modal-open');
   document.body.style.overflow = 'hidden';
   
-  console.log(`✅ Modal opened instantly for: ${modalLabel} (${data.keywords.length} keywords)`);
+  console.log(`✅ Modal opened instantly for: ${modalLabel} (${keywordCount} keywords)`);
 }
 
 // ✅ NUEVO: Función para crear todos los contenedores de modales
@@ -1376,7 +1406,7 @@ function createAllModalContainers() {
 }
 
 // ✅ MIGRADO A GRID.JS: Función para crear Grid.js table para un rango específico
-async function createGridTableForRange(range, keywords, analysisType) {
+async function createGridTableForRange(range, keywords, analysisType, serverSource = null) {
   // Destruir Grid.js anterior si existe
   if (preProcessedModalData[range].gridTable && preProcessedModalData[range].gridTable.destroy) {
     try {
@@ -1396,10 +1426,11 @@ async function createGridTableForRange(range, keywords, analysisType) {
     return;
   }
 
-  console.log(`🔄 Creating Grid.js table for ${range} with ${keywords.length} keywords...`);
+  const keywordCount = serverSource ? serverSource.total : keywords.length;
+  console.log(`🔄 Creating Grid.js table for ${range} with ${keywordCount} keywords...`);
   const startTime = performance.now();
   
-  if (keywords.length === 0) {
+  if (keywordCount === 0) {
     container.innerHTML = `
       <div class="no-aio-message">
         <i class="fas fa-search"></i>
@@ -1419,7 +1450,7 @@ async function createGridTableForRange(range, keywords, analysisType) {
     
     // Importar dinámicamente para evitar dependencias circulares
     const { createKeywordsGridTable } = await import('./ui-keywords-gridjs.js');
-    preProcessedModalData[range].gridTable = createKeywordsGridTable(keywords, analysisType, container);
+    preProcessedModalData[range].gridTable = createKeywordsGridTable(keywords, analysisType, container, serverSource);
     
     if (preProcessedModalData[range].gridTable) {
       const endTime = performance.now();
@@ -1499,11 +1530,12 @@ function sortByPositionLossDesc(a, b) {
 }
 
 // ✅ NUEVO: Función para pre-procesar datos por rangos de posición y estado
-function preprocessKeywordDataByRanges(keywordData) {
+function preprocessKeywordDataByRanges(keywordData, paging = null, keywordStats = null) {
   Object.keys(KEYWORD_MODAL_META).forEach((modalKey) => {
     if (!preProcessedModalData[modalKey]) {
-      preProcessedModalData[modalKey] = { keywords: [], gridTable: null, analysisType: 'single', isLoading: false };
+      preProcessedModalData[modalKey] = { keywords: [], gridTable: null, analysisType: 'single', isLoading: false, server: null };
     }
+    preProcessedModalData[modalKey].server = null;
   });
 
   if (!keywordData || keywordData.length === 0) {
@@ -1523,12 +1555,36 @@ function preprocessKeywordDataByRanges(keywordData) {
     return;
   }
 
-  console.log('🔄 Pre-procesando keywords por rangos y tendencias...');
-  const startTime = performance.now();
-
   // Determinar tipo de análisis una vez
   const analysisType = getAnalysisTypeModal(keywordData);
 
+  // ✅ NUEVO: Con paginado en servidor solo se tiene la primera página; cada
+  // modal pedirá su grupo al abrirse
+  if (paging) {
+    Object.keys(KEYWORD_MODAL_META).forEach((modalKey) => {
+      const modalData = preProcessedModalData[modalKey];
+      if (modalData.gridTable && modalData.gridTable.destroy) {
+        try {
+          modalData.gridTable.destroy();
+        } catch (e) {
+          console.warn(`⚠️ Error al limpiar Grid.js anterior para ${modalKey}:`, e);
+        }
+      }
+      modalData.gridTable = null;
+      modalData.keywords = [];
+      modalData.analysisType = analysisType;
+      modalData.isLoading = false;
+      modalData.server = {
+        params: KEYWORD_MODAL_SERVER_PARAMS[modalKey],
+        total: keywordModalTotal(modalKey, keywordStats)
+      };
+    });
+    return;
+  }
+
+  console.log('🔄 Pre-procesando keywords por rangos y tendencias...');
+  const startTime = performance.now();
+
   // Clasificar keywords por rangos
   const groupedRows = {
     top3: keywordData
@@ -1623,12 +1679,12 @@ function preprocessKeywordDataByRanges(keywordData) {
 }
 
 // ✅ NUEVO: Función para actualizar los datos globales de keywords
-export function updateGlobalKeywordData(keywordData) {
+export function updateGlobalKeywordData(keywordData, paging = null, keywordStats = null) {
   globalKeywordData = keywordData || [];
   console.log('📊 Datos globales de keywords actualizados:', globalKeywordData.length);
   
   // Pre-procesar inmediatamente
-  preprocessKeywordDataByRanges(keywordData);
+  preprocessKeywordDataByRanges(keywordData, paging, keywordStats);
 }
 
 // ✅ NUEVO: Función auxiliar para escapar HTML
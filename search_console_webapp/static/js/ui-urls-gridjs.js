@@ -1,15 +1,35 @@
 // static/js/ui-urls-gridjs.js - Tabla Grid.js para URLs del panel principal
 
 import { formatInteger, formatPercentage, formatPercentageChange, formatPosition, formatPositionDelta, formatAbsoluteDelta, calculateAbsoluteDelta, parsePositionValue, parseIntegerValue, parseNumericValue } from './number-utils.js';
+import { buildServerGridConfig } from './analysis-rows.js';
+
+// Orden en servidor por columna: [campo de /api/analysis, descendente al primer clic]
+const URL_SERVER_SORT_FIELDS = {
+    url: ['url', false],
+    clicks_p1: ['clicks_p1', true],
+    clicks_p2: ['clicks_p2', true],
+    delta_clicks: ['delta_clicks', true],
+    impressions_p1: ['impressions_p1', true],
+    impressions_p2: ['impressions_p2', true],
+    delta_impressions: ['delta_impressions', true],
+    ctr_p1: ['ctr_p1', true],
+    ctr_p2: ['ctr_p2', true],
+    delta_ctr: ['delta_ctr', true],
+    position_p1: ['position_p1', false],
+    position_p2: ['position_p2', false],
+    delta_position: ['delta_position', false]
+};
 
 /**
  * Crea y renderiza la tabla Grid.js de URLs
  * @param {Array} urlsData - Datos de URLs procesados
  * @param {string} analysisType - Tipo de análisis ('single' o 'comparison')
  * @param {HTMLElement} container - Contenedor donde renderizar la tabla
+ * @param {Object|null} serverSource - Tabla paginada en servidor: { total, firstPage, prepareRows }.
+ *   firstPage son las filas crudas (URL + Metrics) y prepareRows las convierte al formato de urlsData
  * @returns {Object|null} Instancia de Grid.js o null si hay error
  */
-export function createUrlsGridTable(urlsData, analysisType = 'comparison', container) {
+export function createUrlsGridTable(urlsData, analysisType = 'comparison', container, serverSource = null) {
     console.log('🏗️ Creating URLs Grid.js table with:', {
         urls: urlsData?.length || 0,
         analysisType: analysisType
@@ -44,20 +64,37 @@ export function createUrlsGridTable(urlsData, analysisType = 'comparison', conta
     container.innerHTML = '';
     container.appendChild(tableContainer);
 
-    // Pre-sort data by Clicks P1 (index 2) descending — most reliable default sort
-    data.sort((a, b) => parseIntegerValue(b[2]) - parseIntegerValue(a[2]));
+    let gridSource;
+    if (serverSource) {
+        // Orden, búsqueda y páginas los resuelve /api/analysis/<id>/pages
+        gridSource = buildServerGridConfig({
+            table: 'pages',
+            firstPage: serverSource.firstPage,
+            total: serverSource.total,
+            mapRows: (rows) => processUrlsDataForGrid(serverSource.prepareRows(rows), analysisType).data,
+            sortFields: columns.map((column) => URL_SERVER_SORT_FIELDS[column.id] || null),
+            search: true
+        });
+        gridSource.search.placeholder = 'Type an URL...';
+    } else {
+        // Pre-sort data by Clicks P1 (index 2) descending — most reliable default sort
+        data.sort((a, b) => parseIntegerValue(b[2]) - parseIntegerValue(a[2]));
+        gridSource = {
+            data: data,
+            pagination: {
+                limit: 10
+            },
+            sort: true, // ✅ CAMBIADO: Simplificar para evitar conflictos
+            search: {
+                placeholder: 'Type an URL...'
+            }
+        };
+    }
 
     // Crear instancia de Grid.js
     const grid = new gridjs.Grid({
         columns: columns,
-        data: data,
-        pagination: {
-            limit: 10
-        },
-        sort: true, // ✅ CAMBIADO: Simplificar para evitar conflictos
-        search: {
-            placeholder: 'Type an URL...'
-        },
+        ...gridSource,
         language: {
             search: {
                 placeholder: 'Type an URL...'
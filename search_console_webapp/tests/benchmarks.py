@@ -0,0 +1,203 @@
+"""
+Benchmarks de rendimiento: implementación anterior vs actual.
+
+No forman parte de la suite (pytest solo recoge test_*.py): los tiempos de
+reloj dependen de la máquina y de la carga, así que la suite solo comprueba la
+equivalencia de resultados y las tablas de tiempos se sacan a mano con este
+script. Las implementaciones de referencia y los datos sintéticos viven en los
+tests de equivalencia de cada módulo y se reutilizan aquí.
+
+Ejecutar (desde search_console_webapp/):
+    python3 -m tests.benchmarks                  # todos
+    python3 -m tests.benchmarks gsc_aggregation  # solo los indicados
+"""
+
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def best_of(fn, *args, repeat=3):
+    """Mejor tiempo (s) de `repeat` ejecuciones de `fn(*args)`."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def compare(old, new, *args, repeat=3):
+    """`(anterior, actual)` en segundos para los mismos argumentos."""
+    return best_of(old, *args, repeat=repeat), best_of(new, *args, repeat=repeat)
+
+
+def print_table(title, size_label, rows, unit=None):
+    """Tabla `tamaño | anterior | actual | mejora` (+ por unidad si se indica)."""
+    print(f"\n{title}")
+    header = f"{size_label:>24} | {'anterior':>9} | {'actual':>9} | {'mejora':>6}"
+    if unit:
+        header += f" | {'µs/' + unit + ' ant.':>11} | {'µs/' + unit + ' act.':>11}"
+    print(header)
+    for size, n, old, new in rows:
+        line = f"{size:>24} | {old:>8.3f}s | {new:>8.3f}s | x{old / new:>5.1f}"
+        if unit:
+            line += f" | {old / n * 1e6:>11.0f} | {new / n * 1e6:>11.0f}"
+        print(line)
+
+
+def load_previous_module(module_name, path, introduced_by):
+    """
+    Carga la versión de `path` anterior al primer commit cuyo diff contiene
+    `introduced_by` (git log -S) como módulo `module_name`. Sirve para medir la
+    implementación real de antes cuando no cabe reproducirla en un test.
+    Devuelve None si no hay git o no se encuentra el commit.
+    """
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=APP_DIR, capture_output=True, text=True, check=True).stdout
+
+    try:
+        commits = git('log', '--format=%H', '--reverse', '-S', introduced_by, '--', path).split()
+        if not commits:
+            return None
+        source = git('show', f'{commits[0]}^:./{path}')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    spec = importlib.util.spec_from_loader(module_name, loader=None)
+    module = importlib.util.module_from_spec(spec)
+    module.__package__ = module_name.rpartition('.')[0]
+    exec(compile(source, f'{path}@{commits[0][:7]}^', 'exec'), module.__dict__)
+    return module
+
+
+@contextmanager
+def production_logging():
+    """Logging como en app.py (INFO con formato) pero a /dev/null: cuenta el coste de formatear."""
+    root = logging.getLogger()
+    previous_level = root.level
+    with open(os.devnull, 'w') as devnull:
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        try:
+            yield
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(previous_level)
+
+
+# ================================
+# Agregación columnar de /get-data (services/gsc_aggregation.py)
+# ================================
+
+def bench_gsc_aggregation(sizes=(25000, 100000)):
+    from services import gsc_aggregation as agg
+    from tests import test_gsc_aggregation_performance as ref
+
+    def legacy(cur_rows, cmp_rows):
+        cur, cmp = ref.legacy_keywords_property(cur_rows), ref.legacy_keywords_property(cmp_rows)
+        ref.legacy_keyword_stats(cur, cmp)
+        ref.legacy_keyword_comparison(cur, cmp)
+
+    def columnar(cur_rows, cmp_rows):
+        cur = agg.aggregate_keywords(cur_rows, by_page=False)
+        cmp = agg.aggregate_keywords(cmp_rows, by_page=False)
+        agg.keyword_stats(cur, cmp)
+        agg.keyword_comparison(cur, cmp)
+
+    rows = []
+    for n in sizes:
+        cur_rows, cmp_rows = ref._synthetic_rows(n, seed=10), ref._synthetic_rows(n, seed=11)
+        rows.append((f'{n} filas', n, *compare(legacy, columnar, cur_rows, cmp_rows)))
+    print_table('Keywords de /get-data: dicts fila a fila vs columnar', 'tamaño', rows)
+
+
+# ================================
+# Detección de marca en AI Overview (services/ai_analysis.py)
+# ================================
+
+def bench_brand_matcher(sizes=(200, 1000)):
+    """
+    La versión anterior reconstruía dominio, variaciones y regex en cada keyword
+    y emitía decenas de líneas INFO por SERP; se carga tal cual desde git y las
+    dos versiones corren con el logging de producción.
+    """
+    from services.ai_analysis import detect_ai_overview_elements, get_brand_matcher
+    from tests import test_ai_analysis_performance as ref
+
+    previous = load_previous_module('services._ai_analysis_previous', 'services/ai_analysis.py',
+                                    'class BrandMatcher')
+    if previous is None:
+        print('\nDetección de marca: no se encontró la versión anterior en git; se omite')
+        return
+    site_url = ref.SITES[0]
+
+    def before(batch):
+        for serp in batch:
+            previous.detect_ai_overview_elements(serp, site_url)
+
+    def after(batch):
+        matcher = get_brand_matcher(site_url)
+        for serp in batch:
+            detect_ai_overview_elements(serp, site_url, brand_matcher=matcher)
+
+    serps = list(ref.FIXTURES.values())
+    rows = []
+    with production_logging():
+        for n in sizes:
+            batch = [serps[i % len(serps)] for i in range(n)]
+            rows.append((f'{n} keywords', n, *compare(before, after, batch)))
+    print_table('Detección de marca en AI Overview: versión anterior vs matcher compartido',
+                'tamaño', rows, unit='kw')
+
+
+# ================================
+# Clasificador de Topic Clusters (services/cluster_classifier.py)
+# ================================
+
+def bench_cluster_classifier(sizes=((1000, 50), (10000, 200), (10000, 1000))):
+    from services.cluster_classifier import ClusterClassifier
+    from tests import test_cluster_classifier_performance as ref
+
+    def legacy(keywords, config):
+        for keyword in keywords:
+            ref.legacy_classify_keyword(keyword, config)
+
+    def compiled(keywords, config):
+        ClusterClassifier(config).classify_many(keywords)
+
+    rows = []
+    for n_keywords, n_terms in sizes:
+        keywords = ref._synthetic_keywords(n_keywords, seed=10)
+        config = ref._synthetic_config(n_terms, seed=11)
+        rows.append((f'{n_keywords} kw × {n_terms} términos', n_keywords,
+                     *compare(legacy, compiled, keywords, config)))
+    print_table('Topic Clusters: bucle cluster × término vs clasificador compilado', 'tamaño', rows)
+
+
+BENCHMARKS = {
+    'gsc_aggregation': bench_gsc_aggregation,
+    'brand_matcher': bench_brand_matcher,
+    'cluster_classifier': bench_cluster_classifier,
+}
+
+
+def main(names):
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print(f"Benchmarks desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(BENCHMARKS)}")
+        return 2
+    for name in names or BENCHMARKS:
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""
+Tests de equivalencia del detector de marca precompilado de
+`detect_ai_overview_elements` (services/ai_analysis.py).
+
+`BrandMatcher.check` debe devolver lo mismo que `check_brand_mention` sobre
+los textos de las SERPs de tests/fixtures/serp_ai_overview. La comparación de tiempos con la versión
+anterior (incluido su logging INFO por SERP) está en tests/benchmarks.py.
+
+Ejecutar:
+    python3 -m pytest tests/test_ai_analysis_performance.py -q
+    python3 -m tests.benchmarks brand_matcher      # tabla de tiempos
+"""
+
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.ai_analysis import (
+    BrandMatcher,
+    check_brand_mention,
+    detect_ai_overview_elements,
+    get_brand_matcher,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'serp_ai_overview')
+SITES = ['sc-domain:runnea.com', 'https://www.corredores.es/', 'sc-domain:tienda-running.com']
+
+
+def _load_fixtures():
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return fixtures
+
+
+FIXTURES = _load_fixtures()
+
+
+def _snippets(serp):
+    aio = serp.get('ai_overview', {})
+    for block in aio.get('text_blocks', []):
+        yield block.get('snippet', '')
+        for item in block.get('list', []):
+            yield item.get('snippet', '')
+    for ref in aio.get('references', []):
+        yield ref.get('title', '')
+        yield ref.get('source', '')
+
+
+# ================================
+# Equivalencia
+# ================================
+
+@pytest.mark.parametrize('site_url', SITES)
+def test_matcher_check_matches_check_brand_mention(site_url):
+    matcher = BrandMatcher(site_url)
+    texts = [s for serp in FIXTURES.values() for s in _snippets(serp)]
+    texts += ['', 'RUNNEA', 'runnearunnea', 'Tienda Running', 'tiendarunning', 'Córredores', 'www.runnea.com']
+
+    for text in texts:
+        assert matcher.check(text) == check_brand_mention(
+            text, matcher.normalized_site_url, matcher.brand_variations)
+
+
+def test_fixture_detection_results():
+    site = 'sc-domain:runnea.com'
+    results = {name: detect_ai_overview_elements(serp, site) for name, serp in FIXTURES.items()}
+
+    assert not results['no_ai_overview']['has_ai_overview']
+    assert results['not_mentioned']['has_ai_overview'] and not results['not_mentioned']['domain_is_ai_source']
+    assert results['references_domain']['domain_ai_source_position'] == 3
+    assert results['text_mention_only']['domain_is_ai_source']
+    assert get_brand_matcher(site) is get_brand_matcher(site)
+
@@ -0,0 +1,153 @@
+"""
+Tests de la caché de dos niveles de AI Overview (`AIOverviewCache`).
+
+- Los payloads grandes se guardan en Redis comprimidos con zlib y las entradas
+  antiguas en JSON plano se siguen leyendo.
+- Una lectura repetida se sirve del LRU local sin tocar Redis, y mutar el
+  resultado no contamina la caché.
+- `prefetch` trae toda la lista con un solo MGET.
+- El LRU respeta su límite de entradas y la invalidación por sitio alcanza
+  a los dos niveles.
+
+Usa un Redis simulado en memoria.
+
+Ejecutar:  python3 -m pytest tests/test_ai_cache_tiers.py -q
+"""
+
+import fnmatch
+import json
+import zlib
+
+import pytest
+
+from services import ai_cache as cache_mod
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def setex(self, key, ttl, value):
+        self.ops.append((key, ttl, value))
+
+    def execute(self):
+        for op in self.ops:
+            self.redis.setex(*op)
+
+
+class _FakeRedis:
+    """Redis binario (decode_responses=False) mínimo."""
+
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+        self.calls = {'get': 0, 'mget': 0}
+
+    def get(self, key):
+        self.calls['get'] += 1
+        return self.store.get(key)
+
+    def mget(self, keys):
+        self.calls['mget'] += 1
+        return [self.store.get(k) for k in keys]
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value if isinstance(value, bytes) else value.encode('utf-8')
+        self.ttls[key] = ttl
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def scan_iter(self, match='*', count=None):
+        return [k for k in list(self.store) if fnmatch.fnmatch(k, match)]
+
+    def delete(self, *keys):
+        return sum(1 for k in keys if self.store.pop(k, None) is not None)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setenv('AI_CACHE_LOCAL_MAX_ENTRIES', '3')
+    monkeypatch.setenv('AI_CACHE_COMPRESS_MIN_BYTES', '512')
+    monkeypatch.setattr(cache_mod, 'create_redis_client', lambda decode_responses=True: _FakeRedis())
+    return cache_mod.AIOverviewCache()
+
+
+def _analysis(keyword, has_aio=True):
+    return {
+        'keyword': keyword,
+        'ai_analysis': {'has_ai_overview': has_aio},
+        'serp_data': {'organic_results': [{'title': f'{keyword} {i}', 'snippet': 'x' * 200} for i in range(20)]},
+    }
+
+
+def test_large_payload_is_compressed_and_round_trips(cache):
+    cache.cache_analysis('zapatillas', 'https://example.com', 'esp', _analysis('zapatillas'))
+    key = cache._generate_cache_key('zapatillas', 'https://example.com', 'esp')
+
+    stored = cache.redis_client.store[key]
+    assert stored[:1] != b'{'
+    assert json.loads(zlib.decompress(stored))['keyword'] == 'zapatillas'
+    assert cache.redis_client.ttls[key] == 24 * 3600
+
+    cache.local.clear()
+    cached = cache.get_cached_analysis('zapatillas', 'https://example.com', 'esp')
+    assert cached['analysis'] == _analysis('zapatillas')
+    assert cache.get_tier_stats()['redis']['compression_ratio'] < 0.5
+
+
+def test_legacy_plain_json_entries_are_still_read(cache):
+    key = cache._generate_cache_key('legacy', 'https://example.com', 'esp')
+    cache.redis_client.store[key] = json.dumps({'analysis': {'keyword': 'legacy'}, 'site_url': 'https://example.com'}).encode()
+
+    assert cache.get_cached_analysis('legacy', 'https://example.com', 'esp')['analysis'] == {'keyword': 'legacy'}
+
+
+def test_repeated_reads_hit_local_tier_and_copies_are_independent(cache):
+    cache.cache_analysis('kw', 'https://example.com', 'esp', _analysis('kw'))
+    redis = cache.redis_client
+
+    first = cache.get_cached_analysis('kw', 'https://example.com', 'esp')
+    first['analysis']['ai_analysis'] = {'mutated': True}
+    second = cache.get_cached_analysis('kw', 'https://example.com', 'esp')
+
+    assert redis.calls['get'] == 0
+    assert second['analysis']['ai_analysis'] == {'has_ai_overview': True}
+    stats = cache.get_tier_stats()
+    assert stats['local']['hits'] == 2 and stats['local']['hit_ratio'] == 1.0
+    assert stats['local']['avg_payload_bytes'] > 0
+
+
+def test_prefetch_uses_a_single_mget_and_warms_local(cache):
+    for kw in ('a', 'b'):
+        cache.cache_analysis(kw, 'https://example.com', 'esp', _analysis(kw, has_aio=False))
+    cache.local.clear()
+    redis = cache.redis_client
+
+    available = cache.prefetch([(kw, 'https://example.com', 'esp') for kw in ('a', 'b', 'c')])
+
+    assert available == 2 and redis.calls['mget'] == 1
+    assert cache.get_cached_analysis('a', 'https://example.com', 'esp')['analysis']['keyword'] == 'a'
+    assert cache.get_cached_analysis('b', 'https://example.com', 'esp') is not None
+    assert redis.calls['get'] == 0
+    stats = cache.get_tier_stats()
+    assert stats['redis']['hits'] == 2 and stats['redis']['misses'] == 1
+
+
+def test_local_tier_is_bounded(cache):
+    for kw in ('a', 'b', 'c', 'd'):
+        cache.cache_analysis(kw, 'https://example.com', 'esp', _analysis(kw))
+
+    assert cache.local.usage()['entries'] == 3
+    assert cache.local.get(cache._generate_cache_key('a', 'https://example.com', 'esp')) is None
+
+
+def test_invalidate_site_clears_both_tiers(cache):
+    cache.cache_analysis('a', 'https://example.com', 'esp', _analysis('a'))
+    cache.cache_analysis('b', 'https://other.com', 'esp', _analysis('b'))
+
+    assert cache.invalidate_site_cache('https://EXAMPLE.com') == 1
+
+    assert cache.get_cached_analysis('a', 'https://example.com', 'esp') is None
+    assert cache.get_cached_analysis('b', 'https://other.com', 'esp') is not None
@@ -0,0 +1,183 @@
+"""
+Tests de los resultados de /get-data guardados en servidor
+(services/analysis_results.py): recorte a la primera página con totales y
+top movers, orden por métricas y deltas, filtros del panel de keywords
+(búsqueda, Keyword Filter, presets y grupos de posición), tabla de URLs con
+P1 = período más reciente y aislamiento por usuario. Sin Redis.
+
+Ejecutar:  python3 -m pytest tests/test_analysis_results.py -q
+"""
+
+import pytest
+
+from services import analysis_results as ar
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(ar, '_redis_checked', True)
+    monkeypatch.setattr(ar, '_redis', None)
+
+
+def _keyword(keyword, clicks_m1=0, clicks_m2=0, position_m1=None, position_m2=None, **extra):
+    row = {
+        'keyword': keyword, 'url': 'https://example.com/a', 'top_urls': [], 'top_urls_count': 1,
+        'clicks_m1': clicks_m1, 'clicks_m2': clicks_m2, 'impressions_m1': 100, 'impressions_m2': 100,
+        'ctr_m1': 5.0, 'ctr_m2': 5.0, 'position_m1': position_m1, 'position_m2': position_m2,
+        'delta_clicks_percent': ((clicks_m1 / clicks_m2 - 1) * 100) if clicks_m2 else 'New',
+    }
+    row.update(extra)
+    return row
+
+
+def _page(url, clicks_p1, clicks_p2):
+    # Llegan con la comparación primero: P1 se decide por StartDate
+    return {'URL': url, 'Metrics': [
+        {'StartDate': '2026-01-01', 'Clicks': clicks_p2, 'Impressions': 10, 'CTR': 0.1, 'Position': 4},
+        {'StartDate': '2026-02-01', 'Clicks': clicks_p1, 'Impressions': 10, 'CTR': 0.1, 'Position': 3},
+    ]}
+
+
+def _payload():
+    keywords = [_keyword(f'kw {i}', clicks_m1=i, clicks_m2=5, position_m1=i + 1, position_m2=5) for i in range(10)]
+    pages = [_page(f'https://example.com/{i}', clicks_p1=i, clicks_p2=2) for i in range(5)]
+    return {'keyword_comparison_data': keywords, 'pages': pages, 'keywordStats': {'overall': {'total': 10}}}
+
+
+def test_paginate_response_keeps_first_page_totals_and_movers():
+    payload = ar.paginate_response(_payload(), user_id=1, page_size=3)
+
+    assert [r['keyword'] for r in payload['keyword_comparison_data']] == ['kw 9', 'kw 8', 'kw 7']
+    assert [r['URL'] for r in payload['pages']] == ['https://example.com/4', 'https://example.com/3', 'https://example.com/2']
+    assert payload['paging']['tables']['keywords']['total'] == 10
+    assert payload['paging']['tables']['pages']['total'] == 5
+    assert payload['keywordStats'] == {'overall': {'total': 10}}
+
+    keyword_movers = payload['movers']['keywords']
+    assert [r['keyword'] for r in keyword_movers['winners']] == ['kw 9', 'kw 8', 'kw 7', 'kw 6']
+    assert [r['keyword'] for r in keyword_movers['losers']][:2] == ['kw 0', 'kw 1']
+    page_movers = payload['movers']['pages']
+    assert [r['URL'] for r in page_movers['winners']] == ['https://example.com/4', 'https://example.com/3']
+    assert [r['URL'] for r in page_movers['losers']] == ['https://example.com/0', 'https://example.com/1']
+
+
+def test_query_rows_sorts_and_pages():
+    analysis_id = ar.save_result_set(1, _payload())
+
+    rows, total = ar.query_rows(analysis_id, 1, 'keywords', page=1, limit=4, sort='clicks_m1', order='asc')
+    assert total == 10
+    assert [r['clicks_m1'] for r in rows] == [4, 5, 6, 7]
+
+    # ΔClicks de la tabla: P1 - P2
+    rows, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=1, sort='delta_clicks', order='asc')
+    assert rows[0]['keyword'] == 'kw 0'
+
+    rows, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=2, sort='keyword', order='desc')
+    assert [r['keyword'] for r in rows] == ['kw 9', 'kw 8']
+
+    # Columnas internas o desconocidas → orden por defecto
+    rows, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=1, sort='_row')
+    assert rows[0]['keyword'] == 'kw 9'
+
+    rows, _ = ar.query_rows(analysis_id, 1, 'pages', sort='clicks_p2', order='desc', limit=1)
+    assert rows[0]['URL'] == 'https://example.com/0'
+    rows, total = ar.query_rows(analysis_id, 1, 'pages', search='EXAMPLE.COM/3')
+    assert total == 1 and rows[0]['URL'] == 'https://example.com/3'
+
+
+def test_nulls_sort_last_in_both_directions():
+    payload = {'keyword_comparison_data': [_keyword('a', position_m1=3), _keyword('b'), _keyword('c', position_m1=1)]}
+    analysis_id = ar.save_result_set(1, payload)
+
+    for order in ('asc', 'desc'):
+        rows, _ = ar.query_rows(analysis_id, 1, 'keywords', sort='position_m1', order=order)
+        assert rows[-1]['keyword'] == 'b'
+
+
+def test_keyword_search_url_search_and_keyword_filter():
+    rows = [
+        _keyword('buy shoes', url='https://shop.com/shoes'),
+        _keyword('shoes review', url='https://blog.com/review', top_urls=['https://shop.com/shoes']),
+        _keyword('boots', url='https://shop.com/boots'),
+    ]
+    analysis_id = ar.save_result_set(1, {'keyword_comparison_data': rows})
+
+    def keywords(**params):
+        found, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=50, sort='keyword', order='asc', **params)
+        return [r['keyword'] for r in found]
+
+    assert keywords(search='SHOES') == ['buy shoes', 'shoes review']
+    assert keywords(url_search='shop.com/shoes') == ['buy shoes', 'shoes review']
+    assert keywords(terms=['shoes'], method='contains') == ['buy shoes', 'shoes review']
+    assert keywords(terms=['Boots'], method='equals') == ['boots']
+    assert keywords(terms=['shoes'], method='notContains') == ['boots']
+    assert keywords(terms=['boots', 'buy shoes'], method='notEquals') == ['shoes review']
+    assert keywords(terms=['shoes'], method='unknown') == ['boots', 'buy shoes', 'shoes review']
+
+
+def test_keyword_presets():
+    rows = [
+        # Easy Wins: posición 8-15, muchas impresiones y CTR bajo el esperado
+        _keyword('easy win', position_m1=9, impressions_m1=500, ctr_m1=1.5),
+        _keyword('low ctr few impressions', position_m1=9, impressions_m1=10, ctr_m1=1.5),
+        _keyword('one two three four'),
+        # Clics caen con impresiones y posición estables o mejores
+        _keyword('ai affected', clicks_m1=50, clicks_m2=100, position_m1=3, position_m2=3),
+        _keyword('cannibal', top_urls=['https://example.com/a/', 'https://example.com/b?x=1']),
+        _keyword('decay', position_m1=12, position_m2=10),
+    ]
+    analysis_id = ar.save_result_set(1, {'keyword_comparison_data': rows})
+
+    def preset(name):
+        found, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=50, preset=name)
+        return {r['keyword'] for r in found}
+
+    assert preset('easyWins') == {'easy win'}
+    assert preset('longTail') == {'one two three four', 'low ctr few impressions'}
+    assert preset('aiSeasonalityAffected') == {'ai affected'}
+    assert preset('cannibalization') == {'cannibal'}
+    assert preset('decayRisk') == {'decay'}
+
+
+def test_position_groups_match_keyword_stats_buckets():
+    rows = [
+        _keyword('top3', position_m1=3, position_m2=3),
+        _keyword('top10', position_m1=3.5, position_m2=8),
+        _keyword('top20', position_m1=15, position_m2=12),
+        _keyword('plus', position_m1=25),
+        _keyword('lost', position_m2=7),
+    ]
+    analysis_id = ar.save_result_set(1, {'keyword_comparison_data': rows})
+
+    def group(name):
+        found, _ = ar.query_rows(analysis_id, 1, 'keywords', limit=50, group=name)
+        return [r['keyword'] for r in found]
+
+    assert group('top3') == ['top3']
+    assert group('top10') == ['top10']
+    assert group('top20') == ['top20']
+    assert group('top20plus') == ['plus']
+    assert group('improved') == ['top10']
+    assert group('worsened') == ['top20']
+    assert group('same') == ['top3']
+    assert group('new') == ['plus']
+    assert group('lost') == ['lost']
+
+
+def test_results_are_private_and_tables_validated():
+    analysis_id = ar.save_result_set(1, _payload())
+    assert ar.query_rows(analysis_id, 2, 'keywords') is None
+    assert ar.query_rows(analysis_id, 1, 'unknown') is None
+    assert ar.query_rows('missing', 1, 'keywords') is None
+    assert ar.load_result_set(analysis_id, 2) is None
+
+    full = ar.load_result_set(analysis_id, 1)
+    assert len(full['keyword_comparison_data']) == 10 and len(full['pages']) == 5
+
+
+def test_empty_tables():
+    payload = ar.paginate_response({'keyword_comparison_data': [], 'pages': []}, user_id=1)
+    assert payload['pages'] == [] and payload['keyword_comparison_data'] == []
+    assert payload['paging']['tables']['keywords']['total'] == 0
+    assert payload['movers']['keywords'] == {'winners': [], 'losers': []}
+    assert ar.query_rows(payload['paging']['analysis_id'], 1, 'keywords', preset='easyWins') == ([], 0)
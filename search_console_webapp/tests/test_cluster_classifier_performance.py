@@ -0,0 +1,176 @@
+"""
+Tests de equivalencia del clasificador compilado de Topic Clusters
+(services/cluster_classifier.py).
+
+La implementación anterior (bucle cluster × término por keyword) se reproduce
+aquí como referencia: los tests comprueban que el clasificador compilado
+devuelve los mismos clusters. La comparación de tiempos (10k keywords y 200+
+términos) está en tests/benchmarks.py, fuera de la suite.
+
+Ejecutar:
+    python3 -m pytest tests/test_cluster_classifier_performance.py -q
+    python3 -m tests.benchmarks cluster_classifier      # tabla de tiempos
+"""
+
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import cluster_classifier
+from services.cluster_classifier import ClusterClassifier, get_cluster_classifier
+
+
+# ================================
+# Implementación anterior (referencia)
+# ================================
+
+def legacy_classify_keyword(keyword, clusters_config):
+    """Copia de ClusterService.classify_keyword (Manual AI / AI Mode)."""
+    if not clusters_config.get('enabled', False) or not keyword:
+        return []
+    keyword_lower = keyword.lower().strip()
+    matching_clusters = []
+    for cluster in clusters_config.get('clusters', []):
+        cluster_name = cluster.get('name', '')
+        terms = cluster.get('terms', [])
+        match_method = cluster.get('match_method', 'contains')
+        if not cluster_name or not terms:
+            continue
+        for term in terms:
+            if not term:
+                continue
+            term_lower = term.lower().strip()
+            if match_method == 'contains':
+                matches = term_lower in keyword_lower
+            elif match_method == 'exact':
+                matches = keyword_lower == term_lower
+            elif match_method == 'starts_with':
+                matches = keyword_lower.startswith(term_lower)
+            elif match_method == 'regex':
+                try:
+                    matches = bool(re.search(term_lower, keyword_lower, re.IGNORECASE))
+                except re.error:
+                    continue
+            else:
+                matches = False
+            if matches:
+                if cluster_name not in matching_clusters:
+                    matching_clusters.append(cluster_name)
+                break
+    return matching_clusters
+
+
+def legacy_classify_keyword_into_clusters(keyword_text, clusters_config):
+    """Copia de app.classify_keyword_into_clusters (método a nivel de config)."""
+    if not keyword_text or not clusters_config or not clusters_config.get('enabled'):
+        return []
+    cluster_method = clusters_config.get('method', 'contains')
+    keyword_lower = keyword_text.lower()
+    matching_clusters = []
+    for cluster in clusters_config.get('clusters', []):
+        cluster_name = cluster.get('name', '')
+        for term in cluster.get('terms', []):
+            term_lower = term.lower()
+            matches = False
+            if cluster_method == 'contains':
+                matches = term_lower in keyword_lower
+            elif cluster_method == 'equals':
+                matches = keyword_lower == term_lower
+            elif cluster_method == 'notContains':
+                matches = term_lower not in keyword_lower
+            elif cluster_method == 'notEquals':
+                matches = keyword_lower != term_lower
+            if matches:
+                if cluster_name not in matching_clusters:
+                    matching_clusters.append(cluster_name)
+                break
+    return matching_clusters
+
+
+# ================================
+# Datos sintéticos
+# ================================
+
+WORDS = ['seo', 'tools', 'precio', 'comprar', 'zapatillas', 'running', 'mujer', 'hombre', 'barato',
+         'online', 'madrid', 'mejor', 'curso', 'gratis', 'opiniones', 'review', 'nike', 'adidas',
+         'trail', 'ofertas', 'envío', 'tienda', 'talla', 'negro', 'blanco', 'marketing']
+
+
+def _synthetic_config(n_terms, seed, methods=('contains', 'exact', 'starts_with', 'regex')):
+    rng = random.Random(seed)
+    clusters = []
+    per_cluster = 10
+    for c in range(max(1, n_terms // per_cluster)):
+        method = methods[c % len(methods)]
+        terms = []
+        for _ in range(per_cluster):
+            term = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+            if method == 'regex':
+                term = rf"\b{term.split()[0]}\b"
+            elif rng.random() < 0.2:
+                term = f"  {term.upper()} "
+            terms.append(term)
+        clusters.append({'name': f'cluster {c % (n_terms // per_cluster - 1 or 1)}',
+                         'terms': terms, 'match_method': method})
+    return {'enabled': True, 'clusters': clusters}
+
+
+def _synthetic_keywords(n, seed):
+    rng = random.Random(seed)
+    return [' '.join(rng.sample(WORDS, rng.randint(1, 5))) + (' ' if rng.random() < 0.1 else '')
+            for _ in range(n)]
+
+
+# ================================
+# Equivalencia
+# ================================
+
+def test_matches_legacy_per_cluster_methods():
+    config = _synthetic_config(200, seed=1)
+    classifier = ClusterClassifier(config)
+    for keyword in _synthetic_keywords(2000, seed=2) + ['', '   ', 'seo', 'SEO TOOLS']:
+        assert classifier.classify(keyword) == legacy_classify_keyword(keyword, config), keyword
+
+
+@pytest.mark.parametrize('method', ['contains', 'equals', 'notContains', 'notEquals'])
+def test_matches_legacy_config_level_method(method):
+    config = _synthetic_config(60, seed=3, methods=(None,))
+    for cluster in config['clusters']:
+        del cluster['match_method']
+        cluster['terms'] = [t.strip().lower() for t in cluster['terms']]
+    config['method'] = method
+    classifier = ClusterClassifier(config)
+    keywords = _synthetic_keywords(1000, seed=4) + ['seo', 'curso gratis']
+    for keyword in keywords:
+        assert classifier.classify(keyword.strip()) == legacy_classify_keyword_into_clusters(keyword.strip(), config)
+
+
+def test_overlapping_terms_and_invalid_regex():
+    config = {'enabled': True, 'clusters': [
+        {'name': 'Largo', 'terms': ['seo tools'], 'match_method': 'contains'},
+        {'name': 'Corto', 'terms': ['seo', 'tool'], 'match_method': 'contains'},
+        {'name': 'Prefijo', 'terms': ['se', 'seo t'], 'match_method': 'starts_with'},
+        {'name': 'Roto', 'terms': ['([', 'tools$'], 'match_method': 'regex'},
+        {'name': 'Sin términos', 'terms': [], 'match_method': 'contains'},
+    ]}
+
+    assert ClusterClassifier(config).classify(' SEO Tools ') == ['Largo', 'Corto', 'Prefijo', 'Roto']
+    assert ClusterClassifier(config).classify('mejores seo') == ['Corto']
+
+
+def test_disabled_config_and_memoization():
+    config = _synthetic_config(40, seed=5)
+    assert get_cluster_classifier({**config, 'enabled': False}).classify('seo') == []
+    assert get_cluster_classifier(None).classify('seo') == []
+
+    first = get_cluster_classifier(config)
+    assert get_cluster_classifier(_synthetic_config(40, seed=5)) is first
+    config['clusters'][0]['terms'].append('nuevo término')
+    assert get_cluster_classifier(config) is not first
+    assert len(cluster_classifier._cache) <= cluster_classifier._CACHE_MAX_ENTRIES
+
@@ -0,0 +1,245 @@
+"""
+Tests del Excel de /download-excel (excel_generator.py) escrito fila a fila
+con xlsxwriter en modo `constant_memory`.
+
+Los tests de estructura leen el fichero generado con openpyxl; el benchmark de
+memoria mide con tracemalloc el pico de la generación para 2k y 20k keywords y
+comprueba que el coste por fila adicional es de bytes (referencias para
+ordenar), no de kilobytes (DataFrames + celdas en memoria, como antes). Los
+hipervínculos sí se guardan en memoria hasta cerrar cada hoja; están acotados
+por EXCEL_MAX_URLS_PER_SHEET y el benchmark los limita para medir el resto.
+
+Ejecutar:
+    python3 -m pytest tests/test_excel_streaming.py -q
+    python3 tests/test_excel_streaming.py      # tabla de memoria
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+openpyxl = pytest.importorskip('openpyxl')
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import excel_generator
+from excel_generator import KEYWORD_COLUMNS, PAGE_COLUMNS, generate_excel_from_data, write_excel_to_tempfile
+
+
+def _synthetic_data(n_keywords, seed=1):
+    rnd = random.Random(seed)
+    keywords = []
+    for i in range(n_keywords):
+        kw = {
+            'keyword': f'keyword {i}',
+            'url': f'https://example.com/page/{i % 250}' if i % 11 else '',
+            'clicks_m1': rnd.randint(0, 500),
+            'impressions_m1': rnd.randint(0, 5000),
+            'ctr_m1': rnd.random() * 10,
+            'position_m1': round(rnd.uniform(1, 40), 1),
+        }
+        if i % 3:
+            kw.update(clicks_m2=rnd.randint(0, 500), impressions_m2=rnd.randint(0, 5000),
+                      ctr_m2=rnd.random() * 10, position_m2=round(rnd.uniform(1, 40), 1))
+        keywords.append(kw)
+    pages = [
+        {'URL': f'https://example.com/page/{i}',
+         'Metrics': [{'Clicks': i, 'Impressions': i * 10, 'CTR': 0.1, 'Position': 3.2, 'StartDate': '2024-02-01'},
+                     {'Clicks': i + 1, 'Impressions': 5, 'CTR': 0.2, 'Position': 4.5, 'StartDate': '2024-01-01'}]}
+        for i in range(max(1, n_keywords // 10))
+    ]
+    return {'pages': pages, 'keyword_comparison_data': keywords, 'selected_country': 'esp'}
+
+
+def _ai_overview_data(n=40):
+    results = []
+    for i in range(n):
+        results.append({
+            'keyword': f'keyword {i}',
+            'site_position': i % 20 or 'No encontrado',
+            'clicks_m1': i,
+            'impressions_m1': i * 3,
+            'ctr_m1': 0.05,
+            'cluster_name': 'Cluster',
+            'ai_analysis': {
+                'has_ai_overview': i % 2 == 0,
+                'domain_is_ai_source': i % 4 == 0,
+                'domain_ai_source_position': (i % 7) or '',
+                'debug_info': {'references_found': [
+                    {'link': f'https://www.rival{j}.com/post', 'index': j} for j in range(i % 4)
+                ]},
+            },
+        })
+    summary = {
+        'total_keywords_analyzed': n,
+        'keywords_with_ai_overview': n // 2,
+        'keywords_as_ai_source': n // 4,
+        'country_analyzed': 'esp',
+        'analysis_timestamp': 1700000000,
+        'competitor_analysis': [
+            {'domain': f'rival{j}.com', 'mentions': 10 - j, 'average_position': j + 1,
+             'visibility_percentage': 12.5, 'competitor_type': 'auto'}
+            for j in range(3)
+        ],
+        'most_cited_urls': [{'url': 'https://rival0.com/post', 'domain': 'rival0.com',
+                             'citation_count': 4, 'keywords_cited_in': ['a', 'b']}],
+    }
+    return {'results': results, 'summary': summary}
+
+
+def _rows(worksheet):
+    return [list(row) for row in worksheet.iter_rows(values_only=True)]
+
+
+def test_workbook_sheets_and_headers():
+    workbook = openpyxl.load_workbook(generate_excel_from_data(_synthetic_data(200), _ai_overview_data()))
+
+    assert workbook.sheetnames == [
+        'Información del Análisis', 'Resultados por URL', 'Keywords',
+        'Keywords Posiciones 1-3', 'Keywords Posiciones 4-10', 'Keywords Posiciones 11-20',
+        'AI Overview Analysis', 'AIO Competitors Analysis',
+    ]
+    assert _rows(workbook['Resultados por URL'])[0] == PAGE_COLUMNS
+    assert _rows(workbook['Keywords'])[0] == KEYWORD_COLUMNS
+    # P1 es el período más reciente aunque llegue en segunda posición
+    assert _rows(workbook['Resultados por URL'])[1][:3] == ['https://example.com/page/0', 0, 1]
+
+    header = workbook['Keywords Posiciones 1-3']['A1']
+    assert header.font.b and header.fill.fgColor.rgb.endswith('4472C4')
+    assert workbook['Keywords'].column_dimensions['B'].width > 50
+
+
+def test_keyword_sheets_sorted_by_url_then_clicks():
+    data = _synthetic_data(300)
+    workbook = openpyxl.load_workbook(generate_excel_from_data(data))
+    rows = _rows(workbook['Keywords'])[1:]
+
+    assert len(rows) == 300
+    keys = [(row[1], -row[2]) for row in rows]
+    assert keys == sorted(keys)
+    assert any(row[1] == 'URL no disponible' for row in rows)
+    # Keywords sin período de comparación dejan vacías las columnas P2
+    single = next(row for row in rows if row[0] == 'keyword 0')
+    assert single[3] is None and single[6] == f"{data['keyword_comparison_data'][0]['ctr_m1']:.2f}%"
+
+
+def test_empty_data_writes_explanatory_rows():
+    workbook = openpyxl.load_workbook(generate_excel_from_data(
+        {'pages': [], 'keyword_comparison_data': [], 'selected_country': ''}
+    ))
+
+    assert _rows(workbook['Resultados por URL'])[1][0] == 'No hay datos para Todos los países.'
+    assert _rows(workbook['Keywords'])[1][0] == 'No hay datos de keywords para Todos los países.'
+    assert _rows(workbook['Keywords Posiciones 4-10'])[1][0].startswith('No hay keywords en posiciones 4 a 10')
+    assert 'AI Overview Analysis' not in workbook.sheetnames
+
+
+def test_ai_overview_sections_and_competitor_layout():
+    ai_data = _ai_overview_data(40)
+    workbook = openpyxl.load_workbook(generate_excel_from_data(_synthetic_data(50), ai_data))
+
+    aio = workbook['AI Overview Analysis']
+    titles = [cell for cell in aio['A'] if cell.value == 'DETALLE COMPLETO POR KEYWORD']
+    assert len(titles) == 1 and titles[0].font.b
+    assert aio.cell(row=titles[0].row + 2, column=1).value == 'keyword 0'
+    assert aio.max_row == titles[0].row + 1 + 40
+
+    competitors = workbook['AIO Competitors Analysis']
+    assert competitors['A1'].value == 'RESUMEN COMPETIDORES'
+    assert competitors['A2'].value == 'Dominio' and competitors['A3'].value == 'rival0.com'
+    # 3 competidores + 2 filas de espaciado + 2 de separación → título de la tabla detallada en la fila 9 (1-based)
+    assert competitors['A9'].value == 'DETAILS OF KEYWORDS WITH AIO'
+    assert competitors['D10'].value == 'rival0.com in AIO'
+    assert competitors['A11'].value == 'keyword 0'
+    cited_title_row = 10 + 20 + 3   # cabecera + 20 keywords con AIO + espaciado
+    assert competitors.cell(row=cited_title_row, column=1).value == 'MOST CITED URLs'
+    assert competitors.cell(row=cited_title_row + 2, column=1).value == 'URL'
+
+
+def test_urls_are_hyperlinks_and_formula_like_strings_are_text():
+    data = _synthetic_data(5)
+    data['keyword_comparison_data'][1]['keyword'] = '=HYPERLINK("http://evil")'
+    workbook = openpyxl.load_workbook(generate_excel_from_data(data))
+    sheet = workbook['Keywords']
+
+    url_cells = [cell for cell in sheet['B'][1:] if cell.value.startswith('https://')]
+    assert url_cells and all(cell.hyperlink and cell.hyperlink.ref == cell.coordinate for cell in url_cells)
+    formula = next(cell for cell in sheet['A'] if cell.value and str(cell.value).startswith('='))
+    assert formula.data_type == 's' and formula.hyperlink is None
+
+
+def test_urls_past_the_sheet_limit_are_plain_text(monkeypatch):
+    monkeypatch.setattr(excel_generator, 'EXCEL_MAX_URLS_PER_SHEET', 3)
+    workbook = openpyxl.load_workbook(generate_excel_from_data(_synthetic_data(10)))
+    sheet = workbook['Keywords']
+
+    url_cells = [cell for cell in sheet['B'][1:] if cell.value.startswith('https://')]
+    assert len(url_cells) > 3
+    assert all(cell.hyperlink for cell in url_cells[:3])
+    assert all(cell.hyperlink is None for cell in url_cells[3:])
+
+
+def test_write_excel_to_tempfile_removes_file_on_error(monkeypatch, tmp_path):
+    path = write_excel_to_tempfile(_synthetic_data(10))
+    try:
+        assert os.path.getsize(path) > 0
+        openpyxl.load_workbook(path)
+    finally:
+        os.remove(path)
+
+    # xlsxwriter también crea temporales en modo constant_memory: se redirigen todos a tmp_path
+    monkeypatch.setattr(excel_generator.tempfile, 'tempdir', str(tmp_path))
+
+    def broken_sheets(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(excel_generator, 'create_keyword_position_sheets', broken_sheets)
+    with pytest.raises(RuntimeError):
+        write_excel_to_tempfile(_synthetic_data(10))
+    assert not list(tmp_path.glob('search_console_report_*'))
+
+
+# ================================
+# Benchmark de memoria
+# ================================
+
+def _peak_generation_memory(n_keywords):
+    """Pico de memoria (bytes) y tiempo de generar el Excel en disco, sin contar los datos de entrada."""
+    data, ai_data = _synthetic_data(n_keywords, seed=7), _ai_overview_data(200)
+    tracemalloc.start()
+    started = time.perf_counter()
+    path = write_excel_to_tempfile(data, ai_data)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    os.remove(path)
+    return peak, elapsed
+
+
+def run_benchmark(sizes=(2000, 20000, 80000)):
+    return [(n,) + _peak_generation_memory(n) for n in sizes]
+
+
+@pytest.mark.performance
+@pytest.mark.slow
+def test_generation_memory_does_not_grow_with_rows(monkeypatch):
+    # Con el tope real cada hipervínculo ocupa ~200 B hasta cerrar la hoja
+    monkeypatch.setattr(excel_generator, 'EXCEL_MAX_URLS_PER_SHEET', 1000)
+    (small_n, small_peak, _), (large_n, large_peak, _) = run_benchmark(sizes=(2000, 20000))
+    per_row = (large_peak - small_peak) / (large_n - small_n)
+    print(f"\npico {small_n}: {small_peak / 1e6:.1f} MB · pico {large_n}: {large_peak / 1e6:.1f} MB"
+          f" · {per_row:.0f} B/fila")
+    # Solo crecen las referencias y claves de orden de las keywords (~100 B/fila);
+    # con DataFrames y celdas en memoria eran ~3 KB por fila
+    assert per_row < 512
+    assert large_peak < 8 * 1024 * 1024
+
+
+if __name__ == '__main__':
+    print(f"{'keywords':>9} | {'pico':>9} | {'tiempo':>8}")
+    for n, peak, elapsed in run_benchmark():
+        print(f"{n:>9} | {peak / 1e6:>6.1f} MB | {elapsed:>7.2f}s")
@@ -0,0 +1,106 @@
+"""
+Tests del modo job asíncrono de /get-data (services/get_data_jobs.py).
+
+Cubre el ciclo de vida del job (cola → running → done/error), los eventos SSE
+de progreso, el aislamiento por usuario y el reporter nulo fuera de un job.
+Redis desactivado: el resultado se sirve desde memoria.
+
+Ejecutar:  python3 -m pytest tests/test_get_data_jobs.py -q
+"""
+
+import json
+
+import pytest
+from flask import Flask, g
+
+from services import get_data_jobs as jobs
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(jobs, '_redis_checked', True)
+    monkeypatch.setattr(jobs, '_redis', None)
+
+
+def _wait(job):
+    return list(jobs.stream_events(job))
+
+
+def test_job_reports_progress_and_result():
+    def run(job):
+        job.advance(pages_fetched=10)
+        job.advance(pages_fetched=5, keywords_processed=3)
+        return {'pages': [1, 2]}, 200
+
+    job = jobs.submit_job(1, run)
+    chunks = _wait(job)
+
+    assert chunks[-1].startswith('id: ')
+    assert 'event: done' in chunks[-1]
+    progress = [json.loads(c.split('data: ', 1)[1]) for c in chunks if 'event: progress' in c]
+    assert progress[-1]['progress'] == {'pages_fetched': 15, 'keywords_processed': 3}
+
+    job_info, payload, status = jobs.get_job_result(job.job_id, 1)
+    assert job_info['status'] == 'done'
+    assert payload == {'pages': [1, 2]}
+    assert status == 200
+
+
+def test_job_is_private_to_its_user():
+    job = jobs.submit_job(1, lambda j: ({}, 200))
+    _wait(job)
+    assert jobs.get_job(job.job_id, 2) is None
+    assert jobs.get_job_result(job.job_id, 2) is None
+
+
+def test_job_errors_are_reported():
+    def boom(job):
+        raise RuntimeError('quota')
+
+    job = jobs.submit_job(1, boom)
+    chunks = _wait(job)
+    assert 'event: error' in chunks[-1]
+    assert job.to_dict()['status'] == 'error'
+
+    job = jobs.submit_job(1, lambda j: ({'error': 'Fechas inválidas'}, 400))
+    _wait(job)
+    assert job.to_dict()['error'] == 'Fechas inválidas'
+
+
+def test_stream_resumes_after_last_event_id():
+    job = jobs.submit_job(1, lambda j: ({}, 200))
+    first = _wait(job)
+    resumed = list(jobs.stream_events(job, after_seq=len(first) - 1))
+    assert resumed == first[-1:]
+
+
+def test_current_progress_is_noop_outside_jobs():
+    app = Flask(__name__)
+    with app.app_context():
+        progress = jobs.current_progress()
+        progress.advance(pages_fetched=1)  # no falla
+        g.get_data_job = job = jobs.GetDataJob('x', 1)
+        assert jobs.current_progress() is job
+
+
+def test_custom_events_stream_partial_results():
+    # Modo job de /api/analyze-ai-overview: un evento `result` por keyword y executor propio
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(job):
+        job.set_counters(keywords_total=2, keywords_done=0)
+        job.publish('result', {'result': {'keyword': 'a', 'has_ai_overview': True}}, keywords_done=1)
+        job.publish('result', {'result': {'keyword': 'b', 'has_ai_overview': False}}, keywords_done=2)
+        job.set_phase('Calculando competidores y resumen')
+        return {'results': ['a', 'b']}, 200
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        job = jobs.submit_job(1, run, phase='Consultando SERPs', executor=executor)
+        chunks = _wait(job)
+
+    first = json.loads(chunks[0].split('data: ', 1)[1])
+    assert first['phase'] == 'Consultando SERPs'
+    partial = [json.loads(c.split('data: ', 1)[1]) for c in chunks if 'event: result' in c]
+    assert [p['result']['keyword'] for p in partial] == ['a', 'b']
+    assert partial[-1]['progress'] == {'keywords_total': 2, 'keywords_done': 2}
+    assert 'event: done' in chunks[-1]
@@ -0,0 +1,311 @@
+"""
+Tests de equivalencia de la agregación columnar de /get-data
+(services/gsc_aggregation.py).
+
+La implementación anterior (dicts anidados fila a fila) se reproduce aquí como
+referencia: los tests comprueban que la versión pandas/NumPy genera el mismo
+payload para el frontend. La comparación de tiempos con 25k y 100k filas
+sintéticas está en tests/benchmarks.py (fuera de la suite).
+
+Ejecutar:
+    python3 -m pytest tests/test_gsc_aggregation_performance.py -q
+    python3 -m tests.benchmarks gsc_aggregation      # tabla de tiempos
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services import gsc_aggregation as agg
+
+
+# ================================
+# Implementación anterior (referencia)
+# ================================
+
+def legacy_keywords_property(rows_data):
+    keyword_data = {}
+    for r_item in rows_data:
+        if len(r_item.get('keys', [])) >= 2:
+            query, page_url = r_item['keys'][0], r_item['keys'][1]
+            if not query:
+                continue
+            if query not in keyword_data:
+                keyword_data[query] = {'clicks': 0, 'impressions': 0, 'ctr_sum': 0.0, 'pos_sum': 0.0, 'count': 0,
+                                       'url': '', 'top_urls': [], 'top_urls_count': 0, 'url_metrics': {}}
+            kw_entry = keyword_data[query]
+            kw_entry['clicks'] += r_item['clicks']
+            kw_entry['impressions'] += r_item['impressions']
+            kw_entry['ctr_sum'] += r_item['ctr'] * r_item['impressions']
+            kw_entry['pos_sum'] += r_item['position'] * r_item['impressions']
+            kw_entry['count'] += r_item['impressions']
+            if page_url:
+                if page_url not in kw_entry['url_metrics']:
+                    kw_entry['url_metrics'][page_url] = {'clicks': 0, 'impressions': 0}
+                kw_entry['url_metrics'][page_url]['clicks'] += r_item['clicks']
+                kw_entry['url_metrics'][page_url]['impressions'] += r_item['impressions']
+    for _, kw_entry in keyword_data.items():
+        url_metrics = kw_entry.pop('url_metrics', {})
+        if not url_metrics:
+            continue
+        sorted_url_items = sorted(url_metrics.items(),
+                                  key=lambda item: (item[1].get('clicks', 0), item[1].get('impressions', 0)),
+                                  reverse=True)
+        all_urls_sorted = [url for url, _ in sorted_url_items]
+        kw_entry['url'] = all_urls_sorted[0]
+        kw_entry['top_urls'] = all_urls_sorted
+        kw_entry['top_urls_count'] = len(all_urls_sorted)
+    return keyword_data
+
+
+def legacy_keywords_by_page(rows_data):
+    keyword_data = {}
+    for r_item in rows_data:
+        if len(r_item.get('keys', [])) >= 2:
+            page_url, query = r_item['keys'][0], r_item['keys'][1]
+            unique_key = f"{query}|||{page_url}"
+            if unique_key not in keyword_data:
+                keyword_data[unique_key] = {'clicks': 0, 'impressions': 0, 'ctr_sum': 0.0, 'pos_sum': 0.0,
+                                            'count': 0, 'url': page_url, 'keyword': query,
+                                            'top_urls': [page_url], 'top_urls_count': 1}
+            kw_entry = keyword_data[unique_key]
+            kw_entry['clicks'] += r_item['clicks']
+            kw_entry['impressions'] += r_item['impressions']
+            kw_entry['ctr_sum'] += r_item['ctr'] * r_item['impressions']
+            kw_entry['pos_sum'] += r_item['position'] * r_item['impressions']
+            kw_entry['count'] += r_item['impressions']
+    return keyword_data
+
+
+def legacy_keyword_stats(current_kw, comparison_kw=None):
+    def process_kw_by_position(kw_data):
+        stats = {'total': set(), 'pos1_3': set(), 'pos4_10': set(), 'pos11_20': set(), 'pos20_plus': set()}
+        for unique_key, data in kw_data.items():
+            if data['count'] > 0:
+                avg_pos = data['pos_sum'] / data['count']
+                stats['total'].add(unique_key)
+                if avg_pos <= 3:
+                    stats['pos1_3'].add(unique_key)
+                elif avg_pos <= 10:
+                    stats['pos4_10'].add(unique_key)
+                elif avg_pos <= 20:
+                    stats['pos11_20'].add(unique_key)
+                else:
+                    stats['pos20_plus'].add(unique_key)
+        return stats
+
+    current_stats = process_kw_by_position(current_kw)
+    keyword_stats = {
+        'overall': {'total': len(current_stats['total'])},
+        'total': {'current': len(current_stats['total'])},
+        'top3': {'current': len(current_stats['pos1_3'])},
+        'top10': {'current': len(current_stats['pos4_10'])},
+        'top20': {'current': len(current_stats['pos11_20'])},
+        'top20plus': {'current': len(current_stats['pos20_plus'])}
+    }
+    if comparison_kw and len(comparison_kw) > 0:
+        comparison_stats = process_kw_by_position(comparison_kw)
+        for key, label in [('total', 'total'), ('pos1_3', 'top3'), ('pos4_10', 'top10'),
+                           ('pos11_20', 'top20'), ('pos20_plus', 'top20plus')]:
+            current_set, comparison_set = current_stats[key], comparison_stats[key]
+            keyword_stats[label].update({
+                'previous': len(comparison_set),
+                'new': len(current_set - comparison_set),
+                'lost': len(comparison_set - current_set),
+                'stay': len(current_set & comparison_set)
+            })
+        current_positions = {q: d['pos_sum'] / d['count'] for q, d in current_kw.items() if d['count'] > 0}
+        comparison_positions = {q: d['pos_sum'] / d['count'] for q, d in comparison_kw.items() if d['count'] > 0}
+        common_queries = set(current_positions) & set(comparison_positions)
+        keyword_stats['overall'] = {
+            'total': len(current_positions),
+            'improved': sum(1 for q in common_queries if current_positions[q] < comparison_positions[q]),
+            'worsened': sum(1 for q in common_queries if current_positions[q] > comparison_positions[q]),
+            'same': sum(1 for q in common_queries if current_positions[q] == comparison_positions[q]),
+            'new': len(set(current_positions) - set(comparison_positions)),
+            'lost': len(set(comparison_positions) - set(current_positions))
+        }
+    else:
+        for label in ['total', 'top3', 'top10', 'top20', 'top20plus']:
+            keyword_stats[label].update({'previous': 0, 'new': 0, 'lost': 0,
+                                         'stay': keyword_stats[label]['current']})
+        keyword_stats['overall'].update({'improved': 0, 'worsened': 0, 'same': 0,
+                                         'new': len(current_stats['total']), 'lost': 0})
+    return keyword_stats
+
+
+def legacy_keyword_comparison(current_kw, comparison_kw=None):
+    def extract_keyword_from_key(key, data):
+        if '|||' in key:
+            return data.get('keyword', key.split('|||')[0])
+        return key
+
+    def pct(new_val, old_val):
+        if old_val == 0:
+            return 'Infinity' if new_val > 0 else 0
+        return ((new_val / old_val) - 1) * 100
+
+    comparison_data = []
+    if not comparison_kw:
+        for unique_key, d in current_kw.items():
+            comparison_data.append({
+                'keyword': extract_keyword_from_key(unique_key, d),
+                'url': d.get('url', ''), 'top_urls': d.get('top_urls', []),
+                'top_urls_count': d.get('top_urls_count', 0),
+                'clicks_m1': d['clicks'], 'clicks_m2': 0, 'delta_clicks_percent': 'New',
+                'impressions_m1': d['impressions'], 'impressions_m2': 0, 'delta_impressions_percent': 'New',
+                'ctr_m1': (d['ctr_sum'] / d['count'] * 100) if d['count'] > 0 else 0, 'ctr_m2': 0,
+                'delta_ctr_percent': 'New',
+                'position_m1': (d['pos_sum'] / d['count']) if d['count'] > 0 else None, 'position_m2': None,
+                'delta_position_absolute': 'New'
+            })
+        return comparison_data
+
+    empty = {'clicks': 0, 'impressions': 0, 'ctr_sum': 0, 'pos_sum': 0, 'count': 0, 'url': '', 'keyword': '',
+             'top_urls': [], 'top_urls_count': 0}
+    for unique_key in set(current_kw) | set(comparison_kw):
+        c = current_kw.get(unique_key, empty)
+        p = comparison_kw.get(unique_key, empty)
+        c_ctr = (c['ctr_sum'] / c['count'] * 100) if c['count'] > 0 else 0
+        p_ctr = (p['ctr_sum'] / p['count'] * 100) if p['count'] > 0 else 0
+        c_pos = (c['pos_sum'] / c['count']) if c['count'] > 0 else None
+        p_pos = (p['pos_sum'] / p['count']) if p['count'] > 0 else None
+        comparison_data.append({
+            'keyword': extract_keyword_from_key(unique_key, c) or extract_keyword_from_key(unique_key, p),
+            'url': c.get('url') or p.get('url', ''),
+            'top_urls': c.get('top_urls') or p.get('top_urls', []),
+            'top_urls_count': c.get('top_urls_count') or p.get('top_urls_count', 0),
+            'clicks_m1': c['clicks'], 'clicks_m2': p['clicks'], 'delta_clicks_percent': pct(c['clicks'], p['clicks']),
+            'impressions_m1': c['impressions'], 'impressions_m2': p['impressions'],
+            'delta_impressions_percent': pct(c['impressions'], p['impressions']),
+            'ctr_m1': c_ctr, 'ctr_m2': p_ctr, 'delta_ctr_percent': c_ctr - p_ctr,
+            'position_m1': c_pos, 'position_m2': p_pos,
+            'delta_position_absolute': c_pos - p_pos if c_pos is not None and p_pos is not None
+            else ('New' if c_pos is not None else 'Lost')
+        })
+    return comparison_data
+
+
+def legacy_urls(rows_data, label, start, end):
+    period_data = {}
+    for r_item in rows_data:
+        period_data.setdefault(r_item['keys'][0], []).append({
+            'Period': label, 'StartDate': start, 'EndDate': end,
+            'Clicks': r_item['clicks'], 'Impressions': r_item['impressions'],
+            'CTR': r_item['ctr'], 'Position': r_item['position']
+        })
+    return period_data
+
+
+def legacy_combine(current, comparison, cur_period, cmp_period):
+    def zero(p):
+        return [{'Period': p['label'], 'StartDate': p['start'], 'EndDate': p['end'],
+                 'Clicks': 0, 'Impressions': 0, 'CTR': 0.0, 'Position': 0.0}]
+    if cmp_period is None:
+        return [{'URL': u, 'Metrics': m} for u, m in current.items()]
+    return [{'URL': u, 'Metrics': (current.get(u) or zero(cur_period)) + (comparison.get(u) or zero(cmp_period))}
+            for u in set(current) | set(comparison)]
+
+
+# ================================
+# Datos sintéticos
+# ================================
+
+def _synthetic_rows(n_rows, seed, page_first=False, n_pages=None):
+    rng = random.Random(seed)
+    n_pages = n_pages or max(10, n_rows // 20)
+    rows = []
+    for i in range(n_rows):
+        query = f"keyword {rng.randrange(n_rows // 3 or 1)}"
+        page = f"https://example.com/p/{rng.randrange(n_pages)}"
+        impressions = rng.randint(1, 500)
+        clicks = rng.randint(0, impressions // 5)
+        rows.append({
+            'keys': [page, query] if page_first else [query, page],
+            'clicks': clicks, 'impressions': impressions,
+            'ctr': clicks / impressions, 'position': rng.uniform(1, 60)
+        })
+    return rows
+
+
+def _page_rows(n_rows, seed):
+    rng = random.Random(seed)
+    return [{'keys': [f"https://example.com/p/{rng.randrange(n_rows)}"], 'clicks': rng.randint(0, 50),
+             'impressions': rng.randint(50, 900), 'ctr': rng.random() / 10, 'position': rng.uniform(1, 40)}
+            for _ in range(n_rows)]
+
+
+def _normalize(rows, key=('keyword', 'url')):
+    """Ordena filas y redondea floats para comparar con la referencia."""
+    def clean(v):
+        if isinstance(v, float):
+            return round(v, 6)
+        if isinstance(v, list):
+            return [clean(x) for x in v]
+        if isinstance(v, dict):
+            return {k: clean(x) for k, x in v.items()}
+        return v
+    return sorted((clean(r) for r in rows), key=lambda r: tuple(str(r[k]) for k in key))
+
+
+CUR = {'label': '2026-01-01 to 2026-01-31 (Current)', 'start': '2026-01-01', 'end': '2026-01-31'}
+CMP = {'label': '2025-12-01 to 2025-12-31 (Comparison)', 'start': '2025-12-01', 'end': '2025-12-31'}
+
+
+# ================================
+# Equivalencia
+# ================================
+
+@pytest.mark.parametrize('by_page', [False, True])
+def test_keyword_pipeline_matches_legacy(by_page):
+    cur_rows = _synthetic_rows(3000, seed=1, page_first=by_page)
+    cmp_rows = _synthetic_rows(3000, seed=2, page_first=by_page)
+    if not by_page:
+        cur_rows.append({'keys': ['', 'https://example.com/x'], 'clicks': 1, 'impressions': 2, 'ctr': 0.5, 'position': 1})
+        cur_rows.append({'keys': ['sin landing', ''], 'clicks': 1, 'impressions': 2, 'ctr': 0.5, 'position': 1})
+    legacy = legacy_keywords_by_page if by_page else legacy_keywords_property
+
+    old_cur, old_cmp = legacy(cur_rows), legacy(cmp_rows)
+    new_cur = agg.aggregate_keywords(cur_rows, by_page=by_page)
+    new_cmp = agg.aggregate_keywords(cmp_rows, by_page=by_page)
+
+    assert len(new_cur) == len(old_cur)
+    assert agg.keyword_stats(new_cur, new_cmp) == legacy_keyword_stats(old_cur, old_cmp)
+    assert agg.keyword_stats(new_cur) == legacy_keyword_stats(old_cur)
+
+    # Sin comparación el orden (primera aparición) también se conserva
+    assert [_normalize([r])[0] for r in agg.keyword_comparison(new_cur)] == \
+        [_normalize([r])[0] for r in legacy_keyword_comparison(old_cur)]
+    assert _normalize(agg.keyword_comparison(new_cur, new_cmp)) == \
+        _normalize(legacy_keyword_comparison(old_cur, old_cmp))
+
+
+def test_url_payload_matches_legacy():
+    cur_rows, cmp_rows = _page_rows(2000, seed=3), _page_rows(2000, seed=4)
+    new_cur, new_cmp = agg.page_metrics_frame(cur_rows), agg.page_metrics_frame(cmp_rows)
+    old_cur = legacy_urls(cur_rows, CUR['label'], CUR['start'], CUR['end'])
+    old_cmp = legacy_urls(cmp_rows, CMP['label'], CMP['start'], CMP['end'])
+
+    assert agg.build_metrics_payload(new_cur, CUR) == legacy_combine(old_cur, {}, CUR, None)
+    assert _normalize(agg.build_metrics_payload(new_cur, CUR, new_cmp, CMP), key=('URL',)) == \
+        _normalize(legacy_combine(old_cur, old_cmp, CUR, CMP), key=('URL',))
+
+
+def test_empty_periods():
+    empty = agg.aggregate_keywords([], by_page=False)
+    some = agg.aggregate_keywords(_synthetic_rows(50, seed=5), by_page=False)
+    assert agg.keyword_comparison(empty) == []
+    assert agg.keyword_stats(empty)['overall']['total'] == 0
+    lost = agg.keyword_comparison(empty, some)
+    assert len(lost) == len(some)
+    assert all(r['delta_position_absolute'] == 'Lost' and r['clicks_m1'] == 0 for r in lost)
+    assert agg.build_metrics_payload(agg.page_metrics_frame([]), CUR) == []
+
+    summary = agg.property_summary_frame([], 'sc-domain:example.com (propiedad completa)')
+    payload = agg.build_metrics_payload(summary, CUR, agg.page_metrics_frame(_page_rows(1, seed=6)), CMP)
+    assert payload[0]['Metrics'][0]['Clicks'] == 0
+
@@ -0,0 +1,120 @@
+"""
+Tests de la caché de respuestas de Search Console (`GSCResponseCache`).
+
+Verifica que los rangos cerrados se guardan con TTL largo y se sirven desde
+Redis, que con la dimensión `date` solo se vuelve a descargar la cola de días
+"asentándose", que el orden de los filtros no altera la clave y que cuentas de
+Google distintas no comparten entradas. Usa un Redis simulado en memoria.
+
+Ejecutar:  python3 -m pytest tests/test_gsc_response_cache.py -q
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from services import ai_cache as cache_mod
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value
+        self.ttls[key] = ttl
+
+
+@pytest.fixture
+def cache():
+    c = cache_mod.GSCResponseCache()
+    c.redis_client = _FakeRedis()
+    c.cache_available = True
+    return c
+
+
+class _Fetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        return [{'keys': [start], 'clicks': 1, 'impressions': 2, 'ctr': 0.5, 'position': 1.0}]
+
+
+def _d(cache, days_after_cutoff):
+    return (cache.settling_cutoff() + timedelta(days=days_after_cutoff)).strftime('%Y-%m-%d')
+
+
+def test_closed_range_is_cached_with_long_ttl(cache):
+    fetch = _Fetcher()
+    args = ('scope', 'sc-domain:example.com', _d(cache, -30), _d(cache, -1), ['page'], None)
+
+    first = cache.get_or_fetch(*args, fetch)
+    second = cache.get_or_fetch(*args, fetch)
+
+    assert first == second
+    assert len(fetch.calls) == 1
+    assert list(cache.redis_client.ttls.values()) == [int(cache.immutable_duration.total_seconds())]
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+
+def test_date_dimension_only_refetches_settling_tail(cache):
+    fetch = _Fetcher()
+    start, end = _d(cache, -10), _d(cache, 2)
+
+    cache.get_or_fetch('scope', 'sc-domain:example.com', start, end, ['date'], None, fetch)
+    assert fetch.calls == [(start, _d(cache, 0)), (_d(cache, 1), end)]
+
+    # La cola expira (TTL corto): solo se vuelve a pedir ese tramo
+    tail_keys = [k for k, ttl in cache.redis_client.ttls.items()
+                 if ttl == int(cache.settling_duration.total_seconds())]
+    assert len(tail_keys) == 1
+    del cache.redis_client.store[tail_keys[0]]
+
+    rows = cache.get_or_fetch('scope', 'sc-domain:example.com', start, end, ['date'], None, fetch)
+    assert fetch.calls[-1] == (_d(cache, 1), end)
+    assert len(fetch.calls) == 3
+    assert len(rows) == 2
+    assert cache.get_stats()['partial_hits'] == 1
+
+
+def test_non_date_dimensions_in_settling_window_use_short_ttl(cache):
+    fetch = _Fetcher()
+    cache.get_or_fetch('scope', 'sc-domain:example.com', _d(cache, -10), _d(cache, 2), ['query'], None, fetch)
+    assert len(fetch.calls) == 1
+    assert list(cache.redis_client.ttls.values()) == [int(cache.settling_duration.total_seconds())]
+
+
+def test_filter_order_does_not_change_key(cache):
+    f1 = [{'filters': [{'dimension': 'page', 'operator': 'contains', 'expression': '/a'}]},
+          {'filters': [{'dimension': 'country', 'operator': 'equals', 'expression': 'esp'}]}]
+    f2 = list(reversed(f1))
+    k1 = cache._generate_cache_key('s', 'sc-domain:x.com', ['page'], f1, '2026-01-01', '2026-01-31')
+    k2 = cache._generate_cache_key('s', 'sc-domain:x.com', ['page'], f2, '2026-01-01', '2026-01-31')
+    assert k1 == k2
+
+
+def test_entries_are_isolated_per_google_account(cache):
+    fetch = _Fetcher()
+    args = ('sc-domain:example.com', _d(cache, -30), _d(cache, -1), ['page'], None)
+    cache.get_or_fetch('account-a', *args, fetch)
+    cache.get_or_fetch('account-b', *args, fetch)
+    cache.get_or_fetch(None, *args, fetch)
+    assert len(fetch.calls) == 3
+    assert cache.get_stats()['bypassed'] == 1
+
+
+def test_cached_rows_are_emitted_to_streaming_callers(cache):
+    fetch = _Fetcher()
+    args = ('scope', 'sc-domain:example.com', _d(cache, -30), _d(cache, -1), ['page'], None)
+    cache.get_or_fetch(*args, fetch)
+
+    emitted = []
+    cache.get_or_fetch(*args, fetch, on_cached=emitted.append)
+    assert len(emitted) == 1 and emitted[0][0]['keys'] == [_d(cache, -30)]
@@ -0,0 +1,205 @@
+"""
+Tests del motor de descarga de Search Console (services/search_console.py).
+
+Cubre la paginación automática por `startRow` (antes se truncaba a 25.000
+filas en silencio), el total pedido con `row_limit`, el tope `max_rows`, el fan-out de varias consultas y el
+limitador de QPS por propiedad. Usa un service de GSC simulado (sin red).
+
+Ejecutar:  python3 -m pytest tests/test_search_console_engine.py -q
+"""
+
+import threading
+
+import pytest
+
+from services import search_console as sc
+
+
+class _FakeRequest:
+    def __init__(self, owner, site_url, body):
+        self.owner = owner
+        self.site_url = site_url
+        self.body = body
+
+    def execute(self, http=None):
+        with self.owner.lock:
+            self.owner.bodies.append(self.body)
+        total = self.owner.total_rows.get(self.site_url, 0)
+        start = self.body.get('startRow', 0)
+        end = min(total, start + self.body['rowLimit'])
+        tag = self.body['dimensionFilterGroups'][0]['filters'][0]['expression'] \
+            if self.body.get('dimensionFilterGroups') else 'all'
+        rows = [
+            {'keys': [f'{tag}/{i}'], 'clicks': 1, 'impressions': 10, 'ctr': 0.1, 'position': 3.0}
+            for i in range(start, end)
+        ]
+        return {'rows': rows} if rows else {}
+
+
+class _FakeService:
+    """Imita service.searchanalytics().query(siteUrl=..., body=...).execute()."""
+
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        return _FakeRequest(self, siteUrl, body)
+
+
+@pytest.fixture(autouse=True)
+def _no_rate_limit(monkeypatch):
+    monkeypatch.setattr(sc, 'gsc_rate_limiter', sc.PropertyRateLimiter(0))
+
+
+def test_single_call_follows_start_row(monkeypatch):
+    monkeypatch.setattr(sc, 'GSC_PAGE_SIZE', 5)
+    service = _FakeService({'sc-domain:example.com': 12})
+    rows = sc.fetch_searchconsole_data_single_call(
+        service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page']
+    )
+    assert len(rows) == 12
+    assert [b['startRow'] for b in service.bodies] == [0, 5, 10]
+
+
+def test_single_call_stops_on_exact_multiple_with_empty_page(monkeypatch):
+    monkeypatch.setattr(sc, 'GSC_PAGE_SIZE', 5)
+    service = _FakeService({'sc-domain:example.com': 10})
+    rows = sc.fetch_searchconsole_data_single_call(
+        service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page']
+    )
+    assert len(rows) == 10
+    assert [b['startRow'] for b in service.bodies] == [0, 5, 10]
+
+
+def test_max_rows_caps_download(monkeypatch):
+    monkeypatch.setattr(sc, 'GSC_PAGE_SIZE', 10)
+    service = _FakeService({'sc-domain:example.com': 100})
+    rows = sc.fetch_searchconsole_data_single_call(
+        service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page'], max_rows=30
+    )
+    assert len(rows) == 30
+    assert len(service.bodies) == 3
+
+
+def test_row_limit_is_a_total_cap_not_a_page_size(monkeypatch):
+    monkeypatch.setattr(sc, 'GSC_PAGE_SIZE', 10)
+    warnings = []
+    monkeypatch.setattr(sc.logger, 'warning', warnings.append)
+    service = _FakeService({'sc-domain:example.com': 100})
+    rows = sc.fetch_searchconsole_data_single_call(
+        service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page'], row_limit=25
+    )
+    assert len(rows) == 25
+    assert [b['rowLimit'] for b in service.bodies] == [10, 10, 5]
+    # Es lo que pidió el llamador: no se avisa de truncado
+    assert warnings == []
+
+    service = _FakeService({'sc-domain:example.com': 100})
+    rows = sc.fetch_searchconsole_data_single_call(
+        service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page'], row_limit=5
+    )
+    assert len(rows) == 5
+    assert [b['rowLimit'] for b in service.bodies] == [5]
+
+
+def test_multi_returns_rows_per_key_including_empty():
+    service = _FakeService({'sc-domain:example.com': 3})
+    queries = [
+        {
+            'key': url,
+            'start_date': '2026-01-01',
+            'end_date': '2026-01-31',
+            'dimensions': ['page'],
+            'filters': [{'filters': [{'dimension': 'page', 'operator': 'contains', 'expression': url}]}],
+        }
+        for url in ('/blog', '/shop')
+    ]
+    result = sc.fetch_searchconsole_data_multi(service, 'sc-domain:example.com', queries, max_workers=4)
+    assert set(result) == {'/blog', '/shop'}
+    assert [r['keys'][0] for r in result['/blog']] == ['/blog/0', '/blog/1', '/blog/2']
+    assert len(result['/shop']) == 3
+
+    assert sc.fetch_searchconsole_data_multi(service, 'sc-domain:example.com', []) == {}
+
+
+def test_stream_propagates_errors():
+    class _Boom(_FakeService):
+        def query(self, siteUrl, body):
+            raise RuntimeError('quota')
+
+    queries = [{'key': 'a', 'start_date': '2026-01-01', 'end_date': '2026-01-02', 'dimensions': ['page']}]
+    with pytest.raises(RuntimeError):
+        list(sc.stream_searchconsole_queries(_Boom({}), 'sc-domain:example.com', queries))
+
+
+def test_rate_limiter_throttles_per_property(monkeypatch):
+    limiter = sc.PropertyRateLimiter(qps=2)
+    sleeps = []
+    monkeypatch.setattr(sc.time, 'sleep', lambda s: sleeps.append(s))
+
+    # El bucket arranca lleno (2 tokens); el tercero debe esperar
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') == 0
+    # Otra propiedad tiene su propio bucket
+    assert limiter.acquire('b') == 0
+    limiter._updated['a'] -= 1.0  # simula que pasó 1 s → se reponen tokens
+    assert limiter.acquire('a') == 0
+    assert sleeps == []
+
+
+def test_concurrent_fetches_return_results_and_timings(monkeypatch):
+    service = _FakeService({'sc-domain:example.com': 4})
+    # Con transporte por hilo simulado se usa el pool de verdad
+    monkeypatch.setattr(sc, '_new_thread_http', lambda s: object())
+    seen_http = []
+
+    def _task(http):
+        seen_http.append(http)
+        return sc.fetch_searchconsole_data_single_call(
+            service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page'], http=http
+        )
+
+    results, timings = sc.run_concurrent_fetches(service, {'current': _task, 'comparison': _task})
+    assert set(results) == set(timings) == {'current', 'comparison'}
+    assert len(results['current']) == 4
+    assert all(h is not None for h in seen_http)
+    assert all(t >= 0 for t in timings.values())
+
+
+def test_concurrent_fetches_fall_back_to_sequential_and_propagate_errors():
+    service = _FakeService({})
+    calls = []
+
+    def _ok(http):
+        calls.append(http)
+        return 'ok'
+
+    def _boom(http):
+        raise RuntimeError('quota')
+
+    results, _ = sc.run_concurrent_fetches(service, {'a': _ok, 'b': _ok})
+    assert results == {'a': 'ok', 'b': 'ok'}
+    assert calls == [None, None]  # sin credenciales: mismo hilo, transporte compartido
+
+    with pytest.raises(RuntimeError):
+        sc.run_concurrent_fetches(service, {'a': _ok, 'b': _boom})
+
+
+def test_user_rate_limiter_applies_per_google_account(monkeypatch):
+    acquired = []
+
+    class _Limiter:
+        def acquire(self, key):
+            acquired.append(key)
+            return 0.0
+
+    monkeypatch.setattr(sc, 'gsc_user_rate_limiter', _Limiter())
+    monkeypatch.setattr(sc, '_cache_scope', lambda s: 'account-1')
+    service = _FakeService({'sc-domain:example.com': 3})
+    list(sc.iter_searchconsole_pages(service, 'sc-domain:example.com', '2026-01-01', '2026-01-31', ['page'], page_size=2))
+    assert acquired == ['account-1', 'account-1']
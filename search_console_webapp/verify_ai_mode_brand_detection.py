@@ -3,6 +3,7 @@ Script para verificar el sistema de detección de marca en AI Mode
 """
 import sys
 from database import get_db_connection
+from services.payload_blobs import hydrate_payloads
 import json
 
 def verify_brand_detection(project_id: int):
@@ -36,16 +37,17 @@ def verify_brand_detection(project_id: int):
             r.analysis_date,
             r.brand_mentioned,
             r.mention_position,
-            r.raw_ai_mode_data
+            r.raw_ai_mode_data,
+            r.raw_ai_mode_data_hash
         FROM ai_mode_results r
         JOIN ai_mode_keywords k ON r.keyword_id = k.id
         WHERE r.project_id = %s
-            AND r.raw_ai_mode_data IS NOT NULL
+            AND (r.raw_ai_mode_data IS NOT NULL OR r.raw_ai_mode_data_hash IS NOT NULL)
         ORDER BY r.analysis_date DESC
         LIMIT 10
     """, (project_id,))
     
-    results = cur.fetchall()
+    results = hydrate_payloads(cur.fetchall(), 'raw_ai_mode_data')
     
     if not results:
         print("⚠️  No hay resultados de análisis disponibles")